@@ -13,6 +13,7 @@ from app.db import Base, get_database_url
 # Import all models so Alembic can detect them
 from app.models.user import User
 from app.models.case import Case
+from app.models.case_match_key import CaseMatchKey
 from app.models.search import Search
 from app.models.event import Event
 from app.models.flyer_template import FlyerTemplate
@@ -26,6 +27,8 @@ from app.models.settings import Settings
 from app.models.forum_import import ForumImportStatus
 from app.models.organization import Organization
 from app.models.call_recording_link import CallRecordingLink
+from app.models.upload_ref import UploadRef
+from app.models.media_info import MediaInfo
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,138 @@
+"""Add case duplicate detection index
+
+Revision ID: 014_add_case_dedup_index
+Revises: 013_add_voice_bot_prompt
+Create Date: 2026-10-18
+
+"""
+import re
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '014_add_case_dedup_index'
+down_revision = '013_add_voice_bot_prompt'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('cases', sa.Column('duplicate_of_case_id', sa.Integer(), sa.ForeignKey('cases.id', ondelete='SET NULL'), nullable=True))
+    op.create_index('ix_cases_duplicate_of_case_id', 'cases', ['duplicate_of_case_id'])
+
+    op.create_table(
+        'case_match_keys',
+        sa.Column('id', sa.Integer(), primary_key=True, index=True),
+        sa.Column('case_id', sa.Integer(), sa.ForeignKey('cases.id', ondelete='CASCADE'), nullable=False, index=True),
+        sa.Column('match_key', sa.String(300), nullable=False, index=True),
+    )
+
+    _backfill_match_keys()
+
+
+# Frozen copy of the key builder of app/services/dedup_service.py at this
+# revision: a migration must not change when the application code does.
+_PLACEHOLDER_NAMES = {"невідомо", "неизвестно", "unknown"}
+_LETTER_FOLDS = str.maketrans({
+    "ё": "е", "є": "е", "э": "е",
+    "ї": "и", "і": "и", "ы": "и", "й": "и",
+    "ґ": "г",
+})
+
+
+def _normalize_name(value):
+    if not value:
+        return ""
+    text = value.strip().lower()
+    if text in _PLACEHOLDER_NAMES:
+        return ""
+    return re.sub(r"[\W\d_]", "", text.translate(_LETTER_FOLDS))
+
+
+def _normalize_phone(value):
+    digits = re.sub(r"\D", "", value or "")
+    if digits.startswith("380") and len(digits) >= 12:
+        digits = digits[3:]
+    elif digits.startswith("0") and len(digits) >= 10:
+        digits = digits[1:]
+    if len(digits) < 7:
+        return ""
+    return digits[-9:]
+
+
+def _normalize_settlement(value):
+    if not value:
+        return ""
+    text = value.lower().strip()
+    text = re.sub(r"^(м\.|с\.|смт\.?|сел\.|місто|село|г\.|пгт\.?)\s*", "", text)
+    return _normalize_name(text.split(",")[0])
+
+
+def _date_key(value):
+    if not value:
+        return ""
+    if isinstance(value, str):
+        return value[:10]
+    return value.date().isoformat() if isinstance(value, datetime) else value.isoformat()
+
+
+def _match_keys(applicant_phone, persons):
+    """persons: (last_name, first_name, birthdate, settlement, phone) tuples"""
+    keys = set()
+    phone = _normalize_phone(applicant_phone)
+    if phone:
+        keys.add(f"phone:{phone}")
+    for last_name, first_name, birthdate, settlement, person_phone in persons:
+        phone = _normalize_phone(person_phone)
+        if phone:
+            keys.add(f"phone:{phone}")
+        last_name, first_name = _normalize_name(last_name), _normalize_name(first_name)
+        if not last_name or not first_name:
+            continue
+        name = f"{last_name}|{first_name}"
+        keys.add(f"name:{name}")
+        birthdate = _date_key(birthdate)
+        if birthdate:
+            keys.add(f"name_bd:{name}|{birthdate}")
+        settlement = _normalize_settlement(settlement)
+        if settlement:
+            keys.add(f"name_st:{name}|{settlement}")
+    return {key[:300] for key in keys}
+
+
+def _backfill_match_keys():
+    """Index existing cases"""
+    bind = op.get_bind()
+    cases = bind.execute(sa.text("""
+        SELECT id, applicant_phone, missing_last_name, missing_first_name,
+               missing_birthdate, missing_settlement, missing_phone
+        FROM cases
+    """)).fetchall()
+    persons: dict = {}
+    for row in bind.execute(sa.text("""
+        SELECT case_id, last_name, first_name, birthdate, settlement, phone
+        FROM missing_persons
+    """)):
+        persons.setdefault(row.case_id, []).append(row)
+
+    match_keys = sa.table('case_match_keys', sa.column('case_id', sa.Integer), sa.column('match_key', sa.String))
+    rows = []
+    for case in cases:
+        case_persons = [
+            (mp.last_name, mp.first_name, mp.birthdate, mp.settlement or case.missing_settlement, mp.phone)
+            for mp in persons.get(case.id, [])
+        ]
+        case_persons.append((
+            case.missing_last_name, case.missing_first_name, case.missing_birthdate,
+            case.missing_settlement, case.missing_phone
+        ))
+        rows.extend({"case_id": case.id, "match_key": key} for key in _match_keys(case.applicant_phone, case_persons))
+    if rows:
+        op.bulk_insert(match_keys, rows)
+
+
+def downgrade():
+    op.drop_table('case_match_keys')
+    op.drop_index('ix_cases_duplicate_of_case_id', table_name='cases')
+    op.drop_column('cases', 'duplicate_of_case_id')
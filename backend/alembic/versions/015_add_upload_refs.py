@@ -0,0 +1,63 @@
+"""Add upload reference tracking
+
+Revision ID: 015_add_upload_refs
+Revises: 014_add_case_dedup_index
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '015_add_upload_refs'
+down_revision = '014_add_case_dedup_index'
+branch_labels = None
+depends_on = None
+
+# (table, owner_type, column, is_array) - keep in sync with services/upload_refs.py
+TRACKED_COLUMNS = [
+    ('cases', 'case', 'missing_photos', True),
+    ('cases', 'case', 'notes_images', True),
+    ('missing_persons', 'missing_person', 'photos', True),
+    ('missing_persons', 'missing_person', 'videos', True),
+    ('events', 'event', 'media_files', True),
+    ('orientations', 'orientation', 'selected_photos', True),
+    ('orientations', 'orientation', 'exported_files', True),
+    ('orientations', 'orientation', 'uploaded_images', True),
+    ('field_searches', 'field_search', 'search_tracks', True),
+    ('field_searches', 'field_search', 'search_photos', True),
+    ('field_searches', 'field_search', 'preparation_grid_file', False),
+    ('field_searches', 'field_search', 'preparation_map_image', False),
+]
+
+
+def upgrade():
+    op.create_table(
+        'upload_refs',
+        sa.Column('id', sa.Integer(), primary_key=True, index=True),
+        sa.Column('url', sa.String(500), nullable=False, index=True),
+        sa.Column('sha256', sa.String(64), nullable=True, index=True),
+        sa.Column('owner_type', sa.String(50), nullable=False),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('field', sa.String(50), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.UniqueConstraint('url', 'owner_type', 'owner_id', 'field', name='uq_upload_refs_url_owner_field'),
+    )
+    op.create_index('ix_upload_refs_owner', 'upload_refs', ['owner_type', 'owner_id'])
+
+    # Backfill references of existing records (legacy files get sha256 = NULL)
+    for table, owner_type, column, is_array in TRACKED_COLUMNS:
+        source = f"unnest({table}.{column})" if is_array else f"(VALUES ({table}.{column}))"
+        op.execute(f"""
+            INSERT INTO upload_refs (url, sha256, owner_type, owner_id, field)
+            SELECT DISTINCT left(ref.url, 500),
+                   substring(ref.url from '^/uploads/[0-9a-f]{{2}}/[0-9a-f]{{2}}/([0-9a-f]{{64}})(\\.[a-z0-9]+)?$'),
+                   '{owner_type}', {table}.id, '{column}'
+            FROM {table}, LATERAL {source} AS ref(url)
+            WHERE ref.url LIKE '/uploads/%'
+            ON CONFLICT DO NOTHING
+        """)
+
+
+def downgrade():
+    op.drop_index('ix_upload_refs_owner', table_name='upload_refs')
+    op.drop_table('upload_refs')
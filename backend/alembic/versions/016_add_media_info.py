@@ -0,0 +1,36 @@
+"""Add media info for processed videos
+
+Revision ID: 016_add_media_info
+Revises: 015_add_upload_refs
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '016_add_media_info'
+down_revision = '015_add_upload_refs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'media_info',
+        sa.Column('id', sa.Integer(), primary_key=True, index=True),
+        sa.Column('url', sa.String(500), nullable=False, unique=True, index=True),
+        sa.Column('sha256', sa.String(64), nullable=True, index=True),
+        sa.Column('status', sa.String(20), nullable=False, server_default='ready'),
+        sa.Column('duration', sa.Float(), nullable=True),
+        sa.Column('width', sa.Integer(), nullable=True),
+        sa.Column('height', sa.Integer(), nullable=True),
+        sa.Column('poster_url', sa.String(500), nullable=True),
+        sa.Column('web_url', sa.String(500), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_table('media_info')
@@ -0,0 +1,24 @@
+"""Add grid shape and search area to field searches
+
+Revision ID: 017_add_grid_area
+Revises: 016_add_media_info
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '017_add_grid_area'
+down_revision = '016_add_media_info'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('field_searches', sa.Column('grid_shape', sa.String(20), nullable=False, server_default='square'))
+    op.add_column('field_searches', sa.Column('grid_area_file', sa.String(500), nullable=True))
+
+
+def downgrade():
+    op.drop_column('field_searches', 'grid_area_file')
+    op.drop_column('field_searches', 'grid_shape')
@@ -0,0 +1,31 @@
+"""Add grid coverage computed from search tracks
+
+Revision ID: 018_add_grid_coverage
+Revises: 017_add_grid_area
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '018_add_grid_coverage'
+down_revision = '017_add_grid_area'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('field_searches', sa.Column('grid_sweep_width', sa.Integer(), nullable=True))
+    op.add_column('field_searches', sa.Column('grid_coverage', postgresql.JSONB(), nullable=True))
+    op.add_column('field_searches', sa.Column('grid_coverage_percent', sa.Float(), nullable=True))
+    op.add_column('field_searches', sa.Column('grid_coverage_updated_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('grid_cells', sa.Column('coverage', sa.Float(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    op.drop_column('grid_cells', 'coverage')
+    op.drop_column('field_searches', 'grid_coverage_updated_at')
+    op.drop_column('field_searches', 'grid_coverage_percent')
+    op.drop_column('field_searches', 'grid_coverage')
+    op.drop_column('field_searches', 'grid_sweep_width')
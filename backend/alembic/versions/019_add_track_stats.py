@@ -0,0 +1,27 @@
+"""Add track owners and effort statistics to field searches
+
+Revision ID: 019_add_track_stats
+Revises: 018_add_grid_coverage
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '019_add_track_stats'
+down_revision = '018_add_grid_coverage'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('field_searches', sa.Column('search_track_owners', postgresql.JSONB(), nullable=True))
+    op.add_column('field_searches', sa.Column('track_stats', postgresql.JSONB(), nullable=True))
+    op.add_column('field_searches', sa.Column('track_stats_updated_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade():
+    op.drop_column('field_searches', 'track_stats_updated_at')
+    op.drop_column('field_searches', 'track_stats')
+    op.drop_column('field_searches', 'search_track_owners')
@@ -0,0 +1,31 @@
+"""Add compact cell state to map grids
+
+Revision ID: 020_add_map_grid_state
+Revises: 019_add_track_stats
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '020_add_map_grid_state'
+down_revision = '019_add_track_stats'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('map_grids', sa.Column('grid_cols', sa.Integer(), nullable=True))
+    op.add_column('map_grids', sa.Column('grid_rows', sa.Integer(), nullable=True))
+    op.add_column('map_grids', sa.Column('cell_states', sa.LargeBinary(), nullable=True))
+    op.add_column('map_grids', sa.Column('cell_assignments', postgresql.JSONB(), nullable=True))
+    op.add_column('map_grids', sa.Column('cell_notes', postgresql.JSONB(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('map_grids', 'cell_notes')
+    op.drop_column('map_grids', 'cell_assignments')
+    op.drop_column('map_grids', 'cell_states')
+    op.drop_column('map_grids', 'grid_rows')
+    op.drop_column('map_grids', 'grid_cols')
@@ -0,0 +1,64 @@
+"""Add change versions and tombstones for delta sync
+
+Revision ID: 021_add_sync_versions
+Revises: 020_add_map_grid_state
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '021_add_sync_versions'
+down_revision = '020_add_map_grid_state'
+branch_labels = None
+depends_on = None
+
+
+def _version_column(name):
+    return sa.Column(name, sa.BigInteger(), server_default='0', nullable=False)
+
+
+def upgrade():
+    op.add_column('map_grids', _version_column('version'))
+    op.add_column('map_grids', _version_column('fields_version'))
+    op.add_column('map_grids', _version_column('pruned_version'))
+    op.add_column('grid_cells', _version_column('version'))
+    op.create_index('ix_grid_cells_map_grid_version', 'grid_cells', ['map_grid_id', 'version'])
+
+    op.add_column('field_searches', _version_column('version'))
+    op.add_column('field_searches', _version_column('fields_version'))
+    op.add_column('field_searches', _version_column('pruned_version'))
+    op.add_column('field_searches', sa.Column('search_track_versions', postgresql.JSONB(), nullable=True))
+    op.add_column('field_search_participants', _version_column('version'))
+
+    op.create_table(
+        'sync_deletions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('entity', sa.String(length=30), nullable=False),
+        sa.Column('parent_id', sa.Integer(), nullable=False),
+        sa.Column('item_key', sa.String(length=500), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_sync_deletions_id', 'sync_deletions', ['id'])
+    op.create_index('ix_sync_deletions_parent_version', 'sync_deletions', ['entity', 'parent_id', 'version'])
+
+
+def downgrade():
+    op.drop_index('ix_sync_deletions_parent_version', table_name='sync_deletions')
+    op.drop_index('ix_sync_deletions_id', table_name='sync_deletions')
+    op.drop_table('sync_deletions')
+
+    op.drop_column('field_search_participants', 'version')
+    op.drop_column('field_searches', 'search_track_versions')
+    op.drop_column('field_searches', 'pruned_version')
+    op.drop_column('field_searches', 'fields_version')
+    op.drop_column('field_searches', 'version')
+
+    op.drop_index('ix_grid_cells_map_grid_version', table_name='grid_cells')
+    op.drop_column('grid_cells', 'version')
+    op.drop_column('map_grids', 'pruned_version')
+    op.drop_column('map_grids', 'fields_version')
+    op.drop_column('map_grids', 'version')
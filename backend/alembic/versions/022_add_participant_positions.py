@@ -0,0 +1,40 @@
+"""Add live GPS positions of field search participants
+
+Revision ID: 022_add_participant_positions
+Revises: 021_add_sync_versions
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '022_add_participant_positions'
+down_revision = '021_add_sync_versions'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'participant_positions',
+        sa.Column('id', sa.BigInteger(), primary_key=True),
+        sa.Column('field_search_id', sa.Integer(), sa.ForeignKey('field_searches.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('recorded_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('lat', sa.Float(), nullable=False),
+        sa.Column('lon', sa.Float(), nullable=False),
+        sa.Column('accuracy', sa.Float(), nullable=True),
+        sa.Column('altitude', sa.Float(), nullable=True),
+        sa.Column('speed', sa.Float(), nullable=True),
+        sa.Column('heading', sa.Float(), nullable=True),
+        sa.Column('received_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+    op.create_index(
+        'ix_participant_positions_search_user_time', 'participant_positions',
+        ['field_search_id', 'user_id', 'recorded_at'], unique=True
+    )
+
+
+def downgrade():
+    op.drop_index('ix_participant_positions_search_user_time', table_name='participant_positions')
+    op.drop_table('participant_positions')
@@ -0,0 +1,37 @@
+"""Add gazetteer settlement ids and coordinates to cases, missing persons and organizations
+
+Revision ID: 023_add_settlement_geocodes
+Revises: 022_add_participant_positions
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '023_add_settlement_geocodes'
+down_revision = '022_add_participant_positions'
+branch_labels = None
+depends_on = None
+
+# table -> (settlement id column, lat column, lon column)
+GEOCODED_TABLES = {
+    'cases': ('missing_settlement_id', 'missing_lat', 'missing_lon'),
+    'missing_persons': ('settlement_id', 'lat', 'lon'),
+    'organizations': ('settlement_id', 'lat', 'lon'),
+}
+
+
+def upgrade():
+    for table, (id_column, lat_column, lon_column) in GEOCODED_TABLES.items():
+        op.add_column(table, sa.Column(id_column, sa.Integer(), nullable=True))
+        op.add_column(table, sa.Column(lat_column, sa.Float(), nullable=True))
+        op.add_column(table, sa.Column(lon_column, sa.Float(), nullable=True))
+        op.create_index(f'ix_{table}_{id_column}', table, [id_column])
+
+
+def downgrade():
+    for table, (id_column, lat_column, lon_column) in GEOCODED_TABLES.items():
+        op.drop_index(f'ix_{table}_{id_column}', table_name=table)
+        op.drop_column(table, lon_column)
+        op.drop_column(table, lat_column)
+        op.drop_column(table, id_column)
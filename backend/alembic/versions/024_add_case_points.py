@@ -0,0 +1,33 @@
+"""Add case points with a geohash index and last-seen coordinates of missing persons
+
+Revision ID: 024_add_case_points
+Revises: 023_add_settlement_geocodes
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '024_add_case_points'
+down_revision = '023_add_settlement_geocodes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('missing_persons', sa.Column('last_seen_lat', sa.Float(), nullable=True))
+    op.add_column('missing_persons', sa.Column('last_seen_lon', sa.Float(), nullable=True))
+    op.add_column('cases', sa.Column('lat', sa.Float(), nullable=True))
+    op.add_column('cases', sa.Column('lon', sa.Float(), nullable=True))
+    # "C" collation: B-tree order is byte order, so a geohash prefix is one index range
+    op.add_column('cases', sa.Column('geohash', sa.String(12, collation='C'), nullable=True))
+    op.create_index('ix_cases_geohash', 'cases', ['geohash'])
+
+
+def downgrade():
+    op.drop_index('ix_cases_geohash', table_name='cases')
+    op.drop_column('cases', 'geohash')
+    op.drop_column('cases', 'lon')
+    op.drop_column('cases', 'lat')
+    op.drop_column('missing_persons', 'last_seen_lon')
+    op.drop_column('missing_persons', 'last_seen_lat')
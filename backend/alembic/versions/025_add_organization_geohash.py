@@ -0,0 +1,34 @@
+"""Add geohash index of organizations and organization link of institutions calls
+
+Revision ID: 025_add_organization_geohash
+Revises: 024_add_case_points
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '025_add_organization_geohash'
+down_revision = '024_add_case_points'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # "C" collation: B-tree order is byte order, so a geohash prefix is one index range
+    op.add_column('organizations', sa.Column('geohash', sa.String(12, collation='C'), nullable=True))
+    op.create_index('ix_organizations_geohash', 'organizations', ['geohash'])
+    op.add_column('institutions_calls', sa.Column('organization_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        'fk_institutions_calls_organization_id', 'institutions_calls', 'organizations',
+        ['organization_id'], ['id'], ondelete='SET NULL'
+    )
+    op.create_index('ix_institutions_calls_organization_id', 'institutions_calls', ['organization_id'])
+
+
+def downgrade():
+    op.drop_index('ix_institutions_calls_organization_id', table_name='institutions_calls')
+    op.drop_constraint('fk_institutions_calls_organization_id', 'institutions_calls', type_='foreignkey')
+    op.drop_column('institutions_calls', 'organization_id')
+    op.drop_index('ix_organizations_geohash', table_name='organizations')
+    op.drop_column('organizations', 'geohash')
@@ -0,0 +1,29 @@
+"""Add shared state table for multi-worker counters and locks
+
+Revision ID: 026_add_shared_state
+Revises: 025_add_organization_geohash
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '026_add_shared_state'
+down_revision = '025_add_organization_geohash'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'shared_state',
+        sa.Column('key', sa.String(255), primary_key=True),
+        sa.Column('value', sa.Text(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index('ix_shared_state_expires_at', 'shared_state', ['expires_at'])
+
+
+def downgrade():
+    op.drop_index('ix_shared_state_expires_at', table_name='shared_state')
+    op.drop_table('shared_state')
@@ -1,7 +1,6 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
-from fastapi.staticfiles import StaticFiles
 from sqlalchemy import text
 from sqlalchemy.exc import IntegrityError, OperationalError
 from starlette.exceptions import HTTPException as StarletteHTTPException
@@ -39,8 +38,11 @@ from app.routers import public
 from app.routers import push_notifications
 from app.routers import organizations
 from app.routers import asterisk
+from app.routers import files
+from app.routers import gazetteer
 import app.models  # Import all models to register them with Base
-from pathlib import Path
+import app.services.upload_refs  # Keeps upload_refs in sync on every flush
+import app.services.geocoding  # Geocodes settlement fields on every flush
 
 # Setup logging
 log_level = os.getenv("LOG_LEVEL", "INFO")
@@ -117,12 +119,29 @@ def on_startup():
         logger.error(f"Failed to create database tables: {str(e)}", exc_info=True)
         raise
 
+    from app.services import live_positions, live_updates
+    live_updates.start_listener()
+    live_positions.start_flusher()
+
 
 @app.on_event("shutdown")
 def on_shutdown():
     """Cleanup on application shutdown"""
     logger.info("Shutting down Missing Persons CRM API")
 
+    from app.services import (
+        grid_coverage, image_variants, live_positions, live_updates, media_pipeline, track_stats, track_variants,
+        video_processing
+    )
+    live_positions.stop_flusher()
+    live_updates.stop_listener()
+    image_variants.shutdown_pool()
+    video_processing.shutdown_pool()
+    grid_coverage.shutdown_pool()
+    track_variants.shutdown_pool()
+    track_stats.shutdown_pool()
+    media_pipeline.shutdown_executor()
+
 
 # Include routers
 app.include_router(public.router)  # Public endpoints first (no auth required)
@@ -148,11 +167,8 @@ app.include_router(forum_import.router)
 app.include_router(push_notifications.router)
 app.include_router(organizations.router)
 app.include_router(asterisk.router)
-
-# Mount uploads directory for static file serving
-UPLOAD_DIR = Path("/app/uploads")
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=str(UPLOAD_DIR)), name="uploads")
+app.include_router(files.router)  # Uploaded files under /uploads (caching, Range, X-Accel-Redirect)
+app.include_router(gazetteer.router)
 
 
 @app.get("/health")
@@ -47,7 +47,11 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     Returns:
         JSON response with validation error details
     """
-    errors = exc.errors()
+    # Errors raised in validators (ValueError) are kept in ctx; they are not JSON serializable
+    errors = [
+        {**error, "ctx": {key: str(value) for key, value in error["ctx"].items()}} if "ctx" in error else error
+        for error in exc.errors()
+    ]
     logger.warning(
         f"Validation error: {len(errors)} error(s) "
         f"path={request.url.path} errors={errors}"
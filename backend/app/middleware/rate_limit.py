@@ -1,37 +1,126 @@
 """
-Simple in-memory rate limiting middleware.
-For production, consider using Redis-based rate limiting.
+Rate limiting for public endpoints.
+
+Every key (client IP) gets a sliding-window counter of fixed size: the
+request counts of the current and the previous fixed window. The number of
+requests in the last window_seconds is estimated as
+
+    previous * (part of the previous window still inside the sliding window) + current
+
+so a check is O(1) in time and memory, however many requests a client sends
+(the previous implementation kept a timestamp per request and rebuilt the
+list on every check).
+
+Keys are spread over SHARDS dictionaries with a lock each, so concurrent
+checks of different clients rarely wait for each other. Each shard drops the
+counters of keys idle for two windows at most once per window, which keeps
+memory bounded under scanning traffic with ever new IPs.
+
+With a shared state backend (SHARED_STATE_BACKEND, see
+services/shared_state.py) the two counts of a key live there instead, so
+all workers enforce one limit: a check reads the previous window's count
+and increments the current one (undone if the request is rejected). Windows
+then follow the wall clock, which all workers share. If the backend fails,
+requests are allowed rather than rejected.
+
+Policies are per route group; defaults can be overridden with environment
+variables RATE_LIMIT_<POLICY>="<requests>/<seconds>", e.g.
+RATE_LIMIT_TELEGRAM="30/60".
 """
 from fastapi import Request, HTTPException, status
-from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional, Tuple, Union
+import math
+import os
 import threading
+import time
+
+from app.core.logging_config import get_logger
+from app.services import shared_state
+
+logger = get_logger(__name__)
+
+SHARDS = 16
+
+DEFAULT_POLICIES = {
+    "public": "5/60",    # Public case form
+    "telegram": "5/60",  # Telegram bot submissions and photos
+}
+
+
+def _estimate(previous: int, current: int, elapsed: float) -> float:
+    """Requests in the sliding window, elapsed being the part of the current window passed"""
+    return previous * (1.0 - elapsed) + current
+
+
+def _retry_after(limit: int, window_seconds: int, previous: int, current: int, elapsed: float) -> int:
+    """Seconds until the estimate leaves room for one more request"""
+    excess = _estimate(previous, current, elapsed) + 1 - limit
+    if excess <= 0:
+        return 0
+    if previous and excess <= previous:
+        # The previous window's weight decays linearly to zero at the window end
+        return math.ceil(excess / previous * window_seconds)
+    return math.ceil((1.0 - elapsed) * window_seconds)
+
+
+class _Counter:
+    __slots__ = ("window", "current", "previous", "last_seen")
+
+    def __init__(self, window: int, now: float):
+        self.window = window
+        self.current = 0
+        self.previous = 0
+        self.last_seen = now
+
+
+class _Shard:
+    __slots__ = ("lock", "counters", "next_sweep")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[str, _Counter] = {}
+        self.next_sweep = 0.0
 
 
 class RateLimiter:
-    """Simple in-memory rate limiter"""
+    """Sliding-window counter rate limiter with sharded state"""
 
-    def __init__(self, requests_per_window: int = 5, window_seconds: int = 60):
+    def __init__(self, requests_per_window: int = 5, window_seconds: int = 60, clock: Callable[[], float] = time.monotonic):
         """
         Initialize rate limiter.
 
         Args:
             requests_per_window: Maximum number of requests allowed per window
             window_seconds: Time window in seconds
+            clock: Source of the current time in seconds (monotonic)
         """
         self.requests_per_window = requests_per_window
         self.window_seconds = window_seconds
-        self.requests: Dict[str, List[datetime]] = {}
-        self.lock = threading.Lock()
+        self.clock = clock
+        self.shards: List[_Shard] = [_Shard() for _ in range(SHARDS)]
+
+    def _shard(self, key: str) -> _Shard:
+        return self.shards[hash(key) % SHARDS]
+
+    def _roll(self, counter: _Counter, window: int) -> None:
+        """Move a counter to the given fixed window"""
+        if window == counter.window:
+            return
+        counter.previous = counter.current if window == counter.window + 1 else 0
+        counter.current = 0
+        counter.window = window
 
-    def _clean_old_requests(self, ip: str, now: datetime):
-        """Remove requests older than the time window"""
-        cutoff_time = now - timedelta(seconds=self.window_seconds)
-        if ip in self.requests:
-            self.requests[ip] = [
-                req_time for req_time in self.requests[ip]
-                if req_time > cutoff_time
-            ]
+    def _estimate(self, counter: _Counter, now: float) -> float:
+        return _estimate(counter.previous, counter.current, now / self.window_seconds - counter.window)
+
+    def _sweep(self, shard: _Shard, now: float) -> None:
+        """Drop counters idle for two windows (caller holds the shard lock)"""
+        if now < shard.next_sweep:
+            return
+        shard.next_sweep = now + self.window_seconds
+        idle_before = now - 2 * self.window_seconds
+        for key in [key for key, counter in shard.counters.items() if counter.last_seen < idle_before]:
+            del shard.counters[key]
 
     def check_rate_limit(self, ip: str) -> bool:
         """
@@ -43,38 +132,149 @@ class RateLimiter:
         Returns:
             True if request is allowed, False if rate limit exceeded
         """
-        with self.lock:
-            now = datetime.now()
+        now = self.clock()
+        window = int(now // self.window_seconds)
+        shard = self._shard(ip)
+        with shard.lock:
+            self._sweep(shard, now)
+            counter = shard.counters.get(ip)
+            if counter is None:
+                counter = shard.counters[ip] = _Counter(window, now)
+            self._roll(counter, window)
+            counter.last_seen = now
+            if self._estimate(counter, now) + 1 > self.requests_per_window:
+                return False
+            counter.current += 1
+            return True
 
-            # Clean old requests
-            self._clean_old_requests(ip, now)
+    def get_remaining_requests(self, ip: str) -> int:
+        """Get number of remaining requests for IP"""
+        now = self.clock()
+        shard = self._shard(ip)
+        with shard.lock:
+            counter = shard.counters.get(ip)
+            if counter is None:
+                return self.requests_per_window
+            self._roll(counter, int(now // self.window_seconds))
+            return max(0, self.requests_per_window - math.ceil(self._estimate(counter, now)))
 
-            # Check if limit exceeded
-            if ip not in self.requests:
-                self.requests[ip] = []
+    def retry_after(self, ip: str) -> int:
+        """Seconds until the next request of IP may be allowed"""
+        now = self.clock()
+        shard = self._shard(ip)
+        with shard.lock:
+            counter = shard.counters.get(ip)
+            if counter is None:
+                return 0
+            self._roll(counter, int(now // self.window_seconds))
+            elapsed = now / self.window_seconds - counter.window
+            return _retry_after(self.requests_per_window, self.window_seconds, counter.previous, counter.current, elapsed)
 
-            if len(self.requests[ip]) >= self.requests_per_window:
-                return False
+    def key_count(self) -> int:
+        """Number of keys with a counter (monitoring)"""
+        return sum(len(shard.counters) for shard in self.shards)
+
+
+class SharedRateLimiter:
+    """Sliding-window counter rate limiter on the shared state backend"""
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_window: int = 5,
+        window_seconds: int = 60,
+        state: Optional[shared_state.SharedState] = None,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        Args:
+            name: Policy name (key namespace of its counters)
+            requests_per_window: Maximum number of requests allowed per window
+            window_seconds: Time window in seconds
+            state: Backend (default: the configured one)
+            clock: Source of the current wall-clock time in seconds
+        """
+        self.name = name
+        self.requests_per_window = requests_per_window
+        self.window_seconds = window_seconds
+        self._state = state
+        self.clock = clock
+
+    @property
+    def state(self) -> shared_state.SharedState:
+        return self._state or shared_state.get_shared_state()
+
+    def _key(self, ip: str, window: int) -> str:
+        return f"rate:{self.name}:{self.window_seconds}:{ip}:{window}"
+
+    def _counts(self, ip: str) -> Tuple[int, int, float]:
+        """(previous count, current count, elapsed part of the current window)"""
+        now = self.clock() / self.window_seconds
+        window = int(now)
+        previous = int(self.state.get(self._key(ip, window - 1)) or 0)
+        current = int(self.state.get(self._key(ip, window)) or 0)
+        return previous, current, now - window
+
+    def check_rate_limit(self, ip: str) -> bool:
+        """
+        Check if request from IP is allowed.
 
-            # Add current request
-            self.requests[ip].append(now)
+        Args:
+            ip: Client IP address
+
+        Returns:
+            True if request is allowed, False if rate limit exceeded
+        """
+        try:
+            now = self.clock() / self.window_seconds
+            window = int(now)
+            previous = int(self.state.get(self._key(ip, window - 1)) or 0)
+            key = self._key(ip, window)
+            # Counters are read by the next window too
+            ttl = 2 * self.window_seconds
+            current = self.state.incr(key, 1, ttl)
+            if _estimate(previous, current, now - window) > self.requests_per_window:
+                self.state.incr(key, -1, ttl)
+                return False
+            return True
+        except Exception as e:
+            logger.warning(f"Rate limit check of policy {self.name} failed, allowing request: {str(e)}")
             return True
 
     def get_remaining_requests(self, ip: str) -> int:
         """Get number of remaining requests for IP"""
-        with self.lock:
-            now = datetime.now()
-            self._clean_old_requests(ip, now)
+        try:
+            previous, current, elapsed = self._counts(ip)
+        except Exception:
+            return self.requests_per_window
+        return max(0, self.requests_per_window - math.ceil(_estimate(previous, current, elapsed)))
 
-            if ip not in self.requests:
-                return self.requests_per_window
+    def retry_after(self, ip: str) -> int:
+        """Seconds until the next request of IP may be allowed"""
+        try:
+            previous, current, elapsed = self._counts(ip)
+        except Exception:
+            return 0
+        return _retry_after(self.requests_per_window, self.window_seconds, previous, current, elapsed)
 
-            return max(0, self.requests_per_window - len(self.requests[ip]))
 
+def parse_policy(value: str, name: str = "public"):
+    """Limiter of a "<requests>/<seconds>" policy (shared if a shared state backend is configured)"""
+    requests, _, seconds = value.partition("/")
+    requests_per_window, window_seconds = int(requests), int(seconds or 60)
+    if shared_state.is_shared():
+        return SharedRateLimiter(name, requests_per_window, window_seconds)
+    return RateLimiter(requests_per_window=requests_per_window, window_seconds=window_seconds)
+
+
+rate_limiters: Dict[str, Union[RateLimiter, SharedRateLimiter]] = {
+    name: parse_policy(os.getenv(f"RATE_LIMIT_{name.upper()}", default), name)
+    for name, default in DEFAULT_POLICIES.items()
+}
 
 # Global rate limiter instance for public endpoints
-# Allows 5 requests per 60 seconds per IP
-public_rate_limiter = RateLimiter(requests_per_window=5, window_seconds=60)
+# Allows 5 requests per 60 seconds per IP (RATE_LIMIT_PUBLIC)
+public_rate_limiter = rate_limiters["public"]
 
 
 def get_client_ip(request: Request) -> str:
@@ -99,21 +299,39 @@ def get_client_ip(request: Request) -> str:
     return "unknown"
 
 
-def check_public_rate_limit(request: Request):
-    """
-    Dependency for checking rate limit on public endpoints.
-    Raises HTTPException if rate limit exceeded.
-    """
+def enforce_rate_limit(limiter: Union[RateLimiter, SharedRateLimiter], request: Request) -> None:
+    """Raise 429 (with Retry-After) if the client is over the limiter's policy"""
     client_ip = get_client_ip(request)
 
-    if not public_rate_limiter.check_rate_limit(client_ip):
-        remaining = public_rate_limiter.get_remaining_requests(client_ip)
+    if not limiter.check_rate_limit(client_ip):
+        remaining = limiter.get_remaining_requests(client_ip)
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail={
                 "error": "Rate limit exceeded",
                 "message": "Too many requests. Please try again later.",
                 "remaining": remaining,
-                "window_seconds": public_rate_limiter.window_seconds
-            }
+                "window_seconds": limiter.window_seconds
+            },
+            headers={"Retry-After": str(max(1, limiter.retry_after(client_ip)))}
         )
+
+
+def rate_limit(policy: str) -> Callable:
+    """
+    Dependency factory for a rate limit policy.
+    Usage: _rate_limit: None = Depends(rate_limit("telegram"))
+    """
+    limiter = rate_limiters[policy]
+
+    def rate_limit_checker(request: Request) -> None:
+        enforce_rate_limit(limiter, request)
+    return rate_limit_checker
+
+
+def check_public_rate_limit(request: Request):
+    """
+    Dependency for checking rate limit on public endpoints.
+    Raises HTTPException if rate limit exceeded.
+    """
+    enforce_rate_limit(public_rate_limiter, request)
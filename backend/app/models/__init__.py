@@ -1,5 +1,6 @@
 from app.models.user import User, Role, Direction, UserStatus, user_roles, user_directions
 from app.models.case import Case
+from app.models.case_match_key import CaseMatchKey
 from app.models.missing_person import MissingPerson
 from app.models.search import Search, SearchStatus
 from app.models.flyer import Flyer
@@ -13,10 +14,16 @@ from app.models.event import Event
 from app.models.push_subscription import PushSubscription
 from app.models.notification_setting import NotificationSetting
 from app.models.call_recording_link import CallRecordingLink
+from app.models.upload_ref import UploadRef
+from app.models.media_info import MediaInfo
+from app.models.sync_deletion import SyncDeletion
+from app.models.participant_position import ParticipantPosition
+from app.models.shared_state import SharedStateEntry
 
 __all__ = [
     'User', 'Role', 'Direction', 'UserStatus', 'user_roles', 'user_directions',
     'Case',
+    'CaseMatchKey',
     'MissingPerson',
     'Search', 'SearchStatus',
     'Flyer',
@@ -30,4 +37,9 @@ __all__ = [
     'PushSubscription',
     'NotificationSetting',
     'CallRecordingLink',
+    'UploadRef',
+    'MediaInfo',
+    'SyncDeletion',
+    'ParticipantPosition',
+    'SharedStateEntry',
 ]
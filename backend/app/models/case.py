@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Text, DateTime, ForeignKey, ARRAY, String, Boolean
+from sqlalchemy import Column, Integer, Text, DateTime, ForeignKey, ARRAY, String, Boolean, Float
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -30,6 +30,15 @@ class Case(Base):
     missing_settlement = Column(String(200))
     missing_region = Column(String(200))
     missing_address = Column(String(500))
+    # Gazetteer settlement of missing_settlement and its coordinates (set on flush, see services/geocoding.py)
+    missing_settlement_id = Column(Integer, index=True)
+    missing_lat = Column(Float)
+    missing_lon = Column(Float)
+    # Point of the case: last-seen place of the first missing person that has one, else the
+    # settlement; geohash (C collation) makes spatial filters B-tree range scans (services/geohash.py)
+    lat = Column(Float)
+    lon = Column(Float)
+    geohash = Column(String(12, collation='C'), index=True)
 
     # LEGACY: Missing person data - kept for backward compatibility
     # New cases use missing_persons relationship (separate table)
@@ -69,6 +78,9 @@ class Case(Base):
     # Call transcript (STT via OpenAI Whisper)
     call_transcript = Column(Text)
 
+    # Duplicate detection: set when the case was submitted again through another channel
+    duplicate_of_case_id = Column(Integer, ForeignKey('cases.id', ondelete='SET NULL'), index=True)
+
     decision_type = Column(String(50), default="На розгляді", nullable=False, index=True)
     decision_comment = Column(Text)
 
@@ -81,6 +93,7 @@ class Case(Base):
     police_contact = relationship('User', foreign_keys=[police_contact_user_id])
     missing_persons = relationship('MissingPerson', back_populates='case', cascade='all, delete-orphan', order_by='MissingPerson.order_index')
     searches = relationship('Search', back_populates='case', cascade='all, delete-orphan')
+    match_keys = relationship('CaseMatchKey', back_populates='case', cascade='all, delete-orphan', passive_deletes=True)
 
     @property
     def applicant_full_name(self) -> str:
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy.orm import relationship
+from app.db import Base
+
+
+class CaseMatchKey(Base):
+    """
+    Blocking key used for duplicate detection at case ingest.
+
+    Every case is indexed under a handful of normalized keys
+    (applicant phone, missing person's name + birthdate, name + settlement, ...).
+    Two cases sharing a key are duplicate candidates.
+    """
+    __tablename__ = 'case_match_keys'
+
+    id = Column(Integer, primary_key=True, index=True)
+    case_id = Column(Integer, ForeignKey('cases.id', ondelete='CASCADE'), nullable=False, index=True)
+
+    # Key kind prefix + normalized value, e.g. "phone:501234567", "name_bd:петренко|марія|1990-05-15"
+    match_key = Column(String(300), nullable=False, index=True)
+
+    # Relationships
+    case = relationship('Case', back_populates='match_keys')
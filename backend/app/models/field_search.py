@@ -1,5 +1,6 @@
 import enum
-from sqlalchemy import Column, Integer, String, Text, DateTime, Date, ForeignKey, Enum as SQLEnum, Table, ARRAY, Float
+from sqlalchemy import Column, BigInteger, Integer, String, Text, DateTime, Date, ForeignKey, Enum as SQLEnum, Table, ARRAY, Float
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db import Base
@@ -22,7 +23,8 @@ field_search_participants = Table(
     Column('field_search_id', Integer, ForeignKey('field_searches.id', ondelete='CASCADE'), nullable=False),
     Column('user_id', Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
     Column('role_on_field', String(50)),  # coordinator, navigator, searcher, driver
-    Column('group_name', String(50))  # Group A, Group B, etc.
+    Column('group_name', String(50)),  # Group A, Group B, etc.
+    Column('version', BigInteger, default=0, server_default='0', nullable=False)  # Field search version when added
 )
 
 
@@ -59,10 +61,31 @@ class FieldSearch(Base):
     grid_cols = Column(Integer)  # Number of grid columns (horizontal)
     grid_rows = Column(Integer)  # Number of grid rows (vertical)
     grid_cell_size = Column(Integer)  # Cell size in meters
+    grid_shape = Column(String(20), default='square', server_default='square', nullable=False)  # square or hex
+    grid_area_file = Column(String(500))  # URL to area polygon (kml/gpx/geojson) the grid is clipped to
+    grid_sweep_width = Column(Integer)  # Width searched along a track in meters (coverage)
+
+    # Grid coverage computed from search_tracks
+    grid_coverage = Column(JSONB)  # {"grid_key": ..., "cells": {"A1": percent, ...}} (covered cells only)
+    grid_coverage_percent = Column(Float)
+    grid_coverage_updated_at = Column(DateTime(timezone=True))
 
     # Search progress section
     search_tracks = Column(ARRAY(String), default=list)  # URLs to track files (gpx/kml)
+    search_track_owners = Column(JSONB)  # {track URL: user_id of the participant who walked it}
     search_photos = Column(ARRAY(String), default=list)  # URLs to photos
+    search_track_versions = Column(JSONB)  # {track URL: field search version when added}
+
+    # Effort statistics computed from search_tracks (see services/track_stats.py)
+    track_stats = Column(JSONB)  # per track file, per participant, per group and totals
+    track_stats_updated_at = Column(DateTime(timezone=True))
+
+    # Delta sync (see services/sync_versions.py): counter of changes to the field
+    # search, its participants and tracks, the version of the last change to its
+    # own fields and the newest version whose tombstones were pruned
+    version = Column(BigInteger, default=0, server_default='0', nullable=False)
+    fields_version = Column(BigInteger, default=0, server_default='0', nullable=False)
+    pruned_version = Column(BigInteger, default=0, server_default='0', nullable=False)
 
     # Relationships
     search = relationship('Search', back_populates='field_searches')
@@ -75,3 +98,8 @@ class FieldSearch(Base):
     def case_id(self) -> int:
         """Get case_id from related search"""
         return self.search.case_id if self.search else None
+
+    @property
+    def track_totals(self):
+        """Effort totals over all tracks (None until computed)"""
+        return (self.track_stats or {}).get("totals")
@@ -13,6 +13,8 @@ class InstitutionsCall(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     user_id = Column(Integer, ForeignKey('users.id', ondelete='SET NULL'))
 
+    # Directory entry the call is planned for (nearest-institutions checklist)
+    organization_id = Column(Integer, ForeignKey('organizations.id', ondelete='SET NULL'), index=True)
     organization_name = Column(String(255), nullable=False)
     organization_type = Column(String(100))
     phone = Column(String(50))
@@ -22,4 +24,5 @@ class InstitutionsCall(Base):
 
     # Relationships
     case = relationship('Case')
+    organization = relationship('Organization')
     user = relationship('User', foreign_keys=[user_id])
@@ -1,5 +1,6 @@
 import enum
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, BigInteger, Integer, Float, String, Text, DateTime, ForeignKey, LargeBinary, Index, Enum as SQLEnum
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db import Base
@@ -29,6 +30,20 @@ class MapGrid(Base):
     map_file_url = Column(String(500))
     notes = Column(Text)
 
+    # Compact state of all cells (see services/grid_state.py), mirror of the grid_cells rows
+    grid_cols = Column(Integer)
+    grid_rows = Column(Integer)
+    cell_states = Column(LargeBinary)  # one status byte per cell, index row * grid_cols + col
+    cell_assignments = Column(JSONB)  # {cell code: field_search_id}
+    cell_notes = Column(JSONB)  # {cell code: text}
+
+    # Delta sync (see services/sync_versions.py): counter of changes to the grid
+    # and its cells, the version of the last change to the grid's own fields and
+    # the newest version whose tombstones were pruned
+    version = Column(BigInteger, default=0, server_default='0', nullable=False)
+    fields_version = Column(BigInteger, default=0, server_default='0', nullable=False)
+    pruned_version = Column(BigInteger, default=0, server_default='0', nullable=False)
+
     # Relationships
     search = relationship('Search', back_populates='map_grids')
     initiator_inforg = relationship('User', foreign_keys=[initiator_inforg_id])
@@ -45,11 +60,18 @@ class GridCell(Base):
     cell_code = Column(String(20), nullable=False)
     coordinates = Column(String(100))
     status = Column(SQLEnum(GridCellStatus), default=GridCellStatus.unassigned, nullable=False)
+    coverage = Column(Float, default=0.0, server_default='0', nullable=False)  # Percent covered by uploaded tracks
 
     assigned_to_field_search_id = Column(Integer, ForeignKey('field_searches.id', ondelete='SET NULL'))
 
     notes = Column(Text)
 
+    version = Column(BigInteger, default=0, server_default='0', nullable=False)  # Grid version of the last change
+
     # Relationships
     map_grid = relationship('MapGrid', back_populates='grid_cells')
     assigned_field_search = relationship('FieldSearch', foreign_keys=[assigned_to_field_search_id])
+
+    __table_args__ = (
+        Index('ix_grid_cells_map_grid_version', 'map_grid_id', 'version'),
+    )
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, Text, Float, DateTime
+from sqlalchemy.sql import func
+from app.db import Base
+
+
+class MediaInfo(Base):
+    """
+    Processing results of an uploaded video, keyed by the original upload URL.
+
+    Filled in by the media worker (services/video_processing.py): duration,
+    display dimensions, poster frame and web-playable rendition.
+    """
+    __tablename__ = 'media_info'
+
+    id = Column(Integer, primary_key=True, index=True)
+    url = Column(String(500), nullable=False, unique=True, index=True)  # Original upload URL
+    sha256 = Column(String(64), index=True)  # Content hash for content-addressed uploads
+
+    status = Column(String(20), nullable=False, default='ready')  # ready, failed
+    duration = Column(Float)  # Seconds
+    width = Column(Integer)  # Display width (rotation applied)
+    height = Column(Integer)
+    poster_url = Column(String(500))
+    web_url = Column(String(500))
+    error = Column(Text)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, ARRAY, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, ARRAY, Boolean, Float
 from sqlalchemy.orm import relationship
 from app.db import Base
 
@@ -24,10 +24,16 @@ class MissingPerson(Base):
     settlement = Column(String(200))
     region = Column(String(200))
     address = Column(String(500))
+    # Gazetteer settlement and its coordinates (set on flush, see services/geocoding.py)
+    settlement_id = Column(Integer, index=True)
+    lat = Column(Float)
+    lon = Column(Float)
 
     # Last seen information
     last_seen_datetime = Column(DateTime(timezone=True))
     last_seen_place = Column(String(500))
+    last_seen_lat = Column(Float)
+    last_seen_lon = Column(Float)
 
     # Photos - array of URLs
     photos = Column(ARRAY(String), default=list)
@@ -1,5 +1,5 @@
 import enum
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db import Base
@@ -35,6 +35,12 @@ class Organization(Base):
     region = Column(String(200), index=True)  # Область
     city = Column(String(200))  # Населений пункт
     address = Column(String(500))  # Адреса
+    # Gazetteer settlement of city and its coordinates (set on flush, see services/geocoding.py);
+    # lat/lon may also be set to the exact location. geohash (C collation) indexes the point
+    settlement_id = Column(Integer, index=True)
+    lat = Column(Float)
+    lon = Column(Float)
+    geohash = Column(String(12, collation='C'), index=True)
 
     # Contact and notes
     contact_info = Column(Text)  # Контактна інформація (телефони, email, години роботи)
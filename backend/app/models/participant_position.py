@@ -0,0 +1,33 @@
+from sqlalchemy import Column, BigInteger, Integer, Float, DateTime, ForeignKey, Index
+from sqlalchemy.sql import func
+from app.db import Base
+
+
+class ParticipantPosition(Base):
+    """
+    GPS fix of a field search participant, posted live from a phone.
+
+    Rows are written in batches by services/live_positions.py; the newest
+    position of each participant is served from memory, and from here too
+    when several workers share the traffic.
+    """
+    __tablename__ = 'participant_positions'
+
+    id = Column(BigInteger, primary_key=True)
+    field_search_id = Column(Integer, ForeignKey('field_searches.id', ondelete='CASCADE'), nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+
+    recorded_at = Column(DateTime(timezone=True), nullable=False)  # Time of the fix on the phone
+    lat = Column(Float, nullable=False)
+    lon = Column(Float, nullable=False)
+    accuracy = Column(Float)  # Meters
+    altitude = Column(Float)  # Meters
+    speed = Column(Float)  # Meters per second
+    heading = Column(Float)  # Degrees from north
+
+    received_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        # Resent points are skipped on insert
+        Index('ix_participant_positions_search_user_time', 'field_search_id', 'user_id', 'recorded_at', unique=True),
+    )
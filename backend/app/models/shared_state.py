@@ -0,0 +1,16 @@
+from sqlalchemy import Column, String, Text, DateTime
+from app.db import Base
+
+
+class SharedStateEntry(Base):
+    """
+    Expiring key/value entry shared by all API workers (counters, locks).
+
+    Used by the postgres backend of services/shared_state.py; expired rows
+    are treated as absent and purged periodically.
+    """
+    __tablename__ = 'shared_state'
+
+    key = Column(String(255), primary_key=True)
+    value = Column(Text, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
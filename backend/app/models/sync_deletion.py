@@ -0,0 +1,26 @@
+from sqlalchemy import Column, BigInteger, Integer, String, DateTime, Index
+from sqlalchemy.sql import func
+from app.db import Base
+
+
+class SyncDeletion(Base):
+    """
+    Tombstone of an item removed from a map grid or field search.
+
+    Delta sync (see services/sync_versions.py) returns changed items by their
+    version stamp; removed items have no row left to carry one, so removing
+    them records the parent's version here instead.
+    """
+    __tablename__ = 'sync_deletions'
+
+    id = Column(Integer, primary_key=True, index=True)
+    # 'grid_cell' (parent: map grid), 'participant' or 'track' (parent: field search)
+    entity = Column(String(30), nullable=False)
+    parent_id = Column(Integer, nullable=False)
+    item_key = Column(String(500), nullable=False)  # Cell id, participant user id or track URL
+    version = Column(BigInteger, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index('ix_sync_deletions_parent_version', 'entity', 'parent_id', 'version'),
+    )
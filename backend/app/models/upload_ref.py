@@ -0,0 +1,31 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index, UniqueConstraint
+from sqlalchemy.sql import func
+from app.db import Base
+
+
+class UploadRef(Base):
+    """
+    Reference from a record to a file under /uploads.
+
+    One row per (url, owner record, field). Rows are maintained automatically
+    on flush (see services/upload_refs.py) for every tracked URL column, so a
+    stored file is referenced as long as at least one row points at its URL.
+    """
+    __tablename__ = 'upload_refs'
+
+    id = Column(Integer, primary_key=True, index=True)
+    url = Column(String(500), nullable=False, index=True)
+    # SHA-256 of content-addressed uploads (NULL for legacy uuid4_<name> files)
+    sha256 = Column(String(64), index=True)
+
+    # Owner record: 'case', 'missing_person', 'event', 'orientation', 'field_search'
+    owner_type = Column(String(50), nullable=False)
+    owner_id = Column(Integer, nullable=False)
+    field = Column(String(50), nullable=False)  # Column holding the URL, e.g. 'missing_photos'
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('url', 'owner_type', 'owner_id', 'field', name='uq_upload_refs_url_owner_field'),
+        Index('ix_upload_refs_owner', 'owner_type', 'owner_id'),
+    )
@@ -623,6 +623,64 @@ def _normalize_digits(phone: str) -> str:
     return digits
 
 
+def _auto_link_voice_bot_recordings(db: Session, case_id: int, phones: List[str]) -> None:
+    """Link recent answered CDR recordings from the given phones to a case."""
+    import logging as _logging
+    _log = _logging.getLogger("milena-bot.create-case")
+
+    if phones:
+        settings = _get_or_create_settings(db)
+        if settings.asterisk_cdr_host:
+            try:
+                conn = _get_cdr_connection(settings)
+                all_variants: set[str] = set()
+                for phone in phones:
+                    all_variants.update(_phone_variants(phone))
+                linked = 0
+                try:
+                    with conn.cursor() as cursor:
+                        placeholders = ",".join(["%s"] * len(all_variants))
+                        cursor.execute(
+                            f"""
+                            SELECT uniqueid, calldate, src, dst, duration, billsec, disposition, recordingfile
+                            FROM cdr
+                            WHERE src IN ({placeholders})
+                              AND calldate >= NOW() - INTERVAL %s MINUTE
+                              AND disposition = 'ANSWERED'
+                              AND recordingfile IS NOT NULL AND recordingfile != ''
+                            ORDER BY calldate DESC LIMIT 10
+                            """,
+                            list(all_variants) + [20],
+                        )
+                        for row in cursor.fetchall():
+                            exists = db.query(CallRecordingLink).filter(
+                                CallRecordingLink.uniqueid == str(row["uniqueid"]),
+                                CallRecordingLink.case_id == case_id,
+                            ).first()
+                            if exists:
+                                continue
+                            db.add(CallRecordingLink(
+                                uniqueid=str(row["uniqueid"]),
+                                case_id=case_id,
+                                calldate=str(row["calldate"]),
+                                src=row["src"] or "",
+                                dst=row["dst"] or "",
+                                duration=int(row["duration"] or 0),
+                                billsec=int(row["billsec"] or 0),
+                                disposition=row["disposition"] or "",
+                                recordingfile=row["recordingfile"] or "",
+                                linked_by_user_id=None,
+                            ))
+                            linked += 1
+                finally:
+                    conn.close()
+                if linked:
+                    db.commit()
+                _log.info(f"Auto-linked {linked} recording(s) to case #{case_id}")
+            except Exception as e:
+                _log.warning(f"Recording auto-link failed: {e}")
+
+
 class VoiceBotCreateCaseRequest(BaseModel):
     transcript: str
     caller_phone: Optional[str] = None
@@ -700,8 +758,19 @@ def voice_bot_create_case(
         _log.error(f"CaseCreate validation error: {e}")
         return {"ok": False, "detail": str(e)}
 
+    # Merge into an existing case if the same disappearance was already reported
+    from app.services.dedup_service import dedup_submission, index_case
+    merged_case, duplicate_of_case_id = dedup_submission(db, validated, source="голосовий бот")
+    if merged_case:
+        db.commit()
+        _log.info(f"Voice bot submission merged into case #{merged_case.id}")
+        phones = [p for p in {data.caller_phone, validated.applicant_phone} if p]
+        _auto_link_voice_bot_recordings(db, merged_case.id, phones)
+        return {"ok": True, "case_id": merged_case.id, "merged": True}
+
     db_case = Case(
         created_by_user_id=None,
+        duplicate_of_case_id=duplicate_of_case_id,
         basis=validated.basis,
         applicant_last_name=validated.applicant_last_name,
         applicant_first_name=validated.applicant_first_name,
@@ -760,6 +829,7 @@ def voice_bot_create_case(
         order_index=0,
     )
     db.add(db_missing)
+    index_case(db, db_case)
     db.commit()
     db.refresh(db_case)
 
@@ -784,57 +854,7 @@ def voice_bot_create_case(
 
     # Step 5: auto-link recordings
     phones = [p for p in {data.caller_phone, validated.applicant_phone} if p]
-    if phones:
-        settings = _get_or_create_settings(db)
-        if settings.asterisk_cdr_host:
-            try:
-                conn = _get_cdr_connection(settings)
-                all_variants: set[str] = set()
-                for phone in phones:
-                    all_variants.update(_phone_variants(phone))
-                linked = 0
-                try:
-                    with conn.cursor() as cursor:
-                        placeholders = ",".join(["%s"] * len(all_variants))
-                        cursor.execute(
-                            f"""
-                            SELECT uniqueid, calldate, src, dst, duration, billsec, disposition, recordingfile
-                            FROM cdr
-                            WHERE src IN ({placeholders})
-                              AND calldate >= NOW() - INTERVAL %s MINUTE
-                              AND disposition = 'ANSWERED'
-                              AND recordingfile IS NOT NULL AND recordingfile != ''
-                            ORDER BY calldate DESC LIMIT 10
-                            """,
-                            list(all_variants) + [20],
-                        )
-                        for row in cursor.fetchall():
-                            exists = db.query(CallRecordingLink).filter(
-                                CallRecordingLink.uniqueid == str(row["uniqueid"]),
-                                CallRecordingLink.case_id == case_id,
-                            ).first()
-                            if exists:
-                                continue
-                            db.add(CallRecordingLink(
-                                uniqueid=str(row["uniqueid"]),
-                                case_id=case_id,
-                                calldate=str(row["calldate"]),
-                                src=row["src"] or "",
-                                dst=row["dst"] or "",
-                                duration=int(row["duration"] or 0),
-                                billsec=int(row["billsec"] or 0),
-                                disposition=row["disposition"] or "",
-                                recordingfile=row["recordingfile"] or "",
-                                linked_by_user_id=None,
-                            ))
-                            linked += 1
-                finally:
-                    conn.close()
-                if linked:
-                    db.commit()
-                _log.info(f"Auto-linked {linked} recording(s) to case #{case_id}")
-            except Exception as e:
-                _log.warning(f"Recording auto-link failed: {e}")
+    _auto_link_voice_bot_recordings(db, case_id, phones)
 
     return {"ok": True, "case_id": case_id}
 
@@ -20,9 +20,13 @@ def get_current_user(
     db: Session = Depends(get_db)
 ) -> User:
     """Extract user from JWT token"""
+    return user_from_token(credentials.credentials, db)
+
+
+def user_from_token(token: str, db: Session) -> User:
+    """Active user of a JWT token (also for WebSocket/SSE clients that pass it as a query parameter)"""
     from app.models.user import UserStatus
 
-    token = credentials.credentials
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
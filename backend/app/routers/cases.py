@@ -1,19 +1,102 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import func
 from sqlalchemy.orm import Session, joinedload
-from typing import List
+from typing import List, Optional
 from app.db import get_db
 from app.schemas.case import (
     CaseCreate, CaseUpdate, CaseResponse, CaseListResponse,
-    CaseFullResponse, CaseAutofillRequest, CaseAutofillResponse
+    CaseFullResponse, CaseAutofillRequest, CaseAutofillResponse,
+    CaseDuplicateCandidate, CaseDuplicatesResponse, CaseMapResponse
 )
 from app.models.case import Case
 from app.models.missing_person import MissingPerson
 from app.models.user import User
 from app.routers.auth import get_current_user, require_permission
 from app.services.openai_service import get_openai_service
+from app.services.dedup_service import build_match_keys, find_candidates, index_case, submission_from_case
+from app.services import geohash
 
 router = APIRouter(prefix="/cases", tags=["Cases"])
 
+MAX_RADIUS_KM = 1000
+# A map view with more cases than this gets clusters instead of points
+MAX_MAP_POINTS = 500
+MAX_MAP_CLUSTERS = 256
+
+
+def _parse_bbox(bbox: str) -> geohash.BBox:
+    """Parse "south,west,north,east" (degrees)"""
+    try:
+        south, west, north, east = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox must be south,west,north,east in degrees"
+        )
+    if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox must satisfy south <= north and west <= east within valid coordinates"
+        )
+    return south, west, north, east
+
+
+def _spatial_filter(
+    db: Session,
+    near_lat: Optional[float],
+    near_lon: Optional[float],
+    near_case_id: Optional[int],
+    near_field_search_id: Optional[int],
+    radius_km: Optional[float],
+    bbox: Optional[str]
+) -> list:
+    """Conditions of the radius and bounding box filters of the case list"""
+    from app.models.field_search import FieldSearch
+
+    conditions = []
+    if bbox:
+        conditions.append(geohash.bbox_filter(Case.lat, Case.lon, Case.geohash, _parse_bbox(bbox)))
+
+    centers = (near_lat is not None or near_lon is not None) + (near_case_id is not None) + (near_field_search_id is not None)
+    if centers == 0:
+        if radius_km is not None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="radius_km needs near_lat/near_lon, near_case_id or near_field_search_id"
+            )
+        return conditions
+    if centers > 1 or radius_km is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Give radius_km and exactly one of near_lat/near_lon, near_case_id, near_field_search_id"
+        )
+
+    if near_case_id is not None:
+        center = db.query(Case.lat, Case.lon).filter(Case.id == near_case_id).first()
+        what = f"Case {near_case_id}"
+        # "Other disappearances near this one"
+        conditions.append(Case.id != near_case_id)
+    elif near_field_search_id is not None:
+        center = db.query(FieldSearch.grid_center_lat, FieldSearch.grid_center_lon).filter(
+            FieldSearch.id == near_field_search_id
+        ).first()
+        what = f"Field search {near_field_search_id}"
+    else:
+        center = (near_lat, near_lon)
+        what = "Point"
+    if center is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"{what} not found"
+        )
+    if center[0] is None or center[1] is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{what} has no coordinates"
+        )
+    conditions.append(geohash.radius_filter(Case.lat, Case.lon, Case.geohash, center[0], center[1], radius_km))
+    return conditions
+
 
 @router.post("/", response_model=CaseResponse, status_code=status.HTTP_201_CREATED)
 def create_case(
@@ -80,6 +163,8 @@ def create_case(
                 address=mp_data.address,
                 last_seen_datetime=mp_data.last_seen_datetime,
                 last_seen_place=mp_data.last_seen_place,
+                last_seen_lat=mp_data.last_seen_lat,
+                last_seen_lon=mp_data.last_seen_lon,
                 photos=mp_data.photos or [],
                 videos=mp_data.videos or [],
                 description=mp_data.description,
@@ -149,6 +234,8 @@ def create_case(
         db_case.missing_clothing = case_data.missing_clothing
         db_case.missing_belongings = case_data.missing_belongings
 
+    index_case(db, db_case)
+
     db.commit()
     db.refresh(db_case)
 
@@ -166,6 +253,12 @@ def list_cases(
     date_to: str = Query(None, description="Filter cases to this date (YYYY-MM-DD)"),
     period: str = Query(None, description="Quick filter: 10d, 30d, all"),
     search_query: str = Query(None, description="Universal search by name, initial_info, or phone"),
+    near_lat: Optional[float] = Query(None, ge=-90, le=90, description="Centre of the radius filter"),
+    near_lon: Optional[float] = Query(None, ge=-180, le=180, description="Centre of the radius filter"),
+    near_case_id: Optional[int] = Query(None, description="Radius filter around this case (excluded from the result)"),
+    near_field_search_id: Optional[int] = Query(None, description="Radius filter around this field search's grid centre"),
+    radius_km: Optional[float] = Query(None, gt=0, le=MAX_RADIUS_KM, description="Radius of the radius filter in km"),
+    bbox: Optional[str] = Query(None, description="Only cases inside south,west,north,east (degrees)"),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_permission("cases:read"))
 ):
@@ -244,12 +337,56 @@ def list_cases(
         except ValueError:
             pass  # Invalid date format, skip filter
 
+    # Spatial filters (case points, see services/geocoding.py)
+    for condition in _spatial_filter(db, near_lat, near_lon, near_case_id, near_field_search_id, radius_km, bbox):
+        query = query.filter(condition)
+
     total = query.count()
     cases = query.order_by(Case.created_at.desc()).offset(skip).limit(limit).all()
 
     return {"total": total, "cases": cases}
 
 
+@router.get("/map", response_model=CaseMapResponse)
+def map_cases(
+    bbox: str = Query(..., description="Map view as south,west,north,east (degrees)"),
+    decision_type_filter: str = Query(None, description="Filter by decision type"),
+    date_from: str = Query(None, description="Filter cases from this date (YYYY-MM-DD)"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_permission("cases:read"))
+):
+    """
+    Cases with a point inside a map view. Up to MAX_MAP_POINTS cases come as
+    points, more as clusters (case count and mean position per geohash cell).
+    """
+    from datetime import datetime
+
+    box = _parse_bbox(bbox)
+    filters = [geohash.bbox_filter(Case.lat, Case.lon, Case.geohash, box)]
+    if decision_type_filter:
+        filters.append(Case.decision_type == decision_type_filter)
+    if date_from:
+        try:
+            filters.append(Case.created_at >= datetime.strptime(date_from, '%Y-%m-%d'))
+        except ValueError:
+            pass  # Invalid date format, skip filter
+
+    total = db.query(func.count(Case.id)).filter(*filters).scalar() or 0
+    if total <= MAX_MAP_POINTS:
+        points = db.query(
+            Case.id, Case.lat, Case.lon, Case.missing_last_name, Case.missing_first_name,
+            Case.decision_type, Case.created_at
+        ).filter(*filters).order_by(Case.created_at.desc()).all()
+        return {"total": total, "points": [point._asdict() for point in points]}
+
+    cell = func.substr(Case.geohash, 1, geohash.cover_precision(box, MAX_MAP_CLUSTERS))
+    clusters = db.query(
+        cell.label("geohash"), func.count(Case.id).label("count"),
+        func.avg(Case.lat).label("lat"), func.avg(Case.lon).label("lon")
+    ).filter(*filters).group_by(cell).all()
+    return {"total": total, "clusters": [cluster._asdict() for cluster in clusters]}
+
+
 @router.get("/{case_id}", response_model=CaseResponse)
 def get_case(
     case_id: int,
@@ -270,6 +407,35 @@ def get_case(
     return db_case
 
 
+def _check_duplicate_link(db: Session, case_id: int, original_id: int) -> None:
+    """
+    A duplicate links straight to its original: not to itself, not to another
+    duplicate, and a case others are linked to cannot become a duplicate
+    (no chains, hence no cycles).
+    """
+    if original_id == case_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A case cannot be a duplicate of itself"
+        )
+    original = db.query(Case.id, Case.duplicate_of_case_id).filter(Case.id == original_id).first()
+    if original is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Case with id {original_id} not found"
+        )
+    if original.duplicate_of_case_id is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Case {original_id} is itself a duplicate of case {original.duplicate_of_case_id}; link to that case"
+        )
+    if db.query(Case.id).filter(Case.duplicate_of_case_id == case_id).first() is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Other cases are linked as duplicates of case {case_id}; it cannot become a duplicate"
+        )
+
+
 @router.put("/{case_id}", response_model=CaseResponse)
 def update_case(
     case_id: int,
@@ -294,14 +460,19 @@ def update_case(
     # Extract missing_persons if provided (handle separately)
     missing_persons_data = update_data.pop('missing_persons', None)
 
+    if update_data.get('duplicate_of_case_id') is not None:
+        _check_duplicate_link(db, case_id, update_data['duplicate_of_case_id'])
+
     # Update regular case fields
     for field, value in update_data.items():
         setattr(db_case, field, value)
 
     # Handle missing_persons update if provided
     if missing_persons_data is not None:
-        # Delete existing missing persons
-        db.query(MissingPerson).filter(MissingPerson.case_id == case_id).delete()
+        # Delete existing missing persons (through the ORM so that flush
+        # hooks such as upload reference tracking see the deletions)
+        for existing_person in list(db_case.missing_persons):
+            db.delete(existing_person)
 
         # Create new missing persons from the array
         for idx, mp_data in enumerate(missing_persons_data):
@@ -318,6 +489,8 @@ def update_case(
                 address=mp_data.get('address'),
                 last_seen_datetime=mp_data.get('last_seen_datetime'),
                 last_seen_place=mp_data.get('last_seen_place'),
+                last_seen_lat=mp_data.get('last_seen_lat'),
+                last_seen_lon=mp_data.get('last_seen_lon'),
                 photos=mp_data.get('photos') or [],
                 videos=mp_data.get('videos') or [],
                 description=mp_data.get('description'),
@@ -350,6 +523,8 @@ def update_case(
     # Track who updated the case
     db_case.updated_by_user_id = current_user.id
 
+    index_case(db, db_case)
+
     db.commit()
     db.refresh(db_case)
 
@@ -402,6 +577,49 @@ def get_case_full(
     return db_case
 
 
+@router.get("/{case_id}/duplicates", response_model=CaseDuplicatesResponse)
+def get_case_duplicates(
+    case_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_permission("cases:read"))
+):
+    """
+    Get possible duplicates of a case.
+
+    Candidates are found through the match key index (phone, missing person's
+    name with birthdate or settlement) and ranked by match score.
+    """
+    db_case = db.query(Case).filter(Case.id == case_id).first()
+
+    if not db_case:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Case with id {case_id} not found"
+        )
+
+    keys = build_match_keys(submission_from_case(db, db_case))
+    candidates = find_candidates(db, keys, exclude_case_id=case_id)
+
+    linked_ids = [
+        row.id for row in db.query(Case.id).filter(Case.duplicate_of_case_id == case_id).all()
+    ]
+
+    return CaseDuplicatesResponse(
+        duplicate_of_case_id=db_case.duplicate_of_case_id,
+        linked_duplicate_ids=linked_ids,
+        candidates=[
+            CaseDuplicateCandidate(
+                case_id=c.case_id,
+                score=c.score,
+                matched_keys=c.matched_keys,
+                created_at=c.created_at,
+                missing_full_name=c.missing_full_name
+            )
+            for c in candidates
+        ]
+    )
+
+
 @router.post("/autofill", response_model=CaseAutofillResponse)
 def autofill_case_fields(
     request: CaseAutofillRequest,
@@ -48,6 +48,16 @@ def get_dashboard_stats(
 
     field_searches_by_status_dict = {status.name: count for status, count in field_searches_by_status}
 
+    # Track effort totals stored per field search (areas are unions within a
+    # field search; separate field searches of the same ground each count)
+    track_totals = FieldSearch.track_stats["totals"]
+    tracks, distance_m, area_m2, time_on_ground_s = db.query(
+        func.coalesce(func.sum(track_totals["tracks"].as_integer()), 0),
+        func.coalesce(func.sum(track_totals["distance_m"].as_float()), 0),
+        func.coalesce(func.sum(track_totals["area_m2"].as_float()), 0),
+        func.coalesce(func.sum(track_totals["time_on_ground_s"].as_float()), 0),
+    ).one()
+
     # Distribution statistics
     total_distributions = db.query(Distribution).count()
     distributions_by_status = db.query(
@@ -72,7 +82,11 @@ def get_dashboard_stats(
         ),
         field_searches=FieldSearchStats(
             total=total_field_searches,
-            by_status=field_searches_by_status_dict
+            by_status=field_searches_by_status_dict,
+            tracks=tracks,
+            distance_km=round(distance_m / 1000, 1),
+            area_km2=round(area_m2 / 1e6, 2),
+            time_on_ground_hours=round(time_on_ground_s / 3600, 1)
         ),
         distributions=DistributionStats(
             total=total_distributions,
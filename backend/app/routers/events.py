@@ -10,6 +10,7 @@ from app.models.event import Event
 from app.models.search import Search
 from app.models.user import User
 from app.routers.auth import get_current_user, require_permission
+from app.services import live_updates
 
 router = APIRouter(prefix="/events", tags=["Events"])
 
@@ -41,6 +42,7 @@ def create_event(
     db.add(db_event)
     db.commit()
     db.refresh(db_event)
+    _publish_event(db, db_event, "created")
 
     return db_event
 
@@ -118,6 +120,7 @@ def update_event(
 
     db.commit()
     db.refresh(db_event)
+    _publish_event(db, db_event, "updated")
 
     return db_event
 
@@ -137,7 +140,17 @@ def delete_event(
             detail=f"Event with id {event_id} not found"
         )
 
+    search_id = db_event.search_id
     db.delete(db_event)
     db.commit()
+    live_updates.publish_for_search(db, search_id, "event", {"action": "deleted", "event": {"id": event_id}})
 
     return None
+
+
+def _publish_event(db: Session, db_event: Event, action: str) -> None:
+    """Tell the field searches of the event's search (live channel)"""
+    live_updates.publish_for_search(db, db_event.search_id, "event", {
+        "action": action,
+        "event": {"id": db_event.id, "event_type": db_event.event_type, "event_datetime": db_event.event_datetime},
+    })
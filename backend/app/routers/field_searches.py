@@ -1,24 +1,57 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response, Header, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import select, insert, delete
-from typing import List, Optional
+from typing import List, Optional, Set, Tuple
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from datetime import datetime
+import os
+import shutil
+from app.core.logging_config import get_logger
 from app.db import get_db
 from app.schemas.field_search import (
     FieldSearchCreate, FieldSearchUpdate, FieldSearchResponse,
-    FieldSearchListResponse, AddParticipantsRequest, ParticipantInfo
+    FieldSearchListResponse, AddParticipantsRequest, ParticipantInfo, GridCoverageResponse,
+    FieldSearchTracksResponse, TrackLines, FieldSearchTrackStatsResponse, FieldSearchChangesResponse,
+    PositionBatch, PositionBatchResponse, ParticipantPositionResponse
 )
 from app.models.field_search import FieldSearch, FieldSearchStatus, field_search_participants
 from app.models.case import Case
 from app.models.search import Search
 from app.models.flyer import Flyer
 from app.models.user import User
-from app.routers.auth import get_current_user, require_permission
-from app.services.gpx_service import generate_gpx, transliterate_ukrainian
+from app.core.permissions import has_permission
+from app.routers.auth import get_current_user, get_user_permissions, require_permission, user_from_token
+from app.routers.files import serve_upload
+from app.services.gpx_service import transliterate_ukrainian
+from app.services.grid_area import AREA_EXTENSIONS, AreaFileError, AreaPolygon, load_area
+from app.services.grid_cells import GRID_SHAPES, MAX_AREA_GRID_CELLS
+from app.services.grid_coverage import COVERAGE_SWEEP_WIDTH, is_pending, schedule_coverage
+from app.services.grid_export import (
+    GRID_FORMATS, TILE_MEDIA_TYPE, GridParams, export_grid, grid_cache_dir, grid_tile, tile_json
+)
+from app.services.storage import LocalStorage, ensure_local, get_storage, key_from_url, publish_local
+from app.services.sync_versions import (
+    PARTICIPANT, TRACK, clear_deletions, deleted_since, is_full_sync, next_version, record_deletions,
+    stamp_tracks, tracks_since
+)
+from app.services import live_positions, live_updates, track_stats
+from app.services.track_variants import (
+    POLYLINE_PRECISION, TRACK_MAX_ZOOM, is_track_url, level_for_zoom, load_track_levels
+)
+from app.services.upload_refs import remove_unreferenced
 
 router = APIRouter(prefix="/field_searches", tags=["Field Searches"])
+logger = get_logger(__name__)
+
+# Changing any of these recomputes the grid coverage
+COVERAGE_FIELDS = {
+    "search_tracks", "grid_center_lat", "grid_center_lon", "grid_cols", "grid_rows",
+    "grid_cell_size", "grid_shape", "grid_area_file", "grid_sweep_width",
+}
+# Changing any of these updates the track statistics
+TRACK_STATS_FIELDS = {"search_tracks", "search_track_owners", "grid_sweep_width"}
 
 
 @router.post("/", response_model=FieldSearchResponse, status_code=status.HTTP_201_CREATED)
@@ -105,9 +138,16 @@ def create_field_search(
         grid_cols=field_search_data.grid_cols,
         grid_rows=field_search_data.grid_rows,
         grid_cell_size=field_search_data.grid_cell_size,
+        grid_shape=field_search_data.grid_shape,
+        grid_area_file=field_search_data.grid_area_file,
+        grid_sweep_width=field_search_data.grid_sweep_width,
         # Search progress
         search_tracks=field_search_data.search_tracks or [],
-        search_photos=field_search_data.search_photos or []
+        search_track_owners=field_search_data.search_track_owners,
+        search_photos=field_search_data.search_photos or [],
+        search_track_versions=stamp_tracks(None, field_search_data.search_tracks, 1)[0],
+        version=1,
+        fields_version=1
     )
 
     # Set custom created_at if provided (for data migration)
@@ -118,6 +158,10 @@ def create_field_search(
     db.commit()
     db.refresh(db_field_search)
 
+    if db_field_search.search_tracks:
+        _schedule_coverage(db_field_search)
+        _schedule_track_stats(db_field_search)
+
     return db_field_search
 
 
@@ -227,6 +271,10 @@ def update_field_search(
                 detail=f"Invalid field search status: {update_data['status']}"
             )
 
+    # Clearing the shape means the default shape
+    if "grid_shape" in update_data and update_data["grid_shape"] is None:
+        update_data["grid_shape"] = "square"
+
     # Verify users if being updated
     if "initiator_inforg_id" in update_data and update_data["initiator_inforg_id"]:
         initiator = db.query(User).filter(User.id == update_data["initiator_inforg_id"]).first()
@@ -253,12 +301,36 @@ def update_field_search(
                 detail=f"Flyer with id {update_data['flyer_id']} not found"
             )
 
+    # Track lists are synced by URL, not by sending the whole field search again
+    changed_fields = sorted(update_data.keys() - {"search_tracks"})
+    version = next_version(db, FieldSearch, field_search_id, fields=bool(changed_fields))
+    added_tracks = removed_tracks = []
+    if "search_tracks" in update_data:
+        db_field_search.search_track_versions, removed_tracks = stamp_tracks(
+            db_field_search.search_track_versions, update_data["search_tracks"], version
+        )
+        added_tracks = tracks_since(db_field_search.search_track_versions, version - 1)
+        record_deletions(db, TRACK, field_search_id, removed_tracks, version)
+
     for field, value in update_data.items():
         setattr(db_field_search, field, value)
 
     db.commit()
     db.refresh(db_field_search)
 
+    if changed_fields:
+        live_updates.publish(field_search_id, "field_search", {"version": version, "fields": changed_fields})
+    if added_tracks or removed_tracks:
+        live_updates.publish(
+            field_search_id, "tracks", {"version": version, "added": added_tracks, "removed": removed_tracks}
+        )
+
+    # New tracks or another grid - coverage follows in the background
+    if COVERAGE_FIELDS & update_data.keys():
+        _schedule_coverage(db_field_search)
+    if TRACK_STATS_FIELDS & update_data.keys():
+        _schedule_track_stats(db_field_search)
+
     return db_field_search
 
 
@@ -286,6 +358,9 @@ def delete_field_search(
     if db_field_search.preparation_map_image:
         files_to_delete.append(db_field_search.preparation_map_image)
 
+    if db_field_search.grid_area_file:
+        files_to_delete.append(db_field_search.grid_area_file)
+
     if db_field_search.search_tracks:
         files_to_delete.extend(db_field_search.search_tracks)
 
@@ -294,23 +369,14 @@ def delete_field_search(
 
     # Delete field search from database first
     db.delete(db_field_search)
+    clear_deletions(db, [PARTICIPANT, TRACK], field_search_id)
     db.commit()
+    live_updates.publish(field_search_id, "deleted", {})
+    live_positions.forget(field_search_id)
 
-    # Delete files from disk
-    upload_dir = Path("/app/uploads")
-    for file_url in files_to_delete:
-        if file_url:
-            # Extract filename from URL (/uploads/filename.ext -> filename.ext)
-            filename = file_url.split('/')[-1]
-            file_path = upload_dir / filename
-
-            # Delete file if it exists
-            try:
-                if file_path.exists():
-                    file_path.unlink()
-            except Exception as e:
-                # Log error but don't fail the deletion
-                print(f"Warning: Could not delete file {file_path}: {str(e)}")
+    # Delete files from disk unless another record still uses them
+    # (identical uploads are stored once and shared)
+    remove_unreferenced(db, files_to_delete)
 
     return None
 
@@ -341,12 +407,14 @@ def add_participants(
         )
 
     # Add participants
+    version = next_version(db, FieldSearch, field_search_id)
     for participant in participants_data.participants:
         stmt = insert(field_search_participants).values(
             field_search_id=field_search_id,
             user_id=participant.user_id,
             role_on_field=participant.role_on_field,
-            group_name=participant.group_name
+            group_name=participant.group_name,
+            version=version
         )
         db.execute(stmt)
 
@@ -354,9 +422,6 @@ def add_participants(
     try:
         from app.services.push_notification_service import push_service
         from app.core.notification_types import NotificationType
-        from app.core.logging_config import get_logger
-
-        logger = get_logger(__name__)
 
         # Get field search with related search and case
         fs = db.query(FieldSearch).options(
@@ -396,6 +461,16 @@ def add_participants(
         print(f"Failed to send push notifications for field search participants: {e}")
 
     db.commit()
+    live_positions.participants_changed(field_search_id)
+    live_updates.publish(field_search_id, "participants", {
+        "version": version,
+        "added": [participant.model_dump() for participant in participants_data.participants],
+        "removed": [],
+    })
+
+    # Groups changed - rebuild the per-group statistics
+    if db_field_search.track_stats:
+        _schedule_track_stats(db_field_search)
 
     return {"message": f"Added {len(participants_data.participants)} participants"}
 
@@ -454,6 +529,9 @@ def remove_participant(
         field_search_participants.c.user_id == user_id
     )
     result = db.execute(stmt)
+    if result.rowcount:
+        version = next_version(db, FieldSearch, field_search_id)
+        record_deletions(db, PARTICIPANT, field_search_id, [user_id], version)
     db.commit()
 
     if result.rowcount == 0:
@@ -461,28 +539,255 @@ def remove_participant(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Participant with user_id {user_id} not found in this field search"
         )
+    live_positions.participants_changed(field_search_id)
+    live_updates.publish(field_search_id, "participants", {"version": version, "added": [], "removed": [user_id]})
+
+    if db_field_search.track_stats:
+        _schedule_track_stats(db_field_search)
 
     return None
 
 
-@router.post("/{field_search_id}/generate-grid")
-def generate_grid(
+@router.get("/{field_search_id}/changes", response_model=FieldSearchChangesResponse)
+def get_field_search_changes(
     field_search_id: int,
+    since_version: Optional[int] = Query(None, ge=0, description="Version of the previous response"),
     db: Session = Depends(get_db),
-    current_user: User = Depends(require_permission("field_searches:update"))
+    current_user: User = Depends(require_permission("field_searches:read"))
 ):
     """
-    Generate GPX grid file for field search based on grid parameters.
+    Changes of a field search after since_version: added and removed
+    participants and tracks, and the field search itself if its fields
+    changed. Without since_version everything is returned.
+    """
+    db_field_search = db.query(FieldSearch).filter(FieldSearch.id == field_search_id).first()
+    if not db_field_search:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Field search with id {field_search_id} not found"
+        )
+    # Read first: changes committed meanwhile are returned now and again next poll, never lost
+    version = db_field_search.version
+    full = is_full_sync(since_version, version, db_field_search.pruned_version)
+    since = 0 if full else since_version
+
+    stmt = select(field_search_participants).where(field_search_participants.c.field_search_id == field_search_id)
+    if not full:
+        stmt = stmt.where(field_search_participants.c.version > since)
+    participants = [
+        ParticipantInfo(user_id=row.user_id, role_on_field=row.role_on_field, group_name=row.group_name)
+        for row in db.execute(stmt).fetchall()
+    ]
+    if full:
+        return {
+            "version": version,
+            "full": True,
+            "field_search": db_field_search,
+            "participants": participants,
+            "tracks": db_field_search.search_tracks or [],
+        }
+
+    # A participant removed and added again is reported as added only
+    added = {participant.user_id for participant in participants}
+    removed_participants = [
+        int(key) for key in dict.fromkeys(deleted_since(db, PARTICIPANT, field_search_id, since))
+        if int(key) not in added
+    ]
+    tracks = tracks_since(db_field_search.search_track_versions, since)
+    removed_tracks = [
+        url for url in dict.fromkeys(deleted_since(db, TRACK, field_search_id, since))
+        if url not in (db_field_search.search_track_versions or {})
+    ]
+    return {
+        "version": version,
+        "full": False,
+        "field_search": db_field_search if db_field_search.fields_version > since else None,
+        "participants": participants,
+        "removed_participants": removed_participants,
+        "tracks": tracks,
+        "removed_tracks": removed_tracks,
+    }
+
+
+# Live channel (see services/live_updates.py). Browsers cannot set headers on
+# WebSocket and EventSource connections, so the JWT may come as ?token=
+
+LIVE_KEEPALIVE_SECONDS = 15
+
+
+def _authorize_live(field_search_id: int, token: Optional[str]) -> int:
+    """Check a live client's token and permission; current version of the field search"""
+    from app.db import SessionLocal
+
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated"
+        )
+    # Own short session: a request session would hold a connection for the whole stream
+    db = SessionLocal()
+    try:
+        user = user_from_token(token, db)
+        if not has_permission(get_user_permissions(user), "field_searches:read"):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Permission 'field_searches:read' required"
+            )
+        version = db.scalar(select(FieldSearch.version).where(FieldSearch.id == field_search_id))
+        if version is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Field search with id {field_search_id} not found"
+            )
+        return version
+    finally:
+        db.close()
 
-    Requires the field search to have the following parameters set:
-    - grid_center_lat
-    - grid_center_lon
-    - grid_cols
-    - grid_rows
-    - grid_cell_size
 
-    Returns JSON with grid_file_url and filename for the generated GPX file.
+async def _open_live(field_search_id: int, token: Optional[str]) -> Tuple[live_updates.Subscription, str]:
+    """Subscribe, then authorize: the version in the hello message misses no later change"""
+    subscription = live_updates.subscribe(field_search_id)
+    try:
+        version = await run_in_threadpool(_authorize_live, field_search_id, token)
+    except BaseException:
+        live_updates.unsubscribe(subscription)
+        raise
+    return subscription, live_updates.serialize(field_search_id, "hello", {"version": version})
+
+
+@router.websocket("/{field_search_id}/live")
+async def field_search_live_socket(
+    websocket: WebSocket,
+    field_search_id: int,
+    token: Optional[str] = Query(None)
+):
+    """
+    Live changes of a field search over WebSocket: a hello message with the
+    current version, then one JSON message per change (pings while idle)
     """
+    try:
+        subscription, hello = await _open_live(field_search_id, token)
+    except HTTPException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(e.detail))
+        return
+
+    await websocket.accept()
+    try:
+        await websocket.send_text(hello)
+        while True:
+            message = await subscription.next(LIVE_KEEPALIVE_SECONDS)
+            await websocket.send_text(message or '{"type":"ping"}')
+    except WebSocketDisconnect:
+        pass
+    finally:
+        live_updates.unsubscribe(subscription)
+
+
+@router.get("/{field_search_id}/live/events")
+async def field_search_live_events(
+    field_search_id: int,
+    request: Request,
+    token: Optional[str] = Query(None, description="JWT, if the Authorization header cannot be set"),
+    authorization: Optional[str] = Header(None)
+):
+    """Live changes of a field search as server-sent events (same messages as the WebSocket)"""
+    if not token and authorization and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    subscription, hello = await _open_live(field_search_id, token)
+
+    async def stream():
+        try:
+            yield f"data: {hello}\n\n"
+            while not await request.is_disconnected():
+                message = await subscription.next(LIVE_KEEPALIVE_SECONDS)
+                yield f"data: {message}\n\n" if message else ": keepalive\n\n"
+        finally:
+            live_updates.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        # No proxy buffering: events must reach the client right away
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Live GPS positions (see services/live_positions.py): buffered in memory,
+# written in batches, last positions served without a query (with a single worker)
+
+# Phone clocks may run a little ahead
+MAX_POSITION_CLOCK_SKEW = timedelta(minutes=5)
+
+
+@router.post("/{field_search_id}/positions", response_model=PositionBatchResponse)
+def post_positions(
+    field_search_id: int,
+    batch: PositionBatch,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Live GPS points of the current user (a participant or the coordinator of the field search)"""
+    def allowed_users() -> Set[int]:
+        row = db.execute(select(FieldSearch.coordinator_id).where(FieldSearch.id == field_search_id)).first()
+        if row is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Field search with id {field_search_id} not found"
+            )
+        participants = set(db.scalars(
+            select(field_search_participants.c.user_id)
+            .where(field_search_participants.c.field_search_id == field_search_id)
+        ))
+        return participants | ({row.coordinator_id} if row.coordinator_id else set())
+
+    if not live_positions.is_allowed(field_search_id, current_user.id, allowed_users):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only participants of the field search can post positions"
+        )
+
+    latest = datetime.now(timezone.utc) + MAX_POSITION_CLOCK_SKEW
+    if any(point.recorded_at > latest for point in batch.points):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Positions must not be recorded in the future"
+        )
+
+    accepted = live_positions.add_positions(field_search_id, current_user.id, [
+        live_positions.Position(
+            point.recorded_at.timestamp(), point.lat, point.lon,
+            point.accuracy, point.altitude, point.speed, point.heading
+        )
+        for point in batch.points
+    ])
+    return PositionBatchResponse(accepted=accepted)
+
+
+@router.get("/{field_search_id}/positions", response_model=List[ParticipantPositionResponse])
+def get_positions(
+    field_search_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_permission("field_searches:read"))
+):
+    """Last known position of every participant (from memory; with several workers also stored ones)"""
+    positions = live_positions.positions(db, field_search_id)
+    return [live_positions.position_dict(user_id, point) for user_id, point in sorted(positions.items())]
+
+
+@router.get("/{field_search_id}/positions/{user_id}/trail", response_model=List[ParticipantPositionResponse])
+def get_position_trail(
+    field_search_id: int,
+    user_id: int,
+    since: Optional[datetime] = Query(None, description="Only points recorded after this time"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_permission("field_searches:read"))
+):
+    """Recent points of a participant (the last few minutes; with several workers also stored ones)"""
+    points = live_positions.recent_trail(db, field_search_id, user_id, since.timestamp() if since else None)
+    return [live_positions.position_dict(user_id, point) for point in points]
+
+
+def _get_field_search_with_case(db: Session, field_search_id: int) -> FieldSearch:
     # Get field search with eager loading of search and case
     db_field_search = db.query(FieldSearch).options(
         joinedload(FieldSearch.search).joinedload(Search.case)
@@ -500,6 +805,56 @@ def generate_grid(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Field search must be associated with a search and case"
         )
+    return db_field_search
+
+
+def _grid_area(db_field_search: FieldSearch) -> Tuple[AreaPolygon, str]:
+    """Search area of a field search and the hash of its file"""
+    key = key_from_url(db_field_search.grid_area_file)
+    if key is None or Path(key).suffix.lower() not in AREA_EXTENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Area file must be an uploaded file of type: {', '.join(sorted(AREA_EXTENSIONS))}"
+        )
+    path = ensure_local(key)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Area file not found"
+        )
+    try:
+        return load_area(path)
+    except AreaFileError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
+def field_search_grid_params(db_field_search: FieldSearch) -> GridParams:
+    """Validated grid parameters of a field search"""
+    shape = db_field_search.grid_shape or "square"
+    if shape not in GRID_SHAPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Grid shape must be one of: {', '.join(GRID_SHAPES)}"
+        )
+
+    if db_field_search.grid_area_file:
+        # The grid covers the area - only the cell size is needed
+        if db_field_search.grid_cell_size is None or db_field_search.grid_cell_size <= 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cell size must be greater than 0 meters"
+            )
+        area, area_sha256 = _grid_area(db_field_search)
+        try:
+            return GridParams.for_area(area, area_sha256, db_field_search.grid_cell_size, shape)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
 
     # Validate grid parameters
     if not all([
@@ -521,6 +876,13 @@ def generate_grid(
             detail="Grid must have at least 1 row and 1 column"
         )
 
+    # Exports and tiles build every cell
+    if db_field_search.grid_cols * db_field_search.grid_rows > MAX_AREA_GRID_CELLS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Grid is too large (at most {MAX_AREA_GRID_CELLS} cells)"
+        )
+
     if db_field_search.grid_cell_size <= 0:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -539,32 +901,86 @@ def generate_grid(
             detail="Longitude must be between -180 and 180 degrees"
         )
 
+    return GridParams(
+        center_lat=db_field_search.grid_center_lat,
+        center_lon=db_field_search.grid_center_lon,
+        cols=db_field_search.grid_cols,
+        rows=db_field_search.grid_rows,
+        cell_size=db_field_search.grid_cell_size,
+        shape=shape,
+    )
+
+
+def _schedule_coverage(db_field_search: FieldSearch) -> bool:
+    """Queue a coverage recomputation; False when the grid is not (validly) defined"""
     try:
-        # Generate GPX content
-        gpx_content = generate_gpx(
-            center_lat=db_field_search.grid_center_lat,
-            center_lon=db_field_search.grid_center_lon,
-            cols=db_field_search.grid_cols,
-            rows=db_field_search.grid_rows,
-            cell_size_meters=db_field_search.grid_cell_size
-        )
+        params = field_search_grid_params(db_field_search)
+    except HTTPException:
+        return False
+    schedule_coverage(
+        db_field_search.id, params, db_field_search.search_tracks or [], db_field_search.grid_sweep_width
+    )
+    return True
+
+
+def _schedule_track_stats(db_field_search: FieldSearch) -> None:
+    """Measure new tracks and rebuild the statistics in the background"""
+    track_stats.schedule_track_stats(
+        db_field_search.id,
+        db_field_search.search_tracks or [],
+        db_field_search.track_stats,
+        db_field_search.grid_sweep_width,
+    )
+
+
+def _grid_file_stem(db_field_search: FieldSearch, params: GridParams) -> str:
+    """<surname>_<params hash>: unique per grid, stable for the same parameters"""
+    missing_last_name = db_field_search.search.case.missing_last_name or "unknown"
+    return f"{transliterate_ukrainian(missing_last_name)}_{params.key[:12]}"
 
-        # Create uploads directory if it doesn't exist
-        upload_dir = Path("/app/uploads")
-        upload_dir.mkdir(parents=True, exist_ok=True)
 
-        # Generate filename based on missing person's last name and current date
-        case = db_field_search.search.case
-        missing_last_name = case.missing_last_name or "unknown"
-        transliterated_name = transliterate_ukrainian(missing_last_name)
-        current_date = datetime.now().strftime("%Y-%m-%d")
-        filename = f"{transliterated_name}_{current_date}.gpx"
+@router.post("/{field_search_id}/generate-grid")
+def generate_grid(
+    field_search_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_permission("field_searches:update"))
+):
+    """
+    Generate GPX grid file for field search based on grid parameters.
+
+    Requires the field search to have the following parameters set:
+    - grid_center_lat
+    - grid_center_lon
+    - grid_cols
+    - grid_rows
+    - grid_cell_size
+
+    With grid_area_file set only grid_cell_size is needed: the grid then
+    covers the area and keeps only the cells intersecting it. grid_shape
+    selects square (default) or hexagonal cells.
 
-        file_path = upload_dir / filename
+    Returns JSON with grid_file_url and filename for the generated GPX file,
+    plus the URLs of the KML/GeoJSON exports and of the vector tiles.
+    """
+    db_field_search = _get_field_search_with_case(db, field_search_id)
+    params = field_search_grid_params(db_field_search)
 
-        # Write GPX file
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(gpx_content)
+    try:
+        # Rendered once per parameter set (cached by parameter hash)
+        gpx_path = export_grid(params, "gpx")
+
+        # The name carries the parameter hash - grids generated the same day
+        # (or for the same surname) no longer overwrite each other
+        filename = f"{_grid_file_stem(db_field_search, params)}.gpx"
+        # Staged in the upload directory, then handed over to the storage backend
+        file_path = LocalStorage().path(filename)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        if not file_path.exists():
+            tmp_path = file_path.with_name(f".{filename}.part")
+            shutil.copyfile(gpx_path, tmp_path)
+            os.replace(tmp_path, file_path)
+            # Hand over to remote storage (no-op with local storage)
+            publish_local(filename)
 
         # Update field search with grid file URL
         grid_file_url = f"/uploads/{filename}"
@@ -572,7 +988,15 @@ def generate_grid(
         db.commit()
 
         # Return JSON with file URL instead of triggering download
-        return {"grid_file_url": grid_file_url, "filename": filename}
+        return {
+            "grid_file_url": grid_file_url,
+            "filename": filename,
+            "exports": {
+                fmt: f"/field_searches/{field_search_id}/grid/export?format={fmt}"
+                for fmt in GRID_FORMATS
+            },
+            "tiles": f"/field_searches/{field_search_id}/grid/tiles.json",
+        }
 
     except Exception as e:
         raise HTTPException(
@@ -581,6 +1005,215 @@ def generate_grid(
         )
 
 
+def _cache_relative(path: Path) -> str:
+    """Path of a grid cache file below the upload directory (for X-Accel-Redirect)"""
+    return str(path.relative_to(grid_cache_dir().parent))
+
+
+@router.get("/{field_search_id}/grid/export")
+def export_grid_file(
+    field_search_id: int,
+    request: Request,
+    format: str = Query("gpx", description="gpx, kml or geojson"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_permission("field_searches:read"))
+):
+    """
+    Download the grid as GPX (OsmAnd, Garmin), KML (Google Earth) or GeoJSON
+    (web maps, GIS). Responses carry an ETag derived from the grid parameters.
+    """
+    if format not in GRID_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown format: {format}. Allowed formats: {', '.join(GRID_FORMATS)}"
+        )
+    db_field_search = _get_field_search_with_case(db, field_search_id)
+    params = field_search_grid_params(db_field_search)
+    extension, media_type = GRID_FORMATS[format]
+
+    path = export_grid(params, format)
+    filename = f"{_grid_file_stem(db_field_search, params)}{extension}"
+    return serve_upload(
+        request,
+        path,
+        _cache_relative(path),
+        immutable=False,
+        etag=f'"{params.key}-{format}"',
+        media_type=media_type,
+        extra_headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/{field_search_id}/grid/tiles.json")
+def get_grid_tilejson(
+    field_search_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_permission("field_searches:read"))
+):
+    """
+    TileJSON for the grid's vector tiles (layers "cells" and "labels").
+    The tile URL is relative to the API root.
+    """
+    db_field_search = db.query(FieldSearch).filter(FieldSearch.id == field_search_id).first()
+    if not db_field_search:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Field search with id {field_search_id} not found"
+        )
+    params = field_search_grid_params(db_field_search)
+    return tile_json(params, f"/field_searches/{field_search_id}/grid/tiles/{{z}}/{{x}}/{{y}}.pbf")
+
+
+@router.get("/{field_search_id}/grid/tiles/{z}/{x}/{y}.pbf")
+def get_grid_tile(
+    field_search_id: int,
+    z: int,
+    x: int,
+    y: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_permission("field_searches:read"))
+):
+    """Vector tile of the grid (204 for tiles without cells)"""
+    db_field_search = db.query(FieldSearch).filter(FieldSearch.id == field_search_id).first()
+    if not db_field_search:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Field search with id {field_search_id} not found"
+        )
+    params = field_search_grid_params(db_field_search)
+
+    min_zoom, max_zoom = params.zoom_range
+    if not (min_zoom <= z <= max_zoom and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Tile not available (zoom levels {min_zoom}-{max_zoom})"
+        )
+
+    path = grid_tile(params, z, x, y)
+    etag = f'"{params.key}-{z}-{x}-{y}"'
+    if path is None:
+        return Response(status_code=status.HTTP_204_NO_CONTENT, headers={"ETag": etag})
+    return serve_upload(request, path, _cache_relative(path), immutable=False, etag=etag, media_type=TILE_MEDIA_TYPE)
+
+
+def _coverage_response(db_field_search: FieldSearch, params: GridParams) -> GridCoverageResponse:
+    coverage = db_field_search.grid_coverage or {}
+    # A result for other grid parameters no longer applies
+    current = coverage.get("grid_key") == params.key
+    return GridCoverageResponse(
+        percent=db_field_search.grid_coverage_percent if current else None,
+        updated_at=db_field_search.grid_coverage_updated_at if current else None,
+        pending=is_pending(db_field_search.id),
+        sweep_width=db_field_search.grid_sweep_width or COVERAGE_SWEEP_WIDTH,
+        cells=coverage.get("cells", {}) if current else {},
+    )
+
+
+@router.get("/{field_search_id}/grid/coverage", response_model=GridCoverageResponse)
+def get_grid_coverage(
+    field_search_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_permission("field_searches:read"))
+):
+    """
+    Coverage of the grid cells by the uploaded search tracks. Recomputed in
+    the background whenever tracks or grid parameters change.
+    """
+    db_field_search = db.query(FieldSearch).filter(FieldSearch.id == field_search_id).first()
+    if not db_field_search:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Field search with id {field_search_id} not found"
+        )
+    return _coverage_response(db_field_search, field_search_grid_params(db_field_search))
+
+
+@router.post(
+    "/{field_search_id}/grid/coverage",
+    response_model=GridCoverageResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
+def recompute_grid_coverage(
+    field_search_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_permission("field_searches:update"))
+):
+    """Queue a recomputation of the grid coverage (e.g. after tracks were replaced on disk)"""
+    db_field_search = db.query(FieldSearch).filter(FieldSearch.id == field_search_id).first()
+    if not db_field_search:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Field search with id {field_search_id} not found"
+        )
+    params = field_search_grid_params(db_field_search)
+    schedule_coverage(
+        db_field_search.id, params, db_field_search.search_tracks or [], db_field_search.grid_sweep_width
+    )
+    return _coverage_response(db_field_search, params)
+
+
+@router.get("/{field_search_id}/stats", response_model=FieldSearchTrackStatsResponse)
+def get_field_search_stats(
+    field_search_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_permission("field_searches:read"))
+):
+    """
+    Effort measured from the uploaded tracks: distance, swept area, time on
+    ground and moving time in total, per participant and per group
+    """
+    db_field_search = db.query(FieldSearch).filter(FieldSearch.id == field_search_id).first()
+    if not db_field_search:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Field search with id {field_search_id} not found"
+        )
+
+    stats = db_field_search.track_stats or {}
+    return FieldSearchTrackStatsResponse(
+        updated_at=db_field_search.track_stats_updated_at,
+        pending=track_stats.is_pending(field_search_id),
+        sweep_width=stats.get("sweep_width"),
+        totals=stats.get("totals"),
+        participants=stats.get("participants", []),
+        groups=stats.get("groups", []),
+    )
+
+
+@router.get("/{field_search_id}/tracks", response_model=FieldSearchTracksResponse)
+def get_field_search_tracks(
+    field_search_id: int,
+    zoom: int = Query(TRACK_MAX_ZOOM, ge=0, le=22, description="Map zoom level"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_permission("field_searches:read"))
+):
+    """
+    All uploaded tracks of a field search as encoded polylines simplified for
+    a zoom level (about one pixel of deviation), instead of the raw GPX/KML
+    """
+    db_field_search = db.query(FieldSearch).filter(FieldSearch.id == field_search_id).first()
+    if not db_field_search:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Field search with id {field_search_id} not found"
+        )
+
+    level = level_for_zoom(zoom)
+    tracks = []
+    for url in db_field_search.search_tracks or []:
+        if not is_track_url(url):
+            continue
+        try:
+            levels = load_track_levels(url)
+        except Exception as e:
+            logger.warning(f"Could not simplify track {url}: {e}")
+            levels = None
+        tracks.append(TrackLines(url=url, lines=levels["zooms"][str(level)] if levels else []))
+
+    return FieldSearchTracksResponse(zoom=level, precision=POLYLINE_PRECISION, tracks=tracks)
+
+
 @router.get("/{field_search_id}/download-grid")
 def download_grid(
     field_search_id: int,
@@ -608,7 +1241,20 @@ def download_grid(
 
     # Extract filename from URL
     filename = db_field_search.preparation_grid_file.split('/')[-1]
-    file_path = Path("/app/uploads") / filename
+    file_path = LocalStorage().path(filename)
+
+    storage = get_storage()
+    if not storage.is_local and not file_path.exists():
+        if not storage.exists(filename):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Grid file not found in storage"
+            )
+        # Presigned URL with Content-Disposition: attachment
+        return RedirectResponse(
+            storage.download_url(filename, filename=filename),
+            status_code=status.HTTP_307_TEMPORARY_REDIRECT
+        )
 
     if not file_path.exists():
         raise HTTPException(
@@ -0,0 +1,237 @@
+"""
+Serving of uploaded files and their derivatives under /uploads.
+
+Content-addressed uploads (/uploads/ab/cd/<sha256>.<ext>) and their variants
+(image sizes, video posters and web renditions) never change once written, so
+they are served with an immutable Cache-Control and a strong ETag; browsers
+and proxies do not ask for them again. Other files (legacy uploads, generated
+grid files) are revalidated with their ETag.
+
+Range requests (video seeking) and conditional requests are handled here.
+In production the bytes can be handed over to the reverse proxy instead of
+streaming them through the API worker:
+
+    UPLOAD_SERVE_MODE=direct      stream from Python (default)
+    UPLOAD_SERVE_MODE=x-accel     X-Accel-Redirect to UPLOAD_ACCEL_PREFIX (nginx)
+    UPLOAD_SERVE_MODE=x-sendfile  X-Sendfile with the absolute path (Apache, lighttpd)
+
+With a remote storage backend (STORAGE_BACKEND=s3) files are answered with a
+temporary redirect to a presigned URL of the bucket; only files still staged
+locally (derivatives being rendered) are served from here.
+"""
+import mimetypes
+import os
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import quote
+
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse, RedirectResponse
+from starlette.concurrency import run_in_threadpool
+from app.services.image_variants import IMAGE_VARIANTS, ensure_variant
+from app.services.storage import ensure_local, get_storage, publish_local
+from app.services.upload_service import UPLOAD_DIR, content_hash_from_url
+from app.services.video_processing import VIDEO_VARIANTS, video_variant_path
+
+router = APIRouter(prefix="/uploads", tags=["Files"])
+
+UPLOAD_SERVE_MODE = os.getenv("UPLOAD_SERVE_MODE", "direct").lower()
+# Internal nginx location aliased to the upload directory
+UPLOAD_ACCEL_PREFIX = os.getenv("UPLOAD_ACCEL_PREFIX", "/internal/uploads/")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+
+def _resolve(relative: str) -> Path:
+    """Map a path below /uploads to disk, rejecting traversal and hidden areas"""
+    if any(part.startswith(".") for part in Path(relative).parts):
+        # .tmp (partial uploads), .quarantine (collected files)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found"
+        )
+    file_path = UPLOAD_DIR / relative
+    try:
+        file_path.resolve().relative_to(UPLOAD_DIR.resolve())
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid file path"
+        )
+    return file_path
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison, as required for If-None-Match
+    return etag in candidates or f"W/{etag}" in candidates
+
+
+def serve_upload(
+    request: Request,
+    file_path: Path,
+    relative: str,
+    immutable: bool,
+    etag: Optional[str] = None,
+    media_type: Optional[str] = None,
+    extra_headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """
+    Build the response for a file below UPLOAD_DIR.
+
+    relative is the path below /uploads used for X-Accel-Redirect; etag
+    defaults to one derived from mtime and size.
+    """
+    try:
+        stat_result = os.stat(file_path)
+    except FileNotFoundError:
+        stat_result = None
+    if stat_result is None or not file_path.is_file():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found"
+        )
+
+    if etag is None:
+        etag = f'"{int(stat_result.st_mtime):x}-{stat_result.st_size:x}"'
+    if media_type is None:
+        media_type = mimetypes.guess_type(file_path.name)[0] or "application/octet-stream"
+
+    headers: Dict[str, str] = {
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+        "ETag": etag,
+        **(extra_headers or {}),
+    }
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if UPLOAD_SERVE_MODE == "x-accel":
+        # nginx serves the bytes (including Range) from an internal location
+        headers["X-Accel-Redirect"] = quote(f"{UPLOAD_ACCEL_PREFIX}{relative}")
+        return Response(media_type=media_type, headers=headers)
+    if UPLOAD_SERVE_MODE == "x-sendfile":
+        headers["X-Sendfile"] = str(file_path.resolve())
+        return Response(media_type=media_type, headers=headers)
+
+    # Starlette handles Range/If-Range (206, multipart ranges, 416)
+    return FileResponse(
+        path=str(file_path),
+        media_type=media_type,
+        headers=headers,
+        stat_result=stat_result,
+    )
+
+
+def redirect_to_storage(key: str) -> RedirectResponse:
+    """Send the client to the object in remote storage"""
+    return RedirectResponse(
+        get_storage().download_url(key),
+        status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+        # Presigned URLs expire, so the redirect itself must not be cached
+        headers={"Cache-Control": "no-store"},
+    )
+
+
+async def _remote_variant(relative: str, variant: str, key: str) -> Response:
+    """Variant of an original kept in remote storage; images are rendered lazily"""
+    storage = get_storage()
+    if await run_in_threadpool(storage.exists, key):
+        return redirect_to_storage(key)
+    if variant in IMAGE_VARIANTS:
+        fetched = not (UPLOAD_DIR / relative).is_file()
+        if await run_in_threadpool(ensure_local, relative) is not None:
+            rendered = await ensure_variant(relative, variant)
+            if fetched:
+                (UPLOAD_DIR / relative).unlink(missing_ok=True)
+            if rendered is not None:
+                for name in IMAGE_VARIANTS:
+                    await run_in_threadpool(publish_local, f"variants/{name}/{relative}.webp")
+                return redirect_to_storage(key)
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="File not found"
+    )
+
+
+@router.api_route("/variants/{variant}/{path:path}", methods=["GET", "HEAD"])
+async def get_file_variant(variant: str, path: str, request: Request):
+    """
+    Get a derivative of an uploaded file: resized WebP variant (thumb, medium)
+    of an image, or poster frame / web rendition (poster, web) of a video.
+
+    Image variants are normally rendered at upload time; for older uploads the
+    variant is rendered on first request and stored for later requests.
+    Video derivatives are produced by the media worker only.
+    """
+    if variant in IMAGE_VARIANTS:
+        suffix, media_type = ".webp", "image/webp"
+    elif variant in VIDEO_VARIANTS:
+        suffix = VIDEO_VARIANTS[variant]
+        media_type = mimetypes.guess_type(f"file{suffix}")[0]
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown variant: {variant}"
+        )
+
+    if not path.endswith(suffix):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found"
+        )
+    relative = path[:-len(suffix)]
+
+    # Security check - ensure original is inside upload directory
+    _resolve(relative)
+
+    if not get_storage().is_local and not _resolve(f"variants/{variant}/{path}").is_file():
+        return await _remote_variant(relative, variant, f"variants/{variant}/{path}")
+
+    if variant in IMAGE_VARIANTS:
+        variant_file = await ensure_variant(relative, variant)
+    else:
+        variant_file = video_variant_path(relative, variant)
+        if not variant_file.is_file():
+            variant_file = None
+    if variant_file is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found"
+        )
+
+    sha256 = content_hash_from_url(f"/uploads/{relative}")
+    return serve_upload(
+        request,
+        variant_file,
+        f"variants/{variant}/{path}",
+        immutable=True,
+        etag=f'"{sha256}-{variant}"' if sha256 else None,
+        media_type=media_type,
+    )
+
+
+@router.api_route("/{path:path}", methods=["GET", "HEAD"])
+def get_upload(path: str, request: Request):
+    """
+    Get an uploaded file (photo, video, audio, GPS track).
+    Supports Range requests for seeking in audio/video.
+    """
+    file_path = _resolve(path)
+    if not get_storage().is_local and not file_path.is_file():
+        return redirect_to_storage(path)
+    sha256 = content_hash_from_url(f"/uploads/{path}")
+
+    return serve_upload(
+        request,
+        file_path,
+        path,
+        # Content-named files never change; their hash is a strong validator
+        immutable=sha256 is not None,
+        etag=f'"{sha256}"' if sha256 else None,
+    )
@@ -41,7 +41,7 @@ def start_import(
 
     # Start import in background
     try:
-        ForumImportService.start_import(
+        started = ForumImportService.start_import(
             forum_url=request.forum_url,
             forum_username=request.forum_username,
             forum_password=request.forum_password,
@@ -55,6 +55,12 @@ def start_import(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to start import: {str(e)}"
         )
+    if not started:
+        # Another request (possibly in another worker) started one meanwhile
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Import is already running"
+        )
 
     # Return updated status
     return ForumImportService.get_status(db)
@@ -65,7 +71,7 @@ def stop_import(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Stop forum import process (sets flag, actual stop depends on implementation)"""
+    """Stop forum import process (the import stops before its next topic)"""
     import_status = ForumImportService.get_status(db)
     if not import_status.is_running:
         raise HTTPException(
@@ -73,7 +79,8 @@ def stop_import(
             detail="Import is not running"
         )
 
-    # Update status to stopped
+    # Update status to stopped; the import (in whichever worker runs it) checks
+    # this before each topic and releases its lock when it has stopped
     return ForumImportService.update_status(
         db,
         is_running=False,
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import Optional
+from app.models.user import User
+from app.routers.auth import get_current_user
+from app.schemas.gazetteer import SettlementAutocompleteResponse, SettlementResponse
+from app.services import gazetteer
+
+router = APIRouter(prefix="/gazetteer", tags=["Gazetteer"])
+
+
+@router.get("/autocomplete", response_model=SettlementAutocompleteResponse)
+def autocomplete_settlements(
+    q: str = Query(..., min_length=1, max_length=200, description="Beginning of a settlement name"),
+    region: Optional[str] = Query(None, max_length=200, description="Only settlements of this region"),
+    limit: int = Query(10, ge=1, le=gazetteer.MAX_AUTOCOMPLETE),
+    current_user: User = Depends(get_current_user)
+):
+    """Settlement suggestions for location fields (offline, no database query)"""
+    return {"settlements": [settlement._asdict() for settlement in gazetteer.autocomplete(q, limit, region)]}
+
+
+@router.get("/settlements/{settlement_id}", response_model=SettlementResponse)
+def get_settlement(
+    settlement_id: int,
+    current_user: User = Depends(get_current_user)
+):
+    """Settlement by gazetteer id (as stored in settlement_id columns)"""
+    index = gazetteer.get_index()
+    settlement = index.get(settlement_id) if index is not None else None
+    if settlement is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Settlement not found"
+        )
+    return settlement._asdict()
@@ -4,12 +4,14 @@ from typing import List, Optional
 from app.db import get_db
 from app.schemas.institutions_call import (
     InstitutionsCallCreate, InstitutionsCallUpdate,
-    InstitutionsCallResponse, InstitutionsCallListResponse
+    InstitutionsCallResponse, InstitutionsCallListResponse,
+    InstitutionsCallChecklistCreate
 )
 from app.models.institutions_call import InstitutionsCall
 from app.models.case import Case
 from app.models.user import User
 from app.routers.auth import get_current_user
+from app.services.nearest_institutions import nearest_organizations, organization_types, plan_calls
 
 router = APIRouter(prefix="/institutions_calls", tags=["Institutions Calls"])
 
@@ -41,6 +43,7 @@ def create_institutions_call(
     db_call = InstitutionsCall(
         case_id=call_data.case_id,
         user_id=call_data.user_id,
+        organization_id=call_data.organization_id,
         organization_name=call_data.organization_name,
         organization_type=call_data.organization_type,
         phone=call_data.phone,
@@ -81,6 +84,43 @@ def list_institutions_calls(
     return {"total": total, "institutions_calls": institutions_calls}
 
 
+@router.post("/checklist", response_model=InstitutionsCallListResponse, status_code=status.HTTP_201_CREATED)
+def create_institutions_call_checklist(
+    checklist_data: InstitutionsCallChecklistCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Plan calls of a case to the nearest institutions of each type: creates
+    pending calls (no result yet) for organizations the case has no call for
+    """
+    case = db.query(Case).filter(Case.id == checklist_data.case_id).first()
+    if not case:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Case with id {checklist_data.case_id} not found"
+        )
+    if case.lat is None or case.lon is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Case {case.id} has no coordinates (settlement or last-seen place)"
+        )
+    try:
+        kinds = organization_types(checklist_data.types)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    nearest, _ = nearest_organizations(
+        db, case.lat, case.lon, checklist_data.per_type, kinds, checklist_data.max_radius_km
+    )
+    calls = plan_calls(db, case.id, nearest)
+    db.commit()
+    for call in calls:
+        db.refresh(call)
+
+    return {"total": len(calls), "institutions_calls": calls}
+
+
 @router.get("/{call_id}", response_model=InstitutionsCallResponse)
 def get_institutions_call(
     call_id: int,
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from typing import List
@@ -7,10 +7,12 @@ from app.schemas.management import (
     DirectionCreate,
     DirectionUpdate,
     DirectionDetailResponse,
+    UploadGCReportResponse,
 )
 from app.schemas.role import RoleResponse
 from app.models.user import User, Role, Direction, user_roles
 from app.routers.auth import require_role
+from app.services.upload_gc import collect_garbage
 
 router = APIRouter(prefix="/management", tags=["Management"])
 
@@ -194,3 +196,15 @@ def delete_direction(
     db.commit()
 
     return {"detail": "Direction deleted successfully"}
+
+
+# ============= UPLOADS MAINTENANCE =============
+
+@router.post("/uploads/gc", response_model=UploadGCReportResponse)
+def collect_orphaned_uploads(
+    dry_run: bool = Query(True, description="Only report what would be quarantined/deleted"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role("admin"))
+):
+    """Quarantine unreferenced uploads and purge expired quarantine (admin only)"""
+    return collect_garbage(db, dry_run=dry_run)
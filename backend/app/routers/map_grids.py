@@ -1,16 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+import base64
+
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy import select, insert, update, delete
+from typing import Dict, Iterable, List, Optional
 from app.db import get_db
 from app.schemas.map_grid import (
     MapGridCreate, MapGridUpdate, MapGridResponse, MapGridListResponse,
-    MapGridWithCellsResponse, GridCellCreate, GridCellUpdate, GridCellResponse
+    MapGridWithCellsResponse, GridCellCreate, GridCellUpdate, GridCellResponse,
+    GridCellsBatchCreate, GridCellsGenerate, GridCellsGenerateResponse, GridCellsBatchUpdate,
+    MapGridStateInit, MapGridStateUpdate, MapGridStateResponse, MapGridChangesResponse
 )
 from app.models.map_grid import MapGrid, GridCell, GridCellStatus
 from app.models.search import Search
 from app.models.field_search import FieldSearch
 from app.models.user import User
 from app.routers.auth import get_current_user
+from app.routers.field_searches import field_search_grid_params
+from app.services.grid_cells import MAX_AREA_GRID_CELLS
+from app.services.grid_export import GridParams
+from app.services.grid_state import (
+    STATUS_NAMES, CellCodeError, apply_change, cell_index, empty_states, status_counts, sync_from_cells, write_cells
+)
+from app.services import live_updates
+from app.services.sync_versions import (
+    GRID_CELL, clear_deletions, deleted_since, is_full_sync, next_version, record_deletions
+)
 
 router = APIRouter(prefix="/map_grids", tags=["Map Grids"])
 
@@ -46,7 +61,9 @@ def create_map_grid(
         center_coordinates=map_grid_data.center_coordinates,
         grid_size=map_grid_data.grid_size,
         map_file_url=map_grid_data.map_file_url,
-        notes=map_grid_data.notes
+        notes=map_grid_data.notes,
+        version=1,
+        fields_version=1
     )
 
     db.add(db_map_grid)
@@ -95,6 +112,42 @@ def get_map_grid(
     return db_map_grid
 
 
+@router.get("/{map_grid_id}/changes", response_model=MapGridChangesResponse)
+def get_map_grid_changes(
+    map_grid_id: int,
+    since_version: Optional[int] = Query(None, ge=0, description="Version of the previous response"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Changes of a map grid after since_version: changed cells, ids of deleted
+    cells and the grid itself if its fields changed. Without since_version
+    everything is returned.
+    """
+    db_map_grid = _get_map_grid(db, map_grid_id)
+    # Read first: changes committed meanwhile are returned now and again next poll, never lost
+    version = db_map_grid.version
+
+    if is_full_sync(since_version, version, db_map_grid.pruned_version):
+        cells = db.scalars(
+            select(GridCell).where(GridCell.map_grid_id == map_grid_id).order_by(GridCell.cell_code)
+        ).all()
+        return {"version": version, "full": True, "map_grid": db_map_grid, "cells": cells}
+
+    cells = db.scalars(
+        select(GridCell).where(
+            GridCell.map_grid_id == map_grid_id, GridCell.version > since_version
+        ).order_by(GridCell.cell_code)
+    ).all()
+    return {
+        "version": version,
+        "full": False,
+        "map_grid": db_map_grid if db_map_grid.fields_version > since_version else None,
+        "cells": cells,
+        "deleted_cell_ids": [int(key) for key in deleted_since(db, GRID_CELL, map_grid_id, since_version)],
+    }
+
+
 @router.put("/{map_grid_id}", response_model=MapGridResponse)
 def update_map_grid(
     map_grid_id: int,
@@ -123,11 +176,13 @@ def update_map_grid(
                 detail=f"User with id {update_data['initiator_inforg_id']} not found"
             )
 
+    version = next_version(db, MapGrid, map_grid_id, fields=True)
     for field, value in update_data.items():
         setattr(db_map_grid, field, value)
 
     db.commit()
     db.refresh(db_map_grid)
+    _publish_map_grid(db, db_map_grid, version)
 
     return db_map_grid
 
@@ -147,8 +202,11 @@ def delete_map_grid(
             detail=f"Map grid with id {map_grid_id} not found"
         )
 
+    search_id = db_map_grid.search_id
     db.delete(db_map_grid)
+    clear_deletions(db, [GRID_CELL], map_grid_id)
     db.commit()
+    live_updates.publish_for_search(db, search_id, "map_grid", {"map_grid_id": map_grid_id, "deleted": True})
 
     return None
 
@@ -199,12 +257,16 @@ def create_grid_cell(
         coordinates=cell_data.coordinates,
         status=cell_status,
         assigned_to_field_search_id=cell_data.assigned_to_field_search_id,
-        notes=cell_data.notes
+        notes=cell_data.notes,
+        version=next_version(db, MapGrid, map_grid_id)
     )
 
     db.add(db_cell)
+    db.flush()
+    _sync_state(db, map_grid_id, [db_cell.cell_code])
     db.commit()
     db.refresh(db_cell)
+    _publish_cells(db, db_map_grid.search_id, map_grid_id, db_cell.version, [db_cell])
 
     return db_cell
 
@@ -286,11 +348,16 @@ def update_grid_cell(
                 detail=f"Field search with id {update_data['assigned_to_field_search_id']} not found"
             )
 
+    old_code = db_cell.cell_code
     for field, value in update_data.items():
         setattr(db_cell, field, value)
+    db_cell.version = next_version(db, MapGrid, map_grid_id)
+    db.flush()
+    _sync_state(db, map_grid_id, [old_code, db_cell.cell_code])
 
     db.commit()
     db.refresh(db_cell)
+    _publish_cells(db, db_cell.map_grid.search_id, map_grid_id, db_cell.version, [db_cell])
 
     return db_cell
 
@@ -314,7 +381,390 @@ def delete_grid_cell(
             detail=f"Grid cell with id {cell_id} not found in map grid {map_grid_id}"
         )
 
+    search_id = db_cell.map_grid.search_id
+    version = next_version(db, MapGrid, map_grid_id)
     db.delete(db_cell)
+    record_deletions(db, GRID_CELL, map_grid_id, [cell_id], version)
+    db.flush()
+    _sync_state(db, map_grid_id, [db_cell.cell_code])
     db.commit()
+    live_updates.publish_cells(db, search_id, map_grid_id, version, [], [cell_id])
 
     return None
+
+
+# Live channel of the field searches of the grid's search (see services/live_updates.py)
+
+def _publish_cells(db: Session, search_id: int, map_grid_id: int, version: int, cells: List[GridCell]) -> None:
+    diffs = [GridCellResponse.model_validate(cell).model_dump() for cell in cells]
+    live_updates.publish_cells(db, search_id, map_grid_id, version, diffs)
+
+
+def _publish_map_grid(db: Session, db_map_grid: MapGrid, version: int) -> None:
+    live_updates.publish_for_search(db, db_map_grid.search_id, "map_grid", {"map_grid_id": db_map_grid.id, "version": version})
+
+
+# Bulk endpoints: validation runs once per request over all referenced
+# cells and field searches, changes are written with one statement
+
+def _get_map_grid(db: Session, map_grid_id: int) -> MapGrid:
+    db_map_grid = db.query(MapGrid).filter(MapGrid.id == map_grid_id).first()
+    if not db_map_grid:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Map grid with id {map_grid_id} not found"
+        )
+    return db_map_grid
+
+
+def _sync_state(db: Session, map_grid_id: int, codes: Optional[Iterable[str]] = None) -> None:
+    """Mirror written grid cells in the compact state (see services/grid_state.py)"""
+    try:
+        sync_from_cells(db, map_grid_id, codes)
+    except CellCodeError as e:
+        # The cells were already written in this transaction
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{e}; the map grid's cell state only takes cells inside its grid"
+        )
+
+
+def _verify_field_searches(db: Session, field_search_ids: Iterable[Optional[int]]) -> None:
+    """Check that all given field searches exist (one query)"""
+    wanted = {field_search_id for field_search_id in field_search_ids if field_search_id}
+    if not wanted:
+        return
+    found = set(db.scalars(select(FieldSearch.id).where(FieldSearch.id.in_(wanted))))
+    missing = sorted(wanted - found)
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Field searches not found: {', '.join(map(str, missing))}"
+        )
+
+
+@router.post("/{map_grid_id}/cells/batch", response_model=List[GridCellResponse], status_code=status.HTTP_201_CREATED)
+def create_grid_cells(
+    map_grid_id: int,
+    cells_data: GridCellsBatchCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Create many grid cells with one INSERT"""
+    db_map_grid = _get_map_grid(db, map_grid_id)
+
+    invalid = sorted({cell.status for cell in cells_data.cells if cell.status and cell.status not in GridCellStatus.__members__})
+    if invalid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid grid cell status: {', '.join(invalid)}"
+        )
+    _verify_field_searches(db, (cell.assigned_to_field_search_id for cell in cells_data.cells))
+
+    version = next_version(db, MapGrid, map_grid_id)
+    rows = [
+        {
+            "map_grid_id": map_grid_id,
+            "cell_code": cell.cell_code,
+            "coordinates": cell.coordinates,
+            "status": GridCellStatus[cell.status] if cell.status else GridCellStatus.unassigned,
+            "assigned_to_field_search_id": cell.assigned_to_field_search_id,
+            "notes": cell.notes,
+            "version": version,
+        }
+        for cell in cells_data.cells
+    ]
+    cells = list(db.scalars(insert(GridCell).returning(GridCell, sort_by_parameter_order=True), rows))
+    _sync_state(db, map_grid_id, [row["cell_code"] for row in rows])
+    search_id = db_map_grid.search_id
+    db.commit()
+    _publish_cells(db, search_id, map_grid_id, version, cells)
+
+    return cells
+
+
+@router.post("/{map_grid_id}/cells/generate", response_model=GridCellsGenerateResponse, status_code=status.HTTP_201_CREATED)
+def generate_grid_cells(
+    map_grid_id: int,
+    generate_data: GridCellsGenerate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Create all cells of a grid (codes A1, B1, ... with center coordinates)
+    from the grid of a field search or explicit parameters, with one INSERT
+    """
+    db_map_grid = _get_map_grid(db, map_grid_id)
+
+    if generate_data.field_search_id is not None:
+        field_search = db.query(FieldSearch).filter(FieldSearch.id == generate_data.field_search_id).first()
+        if not field_search:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Field search with id {generate_data.field_search_id} not found"
+            )
+        params = field_search_grid_params(field_search)
+    else:
+        params = GridParams(
+            center_lat=generate_data.center_lat,
+            center_lon=generate_data.center_lon,
+            cols=generate_data.cols,
+            rows=generate_data.rows,
+            cell_size=generate_data.cell_size,
+            shape=generate_data.shape,
+        )
+    if params.cols * params.rows > MAX_AREA_GRID_CELLS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Grid is too large (at most {MAX_AREA_GRID_CELLS} cells)"
+        )
+
+    version = next_version(db, MapGrid, map_grid_id)
+    if generate_data.replace:
+        deleted = db.scalars(delete(GridCell).where(GridCell.map_grid_id == map_grid_id).returning(GridCell.id))
+        record_deletions(db, GRID_CELL, map_grid_id, deleted.all(), version)
+        existing = set()
+    else:
+        existing = set(db.scalars(select(GridCell.cell_code).where(GridCell.map_grid_id == map_grid_id)))
+
+    cells = params.cells()
+    if generate_data.assign:
+        field_search_id, cell_status = generate_data.field_search_id, GridCellStatus.assigned
+    else:
+        field_search_id, cell_status = None, GridCellStatus.unassigned
+    rows = [
+        {
+            "map_grid_id": map_grid_id,
+            "cell_code": code,
+            "coordinates": f"{lat:.6f},{lon:.6f}",
+            "status": cell_status,
+            "assigned_to_field_search_id": field_search_id,
+            "version": version,
+        }
+        for code, lat, lon in zip(cells.names, cells.center_lats.tolist(), cells.center_lons.tolist())
+        if code not in existing
+    ]
+    if rows:
+        db.execute(insert(GridCell), rows)
+    _sync_state(db, map_grid_id, None if generate_data.replace else [row["cell_code"] for row in rows])
+    search_id = db_map_grid.search_id
+    db.commit()
+    live_updates.publish_for_search(db, search_id, "map_grid", {"map_grid_id": map_grid_id, "version": version})
+
+    return GridCellsGenerateResponse(created=len(rows), skipped=len(cells) - len(rows))
+
+
+@router.patch("/{map_grid_id}/cells", response_model=List[GridCellResponse])
+def update_grid_cells(
+    map_grid_id: int,
+    cells_data: GridCellsBatchUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Change status, assignment or notes of many cells in one transaction.
+    Cells are referenced by id or cell_code; either all changes apply or none.
+    """
+    db_map_grid = _get_map_grid(db, map_grid_id)
+    search_id = db_map_grid.search_id
+
+    ids = {item.id for item in cells_data.cells if item.id is not None}
+    codes = {item.cell_code for item in cells_data.cells if item.cell_code is not None}
+    found = db.execute(
+        select(GridCell.id, GridCell.cell_code).where(
+            GridCell.map_grid_id == map_grid_id,
+            GridCell.id.in_(ids) | GridCell.cell_code.in_(codes)
+        )
+    ).all()
+    found_ids = {cell_id for cell_id, _ in found}
+    ids_by_code: Dict[str, List[int]] = {}
+    for cell_id, code in found:
+        ids_by_code.setdefault(code, []).append(cell_id)
+
+    missing = sorted(map(str, ids - found_ids)) + sorted(codes - ids_by_code.keys())
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Grid cells not found in map grid {map_grid_id}: {', '.join(missing[:20])}"
+        )
+    _verify_field_searches(db, (item.assigned_to_field_search_id for item in cells_data.cells))
+
+    # Later changes of the same cell win
+    changes: Dict[int, Dict] = {}
+    for item in cells_data.cells:
+        values = item.model_dump(exclude_unset=True, exclude={"id", "cell_code"})
+        if "status" in values:
+            values["status"] = GridCellStatus[values["status"]] if values["status"] else GridCellStatus.unassigned
+        for cell_id in ([item.id] if item.id is not None else ids_by_code[item.cell_code]):
+            changes.setdefault(cell_id, {}).update(values)
+
+    mappings = [{"id": cell_id, **values} for cell_id, values in changes.items() if values]
+    if mappings:
+        version = next_version(db, MapGrid, map_grid_id)
+        mappings = [{**mapping, "version": version} for mapping in mappings]
+        # One executemany UPDATE by primary key
+        db.execute(update(GridCell), mappings)
+        codes_by_id = {cell_id: code for cell_id, code in found}
+        _sync_state(db, map_grid_id, {codes_by_id[mapping["id"]] for mapping in mappings})
+    db.commit()
+    if mappings:
+        # Only the changed fields of each cell
+        live_updates.publish_cells(db, search_id, map_grid_id, version, mappings)
+
+    return db.scalars(
+        select(GridCell).where(GridCell.id.in_(changes.keys())).order_by(GridCell.cell_code)
+    ).all()
+
+
+# Compact cell state: all cells of a grid in the map grid row
+
+def _state_response(db_map_grid: MapGrid) -> MapGridStateResponse:
+    return MapGridStateResponse(
+        cols=db_map_grid.grid_cols,
+        rows=db_map_grid.grid_rows,
+        status_names=list(STATUS_NAMES),
+        statuses=base64.b64encode(db_map_grid.cell_states).decode("ascii"),
+        counts=status_counts(db_map_grid.cell_states),
+        assignments=db_map_grid.cell_assignments or {},
+        notes=db_map_grid.cell_notes or {},
+    )
+
+
+def _get_map_grid_state(db: Session, map_grid_id: int, for_update: bool = False) -> MapGrid:
+    query = db.query(MapGrid).filter(MapGrid.id == map_grid_id)
+    if for_update:
+        # Concurrent batches must not overwrite each other's bytes
+        query = query.with_for_update()
+    db_map_grid = query.first()
+    if not db_map_grid:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Map grid with id {map_grid_id} not found"
+        )
+    if db_map_grid.cell_states is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Map grid {map_grid_id} has no cell state yet"
+        )
+    return db_map_grid
+
+
+@router.put("/{map_grid_id}/state", response_model=MapGridStateResponse)
+def init_map_grid_state(
+    map_grid_id: int,
+    state_data: MapGridStateInit,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Create (or resize) the compact cell state of a map grid from its grid
+    cells; the state then mirrors them. All cells must lie inside cols x rows.
+    """
+    db_map_grid = _get_map_grid(db, map_grid_id)
+    try:
+        states = bytearray(empty_states(state_data.cols, state_data.rows))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    outside = []
+    for code in db.scalars(select(GridCell.cell_code).where(GridCell.map_grid_id == map_grid_id)):
+        try:
+            cell_index(code, state_data.cols, state_data.rows)
+        except CellCodeError:
+            outside.append(code)
+    if outside:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Cells outside the {state_data.cols}x{state_data.rows} grid: {', '.join(sorted(outside)[:20])}"
+        )
+
+    version = next_version(db, MapGrid, map_grid_id, fields=True)
+    db_map_grid.grid_cols = state_data.cols
+    db_map_grid.grid_rows = state_data.rows
+    db_map_grid.cell_states = bytes(states)
+    db_map_grid.cell_assignments = {}
+    db_map_grid.cell_notes = {}
+    db.flush()
+    sync_from_cells(db, map_grid_id)
+    db.commit()
+    db.refresh(db_map_grid)
+    _publish_map_grid(db, db_map_grid, version)
+
+    return _state_response(db_map_grid)
+
+
+@router.get("/{map_grid_id}/state", response_model=MapGridStateResponse)
+def get_map_grid_state(
+    map_grid_id: int,
+    format: str = Query("json", description="json (base64 statuses) or binary (raw status bytes)"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Status, assignment and notes of all cells of a map grid from one row"""
+    db_map_grid = _get_map_grid_state(db, map_grid_id)
+    if format == "binary":
+        return Response(
+            content=db_map_grid.cell_states,
+            media_type="application/octet-stream",
+            headers={"X-Grid-Cols": str(db_map_grid.grid_cols), "X-Grid-Rows": str(db_map_grid.grid_rows)},
+        )
+    if format != "json":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Format must be json or binary"
+        )
+    return _state_response(db_map_grid)
+
+
+@router.patch("/{map_grid_id}/state", response_model=MapGridStateResponse)
+def update_map_grid_state(
+    map_grid_id: int,
+    state_data: MapGridStateUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Change cells of the compact state (constant work per cell); the grid
+    cell rows of the changed cells are written too
+    """
+    db_map_grid = _get_map_grid_state(db, map_grid_id, for_update=True)
+
+    indexes = []
+    invalid = []
+    for change in state_data.cells:
+        try:
+            indexes.append(cell_index(change.cell_code, db_map_grid.grid_cols, db_map_grid.grid_rows))
+        except CellCodeError:
+            invalid.append(change.cell_code)
+    if invalid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Cells outside the grid: {', '.join(invalid[:20])}"
+        )
+    _verify_field_searches(db, (change.assigned_to_field_search_id for change in state_data.cells))
+
+    states = bytearray(db_map_grid.cell_states)
+    assignments = dict(db_map_grid.cell_assignments or {})
+    notes = dict(db_map_grid.cell_notes or {})
+    # Later changes of the same cell win
+    changes: Dict[str, Dict] = {}
+    for change, index in zip(state_data.cells, indexes):
+        code = change.cell_code.strip().upper()
+        values = change.model_dump(exclude_unset=True, exclude={"cell_code"})
+        apply_change(states, assignments, notes, code, index, values)
+        changes.setdefault(code, {}).update(values)
+
+    db_map_grid.cell_states = bytes(states)
+    db_map_grid.cell_assignments = assignments
+    db_map_grid.cell_notes = notes
+    # A new fields_version tells syncing clients to fetch the state again
+    version = next_version(db, MapGrid, map_grid_id, fields=True)
+    write_cells(db, map_grid_id, changes, version)
+    db.commit()
+    db.refresh(db_map_grid)
+    _publish_map_grid(db, db_map_grid, version)
+
+    return _state_response(db_map_grid)
@@ -1,17 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import or_
-from typing import Optional
+from typing import List, Optional
 from app.db import get_db
 from app.schemas.organization import (
     OrganizationCreate,
     OrganizationUpdate,
     OrganizationResponse,
     OrganizationListResponse,
+    NearestOrganizationsResponse,
 )
+from app.models.case import Case
 from app.models.organization import Organization, OrganizationType
 from app.models.user import User
 from app.routers.auth import require_permission
+from app.services.nearest_institutions import MAX_PER_TYPE, nearest_organizations, organization_types
 
 router = APIRouter(prefix="/organizations", tags=["Organizations"])
 
@@ -39,6 +42,8 @@ def create_organization(
         region=organization_data.region,
         city=organization_data.city,
         address=organization_data.address,
+        lat=organization_data.lat,
+        lon=organization_data.lon,
         contact_info=organization_data.contact_info,
         notes=organization_data.notes,
     )
@@ -97,6 +102,65 @@ def list_organizations(
     return {"total": total, "organizations": organizations}
 
 
+@router.get("/nearest", response_model=NearestOrganizationsResponse)
+def get_nearest_organizations(
+    case_id: Optional[int] = Query(None, description="Search around the point of this case"),
+    lat: Optional[float] = Query(None, ge=-90, le=90, description="Search around this point (instead of a case)"),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+    per_type: int = Query(3, ge=1, le=MAX_PER_TYPE, description="Organizations per type"),
+    types: Optional[List[str]] = Query(None, description="Organization types (default: all)"),
+    max_radius_km: float = Query(200, gt=0, le=1000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_permission("organizations:read"))
+):
+    """Nearest organizations of each type, ranked by distance"""
+    try:
+        kinds = organization_types(types)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if case_id is not None:
+        point = db.query(Case.lat, Case.lon).filter(Case.id == case_id).first()
+        if point is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Case with id {case_id} not found"
+            )
+        lat, lon = point
+        if lat is None or lon is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Case {case_id} has no coordinates (settlement or last-seen place)"
+            )
+    elif lat is None or lon is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Give case_id or lat and lon"
+        )
+
+    found, radius_km = nearest_organizations(db, lat, lon, per_type, kinds, max_radius_km)
+    return {
+        "lat": lat,
+        "lon": lon,
+        "radius_km": radius_km,
+        "organizations": [
+            {
+                "id": organization.id,
+                "name": organization.name,
+                "type": organization.type.value,
+                "region": organization.region,
+                "city": organization.city,
+                "address": organization.address,
+                "contact_info": organization.contact_info,
+                "lat": organization.lat,
+                "lon": organization.lon,
+                "distance_km": round(distance_km, 3),
+            }
+            for organization, distance_km in found
+        ],
+    }
+
+
 @router.get("/{organization_id}", response_model=OrganizationResponse)
 def get_organization(
     organization_id: int,
@@ -16,7 +16,8 @@ from app.schemas.public_case import (
 from app.schemas.case import CaseCreate
 from app.models.case import Case
 from app.models.missing_person import MissingPerson
-from app.middleware.rate_limit import check_public_rate_limit, get_client_ip
+from app.middleware.rate_limit import check_public_rate_limit, get_client_ip, rate_limit
+from app.services.dedup_service import dedup_submission, index_case
 from app.core.logging_config import get_logger
 import os
 
@@ -28,6 +29,14 @@ router = APIRouter(prefix="/public", tags=["Public"])
 # Set PUBLIC_API_KEY in .env to enable API key validation
 PUBLIC_API_KEY = os.getenv("PUBLIC_API_KEY")
 
+PUBLIC_CASE_CREATED_MESSAGE = "Заявку успішно створено. Наша команда зв'яжеться з вами найближчим часом."
+
+
+def _telegram_case_message(autofill_worked: bool) -> str:
+    if autofill_worked:
+        return "Заявку успішно створено. Дані автоматично розпарсовано."
+    return "Заявку успішно створено. Дані потребують ручного опрацювання."
+
 
 def verify_api_key(request: Request):
     """Optional API key verification for public endpoints"""
@@ -70,9 +79,18 @@ def create_public_case(
         # Create CaseCreate instance for validation
         validated_data = CaseCreate(**internal_case_data)
 
+        # Merge into an existing case if the same disappearance was already reported
+        merged_case, duplicate_of_case_id = dedup_submission(db, validated_data, source="сайт")
+        if merged_case:
+            db.commit()
+            logger.info(f"Public submission merged into case {merged_case.id}, IP={client_ip}")
+            # Same answer as for a new case: callers must not learn about existing cases
+            return PublicCaseResponse(success=True, message=PUBLIC_CASE_CREATED_MESSAGE)
+
         # Create case in database without created_by_user_id (public submission)
         db_case = Case(
             created_by_user_id=None,  # No user for public submissions
+            duplicate_of_case_id=duplicate_of_case_id,
             # Basis
             basis=validated_data.basis,
             # Applicant - split name fields
@@ -141,6 +159,7 @@ def create_public_case(
             order_index=0
         )
         db.add(db_missing_person)
+        index_case(db, db_case)
 
         db.commit()
         db.refresh(db_case)
@@ -169,7 +188,7 @@ def create_public_case(
 
         return PublicCaseResponse(
             success=True,
-            message="Заявку успішно створено. Наша команда зв'яжеться з вами найближчим часом.",
+            message=PUBLIC_CASE_CREATED_MESSAGE,
             case_id=db_case.id
         )
 
@@ -192,7 +211,7 @@ def create_telegram_case(
     case_data: TelegramCaseCreate,
     request: Request,
     db: Session = Depends(get_db),
-    _rate_limit: None = Depends(check_public_rate_limit),
+    _rate_limit: None = Depends(rate_limit("telegram")),
     _api_key: None = Depends(verify_api_key)
 ):
     """
@@ -254,9 +273,18 @@ def create_telegram_case(
         # Create CaseCreate instance for validation
         validated_data = CaseCreate(**case_dict)
 
+        # Merge into an existing case if the same disappearance was already reported
+        merged_case, duplicate_of_case_id = dedup_submission(db, validated_data, source="Telegram")
+        if merged_case:
+            db.commit()
+            logger.info(f"Telegram submission merged into case {merged_case.id}, IP={client_ip}")
+            # Same answer as for a new case, without the id of the existing one
+            return TelegramCaseResponse(success=True, message=_telegram_case_message(autofill_worked))
+
         # Create case in database (created_by_user_id is None for Telegram submissions)
         db_case = Case(
             created_by_user_id=None,
+            duplicate_of_case_id=duplicate_of_case_id,
             # Basis
             basis=validated_data.basis,
             # Applicant
@@ -325,6 +353,7 @@ def create_telegram_case(
             order_index=0
         )
         db.add(db_missing_person)
+        index_case(db, db_case)
 
         db.commit()
         db.refresh(db_case)
@@ -353,15 +382,9 @@ def create_telegram_case(
             logger.error(f"Failed to send push notification for Telegram case: {e}")
             # Don't fail the request if notification fails
 
-        message = "Заявку успішно створено."
-        if autofill_worked:
-            message += " Дані автоматично розпарсовано."
-        else:
-            message += " Дані потребують ручного опрацювання."
-
         return TelegramCaseResponse(
             success=True,
-            message=message,
+            message=_telegram_case_message(autofill_worked),
             case_id=db_case.id
         )
 
@@ -385,7 +408,7 @@ async def add_telegram_case_photos(
     request: Request,
     files: List[UploadFile] = File(...),
     db: Session = Depends(get_db),
-    _rate_limit: None = Depends(check_public_rate_limit),
+    _rate_limit: None = Depends(rate_limit("telegram")),
     _api_key: None = Depends(verify_api_key)
 ):
     """
@@ -396,7 +419,8 @@ async def add_telegram_case_photos(
     Rate limiting: 5 requests per 60 seconds per IP address.
     """
     from pathlib import Path
-    import uuid
+    from app.services.upload_service import UploadTooLargeError, save_upload, remove_uploads
+    from app.services.media_pipeline import process_new_uploads
 
     client_ip = get_client_ip(request)
 
@@ -424,18 +448,12 @@ async def add_telegram_case_photos(
                 detail="Максимум 10 файлів за раз"
             )
 
-        # Upload directory (same as in upload.py)
-        UPLOAD_DIR = Path("/app/uploads")
-        UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-
         # Allowed image extensions
         ALLOWED_IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
         MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB
 
-        uploaded_urls = []
-
+        # Validate all file extensions before storing any of them
         for file in files:
-            # Validate file extension
             file_ext = Path(file.filename).suffix.lower()
             if file_ext not in ALLOWED_IMAGE_EXTENSIONS:
                 raise HTTPException(
@@ -443,27 +461,23 @@ async def add_telegram_case_photos(
                     detail=f"Тип файлу {file_ext} не підтримується. Дозволені типи: {', '.join(ALLOWED_IMAGE_EXTENSIONS)}"
                 )
 
-            # Check file size
-            content = await file.read()
-            if len(content) > MAX_FILE_SIZE:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Файл {file.filename} занадто великий. Максимальний розмір: 10 MB"
-                )
-
-            # Generate unique filename
-            original_name = Path(file.filename).stem
-            safe_name = "".join(c for c in original_name if c.isalnum() or c in (' ', '-', '_')).strip()
-            safe_name = safe_name[:50]  # Limit length
-            unique_filename = f"{uuid.uuid4()}_{safe_name}{file_ext}"
-            file_path = UPLOAD_DIR / unique_filename
-
-            # Save file
-            with open(file_path, "wb") as f:
-                f.write(content)
+        # Stream files to disk in chunks (size limit is checked while copying)
+        stored = []
+        try:
+            for file in files:
+                stored.append(await save_upload(file, MAX_FILE_SIZE))
+        except UploadTooLargeError as e:
+            remove_uploads(stored)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Файл {e.filename} занадто великий. Максимальний розмір: 10 MB"
+            )
+        except Exception:
+            remove_uploads(stored)
+            raise
 
-            # Add URL to list
-            uploaded_urls.append(f"/uploads/{unique_filename}")
+        uploaded_urls = [upload.url for upload in stored]
+        process_new_uploads(uploaded_urls)
 
         # Update case with new photo URLs
         current_photos = db_case.missing_photos or []
@@ -1,13 +1,33 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, status
-from typing import List
-import os
-import uuid
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Header, Query, Request, Response, status
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import datetime, timezone
 from pathlib import Path
+from app.db import get_db
+from app.models.media_info import MediaInfo
+from app.models.user import User
+from app.routers.auth import get_current_user
+from app.schemas.upload import (
+    UploadSessionCreate, UploadSessionResponse, UploadCompleteResponse, MediaInfoResponse,
+    DirectUploadCreate, DirectUploadResponse, DirectUploadComplete
+)
+from app.services.upload_service import (
+    UPLOAD_DIR, UploadTooLargeError, StoredUpload, save_upload, remove_uploads, resolve_upload_name,
+    content_filename, content_hash_from_url
+)
+from app.services.upload_refs import is_referenced
+from app.services import resumable_upload
+from app.services.resumable_upload import (
+    UploadSession, UploadSessionBusy, UploadSessionLimit, UploadSessionNotFound, UploadOffsetMismatch,
+    UploadIntegrityError
+)
+from app.services import storage as storage_service
+from app.services.storage import DirectUploadError, get_storage, guess_content_type, key_from_url
+from app.services.media_pipeline import derivative_keys, process_new_uploads
+from app.services.video_processing import is_processing, is_video_url
 
 router = APIRouter(prefix="/upload", tags=["Upload"])
 
-# Upload directory
-UPLOAD_DIR = Path("/app/uploads")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 # Allowed image extensions
@@ -17,7 +37,7 @@ ALLOWED_MEDIA_EXTENSIONS = {
     ".jpg", ".jpeg", ".png", ".gif", ".webp",  # Images
     ".mp4", ".mov", ".avi", ".mkv", ".webm",   # Video
     ".mp3", ".wav", ".ogg", ".m4a", ".aac",    # Audio
-    ".gpx", ".kml"                              # GPS tracks
+    ".gpx", ".kml", ".geojson"                  # GPS tracks, search areas
 }
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB
 MAX_MEDIA_FILE_SIZE = 100 * 1024 * 1024  # 100 MB for video/audio
@@ -63,36 +83,30 @@ async def upload_images(files: List[UploadFile] = File(...)):
             detail="Maximum 10 files allowed"
         )
 
-    uploaded_urls = []
-
+    # Validate all files before storing any of them
     for file in files:
-        # Validate file
         validate_image_file(file)
 
-        # Check file size
-        content = await file.read()
-        if len(content) > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"File {file.filename} is too large. Maximum size: 10 MB"
-            )
-
-        # Generate unique filename while preserving original name
-        file_ext = Path(file.filename).suffix.lower()
-        original_name = Path(file.filename).stem
-        # Sanitize filename - remove special characters
-        safe_name = "".join(c for c in original_name if c.isalnum() or c in (' ', '-', '_')).strip()
-        safe_name = safe_name[:50]  # Limit length
-        unique_filename = f"{uuid.uuid4()}_{safe_name}{file_ext}"
-        file_path = UPLOAD_DIR / unique_filename
-
-        # Save file
-        with open(file_path, "wb") as f:
-            f.write(content)
-
-        # Return URL (relative path)
-        uploaded_urls.append(f"/uploads/{unique_filename}")
+    stored: List[StoredUpload] = []
+    try:
+        for file in files:
+            stored.append(await save_upload(file, MAX_FILE_SIZE))
+    except UploadTooLargeError as e:
+        remove_uploads(stored)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File {e.filename} is too large. Maximum size: 10 MB"
+        )
+    except Exception:
+        remove_uploads(stored)
+        raise
+
+    uploaded_urls = [upload.url for upload in stored]
+
+    # Render thumbnails/medium sizes in the background
+    process_new_uploads(uploaded_urls)
 
+    # Return URLs (relative paths)
     return uploaded_urls
 
 
@@ -114,59 +128,351 @@ async def upload_media(files: List[UploadFile] = File(...)):
             detail="Maximum 10 files allowed"
         )
 
-    uploaded_urls = []
-
+    # Validate all files before storing any of them
     for file in files:
-        # Validate file
         validate_media_file(file)
 
-        # Check file size
-        content = await file.read()
-        if len(content) > MAX_MEDIA_FILE_SIZE:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"File {file.filename} is too large. Maximum size: 100 MB"
-            )
-
-        # Generate unique filename while preserving original name
-        file_ext = Path(file.filename).suffix.lower()
-        original_name = Path(file.filename).stem
-        # Sanitize filename - remove special characters
-        safe_name = "".join(c for c in original_name if c.isalnum() or c in (' ', '-', '_')).strip()
-        safe_name = safe_name[:50]  # Limit length
-        unique_filename = f"{uuid.uuid4()}_{safe_name}{file_ext}"
-        file_path = UPLOAD_DIR / unique_filename
-
-        # Save file
-        with open(file_path, "wb") as f:
-            f.write(content)
-
-        # Return URL (relative path)
-        uploaded_urls.append(f"/uploads/{unique_filename}")
+    stored: List[StoredUpload] = []
+    try:
+        for file in files:
+            stored.append(await save_upload(file, MAX_MEDIA_FILE_SIZE))
+    except UploadTooLargeError as e:
+        remove_uploads(stored)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File {e.filename} is too large. Maximum size: 100 MB"
+        )
+    except Exception:
+        remove_uploads(stored)
+        raise
+
+    uploaded_urls = [upload.url for upload in stored]
+
+    # Render thumbnails/medium sizes, video posters and web renditions in the background
+    process_new_uploads(uploaded_urls)
 
+    # Return URLs (relative paths)
     return uploaded_urls
 
 
-@router.delete("/images/{filename}")
-async def delete_image(filename: str):
-    """Delete uploaded image"""
-    file_path = UPLOAD_DIR / filename
+@router.get("/media-info", response_model=List[MediaInfoResponse])
+def get_media_info(
+    urls: List[str] = Query(..., description="Upload URLs (e.g. from media_files or videos)"),
+    db: Session = Depends(get_db)
+):
+    """
+    Get duration, dimensions, poster and web rendition of uploaded videos.
+    Videos uploaded before processing existed are queued on first request.
+    """
+    if len(urls) > 50:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Maximum 50 URLs allowed"
+        )
+
+    known = {
+        info.url: info
+        for info in db.query(MediaInfo).filter(MediaInfo.url.in_(urls)).all()
+    }
+
+    result = []
+    to_process = []
+    for url in urls:
+        info = known.get(url)
+        if info is not None:
+            result.append(MediaInfoResponse.model_validate(info))
+        elif not is_video_url(url):
+            result.append(MediaInfoResponse(url=url, status="unsupported"))
+        elif is_processing(url):
+            result.append(MediaInfoResponse(url=url, status="pending"))
+        elif key_from_url(url) and get_storage().exists(key_from_url(url)):
+            to_process.append(url)
+            result.append(MediaInfoResponse(url=url, status="pending"))
+        else:
+            result.append(MediaInfoResponse(url=url, status="failed"))
+
+    process_new_uploads(to_process)
+
+    return result
+
+
+@router.delete("/images/{filename:path}")
+def delete_image(filename: str, db: Session = Depends(get_db)):
+    """
+    Delete uploaded image.
+
+    Stored files are shared between records (identical uploads are stored
+    once), so a file that is still referenced is kept; it is removed by the
+    orphan collector once the last reference is gone.
+    """
+    filename = resolve_upload_name(filename)
+
+    # Security check - ensure file is in upload directory
+    if key_from_url(f"/uploads/{filename}") is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid file path"
+        )
 
-    if not file_path.exists():
+    storage = get_storage()
+    if not storage.exists(filename):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="File not found"
         )
 
-    # Security check - ensure file is in upload directory
+    if is_referenced(db, f"/uploads/{filename}"):
+        return {"detail": "File is still in use and was kept"}
+
+    storage.delete(filename)
+    for key in derivative_keys(filename):
+        storage.delete(key)
+
+    return {"detail": "File deleted successfully"}
+
+
+# ============= RESUMABLE UPLOADS =============
+# Large field videos over unreliable mobile links: the file is sent in chunks
+# and a dropped connection only costs the chunk in flight.
+
+def _session_response(session: UploadSession, response: Optional[Response] = None) -> UploadSessionResponse:
+    offset = session.offset
+    if response is not None:
+        response.headers["Upload-Offset"] = str(offset)
+    return UploadSessionResponse(
+        upload_id=session.upload_id,
+        filename=session.filename,
+        size=session.size,
+        offset=offset,
+        chunk_size=resumable_upload.RECOMMENDED_CHUNK_SIZE,
+        expires_at=datetime.fromtimestamp(session.expires_at, tz=timezone.utc),
+    )
+
+
+def _session_not_found(upload_id: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Upload session {upload_id} not found or expired"
+    )
+
+
+def _get_session_or_404(upload_id: str) -> UploadSession:
     try:
-        file_path.resolve().relative_to(UPLOAD_DIR.resolve())
-    except ValueError:
+        return resumable_upload.get_session(upload_id)
+    except UploadSessionNotFound:
+        raise _session_not_found(upload_id)
+
+
+def _session_busy(upload_id: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"Another request to upload session {upload_id} is in progress"
+    )
+
+
+def _offset_conflict(e: UploadOffsetMismatch) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"Upload offset mismatch: expected {e.expected}, got {e.received}",
+        headers={"Upload-Offset": str(e.expected)}
+    )
+
+
+@router.post("/sessions", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED)
+def create_upload_session(
+    session_data: UploadSessionCreate,
+    response: Response,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Start a resumable upload of a media file (image, video, audio, GPS track).
+    Send the content with PATCH requests, then call /complete. Signed-in
+    users only, with a limited number of unfinished uploads each.
+    """
+    file_ext = Path(session_data.filename).suffix.lower()
+    if file_ext not in ALLOWED_MEDIA_EXTENSIONS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid file path"
+            detail=f"File type not allowed. Allowed types: {', '.join(ALLOWED_MEDIA_EXTENSIONS)}"
         )
 
-    os.remove(file_path)
+    try:
+        session = resumable_upload.create_session(
+            session_data.filename, session_data.size, session_data.sha256, owner_id=current_user.id
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File {e.filename} is too large. Maximum size: {e.max_size // (1024 * 1024)} MB"
+        )
+    except UploadIntegrityError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except UploadSessionLimit as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+
+    return _session_response(session, response)
+
+
+@router.get("/sessions/{upload_id}", response_model=UploadSessionResponse)
+def get_upload_session(upload_id: str, response: Response):
+    """Get the current offset of an upload (where to resume after a disconnect)"""
+    return _session_response(_get_session_or_404(upload_id), response)
+
+
+@router.patch("/sessions/{upload_id}", response_model=UploadSessionResponse)
+async def upload_session_chunk(
+    upload_id: str,
+    request: Request,
+    response: Response,
+    upload_offset: int = Header(..., description="Byte offset of this chunk; must equal the current offset"),
+    upload_checksum: Optional[str] = Header(None, description="Optional 'sha256 <hex>' of this chunk"),
+):
+    """Append a chunk (raw request body) to an upload"""
+    session = _get_session_or_404(upload_id)
+    try:
+        await resumable_upload.append_chunk(session, upload_offset, request.stream(), upload_checksum)
+    except UploadSessionNotFound:
+        raise _session_not_found(upload_id)
+    except UploadSessionBusy:
+        raise _session_busy(upload_id)
+    except UploadOffsetMismatch as e:
+        raise _offset_conflict(e)
+    except UploadIntegrityError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+            headers={"Upload-Offset": str(session.offset)}
+        )
 
-    return {"detail": "File deleted successfully"}
+    return _session_response(session, response)
+
+
+@router.post("/sessions/{upload_id}/complete", response_model=UploadCompleteResponse)
+async def complete_upload_session(upload_id: str):
+    """
+    Finish an upload: verify size and checksum and store the file.
+    Returns the URL to put into media_files / search_photos / search_tracks.
+    """
+    session = _get_session_or_404(upload_id)
+    try:
+        stored = await resumable_upload.complete_session(session)
+    except UploadSessionNotFound:
+        raise _session_not_found(upload_id)
+    except UploadSessionBusy:
+        raise _session_busy(upload_id)
+    except UploadOffsetMismatch as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Upload is incomplete: received {e.received} of {e.expected} bytes",
+            headers={"Upload-Offset": str(e.received)}
+        )
+    except UploadIntegrityError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+    process_new_uploads([stored.url])
+
+    return UploadCompleteResponse(url=stored.url, size=stored.size, sha256=stored.sha256)
+
+
+@router.delete("/sessions/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def abort_upload_session(upload_id: str):
+    """Abort an upload and drop the received data"""
+    session = _get_session_or_404(upload_id)
+    try:
+        await resumable_upload.abort_session(session)
+    except UploadSessionNotFound:
+        raise _session_not_found(upload_id)
+    except UploadSessionBusy:
+        raise _session_busy(upload_id)
+    return None
+
+
+# ============= DIRECT UPLOADS =============
+# The client sends the file straight to storage (a presigned bucket URL with
+# STORAGE_BACKEND=s3), so media bytes do not pass through the API workers.
+# Objects are named after their SHA-256, which the client computes up front.
+
+@router.post("/direct", response_model=DirectUploadResponse)
+def create_direct_upload(upload_data: DirectUploadCreate, current_user: User = Depends(get_current_user)):
+    """
+    Get a presigned URL for uploading a media file directly to storage.
+    Send the file with the returned method and headers, then call /direct/complete.
+    Signed-in users only.
+    """
+    file_ext = Path(upload_data.filename).suffix.lower()
+    if file_ext not in ALLOWED_MEDIA_EXTENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File type not allowed. Allowed types: {', '.join(ALLOWED_MEDIA_EXTENSIONS)}"
+        )
+    if upload_data.size > resumable_upload.MAX_RESUMABLE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File {upload_data.filename} is too large. "
+                   f"Maximum size: {resumable_upload.MAX_RESUMABLE_SIZE // (1024 * 1024)} MB"
+        )
+    sha256 = upload_data.sha256.lower()
+    if not resumable_upload.SHA256_RE.match(sha256):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="sha256 must be 64 hex characters"
+        )
+
+    key = content_filename(sha256, file_ext)
+    storage = get_storage()
+    if storage.size(key) == upload_data.size:
+        # Identical content is stored already
+        return DirectUploadResponse(url=f"/uploads/{key}", exists=True)
+
+    presigned = storage.presigned_upload(
+        key, sha256, upload_data.size, upload_data.content_type or guess_content_type(key)
+    )
+    return DirectUploadResponse(
+        url=f"/uploads/{key}",
+        exists=False,
+        upload_url=presigned.url,
+        method=presigned.method,
+        headers=presigned.headers,
+        expires_at=datetime.fromtimestamp(presigned.expires_at, tz=timezone.utc),
+    )
+
+
+@router.put("/direct/{token}", response_model=UploadCompleteResponse)
+async def receive_direct_upload(token: str, request: Request):
+    """Upload target of presigned URLs issued by the local storage backend"""
+    try:
+        claims = storage_service.verify_direct_upload_token(token)
+    except DirectUploadError as e:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
+
+    try:
+        stored = await storage_service.receive_direct_upload(claims, request.stream())
+    except DirectUploadError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+    return UploadCompleteResponse(url=stored.url, size=stored.size, sha256=stored.sha256)
+
+
+@router.post("/direct/complete", response_model=UploadCompleteResponse)
+def complete_direct_upload(upload_data: DirectUploadComplete):
+    """
+    Confirm a direct upload: check that the object arrived and start
+    rendering thumbnails, video posters and web renditions.
+    """
+    sha256 = content_hash_from_url(upload_data.url)
+    if sha256 is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Not a direct upload URL"
+        )
+
+    size = get_storage().size(key_from_url(upload_data.url))
+    if size is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File has not been uploaded"
+        )
+
+    process_new_uploads([upload_data.url])
+
+    return UploadCompleteResponse(url=upload_data.url, size=size, sha256=sha256)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, computed_field
 from typing import Optional, List, TYPE_CHECKING, Dict, Any
 from datetime import datetime
 
@@ -7,6 +7,7 @@ if TYPE_CHECKING:
 
 from app.schemas.auth import UserBrief
 from app.schemas.missing_person import MissingPersonCreate, MissingPersonUpdate, MissingPerson
+from app.services.image_variants import variant_url
 
 
 class CaseCreate(BaseModel):
@@ -136,6 +137,9 @@ class CaseUpdate(BaseModel):
     # Call transcript
     call_transcript: Optional[str] = None
 
+    # Duplicate detection (link to the original case or unlink with null)
+    duplicate_of_case_id: Optional[int] = None
+
     # Case metadata
     decision_type: Optional[str] = None
     decision_comment: Optional[str] = None
@@ -167,6 +171,11 @@ class CaseResponse(BaseModel):
     missing_settlement: Optional[str]
     missing_region: Optional[str]
     missing_address: Optional[str]
+    missing_settlement_id: Optional[int] = None
+    missing_lat: Optional[float] = None
+    missing_lon: Optional[float] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
 
     # LEGACY: Missing person info - populated from first missing_person for backward compatibility
     # Deprecated: Use missing_persons array instead
@@ -213,6 +222,9 @@ class CaseResponse(BaseModel):
     applicant_full_name: str
     missing_full_name: str
 
+    # Duplicate detection
+    duplicate_of_case_id: Optional[int] = None
+
     # Case metadata
     decision_type: str
     decision_comment: Optional[str]
@@ -221,6 +233,12 @@ class CaseResponse(BaseModel):
     # Latest search result (computed property)
     latest_search_result: Optional[str]
 
+    @computed_field
+    @property
+    def missing_photo_thumbnails(self) -> List[Optional[str]]:
+        """Thumbnail URLs aligned with missing_photos (for list views)"""
+        return [variant_url(url, "thumb") for url in self.missing_photos]
+
     model_config = {"from_attributes": True}
 
 
@@ -237,6 +255,48 @@ class CaseFullResponse(CaseResponse):
     model_config = {"from_attributes": True}
 
 
+class CaseDuplicateCandidate(BaseModel):
+    """Schema for a possible duplicate of a case"""
+    case_id: int
+    score: int = Field(..., description="Match score (sum of matched key weights)")
+    matched_keys: List[str]
+    created_at: Optional[datetime] = None
+    missing_full_name: Optional[str] = None
+
+
+class CaseDuplicatesResponse(BaseModel):
+    """Schema for case duplicates lookup"""
+    duplicate_of_case_id: Optional[int] = None
+    linked_duplicate_ids: List[int] = []
+    candidates: List[CaseDuplicateCandidate] = []
+
+
+class CaseMapPoint(BaseModel):
+    """Case marker on the map of cases"""
+    id: int
+    lat: float
+    lon: float
+    missing_last_name: Optional[str] = None
+    missing_first_name: Optional[str] = None
+    decision_type: Optional[str] = None
+    created_at: datetime
+
+
+class CaseMapCluster(BaseModel):
+    """Cases of one geohash cell, shown as one marker when there are too many points"""
+    geohash: str
+    count: int
+    lat: float = Field(..., description="Mean latitude of the cell's cases")
+    lon: float = Field(..., description="Mean longitude of the cell's cases")
+
+
+class CaseMapResponse(BaseModel):
+    """Cases in a map view: points, or clusters if there are more than the point limit"""
+    total: int
+    points: List[CaseMapPoint] = []
+    clusters: List[CaseMapCluster] = []
+
+
 class CaseAutofillRequest(BaseModel):
     """Schema for autofill request"""
     initial_info: str = Field(..., min_length=1, description="Initial case information text")
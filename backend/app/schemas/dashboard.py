@@ -18,6 +18,11 @@ class FieldSearchStats(BaseModel):
     """Statistics for field searches"""
     total: int
     by_status: Dict[str, int]
+    # Effort measured from uploaded tracks (see services/track_stats.py)
+    tracks: int = 0
+    distance_km: float = 0.0
+    area_km2: float = 0.0
+    time_on_ground_hours: float = 0.0
 
 
 class DistributionStats(BaseModel):
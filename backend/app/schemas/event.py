@@ -1,9 +1,11 @@
 """
 Event schemas for API requests/responses
 """
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, computed_field
 from datetime import datetime
 from typing import Optional
+from app.services.image_variants import variant_url
+from app.services.video_processing import video_variant_url
 
 
 class UserBrief(BaseModel):
@@ -47,6 +49,18 @@ class EventResponse(BaseModel):
     updated_by_user_id: Optional[int]
     updated_by: Optional[UserBrief]
 
+    @computed_field
+    @property
+    def media_thumbnails(self) -> list[Optional[str]]:
+        """Thumbnail URLs aligned with media_files (None for video/audio files)"""
+        return [variant_url(url, "thumb") for url in self.media_files]
+
+    @computed_field
+    @property
+    def media_posters(self) -> list[Optional[str]]:
+        """Video poster frame URLs aligned with media_files (None for other files)"""
+        return [video_variant_url(url, "poster") for url in self.media_files]
+
     class Config:
         from_attributes = True
 
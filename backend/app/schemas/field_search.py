@@ -1,7 +1,11 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List
-from datetime import datetime, date
+from pydantic import BaseModel, Field, computed_field, field_validator
+from typing import Dict, Literal, Optional, List
+from datetime import datetime, date, timezone
 from app.schemas.auth import UserBrief, CaseBrief
+from app.services.image_variants import variant_url
+
+# Cell shape of generated search grids
+GridShape = Literal["square", "hex"]
 
 
 class OrientationBrief(BaseModel):
@@ -65,9 +69,13 @@ class FieldSearchCreate(BaseModel):
     grid_cols: Optional[int] = Field(None, description="Number of grid columns (horizontal)")
     grid_rows: Optional[int] = Field(None, description="Number of grid rows (vertical)")
     grid_cell_size: Optional[int] = Field(None, description="Cell size in meters")
+    grid_shape: GridShape = Field("square", description="Cell shape: square or hex")
+    grid_area_file: Optional[str] = Field(None, max_length=500, description="URL to area polygon (kml/gpx/geojson); the grid then covers only this area")
+    grid_sweep_width: Optional[int] = Field(None, gt=0, description="Width searched along a track in meters (grid coverage)")
 
     # Search progress section
     search_tracks: Optional[List[str]] = Field(default=[], description="URLs to track files (gpx/kml)")
+    search_track_owners: Optional[Dict[str, int]] = Field(None, description="Track URL -> user_id of the participant who walked it")
     search_photos: Optional[List[str]] = Field(default=[], description="URLs to photos")
 
 
@@ -97,12 +105,50 @@ class FieldSearchUpdate(BaseModel):
     grid_cols: Optional[int] = None
     grid_rows: Optional[int] = None
     grid_cell_size: Optional[int] = None
+    grid_shape: Optional[GridShape] = None
+    grid_area_file: Optional[str] = Field(None, max_length=500)
+    grid_sweep_width: Optional[int] = Field(None, gt=0)
 
     # Search progress section
     search_tracks: Optional[List[str]] = None
+    search_track_owners: Optional[Dict[str, int]] = None
     search_photos: Optional[List[str]] = None
 
 
+class TrackStatsTotals(BaseModel):
+    """Effort measured from a set of tracks"""
+    tracks: int = Field(..., description="Track files")
+    points: int
+    distance_m: float = Field(..., description="Distance walked in meters")
+    area_m2: float = Field(..., description="Area covered by the tracks in square meters (ground walked twice counts once)")
+    moving_s: int = Field(..., description="Time in motion in seconds")
+    time_on_ground_s: int = Field(..., description="Union of the recorded time spans in seconds")
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+
+
+class ParticipantTrackStats(TrackStatsTotals):
+    """Effort of one participant (tracks assigned via search_track_owners)"""
+    user_id: int
+    group_name: Optional[str] = None
+
+
+class GroupTrackStats(TrackStatsTotals):
+    """Effort of one group of participants"""
+    group_name: Optional[str] = Field(None, description="None for participants without group")
+    participants: int
+
+
+class FieldSearchTrackStatsResponse(BaseModel):
+    """Effort statistics of a field search computed from its tracks"""
+    updated_at: Optional[datetime] = None
+    pending: bool = Field(..., description="A recomputation is queued or running")
+    sweep_width: Optional[float] = None
+    totals: Optional[TrackStatsTotals] = None
+    participants: List[ParticipantTrackStats] = Field(default_factory=list)
+    groups: List[GroupTrackStats] = Field(default_factory=list)
+
+
 class FieldSearchResponse(BaseModel):
     """Schema for field search response"""
     id: int
@@ -135,10 +181,25 @@ class FieldSearchResponse(BaseModel):
     grid_cols: Optional[int]
     grid_rows: Optional[int]
     grid_cell_size: Optional[int]
+    grid_shape: str = "square"
+    grid_area_file: Optional[str] = None
+    grid_sweep_width: Optional[int] = None
+    grid_coverage_percent: Optional[float] = None
+    grid_coverage_updated_at: Optional[datetime] = None
 
     # Search progress section
     search_tracks: List[str]
+    search_track_owners: Optional[Dict[str, int]] = None
     search_photos: List[str]
+    track_totals: Optional[TrackStatsTotals] = None
+    track_stats_updated_at: Optional[datetime] = None
+    version: int = Field(0, description="Change version (pass as since_version to /changes)")
+
+    @computed_field
+    @property
+    def search_photo_thumbnails(self) -> List[Optional[str]]:
+        """Thumbnail URLs aligned with search_photos"""
+        return [variant_url(url, "thumb") for url in self.search_photos]
 
     model_config = {"from_attributes": True, "use_enum_values": True}
 
@@ -147,3 +208,71 @@ class FieldSearchListResponse(BaseModel):
     """Schema for paginated field search list"""
     total: int
     field_searches: List[FieldSearchResponse]
+
+
+class FieldSearchChangesResponse(BaseModel):
+    """Changes of a field search, its participants and tracks after a version"""
+    version: int = Field(..., description="Current version, the since_version of the next poll")
+    full: bool = Field(..., description="Everything is returned (no, unknown or expired since_version)")
+    field_search: Optional[FieldSearchResponse] = Field(None, description="The field search's own fields, if they changed")
+    participants: List[ParticipantInfo] = Field(default_factory=list, description="Added participants")
+    removed_participants: List[int] = Field(default_factory=list, description="User ids of removed participants")
+    tracks: List[str] = Field(default_factory=list, description="Added track URLs")
+    removed_tracks: List[str] = Field(default_factory=list)
+
+
+# Points per live position batch
+MAX_POSITION_BATCH = 1000
+
+
+class PositionPoint(BaseModel):
+    """One GPS fix posted from a phone"""
+    recorded_at: datetime = Field(..., description="Time of the fix (ISO 8601 or Unix seconds)")
+    lat: float = Field(..., ge=-90, le=90)
+    lon: float = Field(..., ge=-180, le=180)
+    accuracy: Optional[float] = Field(None, ge=0, description="Meters")
+    altitude: Optional[float] = Field(None, description="Meters")
+    speed: Optional[float] = Field(None, ge=0, description="Meters per second")
+    heading: Optional[float] = Field(None, ge=0, lt=360, description="Degrees from north")
+
+    @field_validator("recorded_at")
+    @classmethod
+    def assume_utc(cls, value: datetime) -> datetime:
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class PositionBatch(BaseModel):
+    """Schema for posting live positions of the current user"""
+    points: List[PositionPoint] = Field(..., min_length=1, max_length=MAX_POSITION_BATCH)
+
+
+class PositionBatchResponse(BaseModel):
+    """Result of posting live positions"""
+    accepted: int = Field(..., description="New points (resent ones are skipped)")
+
+
+class ParticipantPositionResponse(PositionPoint):
+    """Live position of a participant"""
+    user_id: int
+
+
+class GridCoverageResponse(BaseModel):
+    """Coverage of a field search grid by its uploaded tracks"""
+    percent: Optional[float] = Field(None, description="Covered share of the whole grid area")
+    updated_at: Optional[datetime] = None
+    pending: bool = Field(..., description="A recomputation is queued or running")
+    sweep_width: float = Field(..., description="Width searched along a track in meters")
+    cells: Dict[str, float] = Field(default_factory=dict, description="Cell name -> covered percent (covered cells only)")
+
+
+class TrackLines(BaseModel):
+    """Simplified lines of one uploaded track file"""
+    url: str
+    lines: List[str] = Field(default_factory=list, description="Google encoded polylines, one per track segment")
+
+
+class FieldSearchTracksResponse(BaseModel):
+    """All tracks of a field search simplified for one zoom level"""
+    zoom: int = Field(..., description="Zoom level the lines were simplified for")
+    precision: int = Field(..., description="Polyline coordinate precision (decimal places)")
+    tracks: List[TrackLines]
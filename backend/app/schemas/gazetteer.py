@@ -0,0 +1,17 @@
+from pydantic import BaseModel
+from typing import List
+
+
+class SettlementResponse(BaseModel):
+    """Settlement of the offline gazetteer"""
+    id: int
+    name: str
+    region: str
+    lat: float
+    lon: float
+    population: int
+
+
+class SettlementAutocompleteResponse(BaseModel):
+    """Settlements matching a typed prefix, most populous first"""
+    settlements: List[SettlementResponse]
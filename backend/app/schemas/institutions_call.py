@@ -7,6 +7,7 @@ class InstitutionsCallCreate(BaseModel):
     """Schema for creating an institutions call"""
     case_id: int = Field(..., description="Case ID this call belongs to")
     user_id: Optional[int] = Field(None, description="User ID who made the call")
+    organization_id: Optional[int] = Field(None, description="Organization of the directory")
     organization_name: str = Field(..., min_length=1, max_length=255, description="Name of the organization")
     organization_type: Optional[str] = Field(None, max_length=100, description="Type: hospital, morgue, police, shelter, etc.")
     phone: Optional[str] = Field(None, max_length=50)
@@ -30,6 +31,7 @@ class InstitutionsCallResponse(BaseModel):
     case_id: int
     created_at: datetime
     user_id: Optional[int]
+    organization_id: Optional[int] = None
     organization_name: str
     organization_type: Optional[str]
     phone: Optional[str]
@@ -43,3 +45,11 @@ class InstitutionsCallListResponse(BaseModel):
     """Schema for paginated institutions call list"""
     total: int
     institutions_calls: List[InstitutionsCallResponse]
+
+
+class InstitutionsCallChecklistCreate(BaseModel):
+    """Schema for planning the calls of a case to its nearest institutions"""
+    case_id: int = Field(..., description="Case whose point is the search centre")
+    per_type: int = Field(3, ge=1, le=20, description="Institutions per organization type")
+    types: Optional[List[str]] = Field(None, description="Organization types (default: all)")
+    max_radius_km: float = Field(200, gt=0, le=1000)
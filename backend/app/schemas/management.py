@@ -50,3 +50,23 @@ class DirectionDetailResponse(BaseModel):
     responsible_user_name: Optional[str] = None
 
     model_config = {"from_attributes": True}
+
+
+class UploadGCReportResponse(BaseModel):
+    """Schema for orphaned upload collector report"""
+    dry_run: bool
+    live_references: int
+    scanned_files: int
+    quarantined_files: int
+    quarantined_bytes: int
+    deleted_files: int
+    deleted_bytes: int
+    restored_files: int
+    stale_parts_removed: int
+    expired_sessions_removed: int
+    grid_cache_entries_removed: int
+    quarantined: List[str] = []
+    deleted: List[str] = []
+    restored: List[str] = []
+
+    model_config = {"from_attributes": True}
@@ -1,7 +1,12 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List
+from pydantic import BaseModel, Field, model_validator
+from typing import Dict, Literal, Optional, List
 from datetime import datetime
 
+GridCellStatusName = Literal["unassigned", "assigned", "in_progress", "completed"]
+
+# Cells per batch request
+MAX_CELL_BATCH = 5000
+
 
 class GridCellCreate(BaseModel):
     """Schema for creating a grid cell"""
@@ -21,6 +26,63 @@ class GridCellUpdate(BaseModel):
     notes: Optional[str] = None
 
 
+class GridCellsBatchCreate(BaseModel):
+    """Schema for creating many grid cells at once"""
+    cells: List[GridCellCreate] = Field(..., min_length=1, max_length=MAX_CELL_BATCH)
+
+
+class GridCellsGenerate(BaseModel):
+    """
+    Schema for creating all cells of a grid from its parameters: those of a
+    field search (field_search_id) or given explicitly
+    """
+    field_search_id: Optional[int] = Field(None, description="Take the grid of this field search")
+    assign: bool = Field(False, description="Assign the new cells to the field search")
+    replace: bool = Field(False, description="Delete existing cells first (otherwise existing cell codes are kept)")
+
+    center_lat: Optional[float] = Field(None, ge=-90, le=90)
+    center_lon: Optional[float] = Field(None, ge=-180, le=180)
+    cols: Optional[int] = Field(None, ge=1)
+    rows: Optional[int] = Field(None, ge=1)
+    cell_size: Optional[float] = Field(None, gt=0, description="Cell size in meters")
+    shape: Literal["square", "hex"] = "square"
+
+    @model_validator(mode="after")
+    def check_source(self):
+        explicit = [self.center_lat, self.center_lon, self.cols, self.rows, self.cell_size]
+        if self.field_search_id is None and any(value is None for value in explicit):
+            raise ValueError("Give field_search_id or center_lat, center_lon, cols, rows and cell_size")
+        if self.assign and self.field_search_id is None:
+            raise ValueError("assign needs field_search_id")
+        return self
+
+
+class GridCellsGenerateResponse(BaseModel):
+    """Result of generating grid cells"""
+    created: int
+    skipped: int = Field(..., description="Cells whose code already existed")
+
+
+class GridCellBatchItem(BaseModel):
+    """Change of one cell in a batch, identified by id or cell_code"""
+    id: Optional[int] = None
+    cell_code: Optional[str] = Field(None, min_length=1, max_length=20)
+    status: Optional[GridCellStatusName] = None
+    assigned_to_field_search_id: Optional[int] = None
+    notes: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_reference(self):
+        if (self.id is None) == (self.cell_code is None):
+            raise ValueError("Give either id or cell_code")
+        return self
+
+
+class GridCellsBatchUpdate(BaseModel):
+    """Schema for changing many grid cells in one transaction"""
+    cells: List[GridCellBatchItem] = Field(..., min_length=1, max_length=MAX_CELL_BATCH)
+
+
 class GridCellResponse(BaseModel):
     """Schema for grid cell response"""
     id: int
@@ -28,8 +90,10 @@ class GridCellResponse(BaseModel):
     cell_code: str
     coordinates: Optional[str]
     status: str
+    coverage: float = Field(0.0, description="Percent of the cell covered by uploaded tracks")
     assigned_to_field_search_id: Optional[int]
     notes: Optional[str]
+    version: int = Field(0, description="Map grid version of the last change")
 
     model_config = {"from_attributes": True}
 
@@ -66,6 +130,9 @@ class MapGridResponse(BaseModel):
     grid_size: Optional[int]
     map_file_url: Optional[str]
     notes: Optional[str]
+    grid_cols: Optional[int] = Field(None, description="Size of the compact cell state (None until initialized)")
+    grid_rows: Optional[int] = None
+    version: int = Field(0, description="Change version (pass as since_version to /changes)")
 
     model_config = {"from_attributes": True}
 
@@ -81,12 +148,54 @@ class MapGridWithCellsResponse(BaseModel):
     grid_size: Optional[int]
     map_file_url: Optional[str]
     notes: Optional[str]
+    grid_cols: Optional[int] = None
+    grid_rows: Optional[int] = None
+    version: int = 0
     grid_cells: List[GridCellResponse]
 
     model_config = {"from_attributes": True}
 
 
+class MapGridChangesResponse(BaseModel):
+    """Changes of a map grid and its cells after a version"""
+    version: int = Field(..., description="Current version, the since_version of the next poll")
+    full: bool = Field(..., description="Everything is returned (no, unknown or expired since_version)")
+    map_grid: Optional[MapGridResponse] = Field(None, description="The grid's own fields, if they changed")
+    cells: List[GridCellResponse] = Field(default_factory=list, description="Created or changed cells")
+    deleted_cell_ids: List[int] = Field(default_factory=list)
+
+
 class MapGridListResponse(BaseModel):
     """Schema for paginated map grid list"""
     total: int
     map_grids: List[MapGridResponse]
+
+
+class MapGridStateInit(BaseModel):
+    """Schema for creating the compact cell state of a map grid"""
+    cols: int = Field(..., ge=1)
+    rows: int = Field(..., ge=1)
+
+
+class GridCellStateChange(BaseModel):
+    """Change of one cell in the compact state"""
+    cell_code: str = Field(..., min_length=1, max_length=20)
+    status: Optional[GridCellStatusName] = None
+    assigned_to_field_search_id: Optional[int] = None
+    notes: Optional[str] = None
+
+
+class MapGridStateUpdate(BaseModel):
+    """Schema for changing cells of the compact state"""
+    cells: List[GridCellStateChange] = Field(..., min_length=1, max_length=MAX_CELL_BATCH)
+
+
+class MapGridStateResponse(BaseModel):
+    """Compact state of all cells of a map grid"""
+    cols: int
+    rows: int
+    status_names: List[str] = Field(..., description="Status of byte value i is status_names[i]")
+    statuses: str = Field(..., description="Base64 of one status byte per cell, index row * cols + col")
+    counts: Dict[str, int] = Field(..., description="Cells per status")
+    assignments: Dict[str, int] = Field(default_factory=dict, description="Cell code -> field search id")
+    notes: Dict[str, str] = Field(default_factory=dict, description="Cell code -> notes")
@@ -1,6 +1,8 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, computed_field
 from typing import Optional, List
 from datetime import datetime
+from app.services.image_variants import variant_url
+from app.services.video_processing import video_variant_url
 
 
 class MissingPersonBase(BaseModel):
@@ -16,6 +18,8 @@ class MissingPersonBase(BaseModel):
     address: Optional[str] = None
     last_seen_datetime: Optional[datetime] = None
     last_seen_place: Optional[str] = None
+    last_seen_lat: Optional[float] = Field(None, ge=-90, le=90)
+    last_seen_lon: Optional[float] = Field(None, ge=-180, le=180)
     photos: Optional[List[str]] = []
     videos: Optional[List[str]] = []
     description: Optional[str] = None
@@ -43,6 +47,8 @@ class MissingPersonUpdate(BaseModel):
     address: Optional[str] = None
     last_seen_datetime: Optional[datetime] = None
     last_seen_place: Optional[str] = None
+    last_seen_lat: Optional[float] = Field(None, ge=-90, le=90)
+    last_seen_lon: Optional[float] = Field(None, ge=-180, le=180)
     photos: Optional[List[str]] = None
     videos: Optional[List[str]] = None
     description: Optional[str] = None
@@ -58,6 +64,21 @@ class MissingPerson(MissingPersonBase):
     id: int
     case_id: int
     order_index: int
+    settlement_id: Optional[int] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+
+    @computed_field
+    @property
+    def photo_thumbnails(self) -> List[Optional[str]]:
+        """Thumbnail URLs aligned with photos (None for non-image files)"""
+        return [variant_url(url, "thumb") for url in self.photos or []]
+
+    @computed_field
+    @property
+    def video_posters(self) -> List[Optional[str]]:
+        """Poster frame URLs aligned with videos (available once the media worker is done)"""
+        return [video_variant_url(url, "poster") for url in self.videos or []]
 
     class Config:
         from_attributes = True
@@ -12,6 +12,8 @@ class OrganizationCreate(BaseModel):
     region: Optional[str] = Field(None, max_length=200, description="Region/Oblast")
     city: Optional[str] = Field(None, max_length=200, description="City/Settlement")
     address: Optional[str] = Field(None, max_length=500, description="Full address")
+    lat: Optional[float] = Field(None, ge=-90, le=90, description="Exact latitude (default: centre of the city)")
+    lon: Optional[float] = Field(None, ge=-180, le=180, description="Exact longitude (default: centre of the city)")
 
     contact_info: Optional[str] = Field(None, description="Contact information (phones, emails, working hours)")
     notes: Optional[str] = Field(None, description="Additional notes/comments")
@@ -25,6 +27,8 @@ class OrganizationUpdate(BaseModel):
     region: Optional[str] = Field(None, max_length=200)
     city: Optional[str] = Field(None, max_length=200)
     address: Optional[str] = Field(None, max_length=500)
+    lat: Optional[float] = Field(None, ge=-90, le=90)
+    lon: Optional[float] = Field(None, ge=-180, le=180)
 
     contact_info: Optional[str] = None
     notes: Optional[str] = None
@@ -46,6 +50,9 @@ class OrganizationResponse(BaseModel):
     region: Optional[str]
     city: Optional[str]
     address: Optional[str]
+    settlement_id: Optional[int] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
 
     contact_info: Optional[str]
     notes: Optional[str]
@@ -57,3 +64,27 @@ class OrganizationListResponse(BaseModel):
     """Schema for paginated organization list"""
     total: int
     organizations: List[OrganizationResponse]
+
+
+class NearestOrganization(BaseModel):
+    """Organization found by the nearest-institutions lookup"""
+    id: int
+    name: str
+    type: str
+    region: Optional[str]
+    city: Optional[str]
+    address: Optional[str]
+    contact_info: Optional[str]
+    lat: float
+    lon: float
+    distance_km: float
+
+    model_config = {"from_attributes": True, "use_enum_values": True}
+
+
+class NearestOrganizationsResponse(BaseModel):
+    """Nearest organizations of each type, ordered by type and distance"""
+    lat: float
+    lon: float
+    radius_km: float = Field(..., description="Search radius that was needed")
+    organizations: List[NearestOrganization]
@@ -0,0 +1,67 @@
+"""
+Upload schemas for API requests/responses
+"""
+from datetime import datetime
+from typing import Dict, Optional
+
+from pydantic import BaseModel, Field
+
+
+class UploadSessionCreate(BaseModel):
+    """Schema for starting a resumable upload"""
+    filename: str = Field(..., min_length=1, max_length=255, description="Original file name (extension decides the file type)")
+    size: int = Field(..., gt=0, description="Total file size in bytes")
+    sha256: Optional[str] = Field(None, description="Expected SHA-256 of the whole file (hex), verified on completion")
+
+
+class UploadSessionResponse(BaseModel):
+    """State of a resumable upload"""
+    upload_id: str
+    filename: str
+    size: int
+    offset: int = Field(..., description="Number of bytes received - next chunk must start here")
+    chunk_size: int = Field(..., description="Recommended chunk size in bytes")
+    expires_at: datetime
+
+
+class UploadCompleteResponse(BaseModel):
+    """Stored file of a completed upload"""
+    url: str
+    size: int
+    sha256: str
+
+
+class MediaInfoResponse(BaseModel):
+    """Processing state and metadata of an uploaded video"""
+    url: str
+    status: str = Field(..., description="pending, ready, failed or unsupported (not a video)")
+    duration: Optional[float] = Field(None, description="Duration in seconds")
+    width: Optional[int] = None
+    height: Optional[int] = None
+    poster_url: Optional[str] = None
+    web_url: Optional[str] = None
+
+    model_config = {"from_attributes": True}
+
+
+class DirectUploadCreate(BaseModel):
+    """Schema for requesting a direct upload URL"""
+    filename: str = Field(..., min_length=1, max_length=255, description="Original file name (extension decides the file type)")
+    size: int = Field(..., gt=0, description="File size in bytes")
+    sha256: str = Field(..., description="SHA-256 of the file (hex) - the stored object is named after it")
+    content_type: Optional[str] = Field(None, max_length=100, description="MIME type, guessed from the file name if omitted")
+
+
+class DirectUploadResponse(BaseModel):
+    """Where to send the file; no upload is needed when it is already stored"""
+    url: str = Field(..., description="URL of the stored file (/uploads/...) to put into records")
+    exists: bool = Field(..., description="Identical content is already stored - skip the upload")
+    upload_url: Optional[str] = Field(None, description="Presigned URL (relative URLs are served by this API)")
+    method: str = "PUT"
+    headers: Dict[str, str] = Field(default_factory=dict, description="Headers the upload request must carry")
+    expires_at: Optional[datetime] = None
+
+
+class DirectUploadComplete(BaseModel):
+    """Schema for confirming a direct upload"""
+    url: str
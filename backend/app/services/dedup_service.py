@@ -0,0 +1,392 @@
+"""
+Duplicate submission detection for incoming cases.
+
+The same disappearance is often reported through the website form, the Telegram
+bot and the voice bot within minutes. Every case is indexed under a small set of
+normalized blocking keys (see CaseMatchKey); a new submission is matched against
+that index with a single indexed lookup instead of scanning the cases table.
+
+Key kinds and their weights:
+    phone     - applicant or missing person phone (last 9 digits)          weight 2
+    name_bd   - missing person's last + first name + birthdate              weight 3
+    name_st   - missing person's last + first name + settlement             weight 2
+    name      - missing person's last + first name                          weight 1
+
+A candidate's score is the sum of weights of distinct key kinds it shares with
+the submission. Recent candidates scoring MERGE_SCORE or more are merged
+automatically, weaker ones are only linked via Case.duplicate_of_case_id.
+"""
+import os
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.logging_config import get_logger
+from app.models.case import Case
+from app.models.case_match_key import CaseMatchKey
+from app.models.missing_person import MissingPerson
+
+logger = get_logger(__name__)
+
+KEY_WEIGHTS = {
+    "phone": 2,
+    "name_bd": 3,
+    "name_st": 2,
+    "name": 1,
+}
+
+# Score needed to merge a submission into an existing case automatically
+MERGE_SCORE = 4
+# Score needed to report a case as a duplicate candidate at all
+CANDIDATE_SCORE = 2
+# Only cases created within this window are merged automatically
+DEDUP_WINDOW_HOURS = int(os.getenv("DEDUP_WINDOW_HOURS", "72"))
+
+# Placeholder values used by ingest endpoints when a field could not be parsed
+PLACEHOLDER_NAMES = {"невідомо", "неизвестно", "unknown"}
+
+# Ukrainian/Russian spelling variants folded to one letter
+_LETTER_FOLDS = str.maketrans({
+    "ё": "е", "є": "е", "э": "е",
+    "ї": "и", "і": "и", "ы": "и", "й": "и",
+    "ґ": "г",
+})
+
+
+def normalize_name(value: Optional[str]) -> str:
+    """Lowercase, fold spelling variants and drop everything but letters"""
+    if not value:
+        return ""
+    text = value.strip().lower()
+    if text in PLACEHOLDER_NAMES:
+        return ""
+    text = text.translate(_LETTER_FOLDS)
+    return re.sub(r"[\W\d_]", "", text)
+
+
+def normalize_phone(value: Optional[str]) -> str:
+    """Strip non-digits and reduce to the 9-digit subscriber number (UA format)"""
+    digits = re.sub(r"\D", "", value or "")
+    if digits.startswith("380") and len(digits) >= 12:
+        digits = digits[3:]
+    elif digits.startswith("0") and len(digits) >= 10:
+        digits = digits[1:]
+    if len(digits) < 7:
+        return ""
+    return digits[-9:]
+
+
+def normalize_settlement(value: Optional[str]) -> str:
+    """Normalize settlement name, dropping common type prefixes (м., с., смт ...)"""
+    if not value:
+        return ""
+    text = value.lower().strip()
+    text = re.sub(r"^(м\.|с\.|смт\.?|сел\.|місто|село|г\.|пгт\.?)\s*", "", text)
+    # Drop trailing district/region parts ("Бровари, Київська обл.")
+    text = text.split(",")[0]
+    return normalize_name(text)
+
+
+def _date_key(value) -> str:
+    if not value:
+        return ""
+    if isinstance(value, str):
+        return value[:10]
+    return value.date().isoformat() if isinstance(value, datetime) else value.isoformat()
+
+
+@dataclass
+class PersonFields:
+    """Subset of missing person fields relevant for matching"""
+    last_name: Optional[str] = None
+    first_name: Optional[str] = None
+    birthdate: Optional[object] = None
+    settlement: Optional[str] = None
+    phone: Optional[str] = None
+
+
+@dataclass
+class SubmissionFields:
+    """Normalized view of a case (existing or incoming) used to build keys"""
+    applicant_phone: Optional[str] = None
+    persons: List[PersonFields] = field(default_factory=list)
+
+
+def _name_key(last_name: Optional[str], first_name: Optional[str]) -> str:
+    last_name, first_name = normalize_name(last_name), normalize_name(first_name)
+    return f"{last_name}|{first_name}" if last_name and first_name else ""
+
+
+def build_match_keys(submission: SubmissionFields) -> Set[str]:
+    """Build the set of blocking keys for a submission"""
+    keys: Set[str] = set()
+
+    applicant_phone = normalize_phone(submission.applicant_phone)
+    if applicant_phone:
+        keys.add(f"phone:{applicant_phone}")
+
+    for person in submission.persons:
+        phone = normalize_phone(person.phone)
+        if phone:
+            keys.add(f"phone:{phone}")
+        name = _name_key(person.last_name, person.first_name)
+        if not name:
+            continue
+        keys.add(f"name:{name}")
+        birthdate = _date_key(person.birthdate)
+        if birthdate:
+            keys.add(f"name_bd:{name}|{birthdate}")
+        settlement = normalize_settlement(person.settlement)
+        if settlement:
+            keys.add(f"name_st:{name}|{settlement}")
+
+    # Keys are stored in a String(300) column
+    return {key[:300] for key in keys}
+
+
+def submission_from_case_data(data) -> SubmissionFields:
+    """Build SubmissionFields from a CaseCreate-like object (legacy flat fields or missing_persons)"""
+    persons = [
+        PersonFields(
+            last_name=mp.last_name,
+            first_name=mp.first_name,
+            birthdate=mp.birthdate,
+            settlement=mp.settlement or data.missing_settlement,
+            phone=mp.phone,
+        )
+        for mp in (getattr(data, "missing_persons", None) or [])
+    ]
+    if not persons:
+        persons.append(PersonFields(
+            last_name=data.missing_last_name,
+            first_name=data.missing_first_name,
+            birthdate=data.missing_birthdate,
+            settlement=data.missing_settlement,
+            phone=data.missing_phone,
+        ))
+    return SubmissionFields(applicant_phone=data.applicant_phone, persons=persons)
+
+
+def submission_from_case(db: Session, db_case: Case) -> SubmissionFields:
+    """Build SubmissionFields from a stored case and its missing persons"""
+    missing_persons = db.query(MissingPerson).filter(MissingPerson.case_id == db_case.id).all()
+    persons = [
+        PersonFields(
+            last_name=mp.last_name,
+            first_name=mp.first_name,
+            birthdate=mp.birthdate,
+            settlement=mp.settlement or db_case.missing_settlement,
+            phone=mp.phone,
+        )
+        for mp in missing_persons
+    ]
+    persons.append(PersonFields(
+        last_name=db_case.missing_last_name,
+        first_name=db_case.missing_first_name,
+        birthdate=db_case.missing_birthdate,
+        settlement=db_case.missing_settlement,
+        phone=db_case.missing_phone,
+    ))
+    return SubmissionFields(applicant_phone=db_case.applicant_phone, persons=persons)
+
+
+def index_case(db: Session, db_case: Case) -> None:
+    """
+    (Re)build match keys for a case. Must be called inside the transaction that
+    creates or updates the case; flushes pending missing persons first.
+    """
+    db.flush()
+    keys = build_match_keys(submission_from_case(db, db_case))
+    db.query(CaseMatchKey).filter(CaseMatchKey.case_id == db_case.id).delete(synchronize_session=False)
+    db.add_all(CaseMatchKey(case_id=db_case.id, match_key=key) for key in keys)
+
+
+@dataclass
+class DuplicateCandidate:
+    """Existing case matching a submission"""
+    case_id: int
+    score: int
+    matched_keys: List[str]
+    created_at: Optional[datetime] = None
+    missing_full_name: Optional[str] = None
+
+
+def _key_kind(key: str) -> str:
+    return key.split(":", 1)[0]
+
+
+def find_candidates(
+    db: Session,
+    keys: Iterable[str],
+    exclude_case_id: Optional[int] = None,
+    limit: int = 10,
+) -> List[DuplicateCandidate]:
+    """
+    Find existing cases sharing blocking keys with the submission.
+    One indexed query over case_match_keys; scoring happens in Python on the
+    (small) list of matching rows.
+    """
+    keys = list(keys)
+    if not keys:
+        return []
+
+    query = db.query(CaseMatchKey.case_id, CaseMatchKey.match_key).filter(CaseMatchKey.match_key.in_(keys))
+    if exclude_case_id is not None:
+        query = query.filter(CaseMatchKey.case_id != exclude_case_id)
+
+    matched: dict[int, Set[str]] = {}
+    for case_id, match_key in query.all():
+        matched.setdefault(case_id, set()).add(match_key)
+
+    candidates = []
+    for case_id, case_keys in matched.items():
+        kinds = {_key_kind(k) for k in case_keys}
+        score = sum(KEY_WEIGHTS[kind] for kind in kinds)
+        if score >= CANDIDATE_SCORE:
+            candidates.append(DuplicateCandidate(case_id=case_id, score=score, matched_keys=sorted(case_keys)))
+
+    candidates.sort(key=lambda c: c.score, reverse=True)
+    candidates = candidates[:limit]
+
+    if candidates:
+        cases = {
+            c.id: c for c in db.query(Case).filter(Case.id.in_([c.case_id for c in candidates])).all()
+        }
+        for candidate in candidates:
+            db_case = cases.get(candidate.case_id)
+            if db_case:
+                candidate.created_at = db_case.created_at
+                candidate.missing_full_name = db_case.missing_full_name
+
+    return candidates
+
+
+def find_merge_target(db: Session, candidates: List[DuplicateCandidate]) -> Optional[Case]:
+    """Return the case a submission should be merged into, if any"""
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=DEDUP_WINDOW_HOURS)
+    for candidate in candidates:
+        if candidate.score < MERGE_SCORE:
+            break
+        db_case = db.query(Case).filter(Case.id == candidate.case_id).first()
+        if not db_case or db_case.duplicate_of_case_id:
+            continue
+        created_at = db_case.created_at
+        if created_at and created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        if created_at is None or created_at >= cutoff:
+            return db_case
+    return None
+
+
+def _merge_missing_persons(db: Session, target: Case, data) -> int:
+    """
+    Add the submission's missing persons the target does not list yet, matched
+    by normalized last + first name; returns how many were added. Persons
+    without a usable name cannot be matched and are left out.
+    """
+    persons = getattr(data, "missing_persons", None) or []
+    if not persons:
+        return 0
+    existing = db.query(MissingPerson).filter(MissingPerson.case_id == target.id).all()
+    known = {_name_key(mp.last_name, mp.first_name) for mp in existing}
+    known.add(_name_key(target.missing_last_name, target.missing_first_name))
+    order_index = max((mp.order_index or 0 for mp in existing), default=-1) + 1
+    added = 0
+    for person in persons:
+        name = _name_key(person.last_name, person.first_name)
+        if not name or name in known:
+            continue
+        known.add(name)
+        values = person.model_dump(exclude={"order_index"})
+        db.add(MissingPerson(
+            case_id=target.id,
+            **{**values, "photos": values.get("photos") or [], "videos": values.get("videos") or []},
+            order_index=order_index,
+        ))
+        order_index += 1
+        added += 1
+    return added
+
+
+def merge_submission(db: Session, target: Case, data, source: str) -> Case:
+    """
+    Merge an incoming submission into an existing case.
+
+    The submission text is appended to additional_info, new photos and
+    missing persons are added, and empty fields of the target are filled
+    from the submission.
+    """
+    timestamp = datetime.now(timezone.utc).strftime("%d.%m.%Y %H:%M")
+    lines = [f"--- Повторне звернення ({source}, {timestamp} UTC) ---"]
+    applicant_name = " ".join(filter(None, [data.applicant_last_name, data.applicant_first_name]))
+    if applicant_name and normalize_name(applicant_name):
+        lines.append(f"Заявник: {applicant_name}")
+    if data.applicant_phone and normalize_phone(data.applicant_phone) != normalize_phone(target.applicant_phone):
+        lines.append(f"Телефон заявника: {data.applicant_phone}")
+    if data.initial_info:
+        lines.append(data.initial_info)
+    added = _merge_missing_persons(db, target, data)
+    if added:
+        lines.append(f"Додано зниклих осіб: {added}")
+    block = "\n".join(lines)
+    target.additional_info = f"{target.additional_info}\n\n{block}" if target.additional_info else block
+
+    new_photos = [p for p in (data.missing_photos or []) if p not in (target.missing_photos or [])]
+    if new_photos:
+        target.missing_photos = (target.missing_photos or []) + new_photos
+
+    for attr in (
+        "applicant_phone", "applicant_relation", "missing_settlement", "missing_region",
+        "missing_address", "missing_birthdate", "missing_gender", "missing_last_seen_datetime",
+        "missing_last_seen_place", "missing_description", "missing_special_signs",
+        "missing_diseases", "missing_phone", "missing_clothing", "missing_belongings",
+        "disappearance_circumstances",
+    ):
+        value = getattr(data, attr, None)
+        if value and not getattr(target, attr):
+            setattr(target, attr, value)
+
+    index_case(db, target)
+    logger.info(f"Submission from {source} merged into case {target.id}")
+    return target
+
+
+def dedup_submission(db: Session, data, source: str) -> Tuple[Optional[Case], Optional[int]]:
+    """
+    Ingest-time dedup stage for public channels (website, Telegram, voice bot).
+
+    Returns (merged_case, duplicate_of_case_id):
+    - merged_case is set when the submission was merged into an existing case;
+      the caller should commit and return that case instead of creating a new one.
+    - duplicate_of_case_id is set when a weaker match was found; the caller
+      creates the new case and links it to the original.
+    """
+    try:
+        keys = build_match_keys(submission_from_case_data(data))
+        candidates = find_candidates(db, keys)
+    except Exception as e:
+        # Dedup must never block case intake
+        logger.error(f"Duplicate lookup failed: {e}", exc_info=True)
+        return None, None
+
+    if not candidates:
+        return None, None
+
+    try:
+        # A failed merge rolls back to the savepoint; the session stays usable for the new case
+        with db.begin_nested():
+            target = find_merge_target(db, candidates)
+            if target:
+                return merge_submission(db, target, data, source), None
+            best = db.query(Case).filter(Case.id == candidates[0].case_id).first()
+    except Exception as e:
+        logger.error(f"Merging a submission from {source} failed, creating a new case: {e}", exc_info=True)
+        return None, None
+
+    if not best:
+        return None, None
+    logger.info(f"Submission from {source} linked as possible duplicate of case {best.id} (score {candidates[0].score})")
+    return None, best.duplicate_of_case_id or best.id
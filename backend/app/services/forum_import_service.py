@@ -3,10 +3,12 @@ Forum import service - adapts forum_migrator.py for web interface
 """
 import asyncio
 import threading
+import uuid
 from datetime import datetime
 from sqlalchemy.orm import Session
 from app.models.forum_import import ForumImportStatus
 from app.db import SessionLocal
+from app.services.shared_state import get_shared_state
 
 # Import the ForumMigrator class
 import sys
@@ -17,6 +19,12 @@ try:
 except ImportError:
     ForumMigrator = None
 
+# Shared lock: one import at a time across all API workers. Its value is the
+# owner token of the running import, which renews it before every topic.
+IMPORT_LOCK_KEY = "forum_import:running"
+# An import of a crashed worker stops blocking new ones after this long
+IMPORT_LOCK_TTL_SECONDS = int(os.getenv("FORUM_IMPORT_LOCK_TTL_SECONDS", str(15 * 60)))
+
 
 class ForumImportService:
     """Service for managing forum imports"""
@@ -61,20 +69,42 @@ class ForumImportService:
         max_topics: int,
         api_email: str,
         api_password: str
-    ):
-        """Start forum import in background thread"""
+    ) -> bool:
+        """
+        Start forum import in background thread.
+        Returns False if an import is already running (in any worker).
+        """
 
         # Check if ForumMigrator is available
         if ForumMigrator is None:
             raise RuntimeError("ForumMigrator not available. Make sure forum_migrator.py is in the project root.")
 
+        token = uuid.uuid4().hex
+        if not get_shared_state().add(IMPORT_LOCK_KEY, token, IMPORT_LOCK_TTL_SECONDS):
+            return False
+
         # Start import in background thread
-        thread = threading.Thread(
-            target=ForumImportService._run_import,
-            args=(forum_url, forum_username, forum_password, subforum_id, max_topics, api_email, api_password),
-            daemon=True
-        )
-        thread.start()
+        try:
+            thread = threading.Thread(
+                target=ForumImportService._run_import,
+                args=(forum_url, forum_username, forum_password, subforum_id, max_topics, api_email, api_password, token),
+                daemon=True
+            )
+            thread.start()
+        except Exception:
+            ForumImportService.release_lock(token)
+            raise
+        return True
+
+    @staticmethod
+    def release_lock(token: str):
+        """Allow a new import to start (only the import holding the lock releases it)"""
+        get_shared_state().delete_if(IMPORT_LOCK_KEY, token)
+
+    @staticmethod
+    def stop_requested(db: Session) -> bool:
+        """Whether the running import was asked to stop (flag in the status row, seen by every worker)"""
+        return db.query(ForumImportStatus.status).filter(ForumImportStatus.id == 1).scalar() == 'stopped'
 
     @staticmethod
     def _run_import(
@@ -84,7 +114,8 @@ class ForumImportService:
         subforum_id: int,
         max_topics: int,
         api_email: str,
-        api_password: str
+        api_password: str,
+        token: str
     ):
         """Run forum import (called in background thread)"""
         db = SessionLocal()
@@ -136,7 +167,14 @@ class ForumImportService:
 
             # Process each topic
             success_count = 0
+            stopped = False
             for i, topic in enumerate(topics, 1):
+                if ForumImportService.stop_requested(db):
+                    stopped = True
+                    break
+                # Keep the lock while running; lost means the lock expired and another import may run
+                if not get_shared_state().extend_if(IMPORT_LOCK_KEY, token, IMPORT_LOCK_TTL_SECONDS):
+                    raise Exception("Import lock lost")
                 try:
                     ForumImportService.update_status(
                         db,
@@ -177,11 +215,11 @@ class ForumImportService:
                         last_error=str(e)
                     )
 
-            # Complete
+            # Complete (or stopped between topics)
             ForumImportService.update_status(
                 db,
                 is_running=False,
-                status='completed',
+                status='stopped' if stopped else 'completed',
                 finished_at=datetime.utcnow(),
                 current_operation=None,
                 current_topic_title=None
@@ -203,3 +241,4 @@ class ForumImportService:
             if 'migrator' in locals() and migrator.driver:
                 migrator.driver.quit()
             db.close()
+            ForumImportService.release_lock(token)
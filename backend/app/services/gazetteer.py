@@ -0,0 +1,322 @@
+"""
+Offline gazetteer: settlement names to ids and coordinates.
+
+The dataset is a CSV with the columns
+
+    id, name, region, lat, lon, population, alternate_names (";"-separated)
+
+GAZETTEER_PATH defaults to the small bundled app/data/settlements.csv (oblast
+centres and large towns); point it to a full export (e.g. converted from the
+GeoNames UA dump, ids being geonameids) in production.
+
+On first use the CSV is compiled into flat NumPy arrays under
+GAZETTEER_INDEX_DIR (one directory per source file version) and every later
+start only maps them with np.load(mmap_mode="r"): workers share the pages and
+nothing is parsed again.
+
+    lat, lon, population, region   one entry per settlement
+    ids                            dataset ids of the settlements
+    names, regions                 UTF-8 blobs with offset arrays
+    keys                           normalized names (dedup_service.normalize_settlement)
+                                   and alternate names, sorted, with the settlement
+                                   row of each key in key_rows
+
+The sorted key array is a flattened prefix trie: the subtree of a prefix is a
+contiguous range. The first two trie levels are a dict of key ranges built
+when the index is mapped; below them two binary searches inside the range
+narrow it down, so autocomplete costs a dict lookup, a few probes and the size
+of the answer, without a pointer structure per node.
+"""
+import bisect
+import csv
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from app.core.logging_config import get_logger
+from app.services.dedup_service import normalize_name, normalize_settlement
+
+logger = get_logger(__name__)
+
+GAZETTEER_PATH = os.getenv(
+    "GAZETTEER_PATH", str(Path(__file__).resolve().parent.parent / "data" / "settlements.csv")
+)
+GAZETTEER_INDEX_DIR = os.getenv("GAZETTEER_INDEX_DIR", os.path.join(tempfile.gettempdir(), "gazetteer"))
+
+MAX_AUTOCOMPLETE = 50
+# Candidate lists up to this size are ranked in Python, larger ones with NumPy
+SMALL_RANGE = 64
+
+_ARRAYS = (
+    "ids", "lat", "lon", "population", "region",
+    "names", "name_offsets", "region_names", "region_offsets",
+    "keys", "key_offsets", "key_rows",
+)
+
+# Words that are not part of a region name ("Київська обл.", "Житомирська область")
+_REGION_WORDS = re.compile(r"\b(область|обл|автономна|республіка|республика|край|район|р-н)\b\.?")
+# Adjective endings, so that "Чернігівська" and "Чернігів" give the same key
+_REGION_SUFFIXES = ("ська", "цька", "зька", "ская", "цкая", "зкая")
+
+
+class Settlement(NamedTuple):
+    id: int
+    name: str
+    region: str
+    lat: float
+    lon: float
+    population: int
+
+
+def region_key(value: Optional[str]) -> str:
+    """Normalized region name for matching (also accepts the name of its centre)"""
+    if not value:
+        return ""
+    text = _REGION_WORDS.sub(" ", value.lower())
+    key = normalize_name(text)
+    for suffix in _REGION_SUFFIXES:
+        if key.endswith(suffix) and len(key) > len(suffix) + 2:
+            return key[:-len(suffix)]
+    return key
+
+
+class _Strings:
+    """Read-only sequence over a UTF-8 blob (bytes items, so bisect needs no decoding)"""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        # memoryviews of the mapped arrays: indexing them is far cheaper than indexing ndarrays
+        self.blob = memoryview(np.ascontiguousarray(blob)) if len(blob) else memoryview(b"")
+        self.offsets = memoryview(np.ascontiguousarray(offsets))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> bytes:
+        return self.blob[self.offsets[index]:self.offsets[index + 1]].tobytes()
+
+    def text(self, index: int) -> str:
+        return self[index].decode()
+
+
+def _pack(strings: List[str]):
+    encoded = [value.encode() for value in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def compile_index(source: str, target: str) -> None:
+    """Parse a settlements CSV and write the index arrays to the target directory"""
+    ids, lats, lons, populations, region_rows, names = [], [], [], [], [], []
+    regions: dict = {}
+    keys = []
+    with open(source, newline="", encoding="utf-8") as f:
+        for record in csv.DictReader(f):
+            try:
+                settlement_id = int(record["id"])
+                lat, lon = float(record["lat"]), float(record["lon"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            row = len(ids)
+            ids.append(settlement_id)
+            lats.append(lat)
+            lons.append(lon)
+            populations.append(int(record.get("population") or 0))
+            region = (record.get("region") or "").strip()
+            region_rows.append(regions.setdefault(region, len(regions)))
+            names.append(record["name"].strip())
+            spellings = [record["name"], *(record.get("alternate_names") or "").split(";")]
+            for key in {normalize_settlement(spelling) for spelling in spellings}:
+                if key:
+                    keys.append((key, row))
+    keys.sort()
+
+    arrays = {
+        "ids": np.array(ids, dtype=np.int64),
+        "lat": np.array(lats, dtype=np.float64),
+        "lon": np.array(lons, dtype=np.float64),
+        "population": np.array(populations, dtype=np.int64),
+        "region": np.array(region_rows, dtype=np.int32),
+        "key_rows": np.array([row for _, row in keys], dtype=np.int32),
+    }
+    arrays["names"], arrays["name_offsets"] = _pack(names)
+    arrays["region_names"], arrays["region_offsets"] = _pack(list(regions))
+    arrays["keys"], arrays["key_offsets"] = _pack([key for key, _ in keys])
+
+    os.makedirs(target, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(target, f"{name}.npy"), array)
+
+
+class GazetteerIndex:
+    """Memory-mapped settlement index"""
+
+    def __init__(self, directory: str):
+        # Plain ndarray views of the maps: slicing np.memmap objects is several times slower
+        arrays = {
+            name: np.asarray(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")) for name in _ARRAYS
+        }
+        self.ids = arrays["ids"]
+        self.lat = arrays["lat"]
+        self.lon = arrays["lon"]
+        self.population = arrays["population"]
+        self.region = arrays["region"]
+        self.key_rows = arrays["key_rows"]
+        self.names = _Strings(arrays["names"], arrays["name_offsets"])
+        self.keys = _Strings(arrays["keys"], arrays["key_offsets"])
+        region_names = _Strings(arrays["region_names"], arrays["region_offsets"])
+        self.region_names = [region_names.text(i) for i in range(len(region_names))]
+        self.region_keys = [region_key(name) for name in self.region_names]
+        # Region text as written in records -> matching region codes
+        self.region_codes: Dict[str, List[int]] = {}
+        self.rows_by_id = {int(settlement_id): row for row, settlement_id in enumerate(self.ids.tolist())}
+        # Top levels of the trie: key range of every 1- and 2-character prefix
+        self.buckets: Dict[str, Tuple[int, int]] = {}
+        for position in range(len(self.keys)):
+            key = self.keys.text(position)
+            for head in (key[:1], key[:2]):
+                lo, _ = self.buckets.get(head, (position, position))
+                self.buckets[head] = (lo, position + 1)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def settlement(self, row: int) -> Settlement:
+        return Settlement(
+            id=int(self.ids[row]),
+            name=self.names.text(row),
+            region=self.region_names[self.region[row]],
+            lat=float(self.lat[row]),
+            lon=float(self.lon[row]),
+            population=int(self.population[row]),
+        )
+
+    def get(self, settlement_id: int) -> Optional[Settlement]:
+        row = self.rows_by_id.get(settlement_id)
+        return self.settlement(row) if row is not None else None
+
+    def _key_range(self, key: str, prefix: bool) -> Tuple[int, int]:
+        """Positions of the keys starting with (prefix=True) or equal to key"""
+        lo, hi = self.buckets.get(key[:2], (0, 0))
+        if prefix and len(key) <= 2:
+            return lo, hi
+        encoded = key.encode()
+        lo = bisect.bisect_left(self.keys, encoded, lo, hi)
+        # 0xFF never occurs in UTF-8, so it sorts after every key with the prefix
+        hi = bisect.bisect_left(self.keys, encoded + b"\xff", lo, hi) if prefix else bisect.bisect_right(self.keys, encoded, lo, hi)
+        return lo, hi
+
+    def _region_rows(self, rows: np.ndarray, region: Optional[str]) -> np.ndarray:
+        if not region:
+            return rows
+        codes = self.region_codes.get(region)
+        if codes is None:
+            wanted = region_key(region)
+            codes = self.region_codes[region] = [code for code, key in enumerate(self.region_keys) if key == wanted]
+        if not codes:
+            # Unknown region - do not let it hide every candidate
+            return rows
+        if len(rows) <= SMALL_RANGE:
+            region = self.region
+            return np.array([row for row in rows.tolist() if region[row] in codes], dtype=rows.dtype)
+        return rows[np.isin(self.region[rows], codes)]
+
+    def _ranked(self, rows: np.ndarray, limit: int) -> List[int]:
+        """Distinct rows (alternate names repeat them), most populous first"""
+        population = self.population
+        if len(rows) > SMALL_RANGE:
+            # Only the most populous candidates need sorting; widen the cut until
+            # enough distinct rows are left
+            count = limit
+            while True:
+                top = rows[np.argpartition(-population[rows], count - 1)[:count]]
+                if len(set(top.tolist())) >= limit or count >= len(rows):
+                    rows = top
+                    break
+                count = min(count * 2, len(rows))
+        return sorted(set(rows.tolist()), key=lambda row: (-population[row], row))[:limit]
+
+    def autocomplete(self, prefix: str, limit: int = 10, region: Optional[str] = None) -> List[Settlement]:
+        """Settlements with a name (or alternate name) starting with prefix"""
+        key = normalize_settlement(prefix)
+        if not key or limit < 1:
+            return []
+        lo, hi = self._key_range(key, prefix=True)
+        rows = self._region_rows(np.asarray(self.key_rows[lo:hi]), region)
+        return [self.settlement(row) for row in self._ranked(rows, limit)]
+
+    def resolve(self, name: Optional[str], region: Optional[str] = None) -> Optional[Settlement]:
+        """
+        Settlement named exactly name (after normalization). Homonyms are told
+        apart by region; otherwise the most populous one wins.
+        """
+        key = normalize_settlement(name)
+        if not key:
+            return None
+        lo, hi = self._key_range(key, prefix=False)
+        ranked = self._ranked(self._region_rows(np.asarray(self.key_rows[lo:hi]), region), 1)
+        return self.settlement(ranked[0]) if ranked else None
+
+
+def _index_dir(source: str) -> str:
+    stat = os.stat(source)
+    signature = hashlib.sha1(f"{os.path.abspath(source)}|{stat.st_size}|{stat.st_mtime_ns}".encode()).hexdigest()
+    return os.path.join(GAZETTEER_INDEX_DIR, signature[:16])
+
+
+def open_index(source: str) -> GazetteerIndex:
+    """Map the compiled index of a dataset, compiling it first if needed"""
+    target = _index_dir(source)
+    if not os.path.exists(os.path.join(target, "done")):
+        os.makedirs(GAZETTEER_INDEX_DIR, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=GAZETTEER_INDEX_DIR)
+        compile_index(source, staging)
+        with open(os.path.join(staging, "done"), "w") as f:
+            json.dump({"source": os.path.abspath(source)}, f)
+        try:
+            os.rename(staging, target)
+        except OSError:
+            # Another worker compiled it first
+            for name in os.listdir(staging):
+                os.remove(os.path.join(staging, name))
+            os.rmdir(staging)
+        logger.info(f"Compiled gazetteer index of {source} into {target}")
+    return GazetteerIndex(target)
+
+
+_index: Optional[GazetteerIndex] = None
+_index_failed = False
+_index_lock = threading.Lock()
+
+
+def get_index() -> Optional[GazetteerIndex]:
+    """The gazetteer of GAZETTEER_PATH (None if it cannot be loaded)"""
+    global _index, _index_failed
+    if _index is None and not _index_failed:
+        with _index_lock:
+            if _index is None and not _index_failed:
+                try:
+                    _index = open_index(GAZETTEER_PATH)
+                except Exception as e:
+                    # Geocoding is optional; writes go on without coordinates
+                    _index_failed = True
+                    logger.error(f"Gazetteer {GAZETTEER_PATH} could not be loaded: {e}")
+    return _index
+
+
+def autocomplete(prefix: str, limit: int = 10, region: Optional[str] = None) -> List[Settlement]:
+    index = get_index()
+    return index.autocomplete(prefix, min(limit, MAX_AUTOCOMPLETE), region) if index is not None else []
+
+
+def resolve(name: Optional[str], region: Optional[str] = None) -> Optional[Settlement]:
+    index = get_index()
+    return index.resolve(name, region) if index is not None else None
+
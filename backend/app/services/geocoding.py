@@ -0,0 +1,161 @@
+"""
+Write-time geocoding of free-text settlements.
+
+Before every flush, records whose settlement or region text changed get the
+matching gazetteer settlement id and its coordinates (see gazetteer.py):
+
+    Case            missing_settlement, missing_region -> missing_settlement_id, missing_lat, missing_lon
+    MissingPerson   settlement, region                 -> settlement_id, lat, lon
+    Organization    city, region                       -> settlement_id, lat, lon
+
+Unknown names clear the derived columns. Coordinates set explicitly in the
+same flush are kept. Like upload_refs.py, hooking the session covers every
+write path (staff forms, public form, bots) without touching the routers.
+
+Organizations keep the geohash of their lat/lon (exact or from the city).
+After the flush, cases whose location inputs changed get their point (lat,
+lon, geohash): the last-seen place of the first missing person that has
+coordinates, else the coordinates of the case settlement.
+"""
+from typing import Dict, Iterable, Set, Tuple
+
+from sqlalchemy import bindparam, event, inspect, select, update
+from sqlalchemy.orm import Session
+
+from app.core.logging_config import get_logger
+
+from app.models.case import Case
+from app.models.missing_person import MissingPerson
+from app.models.organization import Organization
+from app.services import gazetteer, geohash
+
+logger = get_logger(__name__)
+
+# Model -> ((settlement, region) text columns, (id, lat, lon) derived columns)
+GEOCODED_FIELDS: Dict[type, Tuple[Tuple[str, str], Tuple[str, str, str]]] = {
+    Case: (("missing_settlement", "missing_region"), ("missing_settlement_id", "missing_lat", "missing_lon")),
+    MissingPerson: (("settlement", "region"), ("settlement_id", "lat", "lon")),
+    Organization: (("city", "region"), ("settlement_id", "lat", "lon")),
+}
+
+# Model -> (lat, lon, geohash) of records whose geohash is kept on flush
+GEOHASHED_FIELDS: Dict[type, Tuple[str, str, str]] = {
+    Organization: ("lat", "lon", "geohash"),
+}
+
+# Columns a case point is derived from
+CASE_LOCATION_FIELDS = ("missing_lat", "missing_lon")
+PERSON_LOCATION_FIELDS = ("last_seen_lat", "last_seen_lon", "order_index", "case_id")
+
+
+def _changed(obj, fields: Iterable[str]) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+def geocode(obj) -> None:
+    """Set the derived settlement columns of a record from its text columns"""
+    (name_field, region_field), (id_field, lat_field, lon_field) = GEOCODED_FIELDS[type(obj)]
+    settlement = gazetteer.resolve(getattr(obj, name_field), getattr(obj, region_field))
+    setattr(obj, id_field, settlement.id if settlement else None)
+    if _changed(obj, (lat_field, lon_field)):
+        return
+    setattr(obj, lat_field, settlement.lat if settlement else None)
+    setattr(obj, lon_field, settlement.lon if settlement else None)
+
+
+@event.listens_for(Session, "before_flush")
+def _geocode_settlements(session: Session, flush_context, instances) -> None:
+    """Geocode new records and records whose settlement text changed"""
+    for obj in list(session.new) + list(session.dirty):
+        if type(obj) in GEOCODED_FIELDS and (obj in session.new or _changed(obj, GEOCODED_FIELDS[type(obj)][0])):
+            geocode(obj)
+        if type(obj) in GEOHASHED_FIELDS:
+            lat_field, lon_field, geohash_field = GEOHASHED_FIELDS[type(obj)]
+            if obj in session.new or _changed(obj, (lat_field, lon_field)):
+                lat, lon = getattr(obj, lat_field), getattr(obj, lon_field)
+                located = lat is not None and lon is not None
+                setattr(obj, geohash_field, geohash.encode(lat, lon) if located else None)
+
+
+def locate_cases(connection, case_ids: Set[int]) -> None:
+    """Recompute the point and geohash of cases"""
+    cases = Case.__table__
+    persons = MissingPerson.__table__
+    points = {
+        case_id: (lat, lon)
+        for case_id, lat, lon in connection.execute(
+            select(cases.c.id, cases.c.missing_lat, cases.c.missing_lon).where(cases.c.id.in_(case_ids))
+        )
+    }
+    last_seen = {}
+    for case_id, lat, lon in connection.execute(
+        select(persons.c.case_id, persons.c.last_seen_lat, persons.c.last_seen_lon)
+        .where(persons.c.case_id.in_(case_ids), persons.c.last_seen_lat.isnot(None), persons.c.last_seen_lon.isnot(None))
+        .order_by(persons.c.case_id, persons.c.order_index, persons.c.id)
+    ):
+        last_seen.setdefault(case_id, (lat, lon))
+    rows = []
+    for case_id, (lat, lon) in points.items():
+        lat, lon = last_seen.get(case_id, (lat, lon))
+        located = lat is not None and lon is not None
+        rows.append({
+            "case_id": case_id,
+            "point_lat": lat if located else None,
+            "point_lon": lon if located else None,
+            "point_geohash": geohash.encode(lat, lon) if located else None,
+        })
+    if rows:
+        connection.execute(
+            update(cases).where(cases.c.id == bindparam("case_id")).values(
+                lat=bindparam("point_lat"), lon=bindparam("point_lon"), geohash=bindparam("point_geohash")
+            ),
+            rows,
+        )
+
+
+@event.listens_for(Session, "after_flush")
+def _locate_cases(session: Session, flush_context) -> None:
+    """Update the points of cases whose settlement or missing persons' last-seen places changed"""
+    case_ids = {
+        obj.id for obj in session.new
+        if isinstance(obj, Case)
+    } | {
+        obj.id for obj in session.dirty
+        if isinstance(obj, Case) and _changed(obj, CASE_LOCATION_FIELDS)
+    } | {
+        obj.case_id for obj in list(session.new) + list(session.deleted)
+        if isinstance(obj, MissingPerson)
+    } | {
+        obj.case_id for obj in session.dirty
+        if isinstance(obj, MissingPerson) and _changed(obj, PERSON_LOCATION_FIELDS)
+    }
+    case_ids.discard(None)
+    if case_ids:
+        locate_cases(session.connection(), case_ids)
+
+
+def geocode_existing(db: Session, batch_size: int = 500) -> Dict[str, int]:
+    """
+    Geocode all stored records and recompute all case points (after loading a
+    new gazetteer or for records written before geocoding existed). Commits
+    every batch; returns the number of records per table.
+    """
+    counts = {}
+    for model in GEOCODED_FIELDS:
+        count, last_id = 0, 0
+        while True:
+            batch = db.query(model).filter(model.id > last_id).order_by(model.id).limit(batch_size).all()
+            if not batch:
+                break
+            for obj in batch:
+                geocode(obj)
+            if model is Case:
+                db.flush()
+                locate_cases(db.connection(), {obj.id for obj in batch})
+            db.commit()
+            count += len(batch)
+            last_id = batch[-1].id
+        counts[model.__tablename__] = count
+        logger.info(f"Geocoded {count} {model.__tablename__}")
+    return counts
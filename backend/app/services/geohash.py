@@ -0,0 +1,182 @@
+"""
+Geohash cells for spatial filters without PostGIS.
+
+A geohash interleaves longitude and latitude bits and writes them in base 32,
+so every prefix is a rectangular cell and all points of a cell share the
+prefix. Stored in a String column with the "C" collation, the points of a
+cell are one B-tree range: [prefix, next prefix).
+
+A bounding box is covered by at most MAX_COVER_CELLS cells of the finest
+precision that stays within that count; neighbouring cells that follow each
+other in geohash order are merged into one range. The cover is a superset of
+the box, so queries add the exact lat/lon condition (and the great-circle
+distance for a radius) on the few rows the ranges select.
+"""
+import math
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {char: value for value, char in enumerate(BASE32)}
+
+# Stored precision: cells of about 5 x 5 m
+PRECISION = 9
+MAX_COVER_CELLS = 32
+EARTH_RADIUS_KM = 6371.0088
+
+BBox = Tuple[float, float, float, float]  # south, west, north, east
+
+
+def encode(lat: float, lon: float, precision: int = PRECISION) -> str:
+    """Geohash of a point"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits, value, even = 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def decode(geohash: str) -> Tuple[float, float]:
+    """Centre (lat, lon) of a geohash cell"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            interval = lon_range if even else lat_range
+            middle = (interval[0] + interval[1]) / 2
+            if value >> shift & 1:
+                interval[0] = middle
+            else:
+                interval[1] = middle
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """(height, width) of a cell in degrees"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def _cells(bbox: BBox, precision: int) -> List[str]:
+    south, west, north, east = bbox
+    height, width = cell_size(precision)
+    cells = set()
+    # Step from the cell containing the south-west corner to the one containing the north-east corner
+    lat = math.floor((south + 90.0) / height) * height - 90.0 + height / 2
+    while lat - height / 2 <= north:
+        lon = math.floor((west + 180.0) / width) * width - 180.0 + width / 2
+        while lon - width / 2 <= east:
+            cells.add(encode(min(lat, 90.0), min(lon, 180.0), precision))
+            lon += width
+        lat += height
+    return sorted(cells)
+
+
+def cover_precision(bbox: BBox, max_cells: int = MAX_COVER_CELLS) -> int:
+    """Finest precision whose cells cover the box with at most max_cells cells"""
+    south, west, north, east = bbox
+    precision = 1
+    while precision < PRECISION:
+        height, width = cell_size(precision + 1)
+        rows = math.floor((north + 90.0) / height) - math.floor((south + 90.0) / height) + 1
+        cols = math.floor((east + 180.0) / width) - math.floor((west + 180.0) / width) + 1
+        if rows * cols > max_cells:
+            break
+        precision += 1
+    return precision
+
+
+def _next_prefix(prefix: str) -> Optional[str]:
+    """Smallest string greater than every string starting with prefix (None if there is none)"""
+    chars = list(prefix)
+    while chars:
+        value = _DECODE[chars[-1]]
+        if value < len(BASE32) - 1:
+            chars[-1] = BASE32[value + 1]
+            return "".join(chars)
+        chars.pop()
+    return None
+
+
+def cover(bbox: BBox, max_cells: int = MAX_COVER_CELLS) -> List[Tuple[str, Optional[str]]]:
+    """Geohash ranges [start, end) covering a box (end None: no upper bound)"""
+    ranges: List[Tuple[str, Optional[str]]] = []
+    for cell in _cells(clamp(bbox), cover_precision(clamp(bbox), max_cells)):
+        end = _next_prefix(cell)
+        if ranges and ranges[-1][1] == cell:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((cell, end))
+    return ranges
+
+
+def clamp(bbox: BBox) -> BBox:
+    south, west, north, east = bbox
+    return max(south, -90.0), max(west, -180.0), min(north, 90.0), min(east, 180.0)
+
+
+def bbox_around(lat: float, lon: float, radius_km: float) -> BBox:
+    """Box containing the circle of radius_km around a point"""
+    angle = radius_km / EARTH_RADIUS_KM
+    dlat = math.degrees(angle)
+    # Widest longitude offset of the circle (reached north of the parallel, not on it)
+    ratio = math.sin(angle) / max(math.cos(math.radians(lat)), 1e-12)
+    dlon = 180.0 if angle >= math.pi / 2 or ratio >= 1 else math.degrees(math.asin(ratio))
+    return clamp((lat - dlat, lon - dlon, lat + dlat, lon + dlon))
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance (haversine)"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def distance_km_sql(lat_column, lon_column, lat: float, lon: float):
+    """SQL expression of the great-circle distance of a row's point to (lat, lon)"""
+    half_radian = math.pi / 360
+    a = (
+        func.power(func.sin((lat_column - lat) * half_radian), 2)
+        + math.cos(math.radians(lat)) * func.cos(lat_column * (2 * half_radian))
+        * func.power(func.sin((lon_column - lon) * half_radian), 2)
+    )
+    return 2 * EARTH_RADIUS_KM * func.asin(func.sqrt(func.least(1.0, a)))
+
+
+def bbox_filter(lat_column, lon_column, geohash_column, bbox: BBox):
+    """SQL condition: the row's point lies in the box (geohash ranges use the B-tree index)"""
+    south, west, north, east = clamp(bbox)
+    ranges = [
+        and_(geohash_column >= start, geohash_column < end) if end is not None else geohash_column >= start
+        for start, end in cover(bbox)
+    ]
+    return and_(
+        or_(*ranges),
+        lat_column.between(south, north),
+        lon_column.between(west, east),
+    )
+
+
+def radius_filter(lat_column, lon_column, geohash_column, lat: float, lon: float, radius_km: float):
+    """SQL condition: the row's point is within radius_km of (lat, lon)"""
+    return and_(
+        bbox_filter(lat_column, lon_column, geohash_column, bbox_around(lat, lon, radius_km)),
+        distance_km_sql(lat_column, lon_column, lat, lon) <= radius_km,
+    )
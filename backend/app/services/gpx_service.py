@@ -4,13 +4,25 @@ GPX Grid Generation Service
 This service generates GPX files for field search grid operations.
 The grid consists of cells labeled with columns (A, B, C...) and rows (1, 2, 3...).
 Each cell has a waypoint at its center for navigation.
+
+Coordinates are computed as NumPy arrays (one vectorized pass per grid) and the
+GPX document is emitted incrementally, row by row, so a 400x400 grid never
+exists as an element tree or as several full copies of the XML in memory.
 """
 
 import math
+from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import List, Tuple
-from xml.etree.ElementTree import Element, SubElement, tostring
-from xml.dom import minidom
+from typing import IO, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+
+# Meters per degree of latitude (and of longitude at the equator)
+METERS_PER_DEGREE = 111320.0
+
+# Waypoints per emitted chunk - bounds the size of intermediate strings
+WAYPOINT_CHUNK_SIZE = 4096
 
 
 def transliterate_ukrainian(text: str) -> str:
@@ -67,7 +79,7 @@ def meters_to_degrees_lat(meters: float) -> float:
     Convert meters to degrees of latitude.
     1 degree latitude ≈ 111,320 meters (constant at all latitudes)
     """
-    return meters / 111320.0
+    return meters / METERS_PER_DEGREE
 
 
 def meters_to_degrees_lon(meters: float, latitude: float) -> float:
@@ -76,7 +88,7 @@ def meters_to_degrees_lon(meters: float, latitude: float) -> float:
     1 degree longitude ≈ 111,320 * cos(latitude) meters
     """
     lat_rad = math.radians(latitude)
-    return meters / (111320.0 * math.cos(lat_rad))
+    return meters / (METERS_PER_DEGREE * math.cos(lat_rad))
 
 
 def column_label(index: int) -> str:
@@ -92,15 +104,55 @@ def column_label(index: int) -> str:
     return label
 
 
-def calculate_grid_points(
+def column_labels(cols: int) -> List[str]:
+    """Labels of the first `cols` columns (A ... Z, AA, AB, ...)"""
+    return [column_label(index) for index in range(cols)]
+
+
+@dataclass
+class GridGeometry:
+    """
+    Coordinates of a rectangular search grid (all in degrees).
+
+    cell_lats[r] and cell_lons[r, c] are the center of cell (r, c); cell
+    widths (cell_widths[r]) follow the latitude of their row, so cell (r, c)
+    spans left_lon + c * cell_widths[r] ... + cell_widths[r] and
+    top_lat - r * cell_height ... - cell_height. Horizontal line r runs from
+    left_lon to row_right_lons[r] at row_line_lats[r]; vertical line c runs
+    from top_lat to bottom_lat at col_line_lons[c].
+    """
+    cols: int
+    rows: int
+    cell_size_meters: float
+    top_lat: float
+    bottom_lat: float
+    left_lon: float
+    cell_height: float
+    cell_widths: np.ndarray     # (rows,)
+    cell_lats: np.ndarray       # (rows,)
+    cell_lons: np.ndarray       # (rows, cols)
+    row_line_lats: np.ndarray   # (rows + 1,)
+    row_right_lons: np.ndarray  # (rows + 1,)
+    col_line_lons: np.ndarray   # (cols + 1,)
+
+    @property
+    def bounds(self) -> Tuple[float, float, float, float]:
+        """(min_lat, min_lon, max_lat, max_lon) of waypoints and grid lines"""
+        lons = (self.cell_lons, self.row_right_lons, self.col_line_lons)
+        min_lon = min(self.left_lon, *(float(values.min()) for values in lons))
+        max_lon = max(self.left_lon, *(float(values.max()) for values in lons))
+        return self.bottom_lat, min_lon, self.top_lat, max_lon
+
+
+def compute_grid(
     center_lat: float,
     center_lon: float,
     cols: int,
     rows: int,
     cell_size_meters: float
-) -> Tuple[List[dict], List[List[Tuple[float, float]]]]:
+) -> GridGeometry:
     """
-    Calculate grid waypoints and track lines.
+    Compute waypoint and grid line coordinates.
 
     Args:
         center_lat: Latitude of grid center
@@ -108,85 +160,154 @@ def calculate_grid_points(
         cols: Number of columns
         rows: Number of rows
         cell_size_meters: Size of each cell in meters
+    """
+    grid_width_meters = cols * cell_size_meters
+    grid_height_meters = rows * cell_size_meters
+
+    # Top-left corner: north by half the grid height, west by half the grid width
+    top_lat = center_lat + meters_to_degrees_lat(grid_height_meters / 2)
+    left_lon = center_lon - meters_to_degrees_lon(grid_width_meters / 2, center_lat)
+    cell_height_deg = meters_to_degrees_lat(cell_size_meters)
+
+    # Cell centers: rows move south from the top edge, columns east from the left edge
+    cell_lats = top_lat - np.arange(rows) * cell_height_deg - cell_height_deg / 2
+    cell_widths = cell_size_meters / (METERS_PER_DEGREE * np.cos(np.radians(cell_lats)))
+    cell_lons = left_lon + (np.arange(cols) + 0.5) * cell_widths[:, np.newaxis]
+
+    # Horizontal lines (including top and bottom edges), width at their own latitude
+    row_line_lats = top_lat - np.arange(rows + 1) * cell_height_deg
+    row_right_lons = left_lon + grid_width_meters / (METERS_PER_DEGREE * np.cos(np.radians(row_line_lats)))
+
+    # Vertical lines (including left and right edges), spaced at the center latitude
+    col_line_lons = left_lon + np.arange(cols + 1) * meters_to_degrees_lon(cell_size_meters, center_lat)
+
+    return GridGeometry(
+        cols=cols,
+        rows=rows,
+        cell_size_meters=cell_size_meters,
+        top_lat=top_lat,
+        bottom_lat=top_lat - meters_to_degrees_lat(grid_height_meters),
+        left_lon=left_lon,
+        cell_height=cell_height_deg,
+        cell_widths=cell_widths,
+        cell_lats=cell_lats,
+        cell_lons=cell_lons,
+        row_line_lats=row_line_lats,
+        row_right_lons=row_right_lons,
+        col_line_lons=col_line_lons,
+    )
+
+
+def calculate_grid_points(
+    center_lat: float,
+    center_lon: float,
+    cols: int,
+    rows: int,
+    cell_size_meters: float
+) -> Tuple[List[dict], List[List[Tuple[float, float]]]]:
+    """
+    Calculate grid waypoints and track lines as plain Python objects.
+    Prefer compute_grid() for large grids.
 
     Returns:
         Tuple of (waypoints, track_segments)
         - waypoints: List of dicts with lat, lon, name
         - track_segments: List of line segments, each segment is a list of (lat, lon) tuples
     """
-    # Calculate grid dimensions in degrees
-    grid_width_meters = cols * cell_size_meters
-    grid_height_meters = rows * cell_size_meters
+    grid = compute_grid(center_lat, center_lon, cols, rows, cell_size_meters)
+    labels = column_labels(cols)
+
+    waypoints = [
+        {"lat": lat, "lon": lon, "name": f"{labels[col]}{row + 1}"}
+        for row, lat in enumerate(grid.cell_lats.tolist())
+        for col, lon in enumerate(grid.cell_lons[row].tolist())
+    ]
+    track_segments = [
+        [(lat, grid.left_lon), (lat, right)]
+        for lat, right in zip(grid.row_line_lats.tolist(), grid.row_right_lons.tolist())
+    ]
+    track_segments += [
+        [(grid.top_lat, lon), (grid.bottom_lat, lon)]
+        for lon in grid.col_line_lons.tolist()
+    ]
+    return waypoints, track_segments
 
-    # Calculate top-left corner (grid origin)
-    # Move north by half the grid height, west by half the grid width
-    half_height_deg = meters_to_degrees_lat(grid_height_meters / 2)
-    half_width_deg = meters_to_degrees_lon(grid_width_meters / 2, center_lat)
 
-    top_lat = center_lat + half_height_deg
-    left_lon = center_lon - half_width_deg
+def _format_coords(values: np.ndarray) -> List[str]:
+    """Format coordinates with 6 decimals (~0.1 m), as used throughout the GPX"""
+    return np.char.mod("%.6f", values).tolist()
 
-    # Cell dimensions in degrees
-    cell_height_deg = meters_to_degrees_lat(cell_size_meters)
 
-    # Generate waypoints (cell centers)
-    waypoints = []
-    for row in range(rows):
-        # Calculate latitude for this row (move south from top)
-        # Cell center is at half cell size from top edge
-        lat = top_lat - (row * cell_height_deg) - (cell_height_deg / 2)
-
-        # Calculate longitude offset once per row for efficiency
-        cell_width_deg = meters_to_degrees_lon(cell_size_meters, lat)
-
-        for col in range(cols):
-            # Calculate longitude for this column (move east from left)
-            lon = left_lon + (col * cell_width_deg) + (cell_width_deg / 2)
-
-            # Create waypoint label (e.g., A1, B2, C3)
-            col_label = column_label(col)
-            row_label = str(row + 1)
-            name = f"{col_label}{row_label}"
-
-            waypoints.append({
-                "lat": lat,
-                "lon": lon,
-                "name": name
-            })
-
-    # Generate track segments (each line as a separate segment to avoid diagonals)
-    track_segments = []
-
-    # Calculate grid boundaries
-    bottom_lat = top_lat - meters_to_degrees_lat(grid_height_meters)
-
-    # Draw horizontal lines (including top and bottom edges)
-    for row in range(rows + 1):
-        lat = top_lat - (row * cell_height_deg)
-
-        # Calculate longitude at this latitude
-        lon_left = left_lon
-        lon_right = left_lon + meters_to_degrees_lon(grid_width_meters, lat)
-
-        # Each horizontal line is a separate segment
-        track_segments.append([
-            (lat, lon_left),
-            (lat, lon_right)
-        ])
-
-    # Draw vertical lines (including left and right edges)
-    for col in range(cols + 1):
-        # Use a middle latitude for longitude calculation
-        middle_lat = center_lat
-        lon = left_lon + (col * meters_to_degrees_lon(cell_size_meters, middle_lat))
-
-        # Each vertical line is a separate segment
-        track_segments.append([
-            (top_lat, lon),
-            (bottom_lat, lon)
-        ])
+def iter_gpx(
+    grid: GridGeometry,
+    creator: str = "MilenaCRM Field Search Grid Generator",
+    timestamp: Optional[str] = None
+) -> Iterator[str]:
+    """
+    Emit the GPX document for a grid in chunks of text.
+    Suitable for StreamingResponse or for writing to a file.
+    """
+    if timestamp is None:
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    time_line = f"<time>{timestamp}</time>"
+    min_lat, min_lon, max_lat, max_lon = grid.bounds
+
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<gpx xmlns="http://www.topografix.com/GPX/1/1" '
+        'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+        f'creator={quoteattr(creator)} version="1.1" '
+        'xsi:schemaLocation="http://www.topografix.com/GPX/1/1 http://www.topografix.com/GPX/1/1/gpx.xsd">\n'
+        f"<metadata>\n{time_line}\n"
+        f'<bounds minlat="{min_lat:.6f}" minlon="{min_lon:.6f}" maxlat="{max_lat:.6f}" maxlon="{max_lon:.6f}"/>\n'
+        "</metadata>\n"
+    )
+
+    # Waypoints (cell centers), row by row; labels are shared by all rows
+    labels = column_labels(grid.cols)
+    lat_strings = _format_coords(grid.cell_lats)
+    rows_per_chunk = max(1, WAYPOINT_CHUNK_SIZE // max(grid.cols, 1))
+    for start in range(0, grid.rows, rows_per_chunk):
+        stop = min(start + rows_per_chunk, grid.rows)
+        lon_strings = _format_coords(grid.cell_lons[start:stop])
+        parts = []
+        for offset, row_lons in enumerate(lon_strings):
+            row = start + offset
+            lat, number = lat_strings[row], row + 1
+            parts.extend(
+                f'<wpt lat="{lat}" lon="{lon}">\n{time_line}\n<name>{label}{number}</name>\n</wpt>\n'
+                for label, lon in zip(labels, row_lons)
+            )
+        yield "".join(parts)
+
+    # Single track with one segment per grid line - OsmAnd then draws the grid
+    # without diagonal connections
+    yield (
+        "<trk>\n<name>Search Grid</name>\n"
+        f"<desc>{escape(f'Field search grid: {grid.cols}x{grid.rows} cells, {grid.cell_size_meters}m each')}</desc>\n"
+    )
+
+    def segment(lat1: str, lon1: str, lat2: str, lon2: str) -> str:
+        return (
+            f'<trkseg>\n<trkpt lat="{lat1}" lon="{lon1}">\n{time_line}\n</trkpt>\n'
+            f'<trkpt lat="{lat2}" lon="{lon2}">\n{time_line}\n</trkpt>\n</trkseg>\n'
+        )
 
-    return waypoints, track_segments
+    left = f"{grid.left_lon:.6f}"
+    yield "".join(
+        segment(lat, left, lat, right)
+        for lat, right in zip(_format_coords(grid.row_line_lats), _format_coords(grid.row_right_lons))
+    )
+    top, bottom = f"{grid.top_lat:.6f}", f"{grid.bottom_lat:.6f}"
+    yield "".join(segment(top, lon, bottom, lon) for lon in _format_coords(grid.col_line_lons))
+
+    yield "</trk>\n</gpx>"
+
+
+def write_gpx(out: IO[str], grid: GridGeometry, **kwargs) -> None:
+    """Stream the GPX document of a grid into a text file object"""
+    for chunk in iter_gpx(grid, **kwargs):
+        out.write(chunk)
 
 
 def generate_gpx(
@@ -198,7 +319,8 @@ def generate_gpx(
     creator: str = "MilenaCRM Field Search Grid Generator"
 ) -> str:
     """
-    Generate GPX XML content for a search grid.
+    Generate GPX XML content for a search grid as one string.
+    Use compute_grid() with iter_gpx()/write_gpx() to avoid building it in memory.
 
     Args:
         center_lat: Latitude of grid center
@@ -211,78 +333,5 @@ def generate_gpx(
     Returns:
         GPX XML content as a string
     """
-    # Calculate grid points
-    waypoints, track_segments = calculate_grid_points(
-        center_lat, center_lon, cols, rows, cell_size_meters
-    )
-
-    # Calculate bounds
-    all_track_points = [pt for segment in track_segments for pt in segment]
-    all_lats = [wp["lat"] for wp in waypoints] + [pt[0] for pt in all_track_points]
-    all_lons = [wp["lon"] for wp in waypoints] + [pt[1] for pt in all_track_points]
-    min_lat = min(all_lats)
-    max_lat = max(all_lats)
-    min_lon = min(all_lons)
-    max_lon = max(all_lons)
-
-    # Current timestamp in ISO format
-    timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
-
-    # Create GPX root element
-    gpx = Element("gpx")
-    gpx.set("xmlns", "http://www.topografix.com/GPX/1/1")
-    gpx.set("creator", creator)
-    gpx.set("version", "1.1")
-    gpx.set("xmlns:xsi", "http://www.w3.org/2001/XMLSchema-instance")
-    gpx.set("xsi:schemaLocation", "http://www.topografix.com/GPX/1/1 http://www.topografix.com/GPX/1/1/gpx.xsd")
-
-    # Add metadata
-    metadata = SubElement(gpx, "metadata")
-    time_elem = SubElement(metadata, "time")
-    time_elem.text = timestamp
-    bounds = SubElement(metadata, "bounds")
-    bounds.set("minlat", f"{min_lat:.6f}")
-    bounds.set("minlon", f"{min_lon:.6f}")
-    bounds.set("maxlat", f"{max_lat:.6f}")
-    bounds.set("maxlon", f"{max_lon:.6f}")
-
-    # Add waypoints
-    for wp in waypoints:
-        wpt = SubElement(gpx, "wpt")
-        wpt.set("lat", f"{wp['lat']:.6f}")
-        wpt.set("lon", f"{wp['lon']:.6f}")
-
-        wpt_time = SubElement(wpt, "time")
-        wpt_time.text = timestamp
-
-        name = SubElement(wpt, "name")
-        name.text = wp["name"]
-
-    # Add single track with multiple segments (each line as separate segment)
-    # This ensures OsmAnd displays the grid automatically without diagonal connections
-    trk = SubElement(gpx, "trk")
-    trk_name = SubElement(trk, "name")
-    trk_name.text = "Search Grid"
-
-    trk_desc = SubElement(trk, "desc")
-    trk_desc.text = f"Field search grid: {cols}x{rows} cells, {cell_size_meters}m each"
-
-    # Each grid line is a separate segment to avoid diagonal connections
-    for segment in track_segments:
-        trkseg = SubElement(trk, "trkseg")
-        for lat, lon in segment:
-            trkpt = SubElement(trkseg, "trkpt")
-            trkpt.set("lat", f"{lat:.6f}")
-            trkpt.set("lon", f"{lon:.6f}")
-
-            trkpt_time = SubElement(trkpt, "time")
-            trkpt_time.text = timestamp
-
-    # Convert to pretty-printed XML string
-    xml_str = tostring(gpx, encoding="utf-8")
-    dom = minidom.parseString(xml_str)
-    pretty_xml = dom.toprettyxml(indent="", encoding="UTF-8")
-
-    # Remove extra blank lines and return as string
-    lines = [line for line in pretty_xml.decode("utf-8").split("\n") if line.strip()]
-    return "\n".join(lines)
+    grid = compute_grid(center_lat, center_lon, cols, rows, cell_size_meters)
+    return "".join(iter_gpx(grid, creator=creator))
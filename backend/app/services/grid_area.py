@@ -0,0 +1,221 @@
+"""
+Search area polygons for clipping field search grids.
+
+An area is read from an uploaded KML, GPX or GeoJSON file: KML polygons and
+lines, GPX tracks and routes, GeoJSON (Multi)Polygons and lines. Every ring is
+treated as a closed boundary and the rings are combined with the even-odd
+rule, so holes (lakes, fenced-off areas) are excluded.
+
+Clipping works on horizontal bands instead of testing cells one by one. For a
+band between two latitudes, the x-extent of (area ∩ band) is the union of
+
+    the parts of the boundary edges inside the band, and
+    the interior spans on the two band edges (even-odd crossings of a scan line),
+
+computed with NumPy over all edges at once. A cell of that band intersects the
+area exactly when its longitude range overlaps one of the merged spans, which
+is a binary search - the cost grows with rows x edges, not cells x edges.
+"""
+import hashlib
+import json
+import xml.etree.ElementTree as ET
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+# Guard against pathological uploads
+MAX_AREA_VERTICES = 200_000
+
+AREA_EXTENSIONS = {".kml", ".gpx", ".geojson", ".json"}
+
+
+class AreaFileError(ValueError):
+    """File does not contain a usable area polygon"""
+
+
+class AreaPolygon:
+    """Area bounded by one or more rings of (lon, lat) vertices (even-odd rule)"""
+
+    def __init__(self, rings: Sequence[Sequence[Tuple[float, float]]]):
+        arrays = []
+        for ring in rings:
+            points = np.asarray(ring, dtype=float)
+            if points.ndim != 2 or points.shape[0] < 3:
+                continue
+            points = points[:, :2]
+            if not np.array_equal(points[0], points[-1]):
+                points = np.vstack([points, points[:1]])
+            if len(points) >= 4:
+                arrays.append(points)
+        if not arrays:
+            raise AreaFileError("No polygon with at least 3 points found")
+        if sum(len(points) for points in arrays) > MAX_AREA_VERTICES:
+            raise AreaFileError(f"Area has more than {MAX_AREA_VERTICES} vertices")
+
+        self.rings = arrays
+        starts = np.vstack([points[:-1] for points in arrays])
+        ends = np.vstack([points[1:] for points in arrays])
+        self._x0, self._y0 = starts[:, 0], starts[:, 1]
+        self._x1, self._y1 = ends[:, 0], ends[:, 1]
+        self._y_min = np.minimum(self._y0, self._y1)
+        self._y_max = np.maximum(self._y0, self._y1)
+
+    @property
+    def bounds(self) -> Tuple[float, float, float, float]:
+        """(min_lat, min_lon, max_lat, max_lon)"""
+        points = np.vstack(self.rings)
+        return (
+            float(points[:, 1].min()), float(points[:, 0].min()),
+            float(points[:, 1].max()), float(points[:, 0].max()),
+        )
+
+    def scanline_spans(self, y: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Interior spans (starts, ends) of the horizontal line at latitude y"""
+        # Half-open rule: a vertex on the line is counted once
+        crossing = (self._y0 <= y) != (self._y1 <= y)
+        x0, y0 = self._x0[crossing], self._y0[crossing]
+        xs = np.sort(x0 + (y - y0) * (self._x1[crossing] - x0) / (self._y1[crossing] - y0))
+        return xs[0::2], xs[1::2]
+
+    def contains(self, lons: np.ndarray, lat: float) -> np.ndarray:
+        """Point-in-polygon test for points on one latitude (even-odd crossings)"""
+        starts, ends = self.scanline_spans(lat)
+        if not len(starts):
+            return np.zeros(len(lons), dtype=bool)
+        index = np.searchsorted(starts, lons, side="right") - 1
+        return (index >= 0) & (lons <= ends[np.maximum(index, 0)])
+
+    def band_spans(self, y_bottom: float, y_top: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Merged x-spans (starts, ends) of the area inside a latitude band"""
+        inside = (self._y_max >= y_bottom) & (self._y_min <= y_top)
+        x0, y0, x1, y1 = self._x0[inside], self._y0[inside], self._x1[inside], self._y1[inside]
+
+        # Clip each edge to the band; horizontal edges keep their full extent
+        dy = y1 - y0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t_bottom = np.where(dy != 0, (y_bottom - y0) / dy, 0.0)
+            t_top = np.where(dy != 0, (y_top - y0) / dy, 1.0)
+        t_start = np.clip(np.minimum(t_bottom, t_top), 0.0, 1.0)
+        t_end = np.clip(np.maximum(t_bottom, t_top), 0.0, 1.0)
+        xa, xb = x0 + t_start * (x1 - x0), x0 + t_end * (x1 - x0)
+
+        bottom_starts, bottom_ends = self.scanline_spans(y_bottom)
+        top_starts, top_ends = self.scanline_spans(y_top)
+        starts = np.concatenate([np.minimum(xa, xb), bottom_starts, top_starts])
+        ends = np.concatenate([np.maximum(xa, xb), bottom_ends, top_ends])
+        return merge_spans(starts, ends)
+
+    def overlaps_band(self, y_bottom: float, y_top: float, x_starts: np.ndarray, x_ends: np.ndarray) -> np.ndarray:
+        """Which of the boxes [x_starts, x_ends] x [y_bottom, y_top] intersect the area"""
+        starts, ends = self.band_spans(y_bottom, y_top)
+        if not len(starts):
+            return np.zeros(len(x_starts), dtype=bool)
+        index = np.searchsorted(starts, x_ends, side="right") - 1
+        return (index >= 0) & (ends[np.maximum(index, 0)] >= x_starts)
+
+
+def merge_spans(starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Union of intervals as sorted, disjoint (starts, ends)"""
+    if not len(starts):
+        return starts, ends
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], np.maximum.accumulate(ends[order])
+    # A new span begins where the start lies beyond everything seen so far
+    new_span = np.ones(len(starts), dtype=bool)
+    new_span[1:] = starts[1:] > ends[:-1]
+    last = np.append(np.flatnonzero(new_span)[1:] - 1, len(starts) - 1)
+    return starts[new_span], ends[last]
+
+
+def _parse_coordinates(text: str) -> List[Tuple[float, float]]:
+    points = []
+    for item in (text or "").split():
+        values = item.split(",")
+        if len(values) >= 2:
+            points.append((float(values[0]), float(values[1])))
+    return points
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _rings_from_kml(root: ET.Element) -> List[List[Tuple[float, float]]]:
+    rings = []
+    for element in root.iter():
+        if _local_name(element.tag) == "coordinates":
+            points = _parse_coordinates(element.text)
+            if len(points) >= 3:
+                rings.append(points)
+    return rings
+
+
+def _rings_from_gpx(root: ET.Element) -> List[List[Tuple[float, float]]]:
+    rings = []
+    for element in root.iter():
+        if _local_name(element.tag) not in ("trkseg", "rte"):
+            continue
+        points = [
+            (float(point.get("lon")), float(point.get("lat")))
+            for point in element
+            if _local_name(point.tag) in ("trkpt", "rtept")
+        ]
+        if len(points) >= 3:
+            rings.append(points)
+    return rings
+
+
+def _rings_from_geojson(data) -> List[List[Tuple[float, float]]]:
+    if not isinstance(data, dict):
+        return []
+    kind = data.get("type")
+    if kind == "FeatureCollection":
+        return [ring for feature in data.get("features") or [] for ring in _rings_from_geojson(feature)]
+    if kind == "Feature":
+        return _rings_from_geojson(data.get("geometry"))
+    if kind == "GeometryCollection":
+        return [ring for geometry in data.get("geometries") or [] for ring in _rings_from_geojson(geometry)]
+    coordinates = data.get("coordinates") or []
+    if kind == "Polygon" or kind == "MultiLineString":
+        return [list(ring) for ring in coordinates]
+    if kind == "MultiPolygon":
+        return [list(ring) for polygon in coordinates for ring in polygon]
+    if kind == "LineString":
+        return [list(coordinates)]
+    return []
+
+
+def parse_area(data: bytes, suffix: str) -> AreaPolygon:
+    """Area from the content of a KML, GPX or GeoJSON file (suffix: file extension)"""
+    suffix = suffix.lower()
+    try:
+        if suffix in (".geojson", ".json"):
+            rings = _rings_from_geojson(json.loads(data))
+        elif suffix == ".kml":
+            rings = _rings_from_kml(ET.fromstring(data))
+        elif suffix == ".gpx":
+            rings = _rings_from_gpx(ET.fromstring(data))
+        else:
+            raise AreaFileError(f"Unsupported area file type: {suffix}")
+    except AreaFileError:
+        raise
+    except (ET.ParseError, ValueError, TypeError) as e:
+        raise AreaFileError(f"Could not read area file: {e}")
+    return AreaPolygon(rings)
+
+
+@lru_cache(maxsize=16)
+def _load_area(path: str, mtime_ns: int, size: int) -> Tuple[AreaPolygon, str]:
+    data = Path(path).read_bytes()
+    return parse_area(data, Path(path).suffix), hashlib.sha256(data).hexdigest()
+
+
+def load_area(path: Path) -> Tuple[AreaPolygon, str]:
+    """
+    Area of a file and the SHA-256 of its content. Parsed once per file
+    version - grid tiles of the same area are requested in bursts.
+    """
+    stat = path.stat()
+    return _load_area(str(path), stat.st_mtime_ns, stat.st_size)
@@ -0,0 +1,204 @@
+"""
+Search grid cells: square or hexagonal, optionally clipped to an area.
+
+A GridCells holds every cell as a center and a counter-clockwise outline
+(4 or 6 vertices), all as NumPy arrays, so the export writers and the tile
+renderer handle rectangular, clipped and hexagonal grids alike.
+
+Cells are laid out on a lattice of cols x rows and named after their lattice
+position (A1, B1, ...), also when clipping removes some of them - names stay
+stable when the area is edited. Hexagons are pointy-topped, odd rows shifted
+east by half a cell; cell_size is the distance between neighbouring centers.
+"""
+import math
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.services.gpx_service import (
+    METERS_PER_DEGREE, GridGeometry, column_labels, compute_grid, meters_to_degrees_lat, meters_to_degrees_lon
+)
+from app.services.grid_area import AreaPolygon
+
+GRID_SHAPES = ("square", "hex")
+
+# Lattice size limit for grids derived from an area (before clipping)
+MAX_AREA_GRID_CELLS = 500_000
+
+# Hexagon corners, counter-clockwise from the upper right (pointy-topped)
+_HEX_ANGLES = np.radians(30.0 + 60.0 * np.arange(6))
+
+
+@dataclass
+class GridCells:
+    """Cells of a grid, ordered by row and column"""
+    shape: str
+    cols: int                   # lattice size
+    rows: int
+    cell_size_meters: float
+    row_index: np.ndarray       # (n,)
+    col_index: np.ndarray       # (n,)
+    center_lats: np.ndarray     # (n,)
+    center_lons: np.ndarray     # (n,)
+    ring_lats: np.ndarray       # (n, vertices), counter-clockwise
+    ring_lons: np.ndarray       # (n, vertices)
+
+    def __len__(self) -> int:
+        return len(self.row_index)
+
+    @property
+    def names(self) -> List[str]:
+        labels = column_labels(self.cols)
+        return [f"{labels[col]}{row + 1}" for row, col in zip(self.row_index.tolist(), self.col_index.tolist())]
+
+    @property
+    def bounds(self) -> Tuple[float, float, float, float]:
+        """(min_lat, min_lon, max_lat, max_lon) of all outlines"""
+        if not len(self):
+            return 0.0, 0.0, 0.0, 0.0
+        return (
+            float(self.ring_lats.min()), float(self.ring_lons.min()),
+            float(self.ring_lats.max()), float(self.ring_lons.max()),
+        )
+
+    def subset(self, mask: np.ndarray) -> "GridCells":
+        return GridCells(
+            shape=self.shape,
+            cols=self.cols,
+            rows=self.rows,
+            cell_size_meters=self.cell_size_meters,
+            row_index=self.row_index[mask],
+            col_index=self.col_index[mask],
+            center_lats=self.center_lats[mask],
+            center_lons=self.center_lons[mask],
+            ring_lats=self.ring_lats[mask],
+            ring_lons=self.ring_lons[mask],
+        )
+
+
+def square_cells(grid: GridGeometry) -> GridCells:
+    """Cells of a rectangular grid (widths follow the row latitude, as in compute_grid)"""
+    rows, cols = np.divmod(np.arange(grid.rows * grid.cols), grid.cols)
+    widths = grid.cell_widths[rows]
+    left = grid.left_lon + cols * widths
+    right = grid.left_lon + (cols + 1) * widths
+    top = grid.top_lat - rows * grid.cell_height
+    bottom = grid.top_lat - (rows + 1) * grid.cell_height
+    return GridCells(
+        shape="square",
+        cols=grid.cols,
+        rows=grid.rows,
+        cell_size_meters=grid.cell_size_meters,
+        row_index=rows,
+        col_index=cols,
+        center_lats=grid.cell_lats[rows],
+        center_lons=grid.cell_lons.ravel(),
+        ring_lats=np.stack([top, bottom, bottom, top], axis=1),
+        ring_lons=np.stack([left, left, right, right], axis=1),
+    )
+
+
+def hex_cells(center_lat: float, center_lon: float, cols: int, rows: int, cell_size_meters: float) -> GridCells:
+    """Cells of a hexagonal grid centered on a point"""
+    radius = cell_size_meters / math.sqrt(3)
+    row_step = 1.5 * radius
+    width = (cols + 0.5) * cell_size_meters
+    height = 2 * radius + (rows - 1) * row_step
+
+    rows_index, cols_index = np.divmod(np.arange(rows * cols), cols)
+    # Local plane in meters around the center (east, north)
+    xs = -width / 2 + (cols_index + 0.5 + 0.5 * (rows_index % 2)) * cell_size_meters
+    ys = height / 2 - radius - rows_index * row_step
+
+    lat_per_meter = meters_to_degrees_lat(1.0)
+    lon_per_meter = meters_to_degrees_lon(1.0, center_lat)
+    center_lats = center_lat + ys * lat_per_meter
+    center_lons = center_lon + xs * lon_per_meter
+    return GridCells(
+        shape="hex",
+        cols=cols,
+        rows=rows,
+        cell_size_meters=cell_size_meters,
+        row_index=rows_index,
+        col_index=cols_index,
+        center_lats=center_lats,
+        center_lons=center_lons,
+        ring_lats=center_lats[:, np.newaxis] + radius * np.sin(_HEX_ANGLES) * lat_per_meter,
+        ring_lons=center_lons[:, np.newaxis] + radius * np.cos(_HEX_ANGLES) * lon_per_meter,
+    )
+
+
+def clip_cells(cells: GridCells, area: AreaPolygon) -> GridCells:
+    """
+    Cells intersecting the area, tested one row at a time (see grid_area).
+    Square cells are tested exactly; hexagons by their bounding box, so a
+    hexagon whose corner region barely misses the area may be kept.
+    """
+    if not len(cells):
+        return cells
+    lat_min, lat_max = cells.ring_lats.min(axis=1), cells.ring_lats.max(axis=1)
+    lon_min, lon_max = cells.ring_lons.min(axis=1), cells.ring_lons.max(axis=1)
+    min_lat, _, max_lat, _ = area.bounds
+
+    keep = np.zeros(len(cells), dtype=bool)
+    row_starts = np.flatnonzero(np.diff(cells.row_index, prepend=-1))
+    row_ends = np.append(row_starts[1:], len(cells))
+    for start, end in zip(row_starts.tolist(), row_ends.tolist()):
+        bottom, top = lat_min[start], lat_max[start]
+        if top < min_lat or bottom > max_lat:
+            continue
+        keep[start:end] = area.overlaps_band(bottom, top, lon_min[start:end], lon_max[start:end])
+    return cells.subset(keep)
+
+
+def area_layout(area: AreaPolygon, cell_size_meters: float, shape: str) -> Tuple[float, float, int, int]:
+    """
+    (center_lat, center_lon, cols, rows) of the smallest lattice covering an
+    area's bounding box. Raises ValueError when it would exceed MAX_AREA_GRID_CELLS.
+    """
+    min_lat, min_lon, max_lat, max_lon = area.bounds
+    center_lat, center_lon = (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+    height = (max_lat - min_lat) * METERS_PER_DEGREE
+
+    if shape == "hex":
+        radius = cell_size_meters / math.sqrt(3)
+        width = (max_lon - min_lon) * METERS_PER_DEGREE * math.cos(math.radians(center_lat))
+        # Offset rows cover the whole width only from the middle of the first cell on
+        cols = max(1, math.ceil(width / cell_size_meters + 0.5))
+        rows = max(1, math.ceil((height - radius) / (1.5 * radius)) + 1)
+    else:
+        rows = max(1, math.ceil(height / cell_size_meters))
+        # Rows are as wide in meters as the center row, i.e. narrower in degrees
+        # towards the equator - widen until the row closest to it still covers the area
+        equator_lat = 0.0 if min_lat <= 0 <= max_lat else min(abs(min_lat), abs(max_lat))
+        cols = max(1, math.ceil((max_lon - min_lon) * METERS_PER_DEGREE * math.cos(math.radians(center_lat)) / cell_size_meters))
+        while True:
+            left = center_lon - meters_to_degrees_lon(cols * cell_size_meters / 2, center_lat)
+            if left + meters_to_degrees_lon(cols * cell_size_meters, equator_lat) >= max_lon:
+                break
+            cols += 1
+
+    if cols * rows > MAX_AREA_GRID_CELLS:
+        raise ValueError(
+            f"Area needs {cols}x{rows} cells of {cell_size_meters:g} m; "
+            f"use larger cells (at most {MAX_AREA_GRID_CELLS} cells)"
+        )
+    return center_lat, center_lon, cols, rows
+
+
+def build_cells(
+    center_lat: float,
+    center_lon: float,
+    cols: int,
+    rows: int,
+    cell_size_meters: float,
+    shape: str = "square",
+    area: Optional[AreaPolygon] = None
+) -> GridCells:
+    """Cells of a lattice, keeping only those intersecting the area if one is given"""
+    if shape == "hex":
+        cells = hex_cells(center_lat, center_lon, cols, rows, cell_size_meters)
+    else:
+        cells = square_cells(compute_grid(center_lat, center_lon, cols, rows, cell_size_meters))
+    return clip_cells(cells, area) if area is not None else cells
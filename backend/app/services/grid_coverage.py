@@ -0,0 +1,361 @@
+"""
+Coverage of field search grid cells by uploaded GPS tracks.
+
+A track sweeps a strip of sweep_width meters (the distance searchers keep
+to each other). Coverage is measured on a lattice of small square pixels
+(a quarter of the sweep width) in a local metric plane around the grid:
+
+    tracks are densified to one point per pixel step (gaps longer than
+    MAX_SEGMENT_METERS are GPS dropouts and not walked) and points outside
+    the grid are dropped,
+    every point marks the pixels whose centers lie within half the sweep
+    width (a stencil of candidate offsets, filtered by exact distance) in a
+    boolean raster over the grid,
+    each covered pixel is mapped to its cell arithmetically (row/column for
+    square cells, hex rounding for hexagons) - the raster doubles as the
+    spatial index, no cell is ever compared with a track,
+    covered area / cell area gives the cell's coverage.
+
+The cost follows the total track length, not the number of tracks or cells.
+Jobs run in a process pool; the result is stored on the
+field search and bulk-applied to the grid cells assigned to it: cells
+reaching COVERAGE_COMPLETED_PERCENT become completed, other touched cells
+in_progress (statuses are never lowered). Track uploads arriving while a job
+runs are coalesced into one follow-up job.
+"""
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.logging_config import get_logger
+from app.services.gpx_service import METERS_PER_DEGREE
+from app.services.grid_export import GridParams
+from app.services.storage import ensure_local, key_from_url
+from app.services.tracks import TRACK_EXTENSIONS, Track, TrackFileError, read_tracks
+
+logger = get_logger(__name__)
+
+COVERAGE_SWEEP_WIDTH = float(os.getenv("COVERAGE_SWEEP_WIDTH", "20"))
+COVERAGE_COMPLETED_PERCENT = float(os.getenv("COVERAGE_COMPLETED_PERCENT", "80"))
+COVERAGE_WORKERS = int(os.getenv("COVERAGE_WORKERS", "1"))
+
+# Consecutive track points further apart are not connected
+MAX_SEGMENT_METERS = 500.0
+# Smallest pixel side (very narrow sweep widths)
+MIN_RESOLUTION_METERS = 0.5
+# Stamped pixels per vectorized step (bounds temporary memory)
+STAMP_CHUNK_SIZE = 1 << 22
+# Coverage raster size limit - very large grids get coarser pixels
+MAX_RASTER_PIXELS = 64_000_000
+
+_pool: Optional[ProcessPoolExecutor] = None
+# Reentrant: a future that is already done runs its callback inside _submit
+_lock = threading.RLock()
+# Field searches with a running job, and the newest job waiting behind it
+_running: Dict[int, Future] = {}
+_queued: Dict[int, Tuple[GridParams, List[str], float]] = {}
+
+
+def _densify(xs: np.ndarray, ys: np.ndarray, step: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Points along a polyline at most `step` apart (original points included)"""
+    if len(xs) < 2:
+        return xs, ys
+    dx, dy = np.diff(xs), np.diff(ys)
+    lengths = np.hypot(dx, dy)
+    counts = np.where(lengths <= MAX_SEGMENT_METERS, np.ceil(lengths / step), 0).astype(np.int64)
+    segment = np.repeat(np.arange(len(dx)), counts)
+    offsets = np.arange(len(segment)) - np.repeat(np.cumsum(counts) - counts, counts)
+    t = offsets / np.maximum(counts[segment], 1)
+    return (
+        np.concatenate([xs[segment] + t * dx[segment], xs]),
+        np.concatenate([ys[segment] + t * dy[segment], ys]),
+    )
+
+
+def covered_pixels(
+    tracks: List[Track],
+    center_lat: float,
+    center_lon: float,
+    radius: float,
+    resolution: float,
+    extent: Tuple[float, float, float, float],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Columns and rows of the pixels inside extent (min_x, min_y, max_x, max_y)
+    whose centers lie within `radius` meters of a track, in the plane
+    x = east, y = north of the center; pixel (0, 0) starts at the origin.
+    """
+    meters_per_lon = METERS_PER_DEGREE * math.cos(math.radians(center_lat))
+    min_x, min_y, max_x, max_y = extent
+    first_col, first_row = math.floor(min_x / resolution), math.floor(min_y / resolution)
+    covered = np.zeros(
+        (math.floor(max_y / resolution) - first_row + 1, math.floor(max_x / resolution) - first_col + 1),
+        dtype=bool,
+    )
+
+    # Pixel offsets around a point's pixel that can be within reach of it
+    reach = radius / resolution
+    span = np.arange(-math.ceil(reach) - 1, math.ceil(reach) + 2)
+    offset_x, offset_y = (values.ravel() for values in np.meshgrid(span, span))
+    possible = np.maximum(np.abs(offset_x) - 1, 0) ** 2 + np.maximum(np.abs(offset_y) - 1, 0) ** 2 <= reach ** 2
+    offset_x, offset_y = offset_x[possible], offset_y[possible]
+    chunk = max(1, STAMP_CHUNK_SIZE // len(offset_x))
+
+    for track in tracks:
+        xs = (track.lons - center_lon) * meters_per_lon
+        ys = (track.lats - center_lat) * METERS_PER_DEGREE
+        xs, ys = _densify(xs, ys, resolution)
+        near = (xs >= min_x - radius) & (xs <= max_x + radius) & (ys >= min_y - radius) & (ys <= max_y + radius)
+        xs, ys = xs[near, np.newaxis], ys[near, np.newaxis]
+        for start in range(0, len(xs), chunk):
+            x, y = xs[start:start + chunk], ys[start:start + chunk]
+            cols = np.floor(x / resolution).astype(np.int64) + offset_x
+            rows = np.floor(y / resolution).astype(np.int64) + offset_y
+            hit = ((cols + 0.5) * resolution - x) ** 2 + ((rows + 0.5) * resolution - y) ** 2 <= radius ** 2
+            cols, rows = cols[hit] - first_col, rows[hit] - first_row
+            inside = (cols >= 0) & (cols < covered.shape[1]) & (rows >= 0) & (rows < covered.shape[0])
+            covered[rows[inside], cols[inside]] = True
+
+    rows, cols = np.nonzero(covered)
+    return cols + first_col, rows + first_row
+
+
+def _square_lattice(params: GridParams, lons: np.ndarray, lats: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    grid = params.geometry()
+    rows = np.floor((grid.top_lat - lats) / grid.cell_height).astype(np.int64)
+    widths = grid.cell_widths[np.clip(rows, 0, grid.rows - 1)]
+    cols = np.floor((lons - grid.left_lon) / widths).astype(np.int64)
+    return rows, cols
+
+
+def _hex_lattice(params: GridParams, xs: np.ndarray, ys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Odd-r offset coordinates of the hexagons containing points (see grid_cells.hex_cells)"""
+    size = params.cell_size
+    radius = size / math.sqrt(3)
+    width = (params.cols + 0.5) * size
+    height = 2 * radius + (params.rows - 1) * 1.5 * radius
+    # Relative to the center of cell (0, 0), y growing with the row number
+    x = xs - (-width / 2 + 0.5 * size)
+    y = (height / 2 - radius) - ys
+
+    # Axial coordinates, rounded in cube space
+    q = (math.sqrt(3) / 3 * x - y / 3) / radius
+    r = (2 / 3 * y) / radius
+    s = -q - r
+    rq, rr, rs = np.rint(q), np.rint(r), np.rint(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+
+    rows = rr.astype(np.int64)
+    cols = rq.astype(np.int64) + (rows - (rows & 1)) // 2
+    return rows, cols
+
+
+def cell_coverage(params: GridParams, tracks: List[Track], sweep_width: float) -> np.ndarray:
+    """Covered fraction (0..1) of every cell of params.cells(), in that order"""
+    cells = params.cells()
+    if not len(cells):
+        return np.zeros(0)
+    meters_per_lon = METERS_PER_DEGREE * math.cos(math.radians(params.center_lat))
+    ring_xs = (cells.ring_lons - params.center_lon) * meters_per_lon
+    ring_ys = (cells.ring_lats - params.center_lat) * METERS_PER_DEGREE
+    extent = (float(ring_xs.min()), float(ring_ys.min()), float(ring_xs.max()), float(ring_ys.max()))
+
+    area = (extent[2] - extent[0]) * (extent[3] - extent[1])
+    resolution = max(sweep_width / 4, MIN_RESOLUTION_METERS, math.sqrt(area / MAX_RASTER_PIXELS))
+    px, py = covered_pixels(tracks, params.center_lat, params.center_lon, sweep_width / 2, resolution, extent)
+
+    # Pixel centers -> lattice position -> cell index
+    xs, ys = (px + 0.5) * resolution, (py + 0.5) * resolution
+    if params.shape == "hex":
+        rows, cols = _hex_lattice(params, xs, ys)
+    else:
+        rows, cols = _square_lattice(params, params.center_lon + xs / meters_per_lon, params.center_lat + ys / METERS_PER_DEGREE)
+    on_lattice = (rows >= 0) & (rows < params.rows) & (cols >= 0) & (cols < params.cols)
+    lookup = np.full((params.rows, params.cols), -1, dtype=np.int64)
+    lookup[cells.row_index, cells.col_index] = np.arange(len(cells))
+    index = lookup[rows[on_lattice], cols[on_lattice]]
+    counts = np.bincount(index[index >= 0], minlength=len(cells))
+
+    # Cell area in the same plane (a hexagon fills 3/4 of its bounding box)
+    areas = np.ptp(ring_xs, axis=1) * np.ptp(ring_ys, axis=1) * (0.75 if params.shape == "hex" else 1.0)
+    return np.minimum(counts * resolution ** 2 / areas, 1.0)
+
+
+def compute_coverage(params: GridParams, track_keys: List[str], sweep_width: float) -> Dict:
+    """
+    Coverage of a grid by the tracks stored under track_keys. Runs inside a
+    pool worker process; unreadable tracks are skipped.
+    """
+    tracks: List[Track] = []
+    for key in track_keys:
+        try:
+            path = ensure_local(key)
+            if path is not None:
+                tracks.extend(read_tracks(path))
+        except (OSError, TrackFileError) as e:
+            logger.warning(f"Skipping track {key}: {e}")
+
+    fractions = cell_coverage(params, tracks, sweep_width)
+    cells = params.cells()
+    areas = np.ptp(cells.ring_lons, axis=1) * np.ptp(cells.ring_lats, axis=1)
+    percent = float((fractions * areas).sum() / areas.sum() * 100) if len(cells) else 0.0
+    covered = np.flatnonzero(fractions > 0)
+    names = cells.names
+    return {
+        "grid_key": params.key,
+        "percent": round(percent, 1),
+        "cells": {names[i]: round(float(fractions[i]) * 100, 1) for i in covered.tolist()},
+    }
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Lazily create the shared coverage pool"""
+    global _pool
+    if _pool is None:
+        # spawn: forking a multi-threaded server process is not safe
+        _pool = ProcessPoolExecutor(
+            max_workers=COVERAGE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_pool() -> None:
+    """Stop the coverage pool (application shutdown)"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def cell_status(current: str, percent: float) -> str:
+    """Status of a grid cell after a coverage update (never lowered)"""
+    if percent >= COVERAGE_COMPLETED_PERCENT:
+        return "completed"
+    if percent > 0 and current in ("unassigned", "assigned"):
+        return "in_progress"
+    return current
+
+
+def record_coverage(field_search_id: int, result: Dict) -> None:
+    """Store a coverage result and apply it to the grid cells assigned to the field search"""
+    from sqlalchemy import update
+
+    from app.db import SessionLocal
+    from app.models.field_search import FieldSearch
+    from app.models.map_grid import GridCell, GridCellStatus, MapGrid
+    from app.services import live_updates
+    from app.services.grid_state import sync_from_cells
+    from app.services.sync_versions import next_version
+
+    db = SessionLocal()
+    try:
+        field_search = db.query(FieldSearch).filter(FieldSearch.id == field_search_id).first()
+        if field_search is None:
+            return
+        field_search.grid_coverage = {"grid_key": result["grid_key"], "cells": result["cells"]}
+        field_search.grid_coverage_percent = result["percent"]
+        field_search.grid_coverage_updated_at = datetime.now(timezone.utc)
+        field_search_version = next_version(db, FieldSearch, field_search_id, fields=True)
+
+        coverage = result["cells"]
+        assigned = db.query(
+            GridCell.id, GridCell.map_grid_id, GridCell.cell_code, GridCell.status, GridCell.coverage
+        ).filter(
+            GridCell.assigned_to_field_search_id == field_search_id
+        ).all()
+        # Only cells whose coverage or status changes are written (and synced again)
+        changed: Dict[int, List[Dict]] = {}
+        for cell_id, map_grid_id, code, status, old_coverage in assigned:
+            percent = coverage.get(code, 0.0)
+            new_status = GridCellStatus(cell_status(status.value, percent))
+            if percent != old_coverage or new_status != status:
+                changed.setdefault(map_grid_id, []).append({"id": cell_id, "coverage": percent, "status": new_status})
+        mappings = []
+        versions = {}
+        for map_grid_id, cells in sorted(changed.items()):
+            versions[map_grid_id] = version = next_version(db, MapGrid, map_grid_id)
+            changed[map_grid_id] = [{**cell, "version": version} for cell in cells]
+            mappings += changed[map_grid_id]
+        if mappings:
+            # One executemany UPDATE by primary key for all cells
+            db.execute(update(GridCell), mappings)
+        codes = {cell_id: code for cell_id, _, code, _, _ in assigned}
+        for map_grid_id, cells in changed.items():
+            sync_from_cells(db, map_grid_id, {codes[cell["id"]] for cell in cells})
+        searches = dict(db.query(MapGrid.id, MapGrid.search_id).filter(MapGrid.id.in_(changed.keys())).all())
+        db.commit()
+
+        live_updates.publish(
+            field_search_id, "field_search", {"version": field_search_version, "fields": ["grid_coverage"]}
+        )
+        for map_grid_id, cells in changed.items():
+            live_updates.publish_cells(db, searches[map_grid_id], map_grid_id, versions[map_grid_id], cells)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Could not record grid coverage of field search {field_search_id}: {e}")
+    finally:
+        db.close()
+
+
+def _submit(field_search_id: int, params: GridParams, track_keys: List[str], sweep_width: float) -> None:
+    future = get_pool().submit(compute_coverage, params, track_keys, sweep_width)
+    _running[field_search_id] = future
+    future.add_done_callback(lambda f: _on_done(field_search_id, f))
+
+
+def _on_done(field_search_id: int, future: Future) -> None:
+    if not future.cancelled():
+        exc = future.exception()
+        if exc is not None:
+            logger.warning(f"Grid coverage failed for field search {field_search_id}: {exc}")
+        else:
+            record_coverage(field_search_id, future.result())
+    with _lock:
+        _running.pop(field_search_id, None)
+        job = _queued.pop(field_search_id, None)
+        if job is not None and not future.cancelled():
+            try:
+                _submit(field_search_id, *job)
+            except Exception as e:
+                logger.warning(f"Could not schedule grid coverage for field search {field_search_id}: {e}")
+
+
+def schedule_coverage(
+    field_search_id: int,
+    params: GridParams,
+    track_urls: List[str],
+    sweep_width: Optional[float] = None
+) -> None:
+    """
+    Recompute a field search's coverage in the background (fire and forget).
+    While a job for it runs, only the newest request is kept and run next.
+    """
+    track_keys = [
+        key for key in (key_from_url(url) for url in track_urls or [])
+        if key is not None and os.path.splitext(key)[1].lower() in TRACK_EXTENSIONS
+    ]
+    job = (params, track_keys, float(sweep_width or COVERAGE_SWEEP_WIDTH))
+    with _lock:
+        if field_search_id in _running:
+            _queued[field_search_id] = job
+            return
+        try:
+            _submit(field_search_id, *job)
+        except Exception as e:
+            logger.warning(f"Could not schedule grid coverage for field search {field_search_id}: {e}")
+
+
+def is_pending(field_search_id: int) -> bool:
+    """Check whether a coverage job for a field search is queued or running"""
+    return field_search_id in _running or field_search_id in _queued
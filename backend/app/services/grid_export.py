@@ -0,0 +1,449 @@
+"""
+Export of field search grids: GPX, KML, GeoJSON and vector tiles.
+
+All formats are rendered from the grid's cells (see grid_cells) and cached on
+disk under a hash of the grid parameters:
+
+    UPLOAD_DIR/.grid-cache/<params hash>/grid.gpx
+                                        /grid.kml
+                                        /grid.geojson
+                                        /tiles/<z>/<x>/<y>.pbf
+
+so a grid is computed once per parameter set no matter how often it is
+downloaded, and its outputs never change - the hash doubles as ETag. Changing
+any parameter yields a new hash and thus new files and validators. Grids
+clipped to an area are keyed by the area file's content hash.
+
+Plain rectangular grids keep the line-based GPX and KML layout (one line per
+grid line); clipped and hexagonal grids outline every cell instead.
+
+Vector tiles (Mapbox Vector Tile, layers "cells" and "labels") let web maps
+load only the visible part of large grids. Tiles are rendered on first
+request and cached like the other formats. Cache entries not used for
+GRID_CACHE_DAYS are pruned by the upload collector.
+"""
+import hashlib
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, IO, Iterator, Optional, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+
+from app.core.logging_config import get_logger
+from app.services import upload_service
+from app.services.gpx_service import WAYPOINT_CHUNK_SIZE, GridGeometry, column_labels, compute_grid, iter_gpx
+from app.services.grid_area import AreaPolygon
+from app.services.grid_cells import GridCells, area_layout, build_cells
+from app.services.vector_tiles import (
+    TILE_BUFFER, TILE_EXTENT, Layer, encode_tile, tile_bounds
+)
+
+logger = get_logger(__name__)
+
+# Bump when the output of any writer changes - invalidates all cache entries
+EXPORT_VERSION = 2
+
+GRID_CACHE_DAYS = int(os.getenv("GRID_CACHE_DAYS", "30"))
+
+# Format -> (file extension, media type)
+GRID_FORMATS: Dict[str, Tuple[str, str]] = {
+    "gpx": (".gpx", "application/gpx+xml"),
+    "kml": (".kml", "application/vnd.google-earth.kml+xml"),
+    "geojson": (".geojson", "application/geo+json"),
+}
+TILE_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+
+# Cells smaller than this (in 256 px tile pixels) are not drawn - sets the min zoom
+MIN_CELL_PIXELS = 4
+# Zoom levels with tiles above the min zoom; maps overzoom the last level
+TILE_ZOOM_LEVELS = 5
+MAX_TILE_ZOOM = 20
+
+
+def grid_cache_dir() -> Path:
+    return upload_service.UPLOAD_DIR / ".grid-cache"
+
+
+@dataclass(frozen=True)
+class GridParams:
+    """
+    Parameters that fully determine a grid. A grid clipped to an area carries
+    the area (not part of the key) and its file's content hash (part of it).
+    """
+    center_lat: float
+    center_lon: float
+    cols: int
+    rows: int
+    cell_size: float
+    shape: str = "square"
+    area_sha256: Optional[str] = None
+    area: Optional[AreaPolygon] = field(default=None, compare=False, repr=False)
+
+    @classmethod
+    def for_area(cls, area: AreaPolygon, area_sha256: str, cell_size: float, shape: str = "square") -> "GridParams":
+        """Grid covering an area (ValueError if it needs too many cells)"""
+        center_lat, center_lon, cols, rows = area_layout(area, cell_size, shape)
+        return cls(center_lat, center_lon, cols, rows, cell_size, shape, area_sha256, area)
+
+    @property
+    def key(self) -> str:
+        """Hash of the parameters (cache key, ETag and file name part)"""
+        payload = {
+            "version": EXPORT_VERSION,
+            "center_lat": self.center_lat,
+            "center_lon": self.center_lon,
+            "cols": self.cols,
+            "rows": self.rows,
+            "cell_size": self.cell_size,
+        }
+        if self.shape != "square" or self.area_sha256:
+            payload.update(shape=self.shape, area_sha256=self.area_sha256)
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    @property
+    def is_rectangle(self) -> bool:
+        """Plain rectangle of square cells (drawn with grid lines)"""
+        return self.shape == "square" and self.area is None
+
+    def geometry(self) -> GridGeometry:
+        return compute_grid(self.center_lat, self.center_lon, self.cols, self.rows, self.cell_size)
+
+    def cells(self) -> GridCells:
+        return _cells(self)
+
+    @property
+    def zoom_range(self) -> Tuple[int, int]:
+        """Zoom levels tiles are served for"""
+        # Ground resolution of a 256 px tile pixel at zoom 0, at the grid latitude
+        meters_per_pixel = 156543.03392 * math.cos(math.radians(self.center_lat))
+        min_zoom = math.ceil(math.log2(MIN_CELL_PIXELS * meters_per_pixel / self.cell_size))
+        min_zoom = max(0, min(min_zoom, MAX_TILE_ZOOM))
+        return min_zoom, min(min_zoom + TILE_ZOOM_LEVELS - 1, MAX_TILE_ZOOM)
+
+
+def _coord(value: float) -> str:
+    return f"{value:.6f}"
+
+
+def iter_kml(grid: GridGeometry, name: str = "Search Grid") -> Iterator[str]:
+    """KML document: one placemark per cell center and the grid lines"""
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<kml xmlns="http://www.opengis.net/kml/2.2">\n<Document>\n'
+        f"<name>{escape(name)}</name>\n"
+        '<Style id="grid"><LineStyle><color>ff0000ff</color><width>2</width></LineStyle></Style>\n'
+        "<Folder>\n<name>Cells</name>\n"
+    )
+    labels = column_labels(grid.cols)
+    lats = np.char.mod("%.6f", grid.cell_lats).tolist()
+    for row in range(grid.rows):
+        lons = np.char.mod("%.6f", grid.cell_lons[row]).tolist()
+        yield "".join(
+            f"<Placemark><name>{label}{row + 1}</name><Point><coordinates>{lon},{lats[row]}</coordinates></Point></Placemark>\n"
+            for label, lon in zip(labels, lons)
+        )
+    yield '</Folder>\n<Placemark>\n<name>Grid lines</name>\n<styleUrl>#grid</styleUrl>\n<MultiGeometry>\n'
+
+    left = _coord(grid.left_lon)
+    yield "".join(
+        f"<LineString><coordinates>{left},{lat} {_coord(right)},{lat}</coordinates></LineString>\n"
+        for lat, right in zip(np.char.mod("%.6f", grid.row_line_lats).tolist(), grid.row_right_lons.tolist())
+    )
+    top, bottom = _coord(grid.top_lat), _coord(grid.bottom_lat)
+    yield "".join(
+        f"<LineString><coordinates>{lon},{top} {lon},{bottom}</coordinates></LineString>\n"
+        for lon in np.char.mod("%.6f", grid.col_line_lons).tolist()
+    )
+    yield "</MultiGeometry>\n</Placemark>\n</Document>\n</kml>\n"
+
+
+def _iter_cell_chunks(cells: GridCells) -> Iterator[Tuple[int, list, list, list, list, list]]:
+    """
+    Cells in chunks of WAYPOINT_CHUNK_SIZE as (first index, names, center lat
+    strings, center lon strings, outline lat strings, outline lon strings).
+    Outlines are closed (first vertex repeated).
+    """
+    names = cells.names
+    for start in range(0, len(cells), WAYPOINT_CHUNK_SIZE):
+        stop = min(start + WAYPOINT_CHUNK_SIZE, len(cells))
+        ring_lats = cells.ring_lats[start:stop]
+        ring_lons = cells.ring_lons[start:stop]
+        yield (
+            start,
+            names[start:stop],
+            np.char.mod("%.6f", cells.center_lats[start:stop]).tolist(),
+            np.char.mod("%.6f", cells.center_lons[start:stop]).tolist(),
+            np.char.mod("%.6f", np.hstack([ring_lats, ring_lats[:, :1]])).tolist(),
+            np.char.mod("%.6f", np.hstack([ring_lons, ring_lons[:, :1]])).tolist(),
+        )
+
+
+def iter_cells_gpx(
+    cells: GridCells,
+    creator: str = "MilenaCRM Field Search Grid Generator",
+    timestamp: Optional[str] = None
+) -> Iterator[str]:
+    """GPX with a waypoint per cell center and one closed track segment per cell outline"""
+    if timestamp is None:
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    time_line = f"<time>{timestamp}</time>"
+    min_lat, min_lon, max_lat, max_lon = cells.bounds
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<gpx xmlns="http://www.topografix.com/GPX/1/1" '
+        'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+        f'creator={quoteattr(creator)} version="1.1" '
+        'xsi:schemaLocation="http://www.topografix.com/GPX/1/1 http://www.topografix.com/GPX/1/1/gpx.xsd">\n'
+        f"<metadata>\n{time_line}\n"
+        f'<bounds minlat="{min_lat:.6f}" minlon="{min_lon:.6f}" maxlat="{max_lat:.6f}" maxlon="{max_lon:.6f}"/>\n'
+        "</metadata>\n"
+    )
+    for _, names, lats, lons, _, _ in _iter_cell_chunks(cells):
+        yield "".join(
+            f'<wpt lat="{lat}" lon="{lon}">\n{time_line}\n<name>{name}</name>\n</wpt>\n'
+            for name, lat, lon in zip(names, lats, lons)
+        )
+
+    shape = "hexagonal" if cells.shape == "hex" else "square"
+    yield (
+        "<trk>\n<name>Search Grid</name>\n"
+        f"<desc>{escape(f'Field search grid: {len(cells)} {shape} cells, {cells.cell_size_meters}m each')}</desc>\n"
+    )
+    for _, _, _, _, ring_lats, ring_lons in _iter_cell_chunks(cells):
+        yield "".join(
+            "<trkseg>\n" + "".join(
+                f'<trkpt lat="{lat}" lon="{lon}">\n{time_line}\n</trkpt>\n' for lat, lon in zip(lats, lons)
+            ) + "</trkseg>\n"
+            for lats, lons in zip(ring_lats, ring_lons)
+        )
+    yield "</trk>\n</gpx>"
+
+
+def iter_cells_kml(cells: GridCells, name: str = "Search Grid") -> Iterator[str]:
+    """KML document: one placemark per cell center and the cell outlines"""
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<kml xmlns="http://www.opengis.net/kml/2.2">\n<Document>\n'
+        f"<name>{escape(name)}</name>\n"
+        '<Style id="grid"><LineStyle><color>ff0000ff</color><width>2</width></LineStyle></Style>\n'
+        "<Folder>\n<name>Cells</name>\n"
+    )
+    for _, names, lats, lons, _, _ in _iter_cell_chunks(cells):
+        yield "".join(
+            f"<Placemark><name>{cell}</name><Point><coordinates>{lon},{lat}</coordinates></Point></Placemark>\n"
+            for cell, lat, lon in zip(names, lats, lons)
+        )
+    yield '</Folder>\n<Placemark>\n<name>Grid lines</name>\n<styleUrl>#grid</styleUrl>\n<MultiGeometry>\n'
+    for _, _, _, _, ring_lats, ring_lons in _iter_cell_chunks(cells):
+        yield "".join(
+            "<LineString><coordinates>%s</coordinates></LineString>\n"
+            % " ".join(f"{lon},{lat}" for lat, lon in zip(lats, lons))
+            for lats, lons in zip(ring_lats, ring_lons)
+        )
+    yield "</MultiGeometry>\n</Placemark>\n</Document>\n</kml>\n"
+
+
+def iter_geojson(cells: GridCells) -> Iterator[str]:
+    """GeoJSON FeatureCollection with one polygon per cell (properties name, row, col)"""
+    min_lat, min_lon, max_lat, max_lon = cells.bounds
+    yield (
+        '{"type":"FeatureCollection",'
+        f'"bbox":[{_coord(min_lon)},{_coord(min_lat)},{_coord(max_lon)},{_coord(max_lat)}],'
+        '"features":['
+    )
+    rows, cols = cells.row_index.tolist(), cells.col_index.tolist()
+    for start, names, _, _, ring_lats, ring_lons in _iter_cell_chunks(cells):
+        yield "".join(
+            ('' if start + offset == 0 else ',') +
+            '{"type":"Feature","properties":{"name":"%s","row":%d,"col":%d},'
+            '"geometry":{"type":"Polygon","coordinates":[[%s]]}}'
+            % (name, rows[start + offset], cols[start + offset],
+               ",".join(f"[{lon},{lat}]" for lat, lon in zip(lats, lons)))
+            for offset, (name, lats, lons) in enumerate(zip(names, ring_lats, ring_lons))
+        )
+    yield "]}\n"
+
+
+# Writers of plain rectangular grids (grid lines) and of cell outlines
+_GRID_WRITERS: Dict[str, Callable[[GridGeometry], Iterator[str]]] = {
+    "gpx": iter_gpx,
+    "kml": iter_kml,
+}
+_CELL_WRITERS: Dict[str, Callable[[GridCells], Iterator[str]]] = {
+    "gpx": iter_cells_gpx,
+    "kml": iter_cells_kml,
+    "geojson": iter_geojson,
+}
+
+
+@lru_cache(maxsize=8)
+def _cells(params: GridParams) -> GridCells:
+    # Tiles of the same grid are requested in bursts - clip the area once
+    return build_cells(
+        params.center_lat, params.center_lon, params.cols, params.rows,
+        params.cell_size, params.shape, params.area
+    )
+
+
+def _entry_dir(params: GridParams) -> Path:
+    entry = grid_cache_dir() / params.key
+    if entry.is_dir():
+        # Last use - pruning keeps entries that are still requested
+        os.utime(entry)
+    return entry
+
+
+def _write_atomic(target: Path, write: Callable[[IO], None], mode: str = "w") -> None:
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=target.parent, suffix=".part")
+    try:
+        with os.fdopen(fd, mode, **({"encoding": "utf-8"} if "b" not in mode else {})) as out:
+            write(out)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def export_grid(params: GridParams, fmt: str) -> Path:
+    """Path of the grid rendered in a format (gpx, kml, geojson), rendering it if needed"""
+    extension, _ = GRID_FORMATS[fmt]
+    target = _entry_dir(params) / f"grid{extension}"
+    if not target.is_file():
+        if params.is_rectangle and fmt in _GRID_WRITERS:
+            chunks = _GRID_WRITERS[fmt](params.geometry())
+        else:
+            chunks = _CELL_WRITERS[fmt](params.cells())
+        _write_atomic(target, lambda out: out.writelines(chunks))
+    return target
+
+
+def _mercator_y(lats: np.ndarray, zoom: int) -> np.ndarray:
+    """Web Mercator y in tile units (vectorized lonlat_to_tile)"""
+    lats = np.radians(np.clip(lats, -85.05112878, 85.05112878))
+    return (1.0 - np.arcsinh(np.tan(lats)) / math.pi) / 2.0 * 2 ** zoom
+
+
+def render_tile(cells: GridCells, zoom: int, x: int, y: int) -> bytes:
+    """
+    Vector tile with the cells intersecting tile (zoom, x, y).
+    Cells are selected by one vectorized bounding box test and projected
+    together; only the selected cells are encoded one by one.
+    """
+    west, south, east, north = tile_bounds(zoom, x, y)
+    # Margin covering the tile buffer
+    margin_lon = (east - west) * TILE_BUFFER / TILE_EXTENT
+    margin_lat = (north - south) * TILE_BUFFER / TILE_EXTENT
+
+    visible = np.flatnonzero(
+        (cells.ring_lons.max(axis=1) >= west - margin_lon) & (cells.ring_lons.min(axis=1) <= east + margin_lon)
+        & (cells.ring_lats.max(axis=1) >= south - margin_lat) & (cells.ring_lats.min(axis=1) <= north + margin_lat)
+    )
+    if not len(visible):
+        return b""
+
+    # Clockwise in tile coordinates (y grows downwards): reverse the outlines
+    vertices = cells.ring_lons.shape[1]
+    order = np.r_[0, vertices - 1:0:-1]
+    # Linear in longitude: x = (lon + 180) / 360 * 2^z
+    scale = 2 ** zoom / 360.0 * TILE_EXTENT
+    ring_xs = (cells.ring_lons[visible][:, order] + 180.0) * scale - x * TILE_EXTENT
+    ring_ys = (_mercator_y(cells.ring_lats[visible][:, order], zoom) - y) * TILE_EXTENT
+    ring_xs = np.clip(np.rint(ring_xs), -TILE_BUFFER, TILE_EXTENT + TILE_BUFFER).astype(int)
+    ring_ys = np.clip(np.rint(ring_ys), -TILE_BUFFER, TILE_EXTENT + TILE_BUFFER).astype(int)
+    # Degenerate after clamping to the buffer (no width or no height)
+    drawn = (np.ptp(ring_xs, axis=1) > 0) & (np.ptp(ring_ys, axis=1) > 0)
+    center_xs = np.rint((cells.center_lons[visible] + 180.0) * scale - x * TILE_EXTENT).astype(int)
+    center_ys = np.rint((_mercator_y(cells.center_lats[visible], zoom) - y) * TILE_EXTENT).astype(int)
+
+    cells_layer, labels_layer = Layer("cells"), Layer("labels")
+    labels = column_labels(cells.cols)
+    rows, cols = cells.row_index[visible].tolist(), cells.col_index[visible].tolist()
+    for index, (xs, ys, cx, cy) in enumerate(zip(ring_xs.tolist(), ring_ys.tolist(), center_xs.tolist(), center_ys.tolist())):
+        if not drawn[index]:
+            continue
+        row, col = rows[index], cols[index]
+        name = f"{labels[col]}{row + 1}"
+        cells_layer.add_polygon(list(zip(xs, ys)), {"name": name, "row": row, "col": col})
+        if 0 <= cx < TILE_EXTENT and 0 <= cy < TILE_EXTENT:
+            # Each label in exactly one tile
+            labels_layer.add_point(cx, cy, {"name": name})
+
+    return encode_tile([cells_layer, labels_layer])
+
+
+def _tile_outside(cells: GridCells, zoom: int, x: int, y: int) -> bool:
+    """Whether tile (zoom, x, y), buffer included, misses the grid's bounding box"""
+    west, south, east, north = tile_bounds(zoom, x, y)
+    margin_lon = (east - west) * TILE_BUFFER / TILE_EXTENT
+    margin_lat = (north - south) * TILE_BUFFER / TILE_EXTENT
+    min_lat, min_lon, max_lat, max_lon = cells.bounds
+    return (
+        max_lon < west - margin_lon or min_lon > east + margin_lon
+        or max_lat < south - margin_lat or min_lat > north + margin_lat
+    )
+
+
+def grid_tile(params: GridParams, zoom: int, x: int, y: int) -> Optional[Path]:
+    """
+    Path of a cached vector tile, rendering it if needed; None for a tile
+    without cells. Only tiles with cells are cached, so requests for
+    arbitrary tiles cannot fill the disk.
+    """
+    target = _entry_dir(params) / "tiles" / str(zoom) / str(x) / f"{y}.pbf"
+    if target.is_file():
+        return target
+    cells = params.cells()
+    if _tile_outside(cells, zoom, x, y):
+        return None
+    data = render_tile(cells, zoom, x, y)
+    if not data:
+        return None
+    _write_atomic(target, lambda out: out.write(data), mode="wb")
+    return target
+
+
+def tile_json(params: GridParams, tiles_url: str) -> Dict:
+    """TileJSON 3.0 description of a grid's vector tiles"""
+    min_lat, min_lon, max_lat, max_lon = params.cells().bounds
+    min_zoom, max_zoom = params.zoom_range
+    return {
+        "tilejson": "3.0.0",
+        "tiles": [tiles_url],
+        "minzoom": min_zoom,
+        "maxzoom": max_zoom,
+        "bounds": [min_lon, min_lat, max_lon, max_lat],
+        "center": [params.center_lon, params.center_lat, min_zoom + 1],
+        "vector_layers": [
+            {"id": "cells", "fields": {"name": "String", "row": "Number", "col": "Number"}},
+            {"id": "labels", "fields": {"name": "String"}},
+        ],
+    }
+
+
+def prune_grid_cache(max_age_days: Optional[int] = None, dry_run: bool = False) -> int:
+    """Remove cache entries not used for max_age_days. Returns their number."""
+    cache_dir = grid_cache_dir()
+    if not cache_dir.is_dir():
+        return 0
+    cutoff = time.time() - (GRID_CACHE_DAYS if max_age_days is None else max_age_days) * 86400
+    removed = 0
+    with os.scandir(cache_dir) as entries:
+        for entry in entries:
+            if not entry.is_dir(follow_symlinks=False) or entry.stat().st_mtime >= cutoff:
+                continue
+            removed += 1
+            if not dry_run:
+                shutil.rmtree(entry.path, ignore_errors=True)
+    return removed
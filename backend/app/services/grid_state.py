@@ -0,0 +1,204 @@
+"""
+Compact state of all cells of a map grid, kept in the map grid row itself.
+
+    cell_states       one status byte per cell at index row * cols + col
+                      (values: positions in STATUS_NAMES)
+    cell_assignments  {cell code: field_search_id}, assigned cells only
+    cell_notes        {cell code: text}, cells with notes only
+
+Cells are addressed by code (A1 = row 0, column 0; AA10 = row 9, column 26).
+Reading the state of a whole grid costs one row instead of a row per cell,
+and changing a cell is one byte plus at most two dictionary entries.
+
+The state mirrors the grid_cells rows of the grid; both are written in the
+same transaction. Every writer of grid cell rows calls sync_from_cells
+(under the map grid row lock), and changes of the state are applied to the
+rows with write_cells. Cells without a row are unassigned in the state. A
+grid with a state only takes cells inside its cols x rows.
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.models.map_grid import GridCell, GridCellStatus, MapGrid
+from app.services.gpx_service import column_label
+
+# Byte value of a status is its position (same names as GridCellStatus)
+STATUS_NAMES = ("unassigned", "assigned", "in_progress", "completed")
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+
+MAX_STATE_CELLS = 1_000_000
+
+_CELL_CODE = re.compile(r"^([A-Z]+)([1-9][0-9]*)$")
+
+
+class CellCodeError(ValueError):
+    """Cell code is malformed or outside the grid"""
+
+
+def parse_cell_code(code: str) -> Tuple[int, int]:
+    """(row, col) of a cell code like B12 (inverse of gpx_service.column_label)"""
+    match = _CELL_CODE.match(code.strip().upper())
+    if not match:
+        raise CellCodeError(f"Invalid cell code: {code}")
+    letters, number = match.groups()
+    col = 0
+    for letter in letters:
+        col = col * 26 + ord(letter) - 64
+    return int(number) - 1, col - 1
+
+
+def cell_index(code: str, cols: int, rows: int) -> int:
+    """Position of a cell in the status array"""
+    row, col = parse_cell_code(code)
+    if row >= rows or col >= cols:
+        raise CellCodeError(f"Cell {code} is outside the {cols}x{rows} grid")
+    return row * cols + col
+
+
+def cell_code(index: int, cols: int) -> str:
+    row, col = divmod(index, cols)
+    return f"{column_label(col)}{row + 1}"
+
+
+def empty_states(cols: int, rows: int) -> bytes:
+    """All cells unassigned"""
+    if cols * rows > MAX_STATE_CELLS:
+        raise ValueError(f"Grid is too large (at most {MAX_STATE_CELLS} cells)")
+    return bytes(cols * rows)
+
+
+def status_counts(states: bytes) -> Dict[str, int]:
+    """Number of cells per status"""
+    counts = np.bincount(np.frombuffer(states, dtype=np.uint8), minlength=len(STATUS_NAMES))
+    return {name: int(counts[code]) for code, name in enumerate(STATUS_NAMES)}
+
+
+def apply_change(
+    states: bytearray,
+    assignments: Dict[str, int],
+    notes: Dict[str, str],
+    code: str,
+    index: int,
+    values: Dict
+) -> None:
+    """
+    Apply one cell change in place. values may hold status (a name),
+    assigned_to_field_search_id and notes; None clears an assignment or note.
+    """
+    if "status" in values:
+        states[index] = STATUS_CODES[values["status"] or "unassigned"]
+    if "assigned_to_field_search_id" in values:
+        _set_sparse(assignments, code, values["assigned_to_field_search_id"])
+    if "notes" in values:
+        _set_sparse(notes, code, values["notes"] or None)
+
+
+def _set_sparse(mapping: Dict, key: str, value: Optional[object]) -> None:
+    if value is None:
+        mapping.pop(key, None)
+    else:
+        mapping[key] = value
+
+
+def _normalize(code: str) -> str:
+    return code.strip().upper()
+
+
+def sync_from_cells(db: Session, map_grid_id: int, codes: Optional[Iterable[str]] = None) -> None:
+    """
+    Copy status, assignment and notes of grid cell rows into the compact
+    state of their map grid (if it has one), in the caller's transaction.
+    codes are the cells written (None: all, e.g. after replacing the rows);
+    codes without a row are reset. CellCodeError if a cell lies outside the
+    grid (nothing is written).
+    """
+    grids = MapGrid.__table__
+    grid = db.execute(
+        select(grids.c.grid_cols, grids.c.grid_rows, grids.c.cell_states, grids.c.cell_assignments, grids.c.cell_notes)
+        .where(grids.c.id == map_grid_id)
+        .with_for_update()
+    ).first()
+    if grid is None or grid.cell_states is None:
+        return
+    cols, rows = grid.grid_cols, grid.grid_rows
+
+    query = select(GridCell.cell_code, GridCell.status, GridCell.assigned_to_field_search_id, GridCell.notes).where(
+        GridCell.map_grid_id == map_grid_id
+    ).order_by(GridCell.id)
+    if codes is None:
+        states, assignments, notes = bytearray(len(grid.cell_states)), {}, {}
+    else:
+        codes = {_normalize(code) for code in codes}
+        if not codes:
+            return
+        states = bytearray(grid.cell_states)
+        assignments, notes = dict(grid.cell_assignments or {}), dict(grid.cell_notes or {})
+        query = query.where(func.upper(func.trim(GridCell.cell_code)).in_(codes))
+        for code in codes:
+            apply_change(states, assignments, notes, code, cell_index(code, cols, rows), {
+                "status": None, "assigned_to_field_search_id": None, "notes": None,
+            })
+
+    for code, cell_status, field_search_id, cell_notes in db.execute(query):
+        code = _normalize(code)
+        apply_change(states, assignments, notes, code, cell_index(code, cols, rows), {
+            "status": cell_status.value,
+            "assigned_to_field_search_id": field_search_id,
+            "notes": cell_notes,
+        })
+
+    db.execute(
+        update(grids).where(grids.c.id == map_grid_id).values(
+            cell_states=bytes(states), cell_assignments=assignments, cell_notes=notes
+        )
+    )
+
+
+def write_cells(db: Session, map_grid_id: int, changes: Dict[str, Dict], version: int) -> List[Dict]:
+    """
+    Apply changes of the compact state ({cell code: values as for
+    apply_change}) to the grid cell rows, creating rows for cells that have
+    none. Returns the written rows' changed fields (for live updates).
+    """
+    changes = {_normalize(code): values for code, values in changes.items() if values}
+    if not changes:
+        return []
+    ids_by_code: Dict[str, List[int]] = {}
+    for cell_id, code in db.execute(
+        select(GridCell.id, GridCell.cell_code).where(
+            GridCell.map_grid_id == map_grid_id,
+            func.upper(func.trim(GridCell.cell_code)).in_(changes.keys()),
+        )
+    ):
+        ids_by_code.setdefault(_normalize(code), []).append(cell_id)
+
+    updates, inserts = [], []
+    for code, values in changes.items():
+        values = dict(values)
+        if "status" in values:
+            values["status"] = GridCellStatus[values["status"] or "unassigned"]
+        if "notes" in values:
+            values["notes"] = values["notes"] or None
+        if code in ids_by_code:
+            updates += [{"id": cell_id, **values, "version": version} for cell_id in ids_by_code[code]]
+        else:
+            inserts.append({
+                "map_grid_id": map_grid_id,
+                "cell_code": code,
+                "status": GridCellStatus.unassigned,
+                "assigned_to_field_search_id": None,
+                "notes": None,
+                **values,
+                "version": version,
+            })
+    if updates:
+        db.execute(update(GridCell), updates)
+    created = []
+    if inserts:
+        ids = db.scalars(insert(GridCell).returning(GridCell.id, sort_by_parameter_order=True), inserts)
+        created = [{"id": cell_id, **row} for cell_id, row in zip(ids, inserts)]
+    return updates + created
@@ -0,0 +1,180 @@
+"""
+Image derivatives (thumbnails and medium sizes) for uploaded photos.
+
+Every uploaded image gets WebP variants stored next to the originals:
+
+    /uploads/<path>                          original
+    /uploads/variants/thumb/<path>.webp      max 200 px side
+    /uploads/variants/medium/<path>.webp     max 1024 px side
+
+Variants are rendered in a bounded process pool right after upload. Files
+uploaded before this existed are rendered lazily on first request of a
+variant URL (see routers/files.py).
+"""
+import asyncio
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from app.core.logging_config import get_logger
+from app.services.upload_service import UPLOAD_DIR
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+
+logger = get_logger(__name__)
+
+# Variant name -> max side in pixels
+IMAGE_VARIANTS: Dict[str, int] = {
+    "thumb": 200,
+    "medium": 1024,
+}
+WEBP_QUALITY = 80
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+VARIANTS_DIR = UPLOAD_DIR / "variants"
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def is_image_url(url: Optional[str]) -> bool:
+    """Check that a stored URL points at an image we can render variants for"""
+    return bool(url) and url.startswith("/uploads/") and Path(url).suffix.lower() in IMAGE_EXTENSIONS
+
+
+def variant_url(url: Optional[str], variant: str = "thumb") -> Optional[str]:
+    """
+    Map an original upload URL to its variant URL.
+    Returns None for non-image files (video, audio, tracks).
+    """
+    if not is_image_url(url) or url.startswith("/uploads/variants/"):
+        return None
+    relative = url[len("/uploads/"):]
+    return f"/uploads/variants/{variant}/{relative}.webp"
+
+
+def variant_path(relative: str, variant: str, variants_dir: Optional[Path] = None) -> Path:
+    """Disk path of a variant for an original stored at UPLOAD_DIR/relative"""
+    return (variants_dir or VARIANTS_DIR) / variant / f"{relative}.webp"
+
+
+def render_variants(source: str, relative: str, variants: Iterable[str], variants_dir: str) -> Dict[str, str]:
+    """
+    Render WebP variants of one image. Runs inside a pool worker process, so
+    all paths are passed explicitly. Returns {variant: path} of rendered files.
+    """
+    if Image is None:
+        raise RuntimeError("Pillow is not installed")
+
+    rendered = {}
+    with Image.open(source) as img:
+        # Respect camera orientation from EXIF (phone photos)
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "A" in img.getbands() or img.mode == "P" else "RGB")
+
+        for variant in variants:
+            max_side = IMAGE_VARIANTS[variant]
+            target = variant_path(relative, variant, Path(variants_dir))
+            target.parent.mkdir(parents=True, exist_ok=True)
+
+            resized = img.copy()
+            resized.thumbnail((max_side, max_side), Image.LANCZOS)
+
+            # Write atomically: concurrent lazy requests may render the same variant
+            fd, tmp_path = tempfile.mkstemp(dir=target.parent, suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    resized.save(out, "WEBP", quality=WEBP_QUALITY, method=4)
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, target)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+            rendered[variant] = str(target)
+
+    return rendered
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Lazily create the shared image processing pool"""
+    global _pool
+    if _pool is None:
+        # spawn: forking a multi-threaded server process is not safe
+        _pool = ProcessPoolExecutor(
+            max_workers=IMAGE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_pool() -> None:
+    """Stop the image processing pool (application shutdown)"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _log_failure(future: Future) -> None:
+    exc = future.exception()
+    if exc is not None:
+        logger.warning(f"Image variant generation failed: {exc}")
+
+
+def schedule_variants(urls: Iterable[str]) -> Dict[str, Future]:
+    """
+    Queue variant generation for freshly uploaded files (fire and forget).
+    Non-image URLs are ignored. Returns the futures of queued URLs.
+    """
+    queued: Dict[str, Future] = {}
+    if Image is None:
+        return queued
+    for url in urls:
+        if not is_image_url(url):
+            continue
+        relative = url[len("/uploads/"):]
+        try:
+            future = get_pool().submit(
+                render_variants, str(UPLOAD_DIR / relative), relative, list(IMAGE_VARIANTS), str(VARIANTS_DIR)
+            )
+            future.add_done_callback(_log_failure)
+        except Exception as e:
+            logger.warning(f"Could not schedule image variants for {url}: {e}")
+            continue
+        queued[url] = future
+    return queued
+
+
+async def ensure_variant(relative: str, variant: str) -> Optional[Path]:
+    """
+    Return the path of a variant, rendering it in the pool if it does not exist yet.
+    Returns None when the original is missing or is not an image.
+    """
+    target = variant_path(relative, variant)
+    if target.exists():
+        return target
+
+    source = UPLOAD_DIR / relative
+    if Image is None or not source.is_file() or source.suffix.lower() not in IMAGE_EXTENSIONS:
+        return None
+
+    loop = asyncio.get_running_loop()
+    try:
+        # Render all variants at once - the original is decoded only one time
+        await loop.run_in_executor(
+            get_pool(), render_variants, str(source), relative, list(IMAGE_VARIANTS), str(VARIANTS_DIR)
+        )
+    except Exception as e:
+        logger.warning(f"Could not render {variant} variant of {relative}: {e}")
+        return None
+    return target if target.exists() else None
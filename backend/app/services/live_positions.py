@@ -0,0 +1,392 @@
+"""
+Live GPS positions of field search participants.
+
+Phones post batches of points; they are kept in memory and written to
+participant_positions by a background thread every FLUSH_SECONDS with one
+multi-row INSERT, so a point costs no database round trip of its own.
+
+Per participant (field search, user) the service keeps
+
+    trail    ring buffer of the last TRAIL_POINTS points in recording order
+             (deque with maxlen; late points are stored but not added)
+    last     newest point by recording time (batches may arrive out of order)
+    pending  points not written yet, bounded by MAX_PENDING_POINTS - if the
+             database is unreachable for long, the oldest are dropped
+
+Resent points are skipped while still in the buffers; the table has a unique
+index per participant and recording time and writes skip rows stored before,
+which catches resends reaching another worker or arriving after a flush.
+Rows of field searches or users deleted meanwhile (other workers keep
+buffering until their participant cache expires) are dropped on their own,
+the other participants' points are written.
+
+"Where is everyone" is answered from `last` without touching the database.
+The buffers live in the process, so with several workers (a shared state
+backend configured, see shared_state.py) a worker only knows the points
+posted to it: positions() and recent_trail() then read participant_positions
+and add the worker's points not flushed yet, which is at most FLUSH_SECONDS
+behind for points posted to other workers.
+
+Each flush also publishes the new last positions of every field search with
+moving participants as one "positions" live message (see live_updates.py).
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+FLUSH_SECONDS = float(os.getenv("POSITION_FLUSH_SECONDS", "3"))
+# 10 minutes at one point per second
+TRAIL_POINTS = 600
+MAX_PENDING_POINTS = 3600
+# Participant lists are cached so that ingestion does not query them per batch
+PARTICIPANTS_TTL_SECONDS = 30.0
+# Buffers of participants silent for this long are dropped
+IDLE_SECONDS = 12 * 3600
+
+
+class Position(NamedTuple):
+    """One GPS fix; recorded_at is a Unix timestamp"""
+    recorded_at: float
+    lat: float
+    lon: float
+    accuracy: Optional[float] = None
+    altitude: Optional[float] = None
+    speed: Optional[float] = None
+    heading: Optional[float] = None
+
+
+class _Participant:
+    __slots__ = ("trail", "last", "pending", "moved")
+
+    def __init__(self):
+        self.trail: Deque[Position] = deque(maxlen=TRAIL_POINTS)
+        self.last: Optional[Position] = None
+        self.pending: Deque[Position] = deque(maxlen=MAX_PENDING_POINTS)
+        self.moved = False
+
+
+_lock = threading.Lock()
+# (field_search_id, user_id) -> buffers
+_participants: Dict[Tuple[int, int], _Participant] = {}
+# field_search_id -> (loaded at, user ids allowed to post)
+_allowed: Dict[int, Tuple[float, Set[int]]] = {}
+_flusher: Optional[threading.Thread] = None
+_stop = threading.Event()
+
+
+def add_positions(field_search_id: int, user_id: int, points: Iterable[Position]) -> int:
+    """Buffer a batch of one participant's points; returns how many were new"""
+    points = sorted(points, key=lambda point: point.recorded_at)
+    with _lock:
+        participant = _participants.get((field_search_id, user_id))
+        if participant is None:
+            participant = _participants[(field_search_id, user_id)] = _Participant()
+        newest = participant.trail[-1].recorded_at if participant.trail else None
+        added = 0
+        for point in points:
+            # Phones resend batches they got no answer for; late points are
+            # only pending, not in the trail
+            if newest is not None and point.recorded_at <= newest and (
+                point in participant.trail or point in participant.pending
+            ):
+                continue
+            participant.pending.append(point)
+            if newest is None or point.recorded_at > newest:
+                participant.trail.append(point)
+                newest = point.recorded_at
+            added += 1
+        if participant.trail and participant.trail[-1] != participant.last:
+            participant.last = participant.trail[-1]
+            participant.moved = True
+        return added
+
+
+def last_positions(field_search_id: int) -> Dict[int, Position]:
+    """Newest known point of every participant of a field search"""
+    with _lock:
+        return {
+            user_id: participant.last
+            for (search_id, user_id), participant in _participants.items()
+            if search_id == field_search_id and participant.last is not None
+        }
+
+
+def trail(field_search_id: int, user_id: int, since: Optional[float] = None) -> List[Position]:
+    """Recent points of a participant (at most TRAIL_POINTS), optionally after a time"""
+    with _lock:
+        participant = _participants.get((field_search_id, user_id))
+        points = list(participant.trail) if participant is not None else []
+    return [point for point in points if since is None or point.recorded_at > since]
+
+
+def _stored(row) -> Position:
+    from datetime import timezone
+
+    recorded_at = row.recorded_at
+    if recorded_at.tzinfo is None:
+        # SQLite returns naive datetimes
+        recorded_at = recorded_at.replace(tzinfo=timezone.utc)
+    return Position(
+        recorded_at.timestamp(), row.lat, row.lon, row.accuracy, row.altitude, row.speed, row.heading
+    )
+
+
+def stored_last_positions(db, field_search_id: int) -> Dict[int, Position]:
+    """Newest written point of every participant active within IDLE_SECONDS"""
+    from datetime import datetime, timedelta, timezone
+
+    from sqlalchemy import and_, func, select
+
+    from app.models.participant_position import ParticipantPosition as P
+
+    newest = (
+        select(P.user_id, func.max(P.recorded_at).label("recorded_at"))
+        .where(
+            P.field_search_id == field_search_id,
+            P.recorded_at >= datetime.now(timezone.utc) - timedelta(seconds=IDLE_SECONDS)
+        )
+        .group_by(P.user_id)
+        .subquery()
+    )
+    rows = db.execute(
+        select(P.user_id, P.recorded_at, P.lat, P.lon, P.accuracy, P.altitude, P.speed, P.heading)
+        .join(newest, and_(P.user_id == newest.c.user_id, P.recorded_at == newest.c.recorded_at))
+        .where(P.field_search_id == field_search_id)
+        .order_by(P.id)
+    )
+    return {row.user_id: _stored(row) for row in rows}
+
+
+def stored_trail(db, field_search_id: int, user_id: int, since: Optional[float] = None) -> List[Position]:
+    """Last TRAIL_POINTS written points of a participant, optionally after a time"""
+    from datetime import datetime, timezone
+
+    from sqlalchemy import select
+
+    from app.models.participant_position import ParticipantPosition as P
+
+    query = select(P.recorded_at, P.lat, P.lon, P.accuracy, P.altitude, P.speed, P.heading).where(
+        P.field_search_id == field_search_id, P.user_id == user_id
+    )
+    if since is not None:
+        query = query.where(P.recorded_at > datetime.fromtimestamp(since, timezone.utc))
+    rows = db.execute(query.order_by(P.recorded_at.desc(), P.id.desc()).limit(TRAIL_POINTS))
+    return [_stored(row) for row in reversed(rows.all())]
+
+
+def positions(db, field_search_id: int) -> Dict[int, Position]:
+    """
+    Newest point of every participant: from memory with a single worker,
+    else the newer of the stored and this worker's point per participant.
+    """
+    from app.services import shared_state
+
+    local = last_positions(field_search_id)
+    if not shared_state.is_shared():
+        return local
+    merged = stored_last_positions(db, field_search_id)
+    for user_id, point in local.items():
+        if user_id not in merged or point.recorded_at > merged[user_id].recorded_at:
+            merged[user_id] = point
+    return merged
+
+
+def recent_trail(db, field_search_id: int, user_id: int, since: Optional[float] = None) -> List[Position]:
+    """trail(), completed from participant_positions when several workers share the traffic"""
+    from app.services import shared_state
+
+    local = trail(field_search_id, user_id, since)
+    if not shared_state.is_shared():
+        return local
+    points = sorted(set(stored_trail(db, field_search_id, user_id, since)) | set(local))
+    return points[-TRAIL_POINTS:]
+
+
+def forget(field_search_id: int) -> None:
+    """Drop all buffers of a deleted field search, pending points included"""
+    with _lock:
+        for key in [key for key in _participants if key[0] == field_search_id]:
+            del _participants[key]
+        _allowed.pop(field_search_id, None)
+
+
+def participants_changed(field_search_id: int) -> None:
+    """Reload the allowed users of a field search on its next batch"""
+    with _lock:
+        _allowed.pop(field_search_id, None)
+
+
+def is_allowed(field_search_id: int, user_id: int, load: Callable[[], Set[int]]) -> bool:
+    """
+    Whether a user may post positions to a field search. load() returns the
+    allowed user ids and is called at most every PARTICIPANTS_TTL_SECONDS.
+    """
+    now = time.monotonic()
+    with _lock:
+        cached = _allowed.get(field_search_id)
+    if cached is None or now - cached[0] > PARTICIPANTS_TTL_SECONDS:
+        cached = (now, set(load()))
+        with _lock:
+            _allowed[field_search_id] = cached
+    return user_id in cached[1]
+
+
+def _take_pending() -> Tuple[List[Dict], Dict[int, Dict[int, Position]]]:
+    """Pending rows of all participants and the last positions of those that moved"""
+    rows: List[Dict] = []
+    moved: Dict[int, Dict[int, Position]] = {}
+    idle_before = time.time() - IDLE_SECONDS
+    with _lock:
+        for key in [key for key, participant in _participants.items()
+                    if not participant.pending and participant.last is not None
+                    and participant.last.recorded_at < idle_before]:
+            del _participants[key]
+        for (field_search_id, user_id), participant in _participants.items():
+            while participant.pending:
+                point = participant.pending.popleft()
+                rows.append({"field_search_id": field_search_id, "user_id": user_id, **point._asdict()})
+            if participant.moved:
+                participant.moved = False
+                moved.setdefault(field_search_id, {})[user_id] = participant.last
+    return rows, moved
+
+
+def _restore_pending(rows: List[Dict]) -> None:
+    """Put back rows that could not be written (oldest first, still bounded)"""
+    with _lock:
+        for row in reversed(rows):
+            participant = _participants.get((row["field_search_id"], row["user_id"]))
+            if participant is not None and len(participant.pending) < MAX_PENDING_POINTS:
+                participant.pending.appendleft(Position(*(row[field] for field in Position._fields)))
+
+
+def _insert_positions(db, rows: List[Dict]) -> None:
+    """One multi-row INSERT, skipping points stored before (resends)"""
+    from datetime import datetime, timezone
+
+    from sqlalchemy.dialects.postgresql import insert
+
+    from app.models.participant_position import ParticipantPosition
+
+    statement = insert(ParticipantPosition).on_conflict_do_nothing(
+        index_elements=["field_search_id", "user_id", "recorded_at"]
+    )
+    db.execute(statement, [
+        {**row, "recorded_at": datetime.fromtimestamp(row["recorded_at"], timezone.utc)} for row in rows
+    ])
+
+
+def write_positions(rows: List[Dict]) -> List[Dict]:
+    """
+    Insert buffered points; returns the rows that cannot be stored because
+    their field search or user no longer exists (the others are written).
+    """
+    from sqlalchemy import select
+    from sqlalchemy.exc import IntegrityError
+
+    from app.db import SessionLocal
+    from app.models.field_search import FieldSearch
+    from app.models.user import User
+
+    db = SessionLocal()
+    try:
+        field_search_ids = set(db.scalars(
+            select(FieldSearch.id).where(FieldSearch.id.in_({row["field_search_id"] for row in rows}))
+        ))
+        user_ids = set(db.scalars(select(User.id).where(User.id.in_({row["user_id"] for row in rows}))))
+        dropped = [row for row in rows if row["field_search_id"] not in field_search_ids or row["user_id"] not in user_ids]
+        rows = [row for row in rows if row["field_search_id"] in field_search_ids and row["user_id"] in user_ids]
+        if not rows:
+            return dropped
+        try:
+            _insert_positions(db, rows)
+            db.commit()
+        except IntegrityError:
+            # Deleted after the check: write each participant on its own
+            db.rollback()
+            by_participant: Dict[Tuple[int, int], List[Dict]] = {}
+            for row in rows:
+                by_participant.setdefault((row["field_search_id"], row["user_id"]), []).append(row)
+            for participant_rows in by_participant.values():
+                try:
+                    with db.begin_nested():
+                        _insert_positions(db, participant_rows)
+                except IntegrityError:
+                    dropped.extend(participant_rows)
+            db.commit()
+        return dropped
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _discard(rows: List[Dict]) -> None:
+    """Drop the buffers of participants whose points cannot be stored"""
+    with _lock:
+        for row in rows:
+            _participants.pop((row["field_search_id"], row["user_id"]), None)
+            _allowed.pop(row["field_search_id"], None)
+
+
+def position_dict(user_id: int, point: Position) -> Dict:
+    return {"user_id": user_id, **point._asdict()}
+
+
+def flush() -> int:
+    """Write pending points and publish moved participants; returns the number of points written"""
+    from app.services import live_updates
+
+    rows, moved = _take_pending()
+    written = 0
+    if rows:
+        try:
+            dropped = write_positions(rows) or []
+            written = len(rows) - len(dropped)
+            if dropped:
+                # Field search or user deleted meanwhile - retrying cannot succeed
+                logger.error(f"Dropping {len(dropped)} positions of deleted field searches or users")
+                _discard(dropped)
+        except Exception as e:
+            logger.warning(f"Could not write {len(rows)} positions, keeping them for the next flush: {e}")
+            _restore_pending(rows)
+    for field_search_id, positions in moved.items():
+        live_updates.publish(field_search_id, "positions", {
+            "positions": [position_dict(user_id, point) for user_id, point in positions.items()]
+        })
+    return written
+
+
+def _run() -> None:
+    while not _stop.wait(FLUSH_SECONDS):
+        try:
+            flush()
+        except Exception as e:
+            logger.error(f"Position flush failed: {e}")
+
+
+def start_flusher() -> None:
+    """Start the background flush thread (application startup)"""
+    global _flusher
+    if _flusher is not None:
+        return
+    _stop.clear()
+    _flusher = threading.Thread(target=_run, name="position-flusher", daemon=True)
+    _flusher.start()
+
+
+def stop_flusher() -> None:
+    """Stop the flush thread and write what is still pending (application shutdown)"""
+    global _flusher
+    if _flusher is not None:
+        _stop.set()
+        _flusher.join(timeout=FLUSH_SECONDS + 5)
+        _flusher = None
+    flush()
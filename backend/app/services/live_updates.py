@@ -0,0 +1,248 @@
+"""
+Real-time channel per field search (WebSocket / server-sent events).
+
+Writers publish compact diffs after they commit; every connected client of
+the field search gets them from its own queue, without touching the
+database. Messages are JSON objects with a "type" and the field search id:
+
+    cells         changed grid cells (changed fields only) and deleted cell ids
+    map_grid      grid fields or many cells changed - fetch /map_grids/{id}/changes
+    field_search  names of the changed fields
+    participants  added participants and user ids of removed ones
+    tracks        added and removed track URLs
+    event         created, updated or deleted event of the search
+    deleted       the field search was deleted
+    resync        messages were dropped - fetch /field_searches/{id}/changes
+
+Map grids and events belong to a search; their messages go to every field
+search of that search. Messages carry the change version where there is
+one (see sync_versions.py), so clients can fall back to delta sync.
+
+    LIVE_UPDATES_BACKEND=memory    (default) delivery within this process
+    LIVE_UPDATES_BACKEND=postgres  messages go through NOTIFY on NOTIFY_CHANNEL;
+                                   every worker LISTENs and delivers to its
+                                   own clients (multi-worker deployments)
+
+A client more than MAX_QUEUED messages behind gets a single resync message
+instead of the backlog.
+"""
+import asyncio
+import json
+import os
+import select
+import threading
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+LIVE_UPDATES_BACKEND = os.getenv("LIVE_UPDATES_BACKEND", "memory").lower()
+NOTIFY_CHANNEL = "field_search_live"
+# NOTIFY payloads must stay below 8000 bytes
+MAX_NOTIFY_BYTES = 7900
+MAX_QUEUED = 256
+# Larger cell diffs are sent as a map_grid message
+MAX_CELL_DIFFS = 500
+
+_lock = threading.Lock()
+_subscriptions: Dict[int, Set["Subscription"]] = {}
+_listener: Optional[threading.Thread] = None
+_stop = threading.Event()
+
+
+class Subscription:
+    """Queue of serialized messages of one connected client"""
+
+    def __init__(self, field_search_id: int, loop: asyncio.AbstractEventLoop):
+        self.field_search_id = field_search_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.lagging = False
+
+    def _put(self, message: str) -> None:
+        # Runs on the subscriber's event loop
+        if self.lagging:
+            return
+        if self.queue.qsize() >= MAX_QUEUED:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.lagging = True
+            message = serialize(self.field_search_id, "resync", {})
+        self.queue.put_nowait(message)
+
+    async def next(self, timeout: float) -> Optional[str]:
+        """Next message, or None if none arrives within timeout seconds"""
+        try:
+            message = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if self.queue.empty():
+            self.lagging = False
+        return message
+
+
+def subscribe(field_search_id: int) -> Subscription:
+    """Register a client of a field search (call from its event loop)"""
+    subscription = Subscription(field_search_id, asyncio.get_running_loop())
+    with _lock:
+        _subscriptions.setdefault(field_search_id, set()).add(subscription)
+    return subscription
+
+
+def unsubscribe(subscription: Subscription) -> None:
+    with _lock:
+        subscribers = _subscriptions.get(subscription.field_search_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del _subscriptions[subscription.field_search_id]
+
+
+def subscriber_count(field_search_id: int) -> int:
+    """Clients of a field search connected to this process"""
+    with _lock:
+        return len(_subscriptions.get(field_search_id, ()))
+
+
+def serialize(field_search_id: int, message_type: str, payload: Dict) -> str:
+    """Message as compact JSON text"""
+    message = {"type": message_type, "field_search_id": field_search_id, **payload}
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False, default=_json_default)
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def deliver(field_search_id: int, message: str) -> None:
+    """Hand a serialized message to the clients connected to this process (thread-safe)"""
+    with _lock:
+        subscribers = list(_subscriptions.get(field_search_id, ()))
+    for subscription in subscribers:
+        try:
+            subscription.loop.call_soon_threadsafe(subscription._put, message)
+        except RuntimeError:
+            # Event loop already closed (shutdown)
+            unsubscribe(subscription)
+
+
+def _notify(field_search_id: int, message: str) -> None:
+    from app.db import engine
+
+    payload = f"{field_search_id} {message}"
+    if len(payload.encode()) > MAX_NOTIFY_BYTES:
+        payload = f"{field_search_id} {serialize(field_search_id, 'resync', {})}"
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": NOTIFY_CHANNEL, "payload": payload})
+        conn.commit()
+
+
+def publish(field_search_id: int, message_type: str, payload: Dict) -> None:
+    """
+    Send a message to the clients of a field search. Call after the change
+    is committed; failures are logged, never raised to the writer.
+    """
+    message = serialize(field_search_id, message_type, payload)
+    try:
+        if LIVE_UPDATES_BACKEND == "postgres":
+            _notify(field_search_id, message)
+        else:
+            deliver(field_search_id, message)
+    except Exception as e:
+        logger.warning(f"Could not publish {message_type} update of field search {field_search_id}: {e}")
+
+
+def publish_many(field_search_ids: Iterable[int], message_type: str, payload: Dict) -> None:
+    for field_search_id in field_search_ids:
+        publish(field_search_id, message_type, payload)
+
+
+def field_searches_of_search(db: Session, search_id: int) -> List[int]:
+    """Ids of the field searches of a search (receivers of map grid and event messages)"""
+    from app.models.field_search import FieldSearch
+
+    return [field_search_id for (field_search_id,) in db.query(FieldSearch.id).filter(FieldSearch.search_id == search_id)]
+
+
+def publish_for_search(db: Session, search_id: int, message_type: str, payload: Dict) -> None:
+    """Send a message to the clients of all field searches of a search"""
+    publish_many(field_searches_of_search(db, search_id), message_type, payload)
+
+
+def publish_cells(
+    db: Session,
+    search_id: int,
+    map_grid_id: int,
+    version: Optional[int],
+    cells: List[Dict],
+    deleted_ids: Iterable[int] = ()
+) -> None:
+    """
+    Publish changed cells of a map grid (dicts with the cell id and the
+    changed fields); too many become a map_grid message.
+    """
+    deleted_ids = list(deleted_ids)
+    if len(cells) + len(deleted_ids) > MAX_CELL_DIFFS:
+        publish_for_search(db, search_id, "map_grid", {"map_grid_id": map_grid_id, "version": version})
+        return
+    publish_for_search(db, search_id, "cells", {
+        "map_grid_id": map_grid_id, "version": version, "cells": cells, "deleted_cell_ids": deleted_ids
+    })
+
+
+def _listen() -> None:
+    from app.db import engine
+
+    while not _stop.is_set():
+        raw = None
+        try:
+            raw = engine.raw_connection()
+            conn = raw.driver_connection
+            conn.autocommit = True
+            conn.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+            logger.info(f"Listening for live updates on {NOTIFY_CHANNEL}")
+            while not _stop.is_set():
+                # Wakes at least every second to notice shutdown
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    field_search_id, _, message = notify.payload.partition(" ")
+                    deliver(int(field_search_id), message)
+        except Exception as e:
+            logger.warning(f"Live updates listener failed, reconnecting: {e}")
+            _stop.wait(1.0)
+        finally:
+            if raw is not None:
+                try:
+                    # Autocommit and LISTEN must not leak back into the pool
+                    raw.invalidate()
+                except Exception:
+                    pass
+
+
+def start_listener() -> None:
+    """Start receiving NOTIFY messages (postgres backend; application startup)"""
+    global _listener
+    if LIVE_UPDATES_BACKEND != "postgres" or _listener is not None:
+        return
+    _stop.clear()
+    _listener = threading.Thread(target=_listen, name="live-updates-listener", daemon=True)
+    _listener.start()
+
+
+def stop_listener() -> None:
+    """Stop the NOTIFY listener (application shutdown)"""
+    global _listener
+    if _listener is not None:
+        _stop.set()
+        _listener.join(timeout=5)
+        _listener = None
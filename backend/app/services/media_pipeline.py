@@ -0,0 +1,129 @@
+"""
+Post-upload processing of stored files.
+
+With local storage this only queues image variants, video derivatives and
+simplified tracks.
+With a remote storage backend (see storage.py) the original and all of its
+derivatives are staged in UPLOAD_DIR while they are processed and published
+to the backend afterwards; objects uploaded directly by clients are fetched
+into UPLOAD_DIR first.
+"""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, List, Optional
+
+from app.core.logging_config import get_logger
+from app.services import upload_service
+from app.services.image_variants import IMAGE_VARIANTS, is_image_url, schedule_variants
+from app.services.storage import ensure_local, get_storage, key_from_url, publish_local
+from app.services.track_variants import is_track_url, schedule_track_variants, track_variant_key
+from app.services.video_processing import (
+    VIDEO_VARIANTS, is_processing, is_video_url, schedule_video_processing
+)
+
+logger = get_logger(__name__)
+
+# Transfers to/from remote storage (I/O bound, kept off the event loop and
+# off the process pool callback threads)
+TRANSFER_WORKERS = 4
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def derivative_keys(key: str) -> List[str]:
+    """Storage keys of all derivatives an original may have"""
+    keys = [f"variants/{variant}/{key}.webp" for variant in IMAGE_VARIANTS]
+    keys += [f"variants/{variant}/{key}{suffix}" for variant, suffix in VIDEO_VARIANTS.items()]
+    keys.append(track_variant_key(key))
+    return keys
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=TRANSFER_WORKERS, thread_name_prefix="storage")
+        return _executor
+
+
+def shutdown_executor() -> None:
+    """Stop the transfer threads (application shutdown)"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _publish(key: str, original_in_storage: bool = False) -> None:
+    for derivative in derivative_keys(key):
+        publish_local(derivative)
+    if original_in_storage:
+        # Fetched for processing only - drop the local copy
+        (upload_service.UPLOAD_DIR / key).unlink(missing_ok=True)
+    else:
+        publish_local(key)
+
+
+def _publish_when_done(url: str, key: str, futures: List[Future], original_in_storage: bool) -> None:
+    """Publish once every processing job of an upload has finished"""
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(_future: Future) -> None:
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        if is_processing(url):
+            # Another job for the same file is running; it publishes the result
+            return
+        _get_executor().submit(_publish, key, original_in_storage)
+
+    for future in futures:
+        future.add_done_callback(done)
+
+
+def _process_remote(url: str) -> None:
+    if is_processing(url):
+        # Already being rendered by an earlier job, which publishes the result
+        return
+    key = key_from_url(url)
+    original_in_storage = not (upload_service.UPLOAD_DIR / key).is_file()
+    try:
+        if ensure_local(key) is None:
+            logger.warning(f"Uploaded object {key} not found in storage")
+            return
+    except Exception as e:
+        logger.warning(f"Could not fetch {key} for processing: {e}")
+        return
+
+    futures = list(schedule_variants([url]).values())
+    futures += list(schedule_video_processing([url]).values())
+    futures += list(schedule_track_variants([url]).values())
+    if futures:
+        _publish_when_done(url, key, futures, original_in_storage)
+    else:
+        _publish(key, original_in_storage)
+
+
+def process_new_uploads(urls: Iterable[str]) -> None:
+    """
+    Render derivatives of freshly stored uploads (fire and forget) and, with
+    a remote storage backend, publish everything once rendering is done.
+    """
+    urls = list(urls)
+    if get_storage().is_local:
+        schedule_variants(urls)
+        schedule_video_processing(urls)
+        schedule_track_variants(urls)
+        return
+    for url in urls:
+        if key_from_url(url) is None:
+            continue
+        if not (is_image_url(url) or is_video_url(url) or is_track_url(url)):
+            # Nothing to render (audio, documents) - publish right away
+            _get_executor().submit(_publish, key_from_url(url))
+        else:
+            _get_executor().submit(_process_remote, url)
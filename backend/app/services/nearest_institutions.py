@@ -0,0 +1,112 @@
+"""
+Nearest organizations of each type around a point (k nearest neighbours).
+
+The geohash index of organizations (see geohash.py) answers "within r km";
+k nearest neighbours are found by growing r. Each round is one query that
+ranks the organizations inside the circle per type by great-circle distance
+(row_number() over (partition by type order by distance)) and keeps the
+first per_type of each type. Once a type has per_type organizations inside
+r, they are its nearest ones: everything outside the circle is farther.
+
+The radius starts at START_RADIUS_KM and grows by RADIUS_GROWTH until every
+requested type is complete or max_radius_km is reached (then types keep the
+organizations found so far).
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.models.institutions_call import InstitutionsCall
+from app.models.organization import Organization, OrganizationType
+from app.services import geohash
+
+START_RADIUS_KM = 10.0
+RADIUS_GROWTH = 4.0
+MAX_PER_TYPE = 20
+
+
+def organization_types(names: Optional[Iterable[str]]) -> List[OrganizationType]:
+    """Organization types by name (all types if none are given); ValueError for unknown names"""
+    if not names:
+        return list(OrganizationType)
+    try:
+        return [OrganizationType[name] for name in names]
+    except KeyError as e:
+        raise ValueError(f"Invalid organization type: {e.args[0]}")
+
+
+def _ranked(
+    db: Session,
+    lat: float,
+    lon: float,
+    radius_km: float,
+    types: List[OrganizationType],
+    per_type: int
+) -> List[Tuple[Organization, float]]:
+    distance = geohash.distance_km_sql(Organization.lat, Organization.lon, lat, lon)
+    ranked = select(
+        Organization.id,
+        distance.label("distance_km"),
+        func.row_number().over(partition_by=Organization.type, order_by=(distance, Organization.id)).label("rank"),
+    ).where(
+        Organization.type.in_(types),
+        geohash.radius_filter(Organization.lat, Organization.lon, Organization.geohash, lat, lon, radius_km),
+    ).subquery()
+    return [
+        (organization, float(distance_km))
+        for organization, distance_km in db.query(Organization, ranked.c.distance_km)
+        .join(ranked, ranked.c.id == Organization.id)
+        .filter(ranked.c.rank <= per_type)
+        .order_by(Organization.type, ranked.c.distance_km, Organization.id)
+    ]
+
+
+def nearest_organizations(
+    db: Session,
+    lat: float,
+    lon: float,
+    per_type: int = 3,
+    types: Optional[Iterable[OrganizationType]] = None,
+    max_radius_km: float = 200.0
+) -> Tuple[List[Tuple[Organization, float]], float]:
+    """
+    The per_type nearest organizations of each type as (organization,
+    distance in km), ordered by type and distance, and the radius searched.
+    """
+    types = list(types or OrganizationType)
+    per_type = min(per_type, MAX_PER_TYPE)
+    radius_km = min(START_RADIUS_KM, max_radius_km)
+    while True:
+        found = _ranked(db, lat, lon, radius_km, types, per_type)
+        counts: Dict[OrganizationType, int] = {}
+        for organization, _ in found:
+            counts[organization.type] = counts.get(organization.type, 0) + 1
+        if radius_km >= max_radius_km or all(counts.get(kind, 0) >= per_type for kind in types):
+            return found, radius_km
+        radius_km = min(radius_km * RADIUS_GROWTH, max_radius_km)
+
+
+def plan_calls(db: Session, case_id: int, nearest: List[Tuple[Organization, float]]) -> List[InstitutionsCall]:
+    """
+    Add pending calls (no result yet) of a case to the given organizations,
+    skipping organizations the case already has a call for. Not committed.
+    """
+    planned = {
+        organization_id for (organization_id,) in db.query(InstitutionsCall.organization_id).filter(
+            InstitutionsCall.case_id == case_id, InstitutionsCall.organization_id.isnot(None)
+        )
+    }
+    calls = [
+        InstitutionsCall(
+            case_id=case_id,
+            organization_id=organization.id,
+            organization_name=organization.name,
+            organization_type=organization.type.value,
+            notes=f"{distance_km:.1f} km",
+        )
+        for organization, distance_km in nearest
+        if organization.id not in planned
+    ]
+    db.add_all(calls)
+    return calls
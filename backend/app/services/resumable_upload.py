@@ -0,0 +1,337 @@
+"""
+Resumable uploads for large media (drone and body-cam video from the field).
+
+Protocol (routes in routers/upload.py):
+
+    POST   /upload/sessions                 create session (filename, size, optional sha256)
+    GET    /upload/sessions/{id}            current offset - where to resume after a disconnect
+    PATCH  /upload/sessions/{id}            append a chunk; Upload-Offset header must equal
+                                            the current offset, optional Upload-Checksum
+                                            "sha256 <hex>" verifies the chunk
+    POST   /upload/sessions/{id}/complete   verify size/digest, move into content-addressed storage
+    DELETE /upload/sessions/{id}            abort
+
+Sessions live on disk under UPLOAD_DIR/.sessions (<id>.json metadata and
+<id>.part data), so they survive restarts and the final move into
+/uploads/ab/cd/<sha256><ext> is an atomic rename. The current offset is the
+size of the data file: bytes received before a connection drop are kept
+unless the chunk carried a checksum.
+
+Requests to one session are serialized by an exclusive flock on its data
+file, which holds across worker processes sharing UPLOAD_DIR; a request
+finding the session busy is rejected (UploadSessionBusy) instead of waiting,
+and the offset is checked and written under the lock.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import re
+import secrets
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Iterator, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+
+from app.core.logging_config import get_logger
+from app.services.upload_service import (
+    CHUNK_SIZE, UPLOAD_DIR, StoredUpload, UploadTooLargeError, store_staged_file
+)
+
+logger = get_logger(__name__)
+
+SESSIONS_DIR = UPLOAD_DIR / ".sessions"
+
+MAX_RESUMABLE_SIZE = int(os.getenv("RESUMABLE_UPLOAD_MAX_SIZE", str(2 * 1024 * 1024 * 1024)))  # 2 GB
+# Suggested PATCH size - below nginx client_max_body_size
+RECOMMENDED_CHUNK_SIZE = 8 * 1024 * 1024
+# Sessions without activity for this long are discarded
+SESSION_TTL_HOURS = int(os.getenv("RESUMABLE_UPLOAD_TTL_HOURS", "24"))
+# Unfinished sessions a user may have at a time (each reserves up to MAX_RESUMABLE_SIZE)
+MAX_OPEN_SESSIONS = int(os.getenv("RESUMABLE_UPLOAD_MAX_OPEN_SESSIONS", "10"))
+
+UPLOAD_ID_RE = re.compile(r"^[A-Za-z0-9_-]{32,64}$")
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class UploadSessionError(Exception):
+    """Base error of the resumable upload protocol"""
+
+
+class UploadSessionNotFound(UploadSessionError):
+    """Unknown, completed, aborted or expired session"""
+
+
+class UploadSessionLimit(UploadSessionError):
+    """The user has MAX_OPEN_SESSIONS unfinished uploads already"""
+
+
+class UploadSessionBusy(UploadSessionError):
+    """Another request to the session is in progress"""
+
+
+class UploadOffsetMismatch(UploadSessionError):
+    """Chunk does not start at the current offset of the session"""
+
+    def __init__(self, expected: int, received: int):
+        self.expected = expected
+        self.received = received
+        super().__init__(f"Upload offset is {expected}, chunk starts at {received}")
+
+
+class UploadIntegrityError(UploadSessionError):
+    """Chunk or assembled file does not match the announced checksum/size"""
+
+
+@dataclass
+class UploadSession:
+    """Metadata of an upload in progress"""
+    upload_id: str
+    filename: str
+    size: int
+    sha256: Optional[str]
+    created_at: float
+    owner_id: Optional[int] = None
+
+    @property
+    def meta_path(self) -> Path:
+        return SESSIONS_DIR / f"{self.upload_id}.json"
+
+    @property
+    def data_path(self) -> Path:
+        return SESSIONS_DIR / f"{self.upload_id}.part"
+
+    @property
+    def extension(self) -> str:
+        return Path(self.filename).suffix.lower()
+
+    @property
+    def offset(self) -> int:
+        try:
+            return self.data_path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    @property
+    def expires_at(self) -> float:
+        try:
+            last_activity = self.meta_path.stat().st_mtime
+        except FileNotFoundError:
+            last_activity = self.created_at
+        return last_activity + SESSION_TTL_HOURS * 3600
+
+
+def _open_locked(session: UploadSession) -> BinaryIO:
+    """
+    The session's data file opened for writing with an exclusive flock
+    (released by closing it). Raises UploadSessionBusy if another request
+    holds it and UploadSessionNotFound if the session was removed meanwhile.
+    """
+    try:
+        f = open(session.data_path, "r+b")
+    except FileNotFoundError:
+        raise UploadSessionNotFound(session.upload_id)
+    try:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadSessionBusy(session.upload_id)
+        # Completed or aborted while we waited for the file
+        try:
+            removed = os.stat(session.data_path).st_ino != os.fstat(f.fileno()).st_ino
+        except FileNotFoundError:
+            removed = True
+        if removed:
+            raise UploadSessionNotFound(session.upload_id)
+    except BaseException:
+        f.close()
+        raise
+    return f
+
+
+def _discard(session: UploadSession) -> None:
+    for path in (session.data_path, session.meta_path):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _sessions() -> Iterator[UploadSession]:
+    """All sessions on disk, expired ones included"""
+    if not SESSIONS_DIR.is_dir():
+        return
+    for meta_path in SESSIONS_DIR.glob("*.json"):
+        try:
+            yield UploadSession(**json.loads(meta_path.read_text()))
+        except (OSError, ValueError, TypeError):
+            continue
+
+
+def open_session_count(owner_id: int) -> int:
+    """Unfinished, unexpired sessions of a user"""
+    now = time.time()
+    return sum(1 for session in _sessions() if session.owner_id == owner_id and session.expires_at >= now)
+
+
+def create_session(
+    filename: str, size: int, sha256: Optional[str] = None, owner_id: Optional[int] = None
+) -> UploadSession:
+    """Start a new upload of `size` bytes, at most MAX_OPEN_SESSIONS at a time per owner"""
+    if size > MAX_RESUMABLE_SIZE:
+        raise UploadTooLargeError(filename, MAX_RESUMABLE_SIZE)
+    if sha256 is not None:
+        sha256 = sha256.lower()
+        if not SHA256_RE.match(sha256):
+            raise UploadIntegrityError("sha256 must be 64 hex characters")
+    if owner_id is not None and open_session_count(owner_id) >= MAX_OPEN_SESSIONS:
+        raise UploadSessionLimit(f"At most {MAX_OPEN_SESSIONS} unfinished uploads at a time")
+
+    SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
+    session = UploadSession(
+        upload_id=secrets.token_urlsafe(32),
+        filename=filename,
+        size=size,
+        sha256=sha256,
+        created_at=time.time(),
+        owner_id=owner_id,
+    )
+    session.data_path.touch()
+    session.meta_path.write_text(json.dumps(asdict(session)))
+    return session
+
+
+def get_session(upload_id: str) -> UploadSession:
+    """Load a session; raises UploadSessionNotFound for unknown or expired ids"""
+    if not UPLOAD_ID_RE.match(upload_id):
+        raise UploadSessionNotFound(upload_id)
+    try:
+        data = json.loads((SESSIONS_DIR / f"{upload_id}.json").read_text())
+    except (FileNotFoundError, ValueError):
+        raise UploadSessionNotFound(upload_id)
+
+    session = UploadSession(**data)
+    if session.expires_at < time.time():
+        _discard(session)
+        raise UploadSessionNotFound(upload_id)
+    return session
+
+
+async def append_chunk(
+    session: UploadSession,
+    offset: int,
+    chunks: AsyncIterator[bytes],
+    checksum: Optional[str] = None,
+) -> int:
+    """
+    Append request body chunks at `offset`. Returns the new offset.
+
+    Without a checksum, bytes received before a client disconnect are kept so
+    the next PATCH can continue from there. With a checksum the chunk is
+    all-or-nothing.
+    """
+    expected_digest = None
+    if checksum:
+        algorithm, _, value = checksum.strip().partition(" ")
+        if algorithm.lower() != "sha256" or not SHA256_RE.match(value.strip().lower()):
+            raise UploadIntegrityError("Upload-Checksum must be 'sha256 <hex digest>'")
+        expected_digest = value.strip().lower()
+
+    out = await run_in_threadpool(_open_locked, session)
+    try:
+        current = os.fstat(out.fileno()).st_size
+        if offset != current:
+            raise UploadOffsetMismatch(current, offset)
+
+        digest = hashlib.sha256()
+        written = current
+        out.seek(current)
+        try:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                if written + len(chunk) > session.size:
+                    raise UploadIntegrityError(f"Chunk exceeds announced size of {session.size} bytes")
+                digest.update(chunk)
+                await run_in_threadpool(out.write, chunk)
+                written += len(chunk)
+            await run_in_threadpool(out.flush)
+            if expected_digest is not None and digest.hexdigest() != expected_digest:
+                raise UploadIntegrityError("Chunk checksum mismatch")
+        except ClientDisconnect:
+            if expected_digest is not None:
+                await run_in_threadpool(out.truncate, current)
+                written = current
+            else:
+                await run_in_threadpool(out.flush)
+            logger.info(f"Upload {session.upload_id} interrupted at offset {written}")
+            return written
+        except BaseException:
+            await run_in_threadpool(out.truncate, current)
+            raise
+
+        # Activity extends the session lifetime
+        os.utime(session.meta_path)
+        return written
+    finally:
+        await run_in_threadpool(out.close)
+
+
+def _file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def complete_session(session: UploadSession) -> StoredUpload:
+    """Verify the assembled file and move it into content-addressed storage"""
+    data = await run_in_threadpool(_open_locked, session)
+    try:
+        received = os.fstat(data.fileno()).st_size
+        if received != session.size:
+            raise UploadOffsetMismatch(session.size, received)
+
+        sha256 = await run_in_threadpool(_file_digest, session.data_path)
+        if session.sha256 and sha256 != session.sha256:
+            _discard(session)
+            raise UploadIntegrityError("File checksum mismatch, upload discarded")
+
+        os.chmod(session.data_path, 0o644)
+        stored = await run_in_threadpool(
+            store_staged_file, session.data_path, sha256, received, session.extension, session.filename
+        )
+        _discard(session)
+    finally:
+        await run_in_threadpool(data.close)
+
+    logger.info(f"Resumable upload {session.upload_id} completed: {stored.url} ({received} bytes)")
+    return stored
+
+
+async def abort_session(session: UploadSession) -> None:
+    """Drop an unfinished upload"""
+    data = await run_in_threadpool(_open_locked, session)
+    try:
+        _discard(session)
+    finally:
+        await run_in_threadpool(data.close)
+
+
+def cleanup_expired_sessions(dry_run: bool = False) -> int:
+    """Remove sessions without activity for SESSION_TTL_HOURS. Returns their number."""
+    removed = 0
+    now = time.time()
+    for session in _sessions():
+        if session.expires_at < now:
+            removed += 1
+            if not dry_run:
+                _discard(session)
+    return removed
@@ -0,0 +1,320 @@
+"""
+Key/value state shared by all API workers: counters and locks with expiry.
+
+Rate limits (middleware/rate_limit.py) and job locks (forum import) must hold
+across workers; with per-process memory, N workers mean N times the limit
+and N concurrent jobs. Backends:
+
+    SHARED_STATE_BACKEND=memory    (default) state within this process
+                                   (single worker)
+    SHARED_STATE_BACKEND=postgres  shared_state table of the application
+                                   database (one upsert per operation)
+    SHARED_STATE_BACKEND=redis     any server speaking the Redis protocol
+                                   (Redis, Valkey, KeyDB, ...) at
+                                   SHARED_STATE_REDIS_URL
+
+Every key has a time to live; expired keys read as absent. Operations are
+atomic on the server:
+
+    incr(key, amount, ttl)  add to an integer (created as 0 with ttl if absent)
+    get(key)                value or None
+    add(key, value, ttl)    set only if absent; True if set (locks)
+    delete(key)
+    delete_if(key, value)   delete only if the value is still the given one
+                            (release a lock only by its owner)
+    extend_if(key, value, ttl)
+                            renew the ttl only if the value is still the
+                            given one (lock heartbeat)
+
+The Redis backend needs the redis package (redis-py); rediss:// URLs connect
+over TLS.
+"""
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import BigInteger, Text, cast, case, delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.logging_config import get_logger
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = get_logger(__name__)
+
+SHARED_STATE_BACKEND = os.getenv("SHARED_STATE_BACKEND", "memory").lower()
+SHARED_STATE_REDIS_URL = os.getenv("SHARED_STATE_REDIS_URL", "redis://redis:6379/0")
+KEY_PREFIX = "crm:"
+# Expired entries of the memory and postgres backends are purged at most this often
+PURGE_SECONDS = 60.0
+REDIS_TIMEOUT_SECONDS = 2.0
+
+# KEYS[1] key, ARGV[1] expected value (, ARGV[2] ttl in ms): atomic compare-and-delete / -expire
+REDIS_DELETE_IF = "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) else return 0 end"
+REDIS_EXTEND_IF = (
+    "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('PEXPIRE', KEYS[1], ARGV[2]) else return 0 end"
+)
+
+
+class SharedStateError(Exception):
+    """The backend failed or answered with an error"""
+
+
+class SharedState(ABC):
+    """Interface of the shared state backends"""
+
+    @abstractmethod
+    def incr(self, key: str, amount: int = 1, ttl: float = 60.0) -> int:
+        ...
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def add(self, key: str, value: str, ttl: float) -> bool:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def delete_if(self, key: str, value: str) -> bool:
+        ...
+
+    @abstractmethod
+    def extend_if(self, key: str, value: str, ttl: float) -> bool:
+        ...
+
+
+class MemoryState(SharedState):
+    """State of this process only"""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[str, float]] = {}
+        self._next_purge = 0.0
+
+    def _live(self, key: str, now: float) -> Optional[str]:
+        # Caller holds the lock
+        if now >= self._next_purge:
+            self._next_purge = now + PURGE_SECONDS
+            for expired in [k for k, (_, expires) in self._entries.items() if expires <= now]:
+                del self._entries[expired]
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= now:
+            return None
+        return entry[0]
+
+    def incr(self, key: str, amount: int = 1, ttl: float = 60.0) -> int:
+        now = self.clock()
+        with self._lock:
+            value = self._live(key, now)
+            expires = self._entries[key][1] if value is not None else now + ttl
+            total = int(value or 0) + amount
+            self._entries[key] = (str(total), expires)
+            return total
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._live(key, self.clock())
+
+    def add(self, key: str, value: str, ttl: float) -> bool:
+        now = self.clock()
+        with self._lock:
+            if self._live(key, now) is not None:
+                return False
+            self._entries[key] = (value, now + ttl)
+            return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_if(self, key: str, value: str) -> bool:
+        with self._lock:
+            if self._live(key, self.clock()) != value:
+                return False
+            del self._entries[key]
+            return True
+
+    def extend_if(self, key: str, value: str, ttl: float) -> bool:
+        now = self.clock()
+        with self._lock:
+            if self._live(key, now) != value:
+                return False
+            self._entries[key] = (value, now + ttl)
+            return True
+
+
+class PostgresState(SharedState):
+    """State in the shared_state table; expiry uses the database clock"""
+
+    def __init__(self, engine=None):
+        if engine is None:
+            from app.db import engine
+        self.engine = engine
+        self._next_purge = 0.0
+
+    @property
+    def table(self):
+        from app.models.shared_state import SharedStateEntry
+        return SharedStateEntry.__table__
+
+    def _purge(self, connection) -> None:
+        now = time.monotonic()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + PURGE_SECONDS
+        connection.execute(delete(self.table).where(self.table.c.expires_at <= func.now()))
+
+    def incr(self, key: str, amount: int = 1, ttl: float = 60.0) -> int:
+        table = self.table
+        expired = table.c.expires_at <= func.now()
+        statement = insert(table).values(
+            key=key, value=str(amount), expires_at=func.now() + timedelta(seconds=ttl)
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.key],
+            set_={
+                "value": case(
+                    (expired, statement.excluded.value),
+                    else_=cast(cast(table.c.value, BigInteger) + amount, Text),
+                ),
+                "expires_at": case((expired, statement.excluded.expires_at), else_=table.c.expires_at),
+            },
+        ).returning(table.c.value)
+        with self.engine.begin() as connection:
+            self._purge(connection)
+            return int(connection.execute(statement).scalar_one())
+
+    def get(self, key: str) -> Optional[str]:
+        table = self.table
+        with self.engine.connect() as connection:
+            return connection.execute(
+                select(table.c.value).where(table.c.key == key, table.c.expires_at > func.now())
+            ).scalar_one_or_none()
+
+    def add(self, key: str, value: str, ttl: float) -> bool:
+        table = self.table
+        statement = insert(table).values(key=key, value=value, expires_at=func.now() + timedelta(seconds=ttl))
+        # An expired entry is taken over; a live one makes the upsert a no-op (no row returned)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.key],
+            set_={"value": statement.excluded.value, "expires_at": statement.excluded.expires_at},
+            where=table.c.expires_at <= func.now(),
+        ).returning(table.c.key)
+        with self.engine.begin() as connection:
+            self._purge(connection)
+            return connection.execute(statement).first() is not None
+
+    def delete(self, key: str) -> None:
+        with self.engine.begin() as connection:
+            connection.execute(delete(self.table).where(self.table.c.key == key))
+
+    def delete_if(self, key: str, value: str) -> bool:
+        table = self.table
+        with self.engine.begin() as connection:
+            return connection.execute(
+                delete(table).where(table.c.key == key, table.c.value == value, table.c.expires_at > func.now())
+            ).rowcount > 0
+
+    def extend_if(self, key: str, value: str, ttl: float) -> bool:
+        table = self.table
+        with self.engine.begin() as connection:
+            return connection.execute(
+                update(table)
+                .where(table.c.key == key, table.c.value == value, table.c.expires_at > func.now())
+                .values(expires_at=func.now() + timedelta(seconds=ttl))
+            ).rowcount > 0
+
+
+class RedisState(SharedState):
+    """State on a Redis-protocol server through redis-py (pooled, TLS with rediss://)"""
+
+    def __init__(self, url: str = SHARED_STATE_REDIS_URL, timeout: float = REDIS_TIMEOUT_SECONDS):
+        if redis is None:
+            raise RuntimeError("redis is not installed - required for SHARED_STATE_BACKEND=redis")
+        # The pool hands out a connection only after AUTH/SELECT succeeded; a
+        # connection that fails is dropped and the command retried once on a new one
+        self.client = redis.Redis.from_url(
+            url,
+            socket_timeout=timeout,
+            socket_connect_timeout=timeout,
+            retry_on_error=[redis.exceptions.ConnectionError],
+            decode_responses=True,
+        )
+
+    def execute(self, *commands: List[str]) -> list:
+        """Send commands in one round trip (pipelined); their replies"""
+        pipeline = self.client.pipeline(transaction=False)
+        for command in commands:
+            pipeline.execute_command(*command)
+        try:
+            return pipeline.execute()
+        except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
+            raise SharedStateError(f"Shared state server unreachable: {e}") from e
+        except redis.exceptions.RedisError as e:
+            raise SharedStateError(str(e)) from e
+
+    @staticmethod
+    def _ttl_ms(ttl: float) -> str:
+        return str(max(1, int(ttl * 1000)))
+
+    def incr(self, key: str, amount: int = 1, ttl: float = 60.0) -> int:
+        key = KEY_PREFIX + key
+        _, total = self.execute(["SET", key, "0", "PX", self._ttl_ms(ttl), "NX"], ["INCRBY", key, str(amount)])
+        return total
+
+    def get(self, key: str) -> Optional[str]:
+        return self.execute(["GET", KEY_PREFIX + key])[0]
+
+    def add(self, key: str, value: str, ttl: float) -> bool:
+        return bool(self.execute(["SET", KEY_PREFIX + key, value, "PX", self._ttl_ms(ttl), "NX"])[0])
+
+    def delete(self, key: str) -> None:
+        self.execute(["DEL", KEY_PREFIX + key])
+
+    def delete_if(self, key: str, value: str) -> bool:
+        return self.execute(["EVAL", REDIS_DELETE_IF, "1", KEY_PREFIX + key, value])[0] == 1
+
+    def extend_if(self, key: str, value: str, ttl: float) -> bool:
+        return self.execute(["EVAL", REDIS_EXTEND_IF, "1", KEY_PREFIX + key, value, self._ttl_ms(ttl)])[0] == 1
+
+
+_state: Optional[SharedState] = None
+_state_lock = threading.Lock()
+
+
+def is_shared() -> bool:
+    """Whether state is shared between processes (not the memory backend)"""
+    return SHARED_STATE_BACKEND != "memory"
+
+
+def create_state(backend: str = SHARED_STATE_BACKEND) -> SharedState:
+    if backend == "memory":
+        return MemoryState()
+    if backend == "postgres":
+        return PostgresState()
+    if backend == "redis":
+        return RedisState(SHARED_STATE_REDIS_URL)
+    raise ValueError(f"Unknown SHARED_STATE_BACKEND: {backend}")
+
+
+def get_shared_state() -> SharedState:
+    """Get or create the configured shared state backend"""
+    global _state
+    if _state is None:
+        with _state_lock:
+            if _state is None:
+                _state = create_state()
+                logger.info(f"Shared state backend: {SHARED_STATE_BACKEND}")
+    return _state
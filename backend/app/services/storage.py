@@ -0,0 +1,478 @@
+"""
+Storage backends for uploaded files.
+
+Objects are addressed by key - the path below /uploads (ab/cd/<sha256>.jpg,
+variants/thumb/ab/cd/<sha256>.jpg.webp, grid_12.gpx, ...). Stored URLs keep
+the /uploads/<key> form with every backend, so records do not change when the
+backend does.
+
+    STORAGE_BACKEND=local   files live in UPLOAD_DIR (default)
+    STORAGE_BACKEND=s3      S3-compatible object storage (AWS S3, MinIO, ...)
+
+With the S3 backend clients upload directly to the bucket via presigned PUT
+URLs and GET /uploads/<key> redirects to a presigned download URL, so media
+bytes do not pass through the API workers. Files written by the API itself
+(multipart uploads, derivatives, generated grids) are staged in UPLOAD_DIR
+and published to the bucket with publish_local().
+
+The local backend offers the same direct-upload contract through a signed
+PUT /upload/direct/{token} endpoint.
+"""
+import base64
+import hashlib
+import mimetypes
+import os
+import shutil
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterable, Iterator, Optional, Set
+
+from jose import JWTError, jwt
+from starlette.concurrency import run_in_threadpool
+
+from app.core.logging_config import get_logger
+from app.services import upload_service
+from app.services.upload_service import StoredUpload, content_hash_from_url, store_staged_file
+
+try:
+    import boto3
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None
+    BotoConfig = None
+    ClientError = None
+
+logger = get_logger(__name__)
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local").lower()
+
+# Lifetime of presigned upload/download URLs
+PRESIGN_EXPIRES_SECONDS = int(os.getenv("STORAGE_PRESIGN_EXPIRES", "900"))
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Direct upload tokens of the local backend are signed with the JWT secret
+DIRECT_UPLOAD_TOKEN_SUBJECT = "direct-upload"
+
+
+class DirectUploadError(Exception):
+    """Invalid or expired direct upload, or content not matching the announced file"""
+
+
+@dataclass
+class StoredObject:
+    """Object listed from a storage backend"""
+    key: str
+    size: int
+    modified: float  # Unix timestamp
+
+
+@dataclass
+class PresignedUpload:
+    """Where and how a client uploads an object directly"""
+    url: str
+    method: str = "PUT"
+    headers: Dict[str, str] = field(default_factory=dict)
+    expires_at: float = 0
+
+
+def _cache_control(key: str) -> Optional[str]:
+    if content_hash_from_url(f"/uploads/{key}") or key.startswith("variants/"):
+        return IMMUTABLE_CACHE_CONTROL
+    return None
+
+
+def guess_content_type(key: str) -> str:
+    return mimetypes.guess_type(key)[0] or "application/octet-stream"
+
+
+class StorageBackend(ABC):
+    """Interface of upload storage backends"""
+    name = "base"
+    # True when objects are plain files in UPLOAD_DIR
+    is_local = True
+
+    @abstractmethod
+    def put_file(self, path: Path, key: str, content_type: Optional[str] = None) -> None:
+        ...
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def size(self, key: str) -> Optional[int]:
+        """Object size in bytes, None when the object does not exist"""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def move(self, key: str, new_key: str) -> None:
+        """Rename an object; the modification time of the target is 'now'"""
+
+    @abstractmethod
+    def iter_objects(self, prefix: str = "", exclude: Iterable[str] = ()) -> Iterator[StoredObject]:
+        """
+        Lazily list objects below a key prefix ('' for all). Dot entries
+        below the prefix and the directories (key prefixes) in exclude are skipped.
+        """
+
+    @abstractmethod
+    def download_to(self, key: str, path: Path) -> None:
+        ...
+
+    @abstractmethod
+    def download_url(self, key: str, filename: Optional[str] = None) -> str:
+        ...
+
+    @abstractmethod
+    def presigned_upload(self, key: str, sha256: str, size: int, content_type: str) -> PresignedUpload:
+        ...
+
+
+class LocalStorage(StorageBackend):
+    """Files in the local upload directory (single host or shared volume)"""
+    name = "local"
+    is_local = True
+
+    def __init__(self, root: Optional[Path] = None):
+        self._root = root
+
+    @property
+    def root(self) -> Path:
+        return self._root or upload_service.UPLOAD_DIR
+
+    def path(self, key: str) -> Path:
+        path = self.root / key
+        # Security check - keys must stay inside the upload directory
+        path.resolve().relative_to(self.root.resolve())
+        return path
+
+    def put_file(self, path: Path, key: str, content_type: Optional[str] = None) -> None:
+        target = self.path(key)
+        if Path(path).resolve() == target.resolve():
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=target.parent, suffix=".part")
+        os.close(fd)
+        try:
+            shutil.copyfile(path, tmp_path)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def exists(self, key: str) -> bool:
+        return self.path(key).is_file()
+
+    def size(self, key: str) -> Optional[int]:
+        try:
+            return self.path(key).stat().st_size
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key: str) -> None:
+        try:
+            self.path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def move(self, key: str, new_key: str) -> None:
+        target = self.path(new_key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self.path(key), target)
+        os.utime(target)
+
+    def iter_objects(self, prefix: str = "", exclude: Iterable[str] = ()) -> Iterator[StoredObject]:
+        prefix = prefix.strip("/")
+        base = self.root / prefix if prefix else self.root
+        yield from self._walk(base, f"{prefix}/" if prefix else "", set(exclude))
+
+    def _walk(self, directory: Path, relative: str, exclude: Set[str]) -> Iterator[StoredObject]:
+        try:
+            entries = os.scandir(directory)
+        except (FileNotFoundError, NotADirectoryError):
+            return
+        with entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    # Staging areas, .gitkeep and in-flight .part files
+                    continue
+                key = f"{relative}{entry.name}"
+                if entry.is_dir(follow_symlinks=False):
+                    if key in exclude:
+                        continue
+                    yield from self._walk(Path(entry.path), f"{key}/", exclude)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    yield StoredObject(key=key, size=stat.st_size, modified=stat.st_mtime)
+
+    def download_to(self, key: str, path: Path) -> None:
+        if self.path(key).resolve() != Path(path).resolve():
+            shutil.copyfile(self.path(key), path)
+
+    def download_url(self, key: str, filename: Optional[str] = None) -> str:
+        # Served by routers/files.py (or nginx via X-Accel-Redirect)
+        return f"/uploads/{key}"
+
+    def presigned_upload(self, key: str, sha256: str, size: int, content_type: str) -> PresignedUpload:
+        from app.services.auth_service import ALGORITHM, SECRET_KEY
+
+        expires_at = time.time() + PRESIGN_EXPIRES_SECONDS
+        token = jwt.encode(
+            {
+                "sub": DIRECT_UPLOAD_TOKEN_SUBJECT,
+                "key": key,
+                "sha256": sha256,
+                "size": size,
+                "exp": int(expires_at),
+            },
+            SECRET_KEY,
+            algorithm=ALGORITHM,
+        )
+        # Relative to the API root (the client prefixes its API base URL)
+        return PresignedUpload(
+            url=f"/upload/direct/{token}",
+            headers={"Content-Type": content_type},
+            expires_at=expires_at,
+        )
+
+
+class S3Storage(StorageBackend):
+    """S3-compatible object storage (AWS S3, MinIO)"""
+    name = "s3"
+    is_local = False
+
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: Optional[str] = None,
+        public_endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        access_key: Optional[str] = None,
+        secret_key: Optional[str] = None,
+    ):
+        if boto3 is None:
+            raise RuntimeError("boto3 is not installed - required for STORAGE_BACKEND=s3")
+        self.bucket = bucket
+        config = BotoConfig(signature_version="s3v4", s3={"addressing_style": "path"})
+        session = boto3.session.Session(
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            region_name=region or "us-east-1",
+        )
+        self.client = session.client("s3", endpoint_url=endpoint_url, config=config)
+        # Presigned URLs must use the host browsers can reach (MinIO behind a proxy)
+        self.presign_client = (
+            session.client("s3", endpoint_url=public_endpoint_url, config=config)
+            if public_endpoint_url else self.client
+        )
+
+    def _not_found(self, error) -> bool:
+        return error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    def put_file(self, path: Path, key: str, content_type: Optional[str] = None) -> None:
+        extra = {"ContentType": content_type or guess_content_type(key)}
+        cache_control = _cache_control(key)
+        if cache_control:
+            extra["CacheControl"] = cache_control
+        self.client.upload_file(str(path), self.bucket, key, ExtraArgs=extra)
+
+    def exists(self, key: str) -> bool:
+        return self.size(key) is not None
+
+    def size(self, key: str) -> Optional[int]:
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)["ContentLength"]
+        except ClientError as e:
+            if self._not_found(e):
+                return None
+            raise
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def move(self, key: str, new_key: str) -> None:
+        self.client.copy_object(
+            Bucket=self.bucket, Key=new_key, CopySource={"Bucket": self.bucket, "Key": key}
+        )
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def iter_objects(self, prefix: str = "", exclude: Iterable[str] = ()) -> Iterator[StoredObject]:
+        prefix = prefix.strip("/")
+        exclude_prefixes = tuple(f"{name}/" for name in exclude)
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{prefix}/" if prefix else ""):
+            for item in page.get("Contents", []):
+                relative = item["Key"][len(prefix) + 1:] if prefix else item["Key"]
+                if item["Key"].startswith(exclude_prefixes) or any(
+                    part.startswith(".") for part in relative.split("/")
+                ):
+                    continue
+                yield StoredObject(
+                    key=item["Key"],
+                    size=item["Size"],
+                    modified=item["LastModified"].timestamp(),
+                )
+
+    def download_to(self, key: str, path: Path) -> None:
+        self.client.download_file(self.bucket, key, str(path))
+
+    def download_url(self, key: str, filename: Optional[str] = None) -> str:
+        params = {"Bucket": self.bucket, "Key": key}
+        if filename:
+            params["ResponseContentDisposition"] = f'attachment; filename="{filename}"'
+        return self.presign_client.generate_presigned_url(
+            "get_object", Params=params, ExpiresIn=PRESIGN_EXPIRES_SECONDS
+        )
+
+    def presigned_upload(self, key: str, sha256: str, size: int, content_type: str) -> PresignedUpload:
+        # The bucket verifies the digest, so the content matches the key
+        checksum = base64.b64encode(bytes.fromhex(sha256)).decode()
+        params = {
+            "Bucket": self.bucket,
+            "Key": key,
+            "ContentType": content_type,
+            "ChecksumSHA256": checksum,
+        }
+        headers = {"Content-Type": content_type, "x-amz-checksum-sha256": checksum}
+        cache_control = _cache_control(key)
+        if cache_control:
+            params["CacheControl"] = cache_control
+            headers["Cache-Control"] = cache_control
+        url = self.presign_client.generate_presigned_url(
+            "put_object", Params=params, ExpiresIn=PRESIGN_EXPIRES_SECONDS
+        )
+        return PresignedUpload(url=url, headers=headers, expires_at=time.time() + PRESIGN_EXPIRES_SECONDS)
+
+
+_storage: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    """Storage backend configured with STORAGE_BACKEND"""
+    global _storage
+    if _storage is None:
+        if STORAGE_BACKEND == "s3":
+            _storage = S3Storage(
+                bucket=os.getenv("S3_BUCKET", "uploads"),
+                endpoint_url=os.getenv("S3_ENDPOINT_URL") or None,
+                public_endpoint_url=os.getenv("S3_PUBLIC_ENDPOINT_URL") or None,
+                region=os.getenv("S3_REGION") or None,
+                access_key=os.getenv("S3_ACCESS_KEY") or None,
+                secret_key=os.getenv("S3_SECRET_KEY") or None,
+            )
+        else:
+            _storage = LocalStorage()
+        logger.info(f"Upload storage backend: {_storage.name}")
+    return _storage
+
+
+def key_from_url(url: Optional[str]) -> Optional[str]:
+    """Storage key of an /uploads URL (None for other URLs and unsafe paths)"""
+    if not url or not url.startswith("/uploads/"):
+        return None
+    key = url[len("/uploads/"):]
+    if not key or key.startswith("/") or any(part in ("", ".", "..") for part in key.split("/")):
+        return None
+    return key
+
+
+def publish_local(key: str, keep_local: bool = False) -> None:
+    """
+    Make a file staged in UPLOAD_DIR/key available in the storage backend.
+    With a remote backend the local copy is removed afterwards (unless
+    keep_local); with the local backend the file already is in place.
+    """
+    storage = get_storage()
+    if storage.is_local:
+        return
+    path = LocalStorage().path(key)
+    if not path.is_file():
+        return
+    storage.put_file(path, key)
+    if not keep_local:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def ensure_local(key: str) -> Optional[Path]:
+    """
+    Local path of an object (downloaded into UPLOAD_DIR from a remote backend
+    when needed, e.g. to render derivatives). None when it does not exist.
+    """
+    path = LocalStorage().path(key)
+    if path.is_file():
+        return path
+    storage = get_storage()
+    if storage.is_local or not storage.exists(key):
+        return None
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".part")
+    os.close(fd)
+    try:
+        storage.download_to(key, Path(tmp_path))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return path
+
+
+def verify_direct_upload_token(token: str) -> Dict:
+    """Claims of a local direct upload token (key, sha256, size)"""
+    from app.services.auth_service import ALGORITHM, SECRET_KEY
+
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise DirectUploadError("Upload URL is invalid or expired")
+    if claims.get("sub") != DIRECT_UPLOAD_TOKEN_SUBJECT or not key_from_url(f"/uploads/{claims.get('key')}"):
+        raise DirectUploadError("Upload URL is invalid or expired")
+    return claims
+
+
+async def receive_direct_upload(claims: Dict, chunks: AsyncIterator[bytes]) -> StoredUpload:
+    """
+    Write the body of a direct upload to the local backend. The content must
+    match the size and digest the upload URL was issued for.
+    """
+    size_limit = claims["size"]
+    upload_service.UPLOAD_TMP_DIR.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=upload_service.UPLOAD_TMP_DIR, suffix=".part")
+    out = os.fdopen(fd, "wb")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            size += len(chunk)
+            if size > size_limit:
+                raise DirectUploadError(f"Content exceeds announced size of {size_limit} bytes")
+            digest.update(chunk)
+            await run_in_threadpool(out.write, chunk)
+        await run_in_threadpool(out.close)
+        if size != size_limit or digest.hexdigest() != claims["sha256"]:
+            raise DirectUploadError("Content does not match the announced size and checksum")
+        os.chmod(tmp_path, 0o644)
+    except BaseException:
+        out.close()
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    return await run_in_threadpool(
+        store_staged_file, Path(tmp_path), claims["sha256"], size, Path(claims["key"]).suffix, claims["key"]
+    )
@@ -0,0 +1,131 @@
+"""
+Change versions for delta sync of map grids and field searches.
+
+Every change to a map grid or field search (or anything below it) takes the
+next value of the parent's `version` counter and stamps it on what changed:
+
+    map grid      grid cells (version column), its own fields (fields_version)
+    field search  participants (version column), tracks (search_track_versions),
+                  its own fields (fields_version)
+
+Removed items leave a SyncDeletion row with the version of the removal. A
+client that has seen version V asks for everything stamped after V, so a poll
+costs as much as the activity since the last one, not the size of the grid.
+
+Tombstones older than SYNC_DELETION_RETENTION_DAYS are pruned whenever the
+parent records new ones; the parent's pruned_version keeps the newest pruned
+version, and clients behind it get a full sync.
+
+The counter is incremented with UPDATE ... RETURNING, which keeps the parent
+row locked until commit: writers of one parent are serialized and versions
+become visible in increasing order, so a poll never misses a change that
+commits later with a smaller version.
+"""
+import os
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.models.field_search import FieldSearch
+from app.models.map_grid import MapGrid
+from app.models.sync_deletion import SyncDeletion
+
+# SyncDeletion.entity values
+GRID_CELL = "grid_cell"
+PARTICIPANT = "participant"
+TRACK = "track"
+
+# Model of the parent of each entity
+PARENT_MODELS = {GRID_CELL: MapGrid, PARTICIPANT: FieldSearch, TRACK: FieldSearch}
+
+# Clients that have not synced for longer than this get a full sync
+SYNC_DELETION_RETENTION_DAYS = int(os.getenv("SYNC_DELETION_RETENTION_DAYS", "30"))
+
+
+def next_version(db: Session, model, row_id: int, fields: bool = False) -> Optional[int]:
+    """
+    Increment the version of a MapGrid or FieldSearch row and return it
+    (None if the row does not exist). fields=True also marks the row's own
+    fields as changed.
+    """
+    values = {"version": model.version + 1}
+    if fields:
+        values["fields_version"] = model.version + 1
+    return db.execute(
+        update(model).where(model.id == row_id).values(**values).returning(model.version)
+        .execution_options(synchronize_session="fetch")
+    ).scalar_one_or_none()
+
+
+def is_full_sync(since_version: Optional[int], version: int, pruned_version: int = 0) -> bool:
+    """
+    Whether a client at since_version needs everything: it has nothing yet, its
+    version is ahead of the server's (e.g. after a restore) or tombstones it
+    has not seen were pruned.
+    """
+    return not since_version or since_version > version or since_version < pruned_version
+
+
+def record_deletions(db: Session, entity: str, parent_id: int, keys: Iterable, version: int) -> None:
+    """Leave tombstones for items removed at version and prune the expired ones"""
+    rows = [
+        {"entity": entity, "parent_id": parent_id, "item_key": str(key), "version": version}
+        for key in keys
+    ]
+    if not rows:
+        return
+    db.execute(insert(SyncDeletion), rows)
+    pruned = db.execute(
+        delete(SyncDeletion).where(
+            SyncDeletion.entity == entity,
+            SyncDeletion.parent_id == parent_id,
+            SyncDeletion.deleted_at < func.now() - timedelta(days=SYNC_DELETION_RETENTION_DAYS),
+        ).returning(SyncDeletion.version)
+    ).scalars().all()
+    if pruned:
+        model = PARENT_MODELS[entity]
+        db.execute(
+            update(model).where(model.id == parent_id)
+            .values(pruned_version=func.greatest(model.pruned_version, max(pruned)))
+            .execution_options(synchronize_session="fetch")
+        )
+
+
+def deleted_since(db: Session, entity: str, parent_id: int, since_version: int) -> List[str]:
+    """Keys of the items removed after since_version, oldest first"""
+    return list(db.scalars(
+        select(SyncDeletion.item_key).where(
+            SyncDeletion.entity == entity,
+            SyncDeletion.parent_id == parent_id,
+            SyncDeletion.version > since_version,
+        ).order_by(SyncDeletion.version, SyncDeletion.id)
+    ))
+
+
+def clear_deletions(db: Session, entities: Iterable[str], parent_id: int) -> None:
+    """Drop the tombstones of a deleted parent"""
+    db.execute(delete(SyncDeletion).where(
+        SyncDeletion.entity.in_(list(entities)), SyncDeletion.parent_id == parent_id
+    ))
+
+
+def stamp_tracks(
+    versions: Optional[Dict[str, int]],
+    urls: Optional[List[str]],
+    version: int
+) -> Tuple[Dict[str, int], List[str]]:
+    """
+    Versions of the current track list: URLs already present keep theirs, new
+    ones get version. Also returns the URLs that were removed.
+    """
+    versions = versions or {}
+    current = {url: versions.get(url, version) for url in urls or []}
+    removed = [url for url in versions if url not in current]
+    return current, removed
+
+
+def tracks_since(versions: Optional[Dict[str, int]], since_version: int) -> List[str]:
+    """Track URLs added after since_version"""
+    return [url for url, version in (versions or {}).items() if version > since_version]
@@ -0,0 +1,353 @@
+"""
+Effort statistics of a field search computed from its uploaded tracks.
+
+Every track file is measured once (in a process pool, all math vectorized
+with NumPy):
+
+    distance      haversine length of all segments (jumps faster than
+                  MAX_SPEED_MPS are GPS glitches and skipped)
+    moving time   time spent on segments walked at MOVING_SPEED_MPS or more
+    time on ground  union of the recorded time spans of its segments
+    swept area    area within half the sweep width of the track (pixel
+                  raster, see grid_coverage.covered_pixels)
+
+Per-file results are kept on the field search keyed by URL (uploads are
+content addressed), so adding a track only measures the new file. The
+aggregates per participant (track owner), per group and for the whole
+field search are rebuilt from the per-file results on every update; time on
+ground is the union of time spans. The covered area of an aggregate is the
+union of its files' pixels, so ground walked twice counts once: every job
+rasterizes all files of the field search on one pixel lattice and the
+aggregates count the distinct pixels of their files.
+"""
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.logging_config import get_logger
+from app.services.gpx_service import METERS_PER_DEGREE
+from app.services.grid_coverage import COVERAGE_SWEEP_WIDTH, MAX_RASTER_PIXELS, MIN_RESOLUTION_METERS, covered_pixels
+from app.services.storage import ensure_local, key_from_url
+from app.services.tracks import TRACK_EXTENSIONS, Track, TrackFileError, read_tracks
+
+logger = get_logger(__name__)
+
+TRACK_STATS_WORKERS = int(os.getenv("TRACK_STATS_WORKERS", "1"))
+
+EARTH_RADIUS_METERS = 6371008.8
+# Faster is a position jump, not movement (vehicles included)
+MAX_SPEED_MPS = 70.0
+# Slower is standing (GPS drift)
+MOVING_SPEED_MPS = 0.3
+
+_pool: Optional[ProcessPoolExecutor] = None
+# Reentrant: a future that is already done runs its callback inside _submit
+_lock = threading.RLock()
+# Field searches with a running job, and the newest job waiting behind it
+_running: Dict[int, Future] = {}
+_queued: Dict[int, Tuple[Dict[str, str], float, frozenset]] = {}
+
+
+def segment_lengths(lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+    """Haversine distances in meters between consecutive points"""
+    lon, lat = np.radians(lons), np.radians(lats)
+    a = np.sin(np.diff(lat) / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def merge_intervals(intervals: List[List[float]]) -> List[List[float]]:
+    """Union of [start, end] intervals as disjoint sorted intervals"""
+    merged: List[List[float]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def covered_pixel_ids(files: Dict[str, List[Track]], sweep_width: float) -> Tuple[Dict[str, np.ndarray], float]:
+    """
+    Pixels within half the sweep width of the tracks of every file, all on
+    one lattice around the files' common bounding box, as sorted unique ids
+    per file (unions of files are unions of ids). Also returns the area of
+    a pixel in square meters.
+    """
+    files = {url: [track for track in tracks if len(track)] for url, tracks in files.items()}
+    files = {url: tracks for url, tracks in files.items() if tracks}
+    if not files:
+        return {}, 0.0
+    lons = np.concatenate([track.lons for tracks in files.values() for track in tracks])
+    lats = np.concatenate([track.lats for tracks in files.values() for track in tracks])
+    center_lat, center_lon = (lats.min() + lats.max()) / 2, (lons.min() + lons.max()) / 2
+    meters_per_lon = METERS_PER_DEGREE * math.cos(math.radians(center_lat))
+    radius = sweep_width / 2
+    half_width = (lons.max() - lons.min()) / 2 * meters_per_lon + radius
+    half_height = (lats.max() - lats.min()) / 2 * METERS_PER_DEGREE + radius
+    resolution = max(
+        sweep_width / 4, MIN_RESOLUTION_METERS, math.sqrt(4 * half_width * half_height / MAX_RASTER_PIXELS)
+    )
+
+    covered = {}
+    for url, tracks in files.items():
+        # Each file's raster only spans its own tracks; pixel (0, 0) is shared
+        xs = np.concatenate([(track.lons - center_lon) * meters_per_lon for track in tracks])
+        ys = np.concatenate([(track.lats - center_lat) * METERS_PER_DEGREE for track in tracks])
+        extent = (xs.min() - radius, ys.min() - radius, xs.max() + radius, ys.max() + radius)
+        cols, rows = covered_pixels(tracks, center_lat, center_lon, radius, resolution, extent)
+        # Row-major order of the raster keeps the ids sorted
+        covered[url] = rows.astype(np.int64) * (1 << 32) + cols
+    return covered, resolution ** 2
+
+
+def covered_area(covered: Iterable[np.ndarray], pixel_area: float) -> int:
+    """Area in square meters of the union of pixel id sets"""
+    covered = list(covered)
+    if not covered:
+        return 0
+    return round(len(np.unique(np.concatenate(covered))) * pixel_area)
+
+
+def _swept_area(tracks: List[Track], sweep_width: float) -> float:
+    """Area in square meters within half the sweep width of the tracks"""
+    covered, pixel_area = covered_pixel_ids({"": tracks}, sweep_width)
+    return covered_area(covered.values(), pixel_area)
+
+
+def measure_tracks(tracks: List[Track], sweep_width: float) -> Dict:
+    """Statistics of the tracks of one file"""
+    distance = moving = 0.0
+    intervals = []
+    for track in tracks:
+        lengths = segment_lengths(track.lons, track.lats)
+        if track.times is None:
+            distance += float(lengths.sum())
+            continue
+        dt = np.diff(track.times)
+        speed = lengths / np.where(dt > 0, dt, np.nan)
+        timed = np.isfinite(speed)
+        # Untimed segments count, glitches (impossible speeds) do not
+        distance += float(lengths[~timed | (speed <= MAX_SPEED_MPS)].sum())
+        walking = timed & (speed >= MOVING_SPEED_MPS) & (speed <= MAX_SPEED_MPS)
+        moving += float(dt[walking].sum())
+        known = track.times[np.isfinite(track.times)]
+        if len(known):
+            intervals.append([float(known.min()), float(known.max())])
+
+    intervals = merge_intervals(intervals)
+    points = [len(track) for track in tracks if len(track)]
+    return {
+        "segments": len(points),
+        "points": sum(points),
+        "distance_m": round(distance, 1),
+        "moving_s": round(moving),
+        "intervals": intervals,
+        "area_m2": round(_swept_area([t for t in tracks if len(t)], sweep_width)) if points else 0,
+    }
+
+
+def compute_track_stats(track_keys: Dict[str, str], sweep_width: float, measured: Iterable[str] = ()) -> Dict:
+    """
+    Statistics of the track files {url: storage key} except those already
+    `measured`, and the covered pixels of all of them. Runs inside a pool
+    worker process. Returns {"tracks": {url: statistics, None if unreadable},
+    "covered": {url: pixel ids}, "pixel_area": square meters}.
+    """
+    measured = set(measured)
+    results: Dict[str, Optional[Dict]] = {}
+    files: Dict[str, List[Track]] = {}
+    for url, key in track_keys.items():
+        try:
+            path = ensure_local(key)
+            files[url] = read_tracks(path) if path is not None else None
+        except (OSError, TrackFileError) as e:
+            logger.warning(f"Skipping track {key}: {e}")
+            files[url] = None
+        if url not in measured:
+            results[url] = measure_tracks(files[url], sweep_width) if files[url] is not None else None
+    covered, pixel_area = covered_pixel_ids(
+        {url: tracks for url, tracks in files.items() if tracks is not None}, sweep_width
+    )
+    return {"tracks": results, "covered": covered, "pixel_area": pixel_area}
+
+
+def _totals(files: Dict[str, Dict], covered: Dict[str, np.ndarray], pixel_area: float) -> Dict:
+    intervals = merge_intervals([interval for stats in files.values() for interval in stats["intervals"]])
+    return {
+        "tracks": len(files),
+        "points": sum(stats["points"] for stats in files.values()),
+        "distance_m": round(sum(stats["distance_m"] for stats in files.values()), 1),
+        "area_m2": covered_area((covered[url] for url in files if url in covered), pixel_area),
+        "moving_s": sum(stats["moving_s"] for stats in files.values()),
+        "time_on_ground_s": round(sum(end - start for start, end in intervals)),
+        "start": intervals[0][0] if intervals else None,
+        "end": intervals[-1][1] if intervals else None,
+    }
+
+
+def aggregate_track_stats(
+    tracks: Dict[str, Dict],
+    owners: Dict[str, int],
+    groups: Dict[int, Optional[str]],
+    covered: Dict[str, np.ndarray],
+    pixel_area: float
+) -> Dict:
+    """
+    Totals of the whole field search, per participant and per group from
+    per-file statistics. owners: track URL -> user id, groups: participant
+    user id -> group name, covered and pixel_area: see covered_pixel_ids.
+    Tracks without owner count for the totals only.
+    """
+    by_user: Dict[int, Dict[str, Dict]] = {}
+    by_group: Dict[Optional[str], Dict[str, Dict]] = {}
+    members: Dict[Optional[str], set] = {}
+    for url, stats in tracks.items():
+        user_id = owners.get(url)
+        if user_id is None:
+            continue
+        group = groups.get(user_id)
+        by_user.setdefault(user_id, {})[url] = stats
+        by_group.setdefault(group, {})[url] = stats
+        members.setdefault(group, set()).add(user_id)
+
+    return {
+        "totals": _totals(tracks, covered, pixel_area),
+        "participants": [
+            {"user_id": user_id, "group_name": groups.get(user_id), **_totals(files, covered, pixel_area)}
+            for user_id, files in sorted(by_user.items())
+        ],
+        "groups": [
+            {"group_name": group, "participants": len(members[group]), **_totals(files, covered, pixel_area)}
+            for group, files in sorted(by_group.items(), key=lambda item: (item[0] is None, item[0] or ""))
+        ],
+    }
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Lazily create the shared track statistics pool"""
+    global _pool
+    if _pool is None:
+        # spawn: forking a multi-threaded server process is not safe
+        _pool = ProcessPoolExecutor(
+            max_workers=TRACK_STATS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_pool() -> None:
+    """Stop the track statistics pool (application shutdown)"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def record_track_stats(field_search_id: int, results: Dict, sweep_width: float) -> None:
+    """Merge freshly measured files (see compute_track_stats) into a field search's statistics and rebuild the aggregates"""
+    from sqlalchemy import select
+
+    from app.db import SessionLocal
+    from app.models.field_search import FieldSearch, field_search_participants
+    from app.services import live_updates
+    from app.services.sync_versions import next_version
+
+    db = SessionLocal()
+    try:
+        field_search = db.query(FieldSearch).filter(FieldSearch.id == field_search_id).first()
+        if field_search is None:
+            return
+        previous = field_search.track_stats or {}
+        cached = previous.get("tracks", {}) if previous.get("sweep_width") == sweep_width else {}
+        measured = results["tracks"]
+        tracks = {}
+        for url in field_search.search_tracks or []:
+            stats = measured[url] if url in measured else cached.get(url)
+            if stats is not None:
+                tracks[url] = stats
+
+        groups = dict(db.execute(
+            select(field_search_participants.c.user_id, field_search_participants.c.group_name)
+            .where(field_search_participants.c.field_search_id == field_search_id)
+        ).all())
+        owners = {url: int(user_id) for url, user_id in (field_search.search_track_owners or {}).items()}
+
+        field_search.track_stats = {
+            "sweep_width": sweep_width,
+            "tracks": tracks,
+            **aggregate_track_stats(tracks, owners, groups, results["covered"], results["pixel_area"]),
+        }
+        field_search.track_stats_updated_at = datetime.now(timezone.utc)
+        version = next_version(db, FieldSearch, field_search_id, fields=True)
+        db.commit()
+        live_updates.publish(field_search_id, "field_search", {"version": version, "fields": ["track_stats"]})
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Could not record track statistics of field search {field_search_id}: {e}")
+    finally:
+        db.close()
+
+
+def _submit(field_search_id: int, track_keys: Dict[str, str], sweep_width: float, measured: frozenset) -> None:
+    future = get_pool().submit(compute_track_stats, track_keys, sweep_width, measured)
+    _running[field_search_id] = future
+    future.add_done_callback(lambda f: _on_done(field_search_id, sweep_width, f))
+
+
+def _on_done(field_search_id: int, sweep_width: float, future: Future) -> None:
+    if not future.cancelled():
+        exc = future.exception()
+        if exc is not None:
+            logger.warning(f"Track statistics failed for field search {field_search_id}: {exc}")
+        else:
+            record_track_stats(field_search_id, future.result(), sweep_width)
+    with _lock:
+        _running.pop(field_search_id, None)
+        job = _queued.pop(field_search_id, None)
+        if job is not None and not future.cancelled():
+            try:
+                _submit(field_search_id, *job)
+            except Exception as e:
+                logger.warning(f"Could not schedule track statistics for field search {field_search_id}: {e}")
+
+
+def schedule_track_stats(
+    field_search_id: int,
+    track_urls: List[str],
+    previous: Optional[Dict] = None,
+    sweep_width: Optional[float] = None
+) -> None:
+    """
+    Update a field search's track statistics in the background (fire and
+    forget). Only files missing from `previous` (the stored statistics) are
+    measured, all of them are read for the covered areas; a changed sweep
+    width measures all of them again. While a job for the field search runs,
+    only the newest request is kept and run next.
+    """
+    sweep_width = float(sweep_width or COVERAGE_SWEEP_WIDTH)
+    previous = previous or {}
+    cached = previous.get("tracks", {}) if previous.get("sweep_width") == sweep_width else {}
+    track_keys = {
+        url: key for url, key in ((url, key_from_url(url)) for url in track_urls or [])
+        if key is not None and os.path.splitext(key)[1].lower() in TRACK_EXTENSIONS
+    }
+    job = (track_keys, sweep_width, frozenset(url for url in track_keys if url in cached))
+    with _lock:
+        if field_search_id in _running:
+            _queued[field_search_id] = job
+            return
+        try:
+            _submit(field_search_id, *job)
+        except Exception as e:
+            logger.warning(f"Could not schedule track statistics for field search {field_search_id}: {e}")
+
+
+def is_pending(field_search_id: int) -> bool:
+    """Check whether a statistics job for a field search is queued or running"""
+    return field_search_id in _running or field_search_id in _queued
@@ -0,0 +1,276 @@
+"""
+Simplified derivatives of uploaded GPS tracks for map rendering.
+
+A day of field search easily records hundreds of thousands of points per
+track, far more than a map can show. Every uploaded track gets one
+derivative stored next to the original:
+
+    /uploads/<path>                         original GPX/KML
+    /uploads/variants/track/<path>.json     encoded polylines per zoom level
+
+Each line is simplified once with Douglas-Peucker in Web Mercator meters,
+recording for every point the largest tolerance at which it survives. A
+zoom level then keeps the points above TOLERANCE_PIXELS of that zoom, so
+all levels (TRACK_MIN_ZOOM..TRACK_MAX_ZOOM) come from one pass. Lines are
+stored as Google encoded polylines (precision 5, ~1 m).
+
+Derivatives are rendered in a process pool right after upload. Tracks
+uploaded before this existed are rendered on first request (see
+load_track_levels).
+"""
+import json
+import math
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.logging_config import get_logger
+from app.services.image_variants import VARIANTS_DIR
+from app.services.storage import ensure_local, key_from_url, publish_local
+from app.services.tracks import TRACK_EXTENSIONS, Track, read_tracks
+from app.services.upload_service import UPLOAD_DIR
+
+logger = get_logger(__name__)
+
+TRACK_VARIANT = "track"
+TRACK_VARIANT_VERSION = 1
+
+TRACK_MIN_ZOOM = 8
+TRACK_MAX_ZOOM = 18
+# Largest deviation from the original line, in screen pixels of the zoom level
+TOLERANCE_PIXELS = 1.0
+POLYLINE_PRECISION = 5
+
+TRACK_WORKERS = int(os.getenv("TRACK_WORKERS", "1"))
+
+# Web Mercator (EPSG:3857) sphere radius and 256 px tile size
+_EARTH_RADIUS = 6378137.0
+_TILE_SIZE = 256
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def is_track_url(url: Optional[str]) -> bool:
+    """Check that a stored URL points at an uploaded GPX/KML track"""
+    return bool(url) and url.startswith("/uploads/") and not url.startswith("/uploads/variants/") \
+        and Path(url).suffix.lower() in TRACK_EXTENSIONS
+
+
+def track_variant_key(key: str) -> str:
+    """Storage key of the derivative of the track stored under key"""
+    return f"variants/{TRACK_VARIANT}/{key}.json"
+
+
+def track_variant_path(relative: str, variants_dir: Optional[Path] = None) -> Path:
+    """Disk path of the derivative of a track stored at UPLOAD_DIR/relative"""
+    return (variants_dir or VARIANTS_DIR) / TRACK_VARIANT / f"{relative}.json"
+
+
+def zoom_tolerance(zoom: int) -> float:
+    """Simplification tolerance of a zoom level in Web Mercator meters"""
+    return TOLERANCE_PIXELS * 2 * math.pi * _EARTH_RADIUS / (_TILE_SIZE * 2 ** zoom)
+
+
+def _mercator(lons: np.ndarray, lats: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    lats = np.clip(lats, -85.05112878, 85.05112878)
+    return (
+        np.radians(lons) * _EARTH_RADIUS,
+        np.log(np.tan(np.pi / 4 + np.radians(lats) / 2)) * _EARTH_RADIUS,
+    )
+
+
+def simplification_tolerances(xs: np.ndarray, ys: np.ndarray, min_tolerance: float) -> np.ndarray:
+    """
+    Largest Douglas-Peucker tolerance at which every point of a line is kept
+    (inf for the endpoints, 0 for points dropped even at min_tolerance):
+    simplifying with tolerance t keeps exactly the points whose value is > t.
+
+    All segments of one recursion depth are split at once, so the Python
+    loop runs once per depth (about log2 of the point count for GPS tracks).
+    """
+    n = len(xs)
+    tolerances = np.zeros(n)
+    if not n:
+        return tolerances
+    tolerances[[0, -1]] = np.inf
+
+    starts, ends = np.array([0]), np.array([n - 1])
+    while True:
+        interior = ends - starts - 1
+        keep = interior > 0
+        starts, ends, interior = starts[keep], ends[keep], interior[keep]
+        if not len(starts):
+            break
+        offsets = np.cumsum(interior) - interior
+        segment = np.repeat(np.arange(len(starts)), interior)
+        index = np.arange(len(segment)) - offsets[segment] + starts[segment] + 1
+
+        # Distance to the chord (to its endpoint for closed loops)
+        ax, ay = xs[starts][segment], ys[starts][segment]
+        dx, dy = xs[ends][segment] - ax, ys[ends][segment] - ay
+        px, py = xs[index] - ax, ys[index] - ay
+        length2 = dx * dx + dy * dy
+        t = np.clip((px * dx + py * dy) / np.where(length2 > 0, length2, 1.0), 0.0, 1.0)
+        distances = np.hypot(px - t * dx, py - t * dy)
+
+        largest = np.maximum.reduceat(distances, offsets)
+        # First point reaching the maximum of each segment
+        at_max = np.flatnonzero(distances == largest[segment])
+        split = index[at_max[np.flatnonzero(np.diff(segment[at_max], prepend=-1))]]
+
+        # A point never outlives the split that created its segment
+        split_open = largest > min_tolerance
+        parent = np.minimum(tolerances[starts], tolerances[ends])
+        tolerances[split[split_open]] = np.minimum(largest, parent)[split_open]
+        starts, split, ends = starts[split_open], split[split_open], ends[split_open]
+        starts, ends = np.concatenate([starts, split]), np.concatenate([split, ends])
+    return tolerances
+
+
+def encode_polyline(lats: np.ndarray, lons: np.ndarray, precision: int = POLYLINE_PRECISION) -> str:
+    """Google encoded polyline of a line (vectorized)"""
+    if not len(lats):
+        return ""
+    coordinates = np.rint(np.column_stack([lats, lons]) * 10 ** precision).astype(np.int64)
+    deltas = np.diff(coordinates, axis=0, prepend=0).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    # 5-bit groups, least significant first, 0x20 set on all but the last
+    counts = 1 + sum((values >> (5 * k)) > 0 for k in range(1, 7))
+    repeated = np.repeat(values, counts)
+    group = np.arange(len(repeated)) - np.repeat(np.cumsum(counts) - counts, counts)
+    chunks = (repeated >> (5 * group)) & 0x1F
+    chunks |= np.where(group < np.repeat(counts - 1, counts), 0x20, 0)
+    return (chunks + 63).astype(np.uint8).tobytes().decode("ascii")
+
+
+def track_levels(tracks: List[Track]) -> Dict[str, List[str]]:
+    """{zoom: [encoded polyline per track]} for TRACK_MIN_ZOOM..TRACK_MAX_ZOOM"""
+    levels: Dict[str, List[str]] = {str(zoom): [] for zoom in range(TRACK_MIN_ZOOM, TRACK_MAX_ZOOM + 1)}
+    for track in tracks:
+        xs, ys = _mercator(track.lons, track.lats)
+        tolerances = simplification_tolerances(xs, ys, zoom_tolerance(TRACK_MAX_ZOOM))
+        for zoom in range(TRACK_MIN_ZOOM, TRACK_MAX_ZOOM + 1):
+            kept = tolerances > zoom_tolerance(zoom)
+            levels[str(zoom)].append(encode_polyline(track.lats[kept], track.lons[kept]))
+    return levels
+
+
+def render_track(source: str, relative: str, variants_dir: str) -> str:
+    """
+    Render the derivative of one track. Runs inside a pool worker process
+    (or inline for lazily rendered tracks), so all paths are passed explicitly.
+    """
+    tracks = read_tracks(Path(source))
+    target = track_variant_path(relative, Path(variants_dir))
+    target.parent.mkdir(parents=True, exist_ok=True)
+    content = {
+        "version": TRACK_VARIANT_VERSION,
+        "precision": POLYLINE_PRECISION,
+        "points": sum(len(track) for track in tracks),
+        "zooms": track_levels(tracks),
+    }
+
+    # Write atomically: a lazy request may render the same track
+    fd, tmp_path = tempfile.mkstemp(dir=target.parent, suffix=".part")
+    try:
+        with os.fdopen(fd, "w") as out:
+            json.dump(content, out, separators=(",", ":"))
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return str(target)
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Lazily create the shared track processing pool"""
+    global _pool
+    if _pool is None:
+        # spawn: forking a multi-threaded server process is not safe
+        _pool = ProcessPoolExecutor(
+            max_workers=TRACK_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_pool() -> None:
+    """Stop the track processing pool (application shutdown)"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _log_failure(future: Future) -> None:
+    if future.cancelled():
+        return
+    exc = future.exception()
+    if exc is not None:
+        logger.warning(f"Track simplification failed: {exc}")
+
+
+def schedule_track_variants(urls: Iterable[str]) -> Dict[str, Future]:
+    """
+    Queue derivative rendering for freshly uploaded tracks (fire and forget).
+    Non-track URLs are ignored. Returns the futures of queued URLs.
+    """
+    queued: Dict[str, Future] = {}
+    for url in urls:
+        key = key_from_url(url)
+        if key is None or not is_track_url(url):
+            continue
+        try:
+            future = get_pool().submit(render_track, str(UPLOAD_DIR / key), key, str(VARIANTS_DIR))
+            future.add_done_callback(_log_failure)
+        except Exception as e:
+            logger.warning(f"Could not schedule track simplification for {url}: {e}")
+            continue
+        queued[url] = future
+    return queued
+
+
+@lru_cache(maxsize=256)
+def _read_levels(path: str, mtime_ns: int, size: int) -> Optional[Dict]:
+    content = json.loads(Path(path).read_text())
+    return content if content.get("version") == TRACK_VARIANT_VERSION else None
+
+
+def load_track_levels(url: str) -> Optional[Dict]:
+    """
+    Derivative of an uploaded track, rendered in the calling thread if it is
+    missing or outdated. None when the track does not exist.
+    """
+    key = key_from_url(url)
+    if key is None or not is_track_url(url):
+        return None
+    variant_key = track_variant_key(key)
+
+    path = ensure_local(variant_key)
+    if path is not None:
+        stat = path.stat()
+        levels = _read_levels(str(path), stat.st_mtime_ns, stat.st_size)
+        if levels is not None:
+            return levels
+
+    source = ensure_local(key)
+    if source is None:
+        return None
+    path = Path(render_track(str(source), key, str(VARIANTS_DIR)))
+    publish_local(variant_key, keep_local=True)
+    stat = path.stat()
+    return _read_levels(str(path), stat.st_mtime_ns, stat.st_size)
+
+
+def level_for_zoom(zoom: int) -> int:
+    """Stored level serving a requested map zoom"""
+    return min(max(zoom, TRACK_MIN_ZOOM), TRACK_MAX_ZOOM)
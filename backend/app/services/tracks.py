@@ -0,0 +1,117 @@
+"""
+Reading GPS tracks uploaded to field searches (GPX and KML).
+
+Every GPX track segment or route and every KML LineString or gx:Track
+becomes one Track: coordinate arrays plus point times where the file has
+them (seconds since the epoch, NaN where missing).
+"""
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+TRACK_EXTENSIONS = {".gpx", ".kml"}
+
+
+class TrackFileError(ValueError):
+    """File cannot be read as a track"""
+
+
+@dataclass
+class Track:
+    lons: np.ndarray
+    lats: np.ndarray
+    times: Optional[np.ndarray] = None  # epoch seconds, NaN where unknown
+
+    def __len__(self) -> int:
+        return len(self.lons)
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _parse_time(text: Optional[str]) -> float:
+    if not text:
+        return float("nan")
+    try:
+        return datetime.fromisoformat(text.strip().replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return float("nan")
+
+
+def _track(points: List[Tuple[float, float]], times: List[float]) -> Track:
+    coordinates = np.asarray(points, dtype=float).reshape(-1, 2)
+    times_array = np.asarray(times, dtype=float) if times else None
+    if times_array is not None and np.isnan(times_array).all():
+        times_array = None
+    return Track(lons=coordinates[:, 0], lats=coordinates[:, 1], times=times_array)
+
+
+def _tracks_from_gpx(root: ET.Element) -> List[Track]:
+    tracks = []
+    for element in root.iter():
+        if _local_name(element.tag) not in ("trkseg", "rte"):
+            continue
+        points, times = [], []
+        for point in element:
+            if _local_name(point.tag) not in ("trkpt", "rtept"):
+                continue
+            points.append((float(point.get("lon")), float(point.get("lat"))))
+            time = next((child.text for child in point if _local_name(child.tag) == "time"), None)
+            times.append(_parse_time(time))
+        if points:
+            tracks.append(_track(points, times))
+    return tracks
+
+
+def _tracks_from_kml(root: ET.Element) -> List[Track]:
+    tracks = []
+    for element in root.iter():
+        name = _local_name(element.tag)
+        if name == "LineString":
+            text = next((child.text for child in element if _local_name(child.tag) == "coordinates"), "")
+            points = []
+            for item in (text or "").split():
+                values = item.split(",")
+                if len(values) >= 2:
+                    points.append((float(values[0]), float(values[1])))
+            if points:
+                tracks.append(_track(points, []))
+        elif name == "Track":
+            # gx:Track: <when> and <gx:coord>lon lat alt</gx:coord> in parallel
+            whens = [_parse_time(child.text) for child in element if _local_name(child.tag) == "when"]
+            points = [
+                tuple(float(value) for value in child.text.split()[:2])
+                for child in element if _local_name(child.tag) == "coord" and child.text
+            ]
+            if points:
+                tracks.append(_track(points, whens if len(whens) == len(points) else []))
+    return tracks
+
+
+def parse_tracks(data: bytes, suffix: str) -> List[Track]:
+    """Tracks from the content of a GPX or KML file (suffix: file extension)"""
+    suffix = suffix.lower()
+    if suffix not in TRACK_EXTENSIONS:
+        raise TrackFileError(f"Unsupported track file type: {suffix}")
+    try:
+        root = ET.fromstring(data)
+        return _tracks_from_gpx(root) if suffix == ".gpx" else _tracks_from_kml(root)
+    except (ET.ParseError, ValueError, TypeError) as e:
+        raise TrackFileError(f"Could not read track file: {e}")
+
+
+@lru_cache(maxsize=512)
+def _read_tracks(path: str, mtime_ns: int, size: int) -> Tuple[Track, ...]:
+    return tuple(parse_tracks(Path(path).read_bytes(), Path(path).suffix))
+
+
+def read_tracks(path: Path) -> List[Track]:
+    """Tracks of a file, parsed once per file version (workers reuse them across jobs)"""
+    stat = path.stat()
+    return list(_read_tracks(str(path), stat.st_mtime_ns, stat.st_size))
@@ -0,0 +1,257 @@
+"""
+Garbage collection of orphaned uploads.
+
+Files under /uploads are referenced from URL columns of many tables. Deleting
+a case, removing a photo in a form or abandoning an upload leaves files behind
+that nothing points at any more. The collector reclaims them in two stages:
+
+1. Files not referenced by any record and older than the grace period are
+   moved to .quarantine/<key> (UPLOAD_DIR/.quarantine with local storage).
+2. Quarantined files older than the quarantine period are deleted together
+   with their image variants and video derivatives. A quarantined file that became referenced again
+   (e.g. a record was restored from a backup) is moved back instead.
+
+Leftovers of interrupted uploads (partial files, expired resumable upload
+sessions) and unused grid export cache entries are removed as well.
+
+Live references are streamed from the database with server-side cursors and
+stored objects are listed lazily (os.scandir walk or paginated bucket listing,
+see storage.py), so memory use is bounded by the number of distinct referenced
+URLs, not by the size of the tree.
+
+Run from cron with `python gc_uploads.py [--dry-run]` or through
+POST /management/uploads/gc (admin only).
+"""
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Set
+
+from sqlalchemy import Text, cast, func, select
+from sqlalchemy.orm import Session
+
+from app.core.logging_config import get_logger
+from app.models.flyer import Flyer
+from app.models.map_grid import MapGrid
+from app.models.media_info import MediaInfo
+from app.models.orientation import Orientation
+from app.services.grid_export import prune_grid_cache
+from app.services.media_pipeline import derivative_keys
+from app.services.resumable_upload import cleanup_expired_sessions
+from app.services.storage import LocalStorage, StorageBackend, get_storage
+from app.services.upload_refs import TRACKED_UPLOAD_FIELDS
+from app.services.upload_service import UPLOAD_DIR, UPLOAD_TMP_DIR
+
+logger = get_logger(__name__)
+
+# Key prefix of collected files
+QUARANTINE_PREFIX = ".quarantine"
+
+# Unreferenced files younger than this may belong to a form that is not saved yet
+GRACE_PERIOD_HOURS = int(os.getenv("UPLOAD_GC_GRACE_HOURS", "48"))
+# How long quarantined files are kept before they are deleted for good
+QUARANTINE_DAYS = int(os.getenv("UPLOAD_GC_QUARANTINE_DAYS", "14"))
+
+# Rows fetched per round trip when streaming references
+STREAM_BATCH_SIZE = 5000
+# Number of paths listed in the report per category
+REPORT_SAMPLE_SIZE = 50
+
+# Top-level directories the collector never descends into besides dot
+# directories: derivatives (handled with their originals) and flyer templates
+# (managed by the flyer_templates router)
+SKIP_DIRS = {"variants", "flyer_templates"}
+
+# String columns holding upload URLs in addition to the tracked ones
+EXTRA_URL_COLUMNS = [
+    Flyer.photo_url,
+    Flyer.file_url,
+    MapGrid.map_file_url,
+]
+
+
+@dataclass
+class GCReport:
+    """Result of a collector run (or what a dry run would do)"""
+    dry_run: bool
+    live_references: int = 0
+    scanned_files: int = 0
+    quarantined_files: int = 0
+    quarantined_bytes: int = 0
+    deleted_files: int = 0
+    deleted_bytes: int = 0
+    restored_files: int = 0
+    stale_parts_removed: int = 0
+    expired_sessions_removed: int = 0
+    grid_cache_entries_removed: int = 0
+    quarantined: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    restored: List[str] = field(default_factory=list)
+
+    def add_sample(self, bucket: List[str], relative: str) -> None:
+        if len(bucket) < REPORT_SAMPLE_SIZE:
+            bucket.append(relative)
+
+
+def _relative_upload_path(url: Optional[str]) -> Optional[str]:
+    if not url or not url.startswith("/uploads/"):
+        return None
+    # Drop query strings/fragments that occasionally end up in stored URLs
+    return url[len("/uploads/"):].split("?", 1)[0].split("#", 1)[0]
+
+
+def iter_live_urls(db: Session) -> Iterator[str]:
+    """
+    Stream every upload URL referenced from the database.
+    ARRAY columns are unnested server side, so each row is a single URL.
+    """
+    queries = []
+    for model, (_, fields) in TRACKED_UPLOAD_FIELDS.items():
+        for name in fields:
+            column = getattr(model, name)
+            if hasattr(column.type, "item_type"):
+                queries.append(select(func.unnest(column)))
+            else:
+                queries.append(select(column).where(column.isnot(None)))
+    for column in EXTRA_URL_COLUMNS:
+        queries.append(select(column).where(column.isnot(None)))
+
+    for query in queries:
+        result = db.execute(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+        for (url,) in result:
+            if url:
+                yield url
+
+    # Orientation canvases embed image URLs inside JSON
+    canvas_urls = select(func.regexp_matches(
+        cast(Orientation.canvas_data, Text), r'/uploads/[^"\s\\]+', 'g'
+    ))
+    for (match,) in db.execute(canvas_urls.execution_options(yield_per=STREAM_BATCH_SIZE)):
+        yield match[0]
+
+
+def collect_live_paths(db: Session) -> Set[str]:
+    """Relative paths (below UPLOAD_DIR) of all referenced files"""
+    live = set()
+    for url in iter_live_urls(db):
+        relative = _relative_upload_path(url)
+        if relative:
+            live.add(relative)
+    return live
+
+
+def _storage() -> StorageBackend:
+    storage = get_storage()
+    # The local tree is looked up through UPLOAD_DIR of this module
+    return LocalStorage(UPLOAD_DIR) if storage.is_local else storage
+
+
+def _remove_variants(storage: StorageBackend, relative: str) -> None:
+    """Remove image variants and video derivatives of a deleted original"""
+    if storage.exists(relative):
+        # Same content was uploaded again meanwhile - variants are in use
+        return
+    for key in derivative_keys(relative):
+        storage.delete(key)
+
+
+def _forget_media_info(db: Session, urls: List[str]) -> None:
+    """Drop video processing results of purged files"""
+    for start in range(0, len(urls), STREAM_BATCH_SIZE):
+        db.query(MediaInfo).filter(
+            MediaInfo.url.in_(urls[start:start + STREAM_BATCH_SIZE])
+        ).delete(synchronize_session=False)
+    db.commit()
+
+
+def _remove_stale_parts(report: GCReport, cutoff: float) -> None:
+    """Partially written files left behind by crashed uploads"""
+    if not UPLOAD_TMP_DIR.is_dir():
+        return
+    with os.scandir(UPLOAD_TMP_DIR) as entries:
+        for entry in entries:
+            if not entry.is_file(follow_symlinks=False) or entry.stat().st_mtime >= cutoff:
+                continue
+            report.stale_parts_removed += 1
+            if not report.dry_run:
+                try:
+                    os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+def collect_garbage(
+    db: Session,
+    dry_run: bool = True,
+    grace_period_hours: Optional[int] = None,
+    quarantine_days: Optional[int] = None,
+) -> GCReport:
+    """
+    Quarantine unreferenced uploads and purge expired quarantine entries.
+    With dry_run=True nothing is moved or deleted; the report lists what would be.
+    """
+    grace = GRACE_PERIOD_HOURS if grace_period_hours is None else grace_period_hours
+    keep_days = QUARANTINE_DAYS if quarantine_days is None else quarantine_days
+    now = time.time()
+    grace_cutoff = now - grace * 3600
+    purge_cutoff = now - keep_days * 86400
+
+    report = GCReport(dry_run=dry_run)
+    live = collect_live_paths(db)
+    report.live_references = len(live)
+    storage = _storage()
+
+    # Stage 1: quarantine unreferenced files past the grace period
+    for item in storage.iter_objects(exclude=SKIP_DIRS):
+        report.scanned_files += 1
+        if item.key in live or item.modified >= grace_cutoff:
+            continue
+        report.quarantined_files += 1
+        report.quarantined_bytes += item.size
+        report.add_sample(report.quarantined, item.key)
+        if not dry_run:
+            try:
+                # The move stamps the start of the quarantine period
+                storage.move(item.key, f"{QUARANTINE_PREFIX}/{item.key}")
+            except Exception as e:
+                logger.warning(f"Could not quarantine upload {item.key}: {e}")
+
+    # Stage 2: restore re-referenced files, purge expired ones
+    purged_urls = []
+    for item in storage.iter_objects(QUARANTINE_PREFIX):
+        relative = item.key[len(QUARANTINE_PREFIX) + 1:]
+        try:
+            if relative in live:
+                report.restored_files += 1
+                report.add_sample(report.restored, relative)
+                if not dry_run:
+                    if storage.exists(relative):
+                        # Identical content was uploaded again meanwhile
+                        storage.delete(item.key)
+                    else:
+                        storage.move(item.key, relative)
+            elif item.modified < purge_cutoff:
+                report.deleted_files += 1
+                report.deleted_bytes += item.size
+                report.add_sample(report.deleted, relative)
+                if not dry_run:
+                    storage.delete(item.key)
+                    _remove_variants(storage, relative)
+                    purged_urls.append(f"/uploads/{relative}")
+        except Exception as e:
+            logger.warning(f"Could not process quarantined upload {relative}: {e}")
+
+    if purged_urls:
+        _forget_media_info(db, purged_urls)
+    _remove_stale_parts(report, grace_cutoff)
+    report.expired_sessions_removed = cleanup_expired_sessions(dry_run=dry_run)
+    report.grid_cache_entries_removed = prune_grid_cache(dry_run=dry_run)
+
+    logger.info(
+        f"Upload GC{' (dry run)' if dry_run else ''}: scanned={report.scanned_files} "
+        f"live={report.live_references} quarantined={report.quarantined_files} "
+        f"deleted={report.deleted_files} restored={report.restored_files} "
+        f"stale_parts={report.stale_parts_removed} expired_sessions={report.expired_sessions_removed} "
+        f"grid_cache_entries={report.grid_cache_entries_removed}"
+    )
+    return report
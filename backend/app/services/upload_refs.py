@@ -0,0 +1,139 @@
+"""
+Reference tracking for stored uploads.
+
+Records keep upload URLs in plain String / ARRAY(String) columns. To know
+whether a stored file is still in use, every flush mirrors the URLs of the
+tracked columns below into the upload_refs table:
+
+    new / changed record  -> its rows are replaced with the current URLs
+    deleted record        -> its rows are removed
+
+Hooking the session (instead of each router) keeps the table correct for
+every write path, including ORM cascades (deleting a case drops the refs of
+its missing persons, events, orientations and field searches).
+"""
+from typing import Dict, Iterable, List, Set, Tuple
+
+from sqlalchemy import delete, event, func, inspect
+from sqlalchemy.orm import Session
+
+from app.models.case import Case
+from app.models.event import Event
+from app.models.field_search import FieldSearch
+from app.models.missing_person import MissingPerson
+from app.models.orientation import Orientation
+from app.models.upload_ref import UploadRef
+from app.core.logging_config import get_logger
+from app.services.storage import LocalStorage, get_storage, key_from_url
+from app.services.upload_service import UPLOAD_DIR, content_hash_from_url
+
+logger = get_logger(__name__)
+
+# Model -> (owner_type, columns holding upload URLs)
+TRACKED_UPLOAD_FIELDS: Dict[type, Tuple[str, Tuple[str, ...]]] = {
+    Case: ('case', ('missing_photos', 'notes_images')),
+    MissingPerson: ('missing_person', ('photos', 'videos')),
+    Event: ('event', ('media_files',)),
+    Orientation: ('orientation', ('selected_photos', 'exported_files', 'uploaded_images')),
+    FieldSearch: ('field_search', (
+        'search_tracks', 'search_photos', 'preparation_grid_file', 'preparation_map_image',
+        'grid_area_file',
+    )),
+}
+
+
+def upload_urls(value) -> List[str]:
+    """URLs under /uploads held by a column value (string or list of strings)"""
+    if not value:
+        return []
+    values = [value] if isinstance(value, str) else value
+    return [url for url in values if isinstance(url, str) and url.startswith('/uploads/')]
+
+
+def collect_refs(obj) -> Set[Tuple[str, str]]:
+    """Current (url, field) pairs of a tracked record"""
+    _, fields = TRACKED_UPLOAD_FIELDS[type(obj)]
+    return {(url, field) for field in fields for url in upload_urls(getattr(obj, field, None))}
+
+
+def _fields_changed(obj) -> bool:
+    _, fields = TRACKED_UPLOAD_FIELDS[type(obj)]
+    state = inspect(obj)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+def sync_refs(connection, owner_type: str, owner_id: int, refs: Iterable[Tuple[str, str]]) -> None:
+    """Replace the reference rows of one owner record"""
+    table = UploadRef.__table__
+    connection.execute(
+        delete(table).where(table.c.owner_type == owner_type, table.c.owner_id == owner_id)
+    )
+    rows = [
+        {
+            'url': url,
+            'sha256': content_hash_from_url(url),
+            'owner_type': owner_type,
+            'owner_id': owner_id,
+            'field': field,
+        }
+        for url, field in sorted({(url[:500], field) for url, field in refs})
+    ]
+    if rows:
+        connection.execute(table.insert(), rows)
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_upload_refs(session: Session, flush_context) -> None:
+    """Mirror URL columns of flushed records into upload_refs"""
+    changed = [
+        obj for obj in session.new
+        if type(obj) in TRACKED_UPLOAD_FIELDS
+    ] + [
+        obj for obj in session.dirty
+        if type(obj) in TRACKED_UPLOAD_FIELDS and _fields_changed(obj)
+    ]
+    deleted = [obj for obj in session.deleted if type(obj) in TRACKED_UPLOAD_FIELDS]
+    if not changed and not deleted:
+        return
+
+    connection = session.connection()
+    for obj in changed:
+        owner_type, _ = TRACKED_UPLOAD_FIELDS[type(obj)]
+        sync_refs(connection, owner_type, obj.id, collect_refs(obj))
+    for obj in deleted:
+        owner_type, _ = TRACKED_UPLOAD_FIELDS[type(obj)]
+        sync_refs(connection, owner_type, obj.id, ())
+
+
+def reference_count(db: Session, url: str) -> int:
+    """Number of records referencing an upload URL"""
+    return db.query(func.count(UploadRef.id)).filter(UploadRef.url == url).scalar() or 0
+
+
+def is_referenced(db: Session, url: str) -> bool:
+    """Check whether any record references an upload URL"""
+    return db.query(UploadRef.id).filter(UploadRef.url == url).first() is not None
+
+
+def remove_unreferenced(db: Session, urls: Iterable[str]) -> int:
+    """
+    Delete files that are no longer referenced by any record.
+    Call after the change dropping the references was committed.
+    Returns the number of removed files.
+    """
+    storage = get_storage()
+    if storage.is_local:
+        storage = LocalStorage(UPLOAD_DIR)
+    removed = 0
+    for url in set(upload_urls(list(urls))):
+        key = key_from_url(url)
+        if key is None or is_referenced(db, url):
+            continue
+        try:
+            if not storage.exists(key):
+                continue
+            storage.delete(key)
+            removed += 1
+        except Exception as e:
+            logger.warning(f"Could not delete upload {key}: {e}")
+    return removed
@@ -0,0 +1,188 @@
+"""
+Upload storage service.
+
+Uploaded files are copied to disk in fixed-size chunks instead of being read
+into memory as a whole. The copy runs in a worker thread (off the event loop),
+enforces the size limit incrementally, computes a SHA-256 digest on the fly and
+moves the finished file into place atomically, so a partially written file is
+never visible under /uploads.
+
+Storage is content-addressed: a file is named after the SHA-256 of its content
+and sharded by the first two byte pairs of the digest,
+
+    /uploads/ab/cd/abcd...<64 hex>.jpg
+
+so re-uploading the same photo (Telegram flow, forum import, orientation
+editor) reuses the stored copy and no directory grows beyond a few thousand
+entries. Which records point at a file is tracked in upload_refs
+(see services/upload_refs.py). Files uploaded before this scheme keep their
+flat uuid4_<name> names.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, List, Optional
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Upload directory (served under /uploads by main.py)
+UPLOAD_DIR = Path("/app/uploads")
+# Staging directory for partially written files. Lives inside UPLOAD_DIR so that
+# the final os.replace() stays on the same filesystem and is atomic.
+UPLOAD_TMP_DIR = UPLOAD_DIR / ".tmp"
+
+CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+# /uploads/ab/cd/<sha256><ext>
+CONTENT_URL_RE = re.compile(r"^/uploads/([0-9a-f]{2})/([0-9a-f]{2})/(\1\2[0-9a-f]{60})(\.[a-z0-9]+)?$")
+CONTENT_NAME_RE = re.compile(r"^([0-9a-f]{64})(\.[a-z0-9]+)?$")
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an uploaded file exceeds the allowed size"""
+
+    def __init__(self, filename: str, max_size: int):
+        self.filename = filename
+        self.max_size = max_size
+        super().__init__(f"File {filename} exceeds {max_size} bytes")
+
+
+@dataclass
+class StoredUpload:
+    """File stored in the upload directory"""
+    filename: str  # Path relative to UPLOAD_DIR
+    url: str
+    size: int
+    sha256: str
+    # True when identical content was already stored and the existing copy is reused
+    deduplicated: bool = False
+
+    @property
+    def path(self) -> Path:
+        return UPLOAD_DIR / self.filename
+
+
+def content_filename(sha256: str, extension: str) -> str:
+    """Relative path of a content-addressed file: ab/cd/<sha256><ext>"""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}{extension.lower()}"
+
+
+def content_hash_from_url(url: Optional[str]) -> Optional[str]:
+    """SHA-256 of a content-addressed upload URL, None for legacy/foreign URLs"""
+    if not url:
+        return None
+    match = CONTENT_URL_RE.match(url)
+    return match.group(3) if match else None
+
+
+def resolve_upload_name(name: str) -> str:
+    """
+    Map a bare content-addressed file name (<sha256><ext>, as the last URL
+    segment) to its sharded relative path. Other names are returned unchanged.
+    """
+    match = CONTENT_NAME_RE.match(name)
+    if match:
+        return content_filename(match.group(1), match.group(2) or "")
+    return name
+
+
+def _copy_to_upload_dir(source: BinaryIO, extension: str, max_size: int, original_name: str) -> StoredUpload:
+    """
+    Blocking chunked copy of source into content-addressed storage
+    (runs in a worker thread).
+    """
+    UPLOAD_TMP_DIR.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_TMP_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLargeError(original_name, max_size)
+                digest.update(chunk)
+                out.write(chunk)
+        os.chmod(tmp_path, 0o644)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    return store_staged_file(Path(tmp_path), digest.hexdigest(), size, extension, original_name)
+
+
+def store_staged_file(staged_path: Path, sha256: str, size: int, extension: str, original_name: str) -> StoredUpload:
+    """
+    Move a fully written staging file (inside UPLOAD_DIR) to its
+    content-addressed location. The staging file is consumed either way.
+    """
+    filename = content_filename(sha256, extension)
+    target = UPLOAD_DIR / filename
+    try:
+        deduplicated = target.exists()
+        if deduplicated:
+            # Same content already stored - drop the copy, refresh mtime so the
+            # orphan collector treats the file as freshly uploaded
+            os.unlink(staged_path)
+            os.utime(target)
+        else:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(staged_path, target)
+    except BaseException:
+        try:
+            os.unlink(staged_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    if deduplicated:
+        logger.info(f"Upload {original_name} matches stored file {filename}")
+
+    return StoredUpload(
+        filename=filename,
+        url=f"/uploads/{filename}",
+        size=size,
+        sha256=sha256,
+        deduplicated=deduplicated,
+    )
+
+
+async def save_upload(file: UploadFile, max_size: int) -> StoredUpload:
+    """
+    Stream an UploadFile to the upload directory.
+
+    Raises UploadTooLargeError as soon as more than max_size bytes were read;
+    nothing is left on disk in that case.
+    """
+    extension = Path(file.filename or "").suffix.lower()
+    await file.seek(0)
+    return await run_in_threadpool(_copy_to_upload_dir, file.file, extension, max_size, file.filename)
+
+
+def remove_uploads(uploads: List[StoredUpload]) -> None:
+    """Remove files stored earlier in a request that failed later on"""
+    for upload in uploads:
+        if upload.deduplicated:
+            # The file existed before this request and may be referenced elsewhere
+            continue
+        try:
+            upload.path.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove upload {upload.path}: {e}")
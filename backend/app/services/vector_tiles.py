@@ -0,0 +1,144 @@
+"""
+Minimal Mapbox Vector Tile (MVT 2.1) encoder.
+
+Only what map overlays generated by this application need: points and
+polygons with string/number properties, already projected to tile
+coordinates. The protobuf wire format is written by hand, so no protobuf
+runtime or tile library is required.
+
+    https://github.com/mapbox/vector-tile-spec/tree/master/2.1
+"""
+import math
+import struct
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence, Tuple, Union
+
+TILE_EXTENT = 4096
+# Geometry outside the tile kept around it (avoids seams at tile borders)
+TILE_BUFFER = 64
+
+POINT = 1
+POLYGON = 3
+
+_CMD_MOVE_TO = 1
+_CMD_LINE_TO = 2
+_CMD_CLOSE_PATH = 7
+
+PropertyValue = Union[str, int, float, bool]
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _key(field_number: int, wire_type: int) -> bytes:
+    return _varint((field_number << 3) | wire_type)
+
+
+def _length_delimited(field_number: int, payload: bytes) -> bytes:
+    return _key(field_number, 2) + _varint(len(payload)) + payload
+
+
+def _packed(field_number: int, values: Sequence[int]) -> bytes:
+    return _length_delimited(field_number, b"".join(_varint(v) for v in values))
+
+
+def _command(command: int, count: int) -> int:
+    return (command & 0x7) | (count << 3)
+
+
+def lonlat_to_tile(lon: float, lat: float, zoom: int) -> Tuple[float, float]:
+    """Web Mercator position in tile units (integer part = tile x/y)"""
+    n = 2 ** zoom
+    lat = max(min(lat, 85.05112878), -85.05112878)
+    x = (lon + 180.0) / 360.0 * n
+    y = (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n
+    return x, y
+
+
+def tile_bounds(zoom: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """(west, south, east, north) of a tile in degrees"""
+    n = 2 ** zoom
+
+    def lat(tile_y: float) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / n))))
+
+    return x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)
+
+
+@dataclass
+class Layer:
+    """Features of one tile layer; geometry in tile coordinates (0..extent)"""
+    name: str
+    extent: int = TILE_EXTENT
+    _features: List[bytes] = field(default_factory=list)
+    _keys: Dict[str, int] = field(default_factory=dict)
+    _values: Dict[Tuple[type, PropertyValue], int] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self._features)
+
+    def _tags(self, properties: Dict[str, PropertyValue]) -> List[int]:
+        tags = []
+        for key, value in properties.items():
+            key_index = self._keys.setdefault(key, len(self._keys))
+            value_index = self._values.setdefault((type(value), value), len(self._values))
+            tags += [key_index, value_index]
+        return tags
+
+    def _add(self, geom_type: int, geometry: List[int], properties: Dict[str, PropertyValue]) -> None:
+        feature = _packed(2, self._tags(properties))
+        feature += _key(3, 0) + _varint(geom_type)
+        feature += _packed(4, geometry)
+        self._features.append(feature)
+
+    def add_point(self, x: int, y: int, properties: Dict[str, PropertyValue]) -> None:
+        self._add(POINT, [_command(_CMD_MOVE_TO, 1), _zigzag(x), _zigzag(y)], properties)
+
+    def add_polygon(self, ring: Sequence[Tuple[int, int]], properties: Dict[str, PropertyValue]) -> None:
+        """
+        Add a polygon with one exterior ring (without the closing point).
+        The ring must be clockwise in tile coordinates (y grows downwards).
+        """
+        x0, y0 = ring[0]
+        geometry = [_command(_CMD_MOVE_TO, 1), _zigzag(x0), _zigzag(y0), _command(_CMD_LINE_TO, len(ring) - 1)]
+        previous_x, previous_y = x0, y0
+        for x, y in ring[1:]:
+            geometry += [_zigzag(x - previous_x), _zigzag(y - previous_y)]
+            previous_x, previous_y = x, y
+        geometry.append(_command(_CMD_CLOSE_PATH, 1))
+        self._add(POLYGON, geometry, properties)
+
+    def encode(self) -> bytes:
+        out = bytearray(_key(15, 0) + _varint(2))  # version
+        out += _length_delimited(1, self.name.encode())
+        for feature in self._features:
+            out += _length_delimited(2, feature)
+        for key in self._keys:
+            out += _length_delimited(3, key.encode())
+        for value_type, value in self._values:
+            if value_type is str:
+                encoded = _length_delimited(1, value.encode())
+            elif value_type is bool:
+                encoded = _key(7, 0) + _varint(int(value))
+            elif value_type is int:
+                encoded = _key(6, 0) + _varint(_zigzag(value))
+            else:
+                encoded = _key(3, 1) + struct.pack("<d", value)
+            out += _length_delimited(4, encoded)
+        out += _key(5, 0) + _varint(self.extent)
+        return bytes(out)
+
+
+def encode_tile(layers: Sequence[Layer]) -> bytes:
+    """Serialize layers into a vector tile (empty layers are omitted)"""
+    return b"".join(_length_delimited(3, layer.encode()) for layer in layers if len(layer))
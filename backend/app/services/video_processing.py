@@ -0,0 +1,262 @@
+"""
+Background processing of uploaded videos with a locally installed ffmpeg.
+
+For every uploaded video (.mp4, .mov, .avi, .mkv, .webm) the media worker
+
+    probes duration and dimensions (ffprobe),
+    extracts a poster frame     -> /uploads/variants/poster/<path>.jpg
+    renders a web rendition     -> /uploads/variants/web/<path>.mp4
+                                   (H.264/AAC, max 1280 px, ~1.5 Mbit/s, faststart)
+
+Work runs in a small process pool (ffmpeg itself is multi-threaded, so one or
+two concurrent jobs are enough); results are recorded in the media_info table
+keyed by the original upload URL.
+"""
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set
+
+from app.core.logging_config import get_logger
+from app.services.image_variants import VARIANTS_DIR
+from app.services.upload_service import UPLOAD_DIR, content_hash_from_url
+
+logger = get_logger(__name__)
+
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".avi", ".mkv", ".webm"}
+
+# Variant name -> file extension
+VIDEO_VARIANTS: Dict[str, str] = {
+    "poster": ".jpg",
+    "web": ".mp4",
+}
+POSTER_MAX_SIDE = 1024
+WEB_MAX_WIDTH = 1280
+WEB_VIDEO_BITRATE = "1500k"
+WEB_AUDIO_BITRATE = "96k"
+
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+FFPROBE_BIN = os.getenv("FFPROBE_BIN", "ffprobe")
+VIDEO_WORKERS = int(os.getenv("VIDEO_WORKERS", "1"))
+# Upper bound for one transcoding job
+VIDEO_TIMEOUT_SECONDS = int(os.getenv("VIDEO_TIMEOUT_SECONDS", "1800"))
+
+_pool: Optional[ProcessPoolExecutor] = None
+# URLs queued or being processed (prevents duplicate jobs for lazy requests)
+_in_flight: Set[str] = set()
+
+
+def ffmpeg_available() -> bool:
+    """Check that ffmpeg and ffprobe are installed"""
+    return shutil.which(FFMPEG_BIN) is not None and shutil.which(FFPROBE_BIN) is not None
+
+
+def is_video_url(url: Optional[str]) -> bool:
+    """Check that a stored URL points at an uploaded video"""
+    return bool(url) and url.startswith("/uploads/") and not url.startswith("/uploads/variants/") \
+        and Path(url).suffix.lower() in VIDEO_EXTENSIONS
+
+
+def video_variant_url(url: Optional[str], variant: str = "poster") -> Optional[str]:
+    """Map an original video URL to its poster/web rendition URL (None for non-video files)"""
+    if not is_video_url(url):
+        return None
+    relative = url[len("/uploads/"):]
+    return f"/uploads/variants/{variant}/{relative}{VIDEO_VARIANTS[variant]}"
+
+
+def video_variant_path(relative: str, variant: str, variants_dir: Optional[Path] = None) -> Path:
+    """Disk path of a derivative of the video stored at UPLOAD_DIR/relative"""
+    return (variants_dir or VARIANTS_DIR) / variant / f"{relative}{VIDEO_VARIANTS[variant]}"
+
+
+def _run(args, timeout: int) -> subprocess.CompletedProcess:
+    return subprocess.run(args, capture_output=True, timeout=timeout, check=True)
+
+
+def probe_video(source: str, ffprobe_bin: str = FFPROBE_BIN) -> Dict[str, Optional[float]]:
+    """Duration (seconds) and display dimensions of the first video stream"""
+    result = _run([
+        ffprobe_bin, "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "stream=width,height:stream_tags=rotate:stream_side_data=rotation:format=duration",
+        "-of", "json", source,
+    ], timeout=60)
+    data = json.loads(result.stdout or b"{}")
+    stream = (data.get("streams") or [{}])[0]
+    width, height = stream.get("width"), stream.get("height")
+
+    rotation = stream.get("tags", {}).get("rotate")
+    for side_data in stream.get("side_data_list", []):
+        rotation = side_data.get("rotation", rotation)
+    # Phone videos are stored landscape with a rotation flag
+    if rotation is not None and abs(int(float(rotation))) % 180 == 90:
+        width, height = height, width
+
+    duration = data.get("format", {}).get("duration")
+    return {
+        "duration": float(duration) if duration not in (None, "N/A") else None,
+        "width": width,
+        "height": height,
+    }
+
+
+def _render_to(target: Path, build_args, timeout: int) -> None:
+    """Run ffmpeg into a temporary file and move it into place atomically"""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=target.parent, suffix=f".part{target.suffix}")
+    os.close(fd)
+    try:
+        _run(build_args(tmp_path), timeout=timeout)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def process_video(
+    source: str,
+    relative: str,
+    variants_dir: str,
+    ffmpeg_bin: str = FFMPEG_BIN,
+    ffprobe_bin: str = FFPROBE_BIN,
+    timeout: int = VIDEO_TIMEOUT_SECONDS,
+) -> Dict:
+    """
+    Probe a video and render its poster and web rendition. Runs inside a pool
+    worker process, so all paths are passed explicitly.
+    """
+    info = probe_video(source, ffprobe_bin)
+    duration = info["duration"] or 0
+
+    poster = video_variant_path(relative, "poster", Path(variants_dir))
+    # A frame a little into the clip is more telling than the (often black) first one
+    seek = min(1.0, duration / 2) if duration else 0
+    _render_to(poster, lambda out: [
+        ffmpeg_bin, "-y", "-v", "error",
+        "-ss", f"{seek:.2f}", "-i", source,
+        "-frames:v", "1",
+        "-vf", f"scale='min({POSTER_MAX_SIDE},iw)':-2",
+        "-q:v", "3", "-update", "1", out,
+    ], timeout=120)
+
+    web = video_variant_path(relative, "web", Path(variants_dir))
+    _render_to(web, lambda out: [
+        ffmpeg_bin, "-y", "-v", "error", "-i", source,
+        "-map", "0:v:0", "-map", "0:a:0?",
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "28",
+        "-maxrate", WEB_VIDEO_BITRATE, "-bufsize", "3000k",
+        "-vf", f"scale='min({WEB_MAX_WIDTH},iw)':-2",
+        "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-b:a", WEB_AUDIO_BITRATE,
+        "-movflags", "+faststart",
+        "-f", "mp4", out,
+    ], timeout=timeout)
+
+    return {**info, "poster": str(poster), "web": str(web)}
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Lazily create the shared video processing pool"""
+    global _pool
+    if _pool is None:
+        # spawn: forking a multi-threaded server process is not safe
+        _pool = ProcessPoolExecutor(
+            max_workers=VIDEO_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_pool() -> None:
+    """Stop the video processing pool (application shutdown)"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def record_result(url: str, result: Optional[Dict] = None, error: Optional[str] = None) -> None:
+    """Store the processing outcome of a video in media_info"""
+    from app.db import SessionLocal
+    from app.models.media_info import MediaInfo
+
+    db = SessionLocal()
+    try:
+        info = db.query(MediaInfo).filter(MediaInfo.url == url).first()
+        if info is None:
+            info = MediaInfo(url=url, sha256=content_hash_from_url(url))
+            db.add(info)
+        if result is not None:
+            info.status = "ready"
+            info.duration = result.get("duration")
+            info.width = result.get("width")
+            info.height = result.get("height")
+            info.poster_url = video_variant_url(url, "poster")
+            info.web_url = video_variant_url(url, "web")
+            info.error = None
+        else:
+            info.status = "failed"
+            info.error = (error or "")[:2000]
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Could not record media info for {url}: {e}")
+    finally:
+        db.close()
+
+
+def _on_done(url: str, future: Future) -> None:
+    _in_flight.discard(url)
+    if future.cancelled():
+        return
+    exc = future.exception()
+    if exc is not None:
+        message = exc.stderr.decode(errors="replace").strip() if isinstance(exc, subprocess.CalledProcessError) and exc.stderr else str(exc)
+        logger.warning(f"Video processing failed for {url}: {message}")
+        record_result(url, error=message or exc.__class__.__name__)
+    else:
+        record_result(url, result=future.result())
+
+
+def schedule_video_processing(urls: Iterable[str]) -> Dict[str, Future]:
+    """
+    Queue poster/web rendition generation for uploaded videos (fire and forget).
+    Non-video URLs are ignored. Returns the futures of queued URLs.
+    """
+    queued: Dict[str, Future] = {}
+    if not ffmpeg_available():
+        return queued
+    for url in urls:
+        if not is_video_url(url) or url in _in_flight:
+            continue
+        relative = url[len("/uploads/"):]
+        source = UPLOAD_DIR / relative
+        try:
+            # Security check - URLs may come from clients
+            source.resolve().relative_to(UPLOAD_DIR.resolve())
+        except ValueError:
+            continue
+        try:
+            future = get_pool().submit(
+                process_video, str(source), relative, str(VARIANTS_DIR)
+            )
+        except Exception as e:
+            logger.warning(f"Could not schedule video processing for {url}: {e}")
+            continue
+        _in_flight.add(url)
+        future.add_done_callback(lambda f, url=url: _on_done(url, f))
+        queued[url] = future
+    return queued
+
+
+def is_processing(url: str) -> bool:
+    """Check whether a video is queued or being processed"""
+    return url in _in_flight
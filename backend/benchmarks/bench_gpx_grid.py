@@ -0,0 +1,106 @@
+"""
+Benchmark of search grid GPX generation
+Usage: python benchmarks/bench_gpx_grid.py [--repeat N] [--area]
+
+Measures coordinate computation and streaming GPX output for grids of
+10k, 40k and 160k cells (100x100, 200x200 and 400x400 cells of 50 m):
+wall time, peak Python memory (tracemalloc) and output size.
+
+With --area, grids clipped to an irregular 5000-vertex area instead: time
+to lay out and clip square and hexagonal cells of 50 m.
+"""
+import argparse
+import io
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+
+from app.services.gpx_service import compute_grid, write_gpx  # noqa: E402
+from app.services.grid_area import AreaPolygon  # noqa: E402
+from app.services.grid_cells import area_layout, build_cells  # noqa: E402
+
+CENTER = (50.4501, 30.5234)  # Kyiv
+CELL_SIZE = 50
+SIDES = (100, 200, 400)
+
+
+class CountingWriter(io.TextIOBase):
+    """Text sink that only counts characters (measures the writer, not the disk)"""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, text):
+        self.size += len(text)
+        return len(text)
+
+
+def run(side: int):
+    start = time.perf_counter()
+    grid = compute_grid(*CENTER, cols=side, rows=side, cell_size_meters=CELL_SIZE)
+    computed = time.perf_counter()
+    out = CountingWriter()
+    write_gpx(out, grid)
+    return computed - start, time.perf_counter() - computed, out.size
+
+
+def irregular_area(radius_deg: float, vertices: int = 5000) -> AreaPolygon:
+    """Wavy closed outline around CENTER (forest edge like)"""
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    radii = radius_deg * (1 + 0.3 * np.sin(7 * angles) + 0.1 * np.sin(31 * angles))
+    return AreaPolygon([np.c_[CENTER[1] + 1.5 * radii * np.cos(angles), CENTER[0] + radii * np.sin(angles)]])
+
+
+def run_area(repeat: int):
+    print(f"{'shape':>8} {'lattice':>10} {'kept':>10} {'time':>10}")
+    for radius in (0.02, 0.05, 0.1):
+        area = irregular_area(radius)
+        for shape in ("square", "hex"):
+            layout = area_layout(area, CELL_SIZE, shape)
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                cells = build_cells(*layout, CELL_SIZE, shape, area)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            print(f"{shape:>8} {layout[2] * layout[3]:>10} {len(cells):>10} {best * 1000:>8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark GPX grid generation")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per grid size (best is reported)")
+    parser.add_argument("--area", action="store_true", help="Benchmark clipping to an irregular area")
+    args = parser.parse_args()
+
+    if args.area:
+        run_area(args.repeat)
+        return
+
+    print(f"{'cells':>8} {'compute':>10} {'write':>10} {'total':>10} {'peak mem':>10} {'output':>10}")
+    for side in SIDES:
+        best = None
+        for _ in range(args.repeat):
+            result = run(side)
+            if best is None or sum(result[:2]) < sum(best[:2]):
+                best = result
+        # Memory measured separately - tracing slows allocation down
+        tracemalloc.start()
+        run(side)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        compute_s, write_s, size = best
+        print(
+            f"{side * side:>8} {compute_s * 1000:>8.1f}ms {write_s * 1000:>8.1f}ms "
+            f"{(compute_s + write_s) * 1000:>8.1f}ms {peak / 1e6:>8.1f}MB {size / 1e6:>8.1f}MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
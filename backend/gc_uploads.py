@@ -0,0 +1,56 @@
+"""
+Script to remove orphaned uploads (files no record references any more)
+Usage: python gc_uploads.py [--dry-run] [--grace-hours N] [--quarantine-days N]
+
+Unreferenced files are first moved to uploads/.quarantine and deleted on a
+later run once the quarantine period is over. Intended to run daily from cron.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.db import SessionLocal
+import app.models  # noqa: F401 - register all models
+from app.services.upload_gc import collect_garbage
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect orphaned uploads")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be done")
+    parser.add_argument("--grace-hours", type=int, default=None, help="Keep unreferenced files younger than this")
+    parser.add_argument("--quarantine-days", type=int, default=None, help="Days to keep quarantined files")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        report = collect_garbage(
+            db,
+            dry_run=args.dry_run,
+            grace_period_hours=args.grace_hours,
+            quarantine_days=args.quarantine_days,
+        )
+    finally:
+        db.close()
+
+    mode = "DRY RUN - nothing changed" if report.dry_run else "done"
+    print(f"Upload GC ({mode})")
+    print(f"  referenced files:   {report.live_references}")
+    print(f"  scanned files:      {report.scanned_files}")
+    print(f"  quarantined:        {report.quarantined_files} ({report.quarantined_bytes / 1024 / 1024:.1f} MB)")
+    print(f"  deleted:            {report.deleted_files} ({report.deleted_bytes / 1024 / 1024:.1f} MB)")
+    print(f"  restored:           {report.restored_files}")
+    print(f"  stale partial files: {report.stale_parts_removed}")
+    print(f"  expired sessions:   {report.expired_sessions_removed}")
+    print(f"  grid cache entries: {report.grid_cache_entries_removed}")
+    for title, paths in (("Quarantined", report.quarantined), ("Deleted", report.deleted), ("Restored", report.restored)):
+        if paths:
+            print(f"\n{title} (first {len(paths)}):")
+            for path in paths:
+                print(f"  {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Script to geocode stored settlements with the offline gazetteer
+Usage: python geocode_records.py [--batch-size N]
+
+Fills settlement ids and coordinates of cases, missing persons and
+organizations and recomputes case points. New writes are geocoded on their
+own; run this once after upgrading and whenever GAZETTEER_PATH changes.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.db import SessionLocal
+import app.models  # noqa: F401 - register all models
+from app.services.geocoding import geocode_existing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Geocode stored settlements")
+    parser.add_argument("--batch-size", type=int, default=500, help="Records per transaction")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        counts = geocode_existing(db, batch_size=args.batch_size)
+    finally:
+        db.close()
+
+    print("Geocoding done")
+    for table, count in counts.items():
+        print(f"  {table}: {count}")
+
+
+if __name__ == "__main__":
+    main()
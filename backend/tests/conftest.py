@@ -1,17 +1,26 @@
+import os
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from app.main import app
 from app.db import Base, get_db
-from app.models.user import User, Role
+from app.routers import files
+from app.services import (
+    image_variants, resumable_upload, track_variants, upload_gc, upload_refs, upload_service, video_processing
+)
+from app.models.user import User, Role, UserStatus
 from app.services.auth_service import get_password_hash
+from app.core.permissions import get_all_permissions
 
-# Use in-memory SQLite for testing
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+# SQLite file database by default; set TEST_DATABASE_URL to a PostgreSQL
+# database for tests of Postgres-only SQL (upserts, geohash ranges, ...)
+SQLALCHEMY_DATABASE_URL = os.getenv("TEST_DATABASE_URL", "sqlite:///./test.db")
 
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -25,7 +34,26 @@ def db_session():
         yield db
     finally:
         db.close()
-        Base.metadata.drop_all(bind=engine)
+        if engine.dialect.name == "postgresql":
+            # searches <-> flyers reference each other, so drop_all cannot order them
+            tables = ", ".join(table.name for table in Base.metadata.sorted_tables)
+            with engine.begin() as connection:
+                connection.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+        else:
+            Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    """Point the upload services (and their copies of the paths) at a temporary upload directory"""
+    for module in (upload_service, image_variants, track_variants, upload_gc, upload_refs, video_processing, files):
+        monkeypatch.setattr(module, "UPLOAD_DIR", tmp_path)
+    for module in (upload_service, upload_gc):
+        monkeypatch.setattr(module, "UPLOAD_TMP_DIR", tmp_path / ".tmp")
+    for module in (image_variants, track_variants):
+        monkeypatch.setattr(module, "VARIANTS_DIR", tmp_path / "variants")
+    monkeypatch.setattr(resumable_upload, "SESSIONS_DIR", tmp_path / ".sessions")
+    return tmp_path
 
 
 @pytest.fixture(scope="function")
@@ -45,15 +73,18 @@ def client(db_session):
 
 @pytest.fixture(scope="function")
 def test_user(db_session):
-    """Create a test user"""
+    """Create a test user (role with every permission)"""
+    role = Role(name="tester", display_name="Tester", permissions=get_all_permissions())
     user = User(
-        full_name="Test User",
+        last_name="User",
+        first_name="Test",
         phone="+79991234567",
         email="test@example.com",
         password_hash=get_password_hash("testpassword"),
         city="Moscow",
-        status="active"
+        status=UserStatus.active
     )
+    user.roles.append(role)
     db_session.add(user)
     db_session.commit()
     db_session.refresh(user)
@@ -64,18 +95,19 @@ def test_user(db_session):
 def test_admin_user(db_session):
     """Create a test admin user with admin role"""
     # Create admin role
-    admin_role = Role(name="admin", description="Administrator")
+    admin_role = Role(name="admin", display_name="Administrator", description="Administrator", permissions=get_all_permissions())
     db_session.add(admin_role)
     db_session.commit()
 
     # Create admin user
     user = User(
-        full_name="Admin User",
+        last_name="User",
+        first_name="Admin",
         phone="+79991234568",
         email="admin@example.com",
         password_hash=get_password_hash("adminpassword"),
         city="Moscow",
-        status="active"
+        status=UserStatus.active
     )
     user.roles.append(admin_role)
     db_session.add(user)
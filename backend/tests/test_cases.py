@@ -180,3 +180,42 @@ def test_filter_cases_by_status(client, auth_headers, sample_case_data):
     data = response.json()
     assert data["total"] == 1
     assert all(case["case_status"] == "new" for case in data["cases"])
+
+
+def test_filter_cases_by_location(client, auth_headers):
+    """Test radius and bounding box filters on case points"""
+    def create(last_name, lat, lon):
+        response = client.post("/cases/", json={
+            "applicant_last_name": "Петренко",
+            "applicant_first_name": "Іван",
+            "missing_persons": [{
+                "last_name": last_name,
+                "first_name": "Марія",
+                "last_seen_lat": lat,
+                "last_seen_lon": lon,
+            }],
+        }, headers=auth_headers)
+        assert response.status_code == 201
+        return response.json()
+
+    kyiv = create("Київська", 50.4501, 30.5234)
+    brovary = create("Броварська", 50.5110, 30.7909)
+    lviv = create("Львівська", 49.8397, 24.0297)
+    assert (kyiv["lat"], kyiv["lon"]) == (50.4501, 30.5234)
+
+    response = client.get("/cases/?near_lat=50.45&near_lon=30.52&radius_km=30", headers=auth_headers)
+    assert response.status_code == 200
+    assert {case["id"] for case in response.json()["cases"]} == {kyiv["id"], brovary["id"]}
+
+    response = client.get(f"/cases/?near_case_id={kyiv['id']}&radius_km=30", headers=auth_headers)
+    assert [case["id"] for case in response.json()["cases"]] == [brovary["id"]]
+
+    response = client.get("/cases/?bbox=49,23,50.5,25", headers=auth_headers)
+    assert [case["id"] for case in response.json()["cases"]] == [lviv["id"]]
+
+    response = client.get("/cases/map?bbox=44,22,53,41", headers=auth_headers)
+    assert response.json()["total"] == 3
+    assert len(response.json()["points"]) == 3
+
+    assert client.get("/cases/?radius_km=30", headers=auth_headers).status_code == 400
+    assert client.get("/cases/?bbox=1,2,3", headers=auth_headers).status_code == 400
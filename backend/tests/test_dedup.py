@@ -0,0 +1,139 @@
+from datetime import datetime
+
+from app.services.dedup_service import (
+    PersonFields,
+    SubmissionFields,
+    build_match_keys,
+    normalize_name,
+    normalize_phone,
+    normalize_settlement,
+)
+
+
+def test_normalize_phone_formats():
+    """Test that all UA phone formats normalize to the same subscriber number"""
+    assert normalize_phone("0501234567") == "501234567"
+    assert normalize_phone("+380 (50) 123-45-67") == "501234567"
+    assert normalize_phone("380501234567") == "501234567"
+    assert normalize_phone("123") == ""
+    assert normalize_phone(None) == ""
+
+
+def test_normalize_name_folds_spelling_variants():
+    """Test that Ukrainian and Russian spellings of a name match"""
+    assert normalize_name("Ірина") == normalize_name("Ирина")
+    assert normalize_name("  Петрова-Сидоренко ") == "петровасидоренко"
+    assert normalize_name("Невідомо") == ""
+
+
+def test_normalize_settlement_drops_prefix():
+    """Test that settlement type prefixes and region suffixes are ignored"""
+    assert normalize_settlement("м. Бровари") == normalize_settlement("Бровари, Київська обл.")
+    assert normalize_settlement("смт Козин") == "козин"
+
+
+def test_build_match_keys_same_person_from_different_channels():
+    """Test that website and Telegram submissions of the same case share keys"""
+    website = SubmissionFields(
+        applicant_phone="+380501234567",
+        persons=[PersonFields("Петрова", "Марія", datetime(1990, 5, 15), "м. Київ", None)]
+    )
+    telegram = SubmissionFields(
+        applicant_phone="050 123 45 67",
+        persons=[PersonFields("петрова", "Марія", "1990-05-15", "Київ", None)]
+    )
+
+    shared = build_match_keys(website) & build_match_keys(telegram)
+
+    assert "phone:501234567" in shared
+    assert "name_bd:петрова|мария|1990-05-15" in shared
+    assert "name_st:петрова|мария|киив" in shared
+
+
+def test_build_match_keys_skips_placeholder_names():
+    """Test that placeholder names from failed autofill produce no name keys"""
+    submission = SubmissionFields(
+        applicant_phone=None,
+        persons=[PersonFields("Невідомо", "Невідомо", None, "Київ", None)]
+    )
+
+    assert build_match_keys(submission) == set()
+
+
+def _create_case(client, auth_headers, **fields):
+    payload = {
+        "applicant_last_name": "Петров", "applicant_first_name": "Іван",
+        "missing_last_name": "Петрова", "missing_first_name": "Марія", "tags": [], **fields
+    }
+    response = client.post("/cases/", json=payload, headers=auth_headers)
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def test_merge_adds_new_missing_persons(client, auth_headers, db_session):
+    """Test that a merged submission adds only the missing persons the case does not list"""
+    from app.models.case import Case
+    from app.models.missing_person import MissingPerson
+    from app.schemas.case import CaseCreate
+    from app.services.dedup_service import merge_submission
+
+    case_id = _create_case(client, auth_headers)
+    submission = CaseCreate(
+        applicant_last_name="Петров", applicant_first_name="Іван",
+        missing_persons=[
+            {"last_name": "Петрова", "first_name": "Мария"},
+            {"last_name": "Петров", "first_name": "Олег", "phone": "0501234567"},
+            {"last_name": "Петров", "first_name": "Олег"},
+            {"last_name": "Невідомо", "first_name": "Невідомо"},
+        ],
+    )
+    target = db_session.query(Case).filter(Case.id == case_id).one()
+    merge_submission(db_session, target, submission, "сайт")
+    db_session.commit()
+
+    persons = db_session.query(MissingPerson).filter(MissingPerson.case_id == case_id).order_by(MissingPerson.order_index).all()
+    assert [(person.first_name, person.phone) for person in persons][-1] == ("Олег", "0501234567")
+    assert sum(person.first_name == "Олег" for person in persons) == 1
+    assert "Додано зниклих осіб: 1" in target.additional_info
+
+
+def test_duplicate_link_validation(client, auth_headers):
+    """Test that duplicates link straight to an existing original"""
+    original = _create_case(client, auth_headers)
+    duplicate = _create_case(client, auth_headers)
+    other = _create_case(client, auth_headers)
+
+    def link(case_id, original_id):
+        return client.put(f"/cases/{case_id}", json={"duplicate_of_case_id": original_id}, headers=auth_headers)
+
+    assert link(original, original).status_code == 400
+    assert link(original, 999999).status_code == 404
+    assert link(duplicate, original).status_code == 200
+    # Chain and cycle
+    assert link(other, duplicate).status_code == 400
+    assert link(original, duplicate).status_code == 400
+    assert link(duplicate, None).status_code == 200
+    assert link(original, duplicate).status_code == 200
+
+
+def test_public_merge_answers_like_a_new_case(client, monkeypatch):
+    """Test that a merged public submission does not reveal the existing case and a failed merge creates a case"""
+    from app.services import dedup_service
+
+    payload = {
+        "applicant_full_name": "Петров Іван", "applicant_phone": "0501234567",
+        "missing_full_name": "Петрова Марія", "missing_birthdate": "1990-05-15", "missing_settlement": "Київ",
+    }
+    created = client.post("/public/cases", json=payload)
+    merged = client.post("/public/cases", json=payload)
+    assert created.status_code == merged.status_code == 201
+    assert created.json()["case_id"]
+    assert merged.json() == {**created.json(), "case_id": None}
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("merge failed")
+
+    monkeypatch.setattr(dedup_service, "merge_submission", fail)
+    response = client.post("/public/cases", json=payload)
+    assert response.status_code == 201
+    assert response.json()["case_id"] not in (None, created.json()["case_id"])
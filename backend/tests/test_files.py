@@ -0,0 +1,71 @@
+import hashlib
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import files
+
+CONTENT = bytes(range(256)) * 4
+DIGEST = hashlib.sha256(CONTENT).hexdigest()
+CONTENT_PATH = f"{DIGEST[:2]}/{DIGEST[2:4]}/{DIGEST}.mp4"
+
+
+@pytest.fixture
+def client(upload_dir):
+    """Client for the files router serving a temporary upload directory"""
+    (upload_dir / CONTENT_PATH).parent.mkdir(parents=True)
+    (upload_dir / CONTENT_PATH).write_bytes(CONTENT)
+    (upload_dir / "grid_1.gpx").write_text("<gpx/>")
+    (upload_dir / ".quarantine").mkdir()
+    (upload_dir / ".quarantine" / "old.jpg").write_bytes(b"x")
+
+    app = FastAPI()
+    app.include_router(files.router)
+    return TestClient(app)
+
+
+def test_content_addressed_file_is_immutable(client):
+    """Test cache headers and conditional requests for content-named files"""
+    response = client.get(f"/uploads/{CONTENT_PATH}")
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["etag"] == f'"{DIGEST}"'
+    assert "immutable" in response.headers["cache-control"]
+    assert response.headers["content-type"] == "video/mp4"
+
+    cached = client.get(f"/uploads/{CONTENT_PATH}", headers={"If-None-Match": f'"{DIGEST}"'})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+
+def test_range_request_returns_partial_content(client):
+    """Test that video seeking gets only the requested bytes"""
+    response = client.get(f"/uploads/{CONTENT_PATH}", headers={"Range": "bytes=100-199"})
+
+    assert response.status_code == 206
+    assert response.content == CONTENT[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(CONTENT)}"
+
+
+def test_legacy_file_is_revalidated_and_hidden_dirs_are_not_served(client):
+    """Test headers of mutable files and that quarantine is not reachable"""
+    response = client.get("/uploads/grid_1.gpx")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "public, no-cache"
+
+    assert client.get("/uploads/.quarantine/old.jpg").status_code == 404
+    assert client.get("/uploads/missing.jpg").status_code == 404
+
+
+def test_x_accel_mode_delegates_bytes_to_proxy(client, monkeypatch):
+    """Test that in X-Accel-Redirect mode no file content is sent"""
+    monkeypatch.setattr(files, "UPLOAD_SERVE_MODE", "x-accel")
+
+    response = client.get(f"/uploads/{CONTENT_PATH}")
+
+    assert response.status_code == 200
+    assert response.content == b""
+    assert response.headers["x-accel-redirect"] == f"/internal/uploads/{CONTENT_PATH}"
+    assert response.headers["etag"] == f'"{DIGEST}"'
@@ -0,0 +1,90 @@
+"""
+Tests for the forum import lock and stop flag (fake migrator, shared state in memory).
+"""
+import threading
+import time
+
+import pytest
+
+from app.services import forum_import_service
+from app.services.forum_import_service import IMPORT_LOCK_KEY, ForumImportService
+from app.services.shared_state import MemoryState
+from tests.conftest import TestingSessionLocal
+
+
+class FakeMigrator:
+    proceed = threading.Event()
+    details = []
+
+    def __init__(self, forum_url, api_url):
+        self.driver = None
+
+    def setup_driver(self):
+        pass
+
+    def login_forum(self, username, password):
+        return True
+
+    def login_api(self, email, password):
+        return True
+
+    def get_topics_from_subforum(self, subforum_id, max_topics):
+        return [{"title": f"Topic {i}", "url": f"topic-{i}"} for i in range(max_topics)]
+
+    def get_topic_details(self, url):
+        self.details.append(url)
+        FakeMigrator.proceed.wait(5)
+        return {"posts": []}
+
+    def create_case_from_topic(self, topic_data):
+        return 1
+
+    def create_search_for_case(self, case_id, topic_data):
+        return None
+
+
+@pytest.fixture
+def state(monkeypatch, db_session):
+    state = MemoryState()
+    monkeypatch.setattr(forum_import_service, "get_shared_state", lambda: state)
+    monkeypatch.setattr(forum_import_service, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(forum_import_service, "ForumMigrator", FakeMigrator)
+    FakeMigrator.proceed.clear()
+    FakeMigrator.details.clear()
+    return state
+
+
+def _start():
+    return ForumImportService.start_import("http://forum", "user", "secret", 1, 3, "api@example.com", "secret")
+
+
+def _wait(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_stop_keeps_lock_until_import_ends(state, db_session):
+    """Test that a stopped import blocks new ones until its thread has stopped"""
+    assert _start()
+    _wait(lambda: FakeMigrator.details)
+    assert not _start()
+
+    ForumImportService.update_status(db_session, is_running=False, status='stopped')
+    # The first topic is still being processed: the lock is held
+    assert not _start()
+
+    FakeMigrator.proceed.set()
+    _wait(lambda: state.get(IMPORT_LOCK_KEY) is None)
+    db_session.expire_all()
+    status = ForumImportService.get_status(db_session)
+    assert status.status == 'stopped' and not status.is_running
+    assert FakeMigrator.details == ["topic-0"]
+
+
+def test_release_only_by_owner(state):
+    """Test that an import only releases its own lock"""
+    assert state.add(IMPORT_LOCK_KEY, "new-import", 60)
+    ForumImportService.release_lock("old-import")
+    assert state.get(IMPORT_LOCK_KEY) == "new-import"
@@ -0,0 +1,95 @@
+import os
+
+import pytest
+
+from app.models.case import Case
+from app.models.organization import Organization
+from app.services import gazetteer, geocoding
+from app.services.gazetteer import open_index, region_key
+
+SETTLEMENTS = """id,name,region,lat,lon,population,alternate_names
+1,Київ,Київ,50.4501,30.5234,2950000,Киев;Kyiv
+2,Миколаїв,Миколаївська,46.9750,31.9946,470000,Николаев
+3,Миколаївка,Донецька,48.8600,37.5800,14000,
+4,Миколаївка,Сумська,51.5000,34.4000,3000,
+5,Кам'янець-Подільський,Хмельницька,48.6845,26.5856,99000,
+6,Київець,Львівська,49.6500,24.3000,1500,
+"""
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setattr(gazetteer, "GAZETTEER_INDEX_DIR", str(tmp_path / "index"))
+    source = tmp_path / "settlements.csv"
+    source.write_text(SETTLEMENTS, encoding="utf-8")
+    return open_index(str(source))
+
+
+def test_region_key():
+    """Test that region spellings and the name of the centre give one key"""
+    assert region_key("Київська обл.") == region_key("Київ") == region_key("київська область")
+    assert region_key("Чернігівська") == region_key("Чернігів")
+    assert region_key("Чернівецька") != region_key("Чернігівська")
+    assert region_key(None) == ""
+
+
+def test_autocomplete_prefix(index):
+    """Test prefix matches ranked by population, alternate names included"""
+    assert [s.id for s in index.autocomplete("Ки")] == [1, 6]
+    assert [s.id for s in index.autocomplete("мико")] == [2, 3, 4]
+    assert [s.id for s in index.autocomplete("мико", limit=2)] == [2, 3]
+    assert [s.id for s in index.autocomplete("Kyi")] == [1]
+    assert [s.id for s in index.autocomplete("кам'янець")] == [5]
+    assert [s.id for s in index.autocomplete("м. Мико", region="Сумська обл.")] == [4]
+    assert index.autocomplete("Ж") == []
+    assert index.autocomplete("") == []
+
+
+def test_resolve(index):
+    """Test exact lookup with homonyms told apart by region"""
+    kyiv = index.resolve("м. Київ")
+    assert (kyiv.id, kyiv.name, kyiv.region) == (1, "Київ", "Київ")
+    assert (kyiv.lat, kyiv.lon) == pytest.approx((50.4501, 30.5234))
+    assert index.resolve("Киев, Київська обл.").id == 1
+    assert index.resolve("Миколаївка").id == 3
+    assert index.resolve("с. Миколаївка", "Сумська").id == 4
+    # An unknown region does not hide the candidates
+    assert index.resolve("Миколаївка", "Марсіанська").id == 3
+    # A known region without such a settlement
+    assert index.resolve("Миколаївка", "Київська") is None
+    assert index.resolve("Мико") is None
+    assert index.get(5).name == "Кам'янець-Подільський"
+    assert index.get(99) is None
+
+
+def test_index_is_compiled_once(index, tmp_path):
+    """Test that a second open maps the existing arrays"""
+    directories = os.listdir(tmp_path / "index")
+    again = open_index(str(tmp_path / "settlements.csv"))
+    assert os.listdir(tmp_path / "index") == directories
+    assert len(again) == len(index) == 6
+
+
+def test_bundled_dataset(tmp_path, monkeypatch):
+    """Test that the bundled settlements load"""
+    monkeypatch.setattr(gazetteer, "GAZETTEER_INDEX_DIR", str(tmp_path))
+    index = open_index(gazetteer.GAZETTEER_PATH)
+    assert index.resolve("Дніпропетровськ").name == "Дніпро"
+    assert index.resolve("Кировоград").name == "Кропивницький"
+
+
+def test_geocode_records(index, monkeypatch):
+    """Test that records get the settlement id and coordinates of their text fields"""
+    monkeypatch.setattr(gazetteer, "_index", index)
+    case = Case(missing_settlement="Миколаївка", missing_region="Сумська обл.")
+    geocoding.geocode(case)
+    assert (case.missing_settlement_id, case.missing_lat, case.missing_lon) == (4, 51.5, 34.4)
+
+    organization = Organization(city="Невідоме", region="Київська")
+    geocoding.geocode(organization)
+    assert (organization.settlement_id, organization.lat, organization.lon) == (None, None, None)
+
+    # Explicit coordinates are kept
+    pinned = Case(missing_settlement="Київ", missing_lat=50.1, missing_lon=30.1)
+    geocoding.geocode(pinned)
+    assert (pinned.missing_settlement_id, pinned.missing_lat, pinned.missing_lon) == (1, 50.1, 30.1)
@@ -0,0 +1,58 @@
+import random
+
+import pytest
+
+from app.services.geohash import (
+    MAX_COVER_CELLS, bbox_around, cell_size, cover, cover_precision, decode, distance_km, encode
+)
+
+
+def _covered(ranges, value):
+    return any(value >= start and (end is None or value < end) for start, end in ranges)
+
+
+def test_encode_decode():
+    """Test against the reference geohash of the Wikipedia example"""
+    assert encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    lat, lon = decode("u4pruydqqvj")
+    assert (lat, lon) == pytest.approx((57.64911, 10.40744), abs=1e-5)
+    assert encode(50.4501, 30.5234)[:5] == encode(50.4502, 30.5235)[:5]
+    assert len(encode(0, 0)) == 9
+
+
+def test_cell_size():
+    """Test the cell dimensions of the first precisions"""
+    assert cell_size(1) == (45.0, 45.0)
+    assert cell_size(2) == (5.625, 11.25)
+
+
+def test_cover_contains_box():
+    """Test that every point of a box falls into one of its ranges"""
+    rng = random.Random(7)
+    for _ in range(200):
+        south, west = rng.uniform(44, 52), rng.uniform(22, 40)
+        box = (south, west, south + rng.uniform(0, 3) ** 2, west + rng.uniform(0, 2) ** 3)
+        ranges = cover(box)
+        assert 1 <= len(ranges) <= MAX_COVER_CELLS
+        for _ in range(50):
+            point = rng.uniform(box[0], box[2]), rng.uniform(box[1], box[3])
+            assert _covered(ranges, encode(*point))
+
+
+def test_cover_merges_neighbours():
+    """Test that consecutive cells become one range and the whole world is one open range"""
+    assert cover((-90, -180, 90, 180)) == [("0", None)]
+    ranges = cover((50.3, 30.3, 50.6, 30.8))
+    assert all(end is None or start < end for start, end in ranges)
+    assert len(ranges) < 4
+    assert cover_precision((50.44, 30.51, 50.46, 30.53)) > cover_precision((50.3, 30.3, 50.6, 30.8))
+
+
+def test_radius():
+    """Test distances and the box around a circle"""
+    assert distance_km(50.4501, 30.5234, 49.8397, 24.0297) == pytest.approx(468, abs=2)
+    assert distance_km(50, 30, 50, 30) == 0
+    south, west, north, east = bbox_around(50.45, 30.52, 30)
+    assert distance_km(50.45, 30.52, north, 30.52) == pytest.approx(30, rel=1e-6)
+    assert distance_km(50.45, 30.52, 50.45, east) >= 30
+    assert west < 30.52 < east and south < 50.45 < north
@@ -0,0 +1,69 @@
+import io
+import math
+import xml.etree.ElementTree as ET
+
+from app.services.gpx_service import (
+    calculate_grid_points, column_label, compute_grid, generate_gpx, iter_gpx, write_gpx
+)
+
+NS = {"gpx": "http://www.topografix.com/GPX/1/1"}
+
+
+def test_column_labels_continue_after_z():
+    """Test spreadsheet-style column labels"""
+    assert [column_label(i) for i in (0, 25, 26, 27, 701, 702)] == ["A", "Z", "AA", "AB", "ZZ", "AAA"]
+
+
+def test_grid_cells_are_centered_and_sized():
+    """Test that cell centers are one cell size apart and the grid is centered"""
+    grid = compute_grid(50.45, 30.52, cols=4, rows=3, cell_size_meters=100)
+
+    assert grid.cell_lons.shape == (3, 4)
+    assert math.isclose((grid.cell_lats[0] - grid.cell_lats[1]) * 111320, 100)
+    row_width = (grid.cell_lons[1, 1] - grid.cell_lons[1, 0]) * 111320 * math.cos(math.radians(grid.cell_lats[1]))
+    assert math.isclose(row_width, 100)
+    assert math.isclose((grid.top_lat + grid.bottom_lat) / 2, 50.45)
+    assert math.isclose((grid.col_line_lons[0] + grid.col_line_lons[-1]) / 2, 30.52)
+
+
+def test_gpx_document_structure():
+    """Test waypoints, bounds and one track segment per grid line"""
+    root = ET.fromstring(generate_gpx(50.45, 30.52, cols=3, rows=2, cell_size_meters=50).encode())
+
+    waypoints = root.findall("gpx:wpt", NS)
+    assert [w.find("gpx:name", NS).text for w in waypoints] == ["A1", "B1", "C1", "A2", "B2", "C2"]
+    assert len(root.findall("gpx:trk/gpx:trkseg", NS)) == (2 + 1) + (3 + 1)
+
+    bounds = root.find("gpx:metadata/gpx:bounds", NS)
+    for waypoint in waypoints:
+        assert float(bounds.get("minlat")) <= float(waypoint.get("lat")) <= float(bounds.get("maxlat"))
+        assert float(bounds.get("minlon")) <= float(waypoint.get("lon")) <= float(bounds.get("maxlon"))
+
+
+def test_streaming_output_matches_point_lists():
+    """Test that the streamed document carries the same coordinates as the plain lists"""
+    waypoints, segments = calculate_grid_points(48.9, 24.7, cols=30, rows=20, cell_size_meters=75)
+    grid = compute_grid(48.9, 24.7, cols=30, rows=20, cell_size_meters=75)
+
+    out = io.StringIO()
+    write_gpx(out, grid, creator="Test & Co", timestamp="2024-01-01T00:00:00Z")
+    root = ET.fromstring(out.getvalue().encode())
+
+    assert root.get("creator") == "Test & Co"
+    streamed = [(float(w.get("lat")), float(w.get("lon")), w.find("gpx:name", NS).text) for w in root.findall("gpx:wpt", NS)]
+    assert streamed == [(round(w["lat"], 6), round(w["lon"], 6), w["name"]) for w in waypoints]
+    streamed_segments = [
+        [(float(p.get("lat")), float(p.get("lon"))) for p in seg.findall("gpx:trkpt", NS)]
+        for seg in root.findall("gpx:trk/gpx:trkseg", NS)
+    ]
+    assert streamed_segments == [[(round(lat, 6), round(lon, 6)) for lat, lon in seg] for seg in segments]
+
+
+def test_large_grid_is_emitted_in_chunks():
+    """Test that no single chunk holds the whole document"""
+    grid = compute_grid(50.45, 30.52, cols=200, rows=200, cell_size_meters=50)
+    chunks = list(iter_gpx(grid))
+
+    total = sum(len(chunk) for chunk in chunks)
+    assert len(chunks) > 10
+    assert max(len(chunk) for chunk in chunks) < total / 5
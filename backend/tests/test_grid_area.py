@@ -0,0 +1,183 @@
+import json
+import math
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pytest
+
+from app.services.grid_area import AreaFileError, AreaPolygon, load_area, merge_spans, parse_area
+from app.services.grid_cells import MAX_AREA_GRID_CELLS, area_layout, build_cells, hex_cells
+from app.services.grid_export import GridParams, export_grid
+
+# Irregular area around Kyiv (lon, lat): a notched pentagon
+AREA = [
+    (30.500, 50.440), (30.540, 50.438), (30.548, 50.455),
+    (30.525, 50.450), (30.515, 50.466), (30.495, 50.458),
+]
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(upload_dir):
+    return upload_dir
+
+
+def _inside(lon, lat, ring):
+    """Reference even-odd point-in-polygon test"""
+    inside = False
+    for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1]):
+        if (y0 <= lat) != (y1 <= lat) and lon < x0 + (lat - y0) * (x1 - x0) / (y1 - y0):
+            inside = not inside
+    return inside
+
+
+def test_merge_spans_joins_overlapping_intervals():
+    """Test that overlapping and nested intervals collapse into disjoint spans"""
+    starts, ends = merge_spans(np.array([5.0, 0.0, 1.0, 8.0, 2.0]), np.array([6.0, 2.0, 1.5, 9.0, 3.0]))
+    assert starts.tolist() == [0.0, 5.0, 8.0]
+    assert ends.tolist() == [3.0, 6.0, 9.0]
+
+
+def test_contains_matches_reference_test():
+    """Test the vectorized point-in-polygon test against a plain ray casting"""
+    area = AreaPolygon([AREA])
+    lons = np.linspace(30.49, 30.55, 97)
+    for lat in np.linspace(50.435, 50.47, 23):
+        expected = [_inside(lon, lat, AREA) for lon in lons]
+        assert area.contains(lons, lat).tolist() == expected
+
+
+def test_square_cells_are_clipped_to_the_area():
+    """Test that only cells intersecting the area are kept"""
+    area = AreaPolygon([AREA])
+    center_lat, center_lon, cols, rows = area_layout(area, 100, "square")
+    full = build_cells(center_lat, center_lon, cols, rows, 100)
+    clipped = build_cells(center_lat, center_lon, cols, rows, 100, area=area)
+    assert 0 < len(clipped) < len(full)
+
+    kept = set(zip(clipped.row_index.tolist(), clipped.col_index.tolist()))
+    samples = np.linspace(0.0, 1.0, 9)
+    hits = set()
+    for index in range(len(full)):
+        lat_min, lat_max = full.ring_lats[index].min(), full.ring_lats[index].max()
+        lon_min, lon_max = full.ring_lons[index].min(), full.ring_lons[index].max()
+        if any(
+            _inside(lon_min + u * (lon_max - lon_min), lat_min + v * (lat_max - lat_min), AREA)
+            for u in samples for v in samples
+        ):
+            hits.add((int(full.row_index[index]), int(full.col_index[index])))
+
+    assert hits <= kept
+    # Cells missed by the sampling are only touched by the boundary
+    for row, col in kept - hits:
+        assert any((row + dr, col + dc) in hits for dr in (-1, 0, 1) for dc in (-1, 0, 1))
+
+
+def test_area_layout_covers_the_area():
+    """Test that every vertex of the area lies in a kept cell"""
+    area = AreaPolygon([AREA])
+    for shape in ("square", "hex"):
+        cells = build_cells(*area_layout(area, 150, shape), 150, shape, area)
+        for lon, lat in AREA:
+            assert np.any(
+                (cells.ring_lons.min(axis=1) <= lon) & (lon <= cells.ring_lons.max(axis=1))
+                & (cells.ring_lats.min(axis=1) <= lat) & (lat <= cells.ring_lats.max(axis=1))
+            )
+
+
+def test_area_layout_rejects_huge_grids():
+    """Test that tiny cells over a large area are refused"""
+    area = AreaPolygon([[(30.0, 50.0), (31.0, 50.0), (31.0, 51.0)]])
+    with pytest.raises(ValueError):
+        area_layout(area, 10, "square")
+    cols, rows = area_layout(area, 500, "square")[2:]
+    assert cols * rows <= MAX_AREA_GRID_CELLS
+
+
+def test_holes_are_excluded():
+    """Test that an inner ring removes the cells inside it"""
+    outer = [(30.40, 50.40), (30.60, 50.40), (30.60, 50.52), (30.40, 50.52)]
+    hole = [(30.45, 50.43), (30.55, 50.43), (30.55, 50.49), (30.45, 50.49)]
+    with_hole = AreaPolygon([outer, hole])
+    layout = area_layout(with_hole, 500, "square")
+
+    solid = build_cells(*layout, 500, area=AreaPolygon([outer]))
+    holed = build_cells(*layout, 500, area=with_hole)
+    assert len(holed) < len(solid)
+    # No remaining cell lies entirely inside the hole
+    assert not np.any(
+        (holed.ring_lons.min(axis=1) > 30.45) & (holed.ring_lons.max(axis=1) < 30.55)
+        & (holed.ring_lats.min(axis=1) > 50.43) & (holed.ring_lats.max(axis=1) < 50.49)
+    )
+
+
+def test_hex_neighbours_are_one_cell_size_apart():
+    """Test hexagon spacing and outline size"""
+    cells = hex_cells(50.45, 30.52, 6, 5, 200)
+    meters_per_lon = 111320.0 * math.cos(math.radians(50.45))
+
+    def distance(a, b):
+        return math.hypot(
+            (cells.center_lats[a] - cells.center_lats[b]) * 111320.0,
+            (cells.center_lons[a] - cells.center_lons[b]) * meters_per_lon,
+        )
+
+    # Same row, and diagonally to the (shifted) next row
+    assert distance(0, 1) == pytest.approx(200, rel=1e-6)
+    assert distance(0, 6) == pytest.approx(200, rel=1e-6)
+    assert distance(7, 13) == pytest.approx(200, rel=1e-6)
+    assert cells.ring_lats.shape == (30, 6)
+    assert cells.names[:2] == ["A1", "B1"] and cells.names[6] == "A2"
+
+
+def test_area_files_are_parsed(tmp_path):
+    """Test reading areas from GeoJSON, KML and GPX"""
+    coordinates = [[lon, lat] for lon, lat in AREA] + [list(AREA[0])]
+    geojson = {"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": {}, "geometry": {"type": "Polygon", "coordinates": [coordinates]}},
+        {"type": "Feature", "properties": {}, "geometry": {"type": "Point", "coordinates": [30.5, 50.4]}},
+    ]}
+    kml = (
+        '<kml xmlns="http://www.opengis.net/kml/2.2"><Placemark><Polygon><outerBoundaryIs><LinearRing>'
+        f'<coordinates>{" ".join(f"{lon},{lat},0" for lon, lat in coordinates)}</coordinates>'
+        "</LinearRing></outerBoundaryIs></Polygon></Placemark></kml>"
+    )
+    gpx = (
+        '<gpx xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>'
+        + "".join(f'<trkpt lat="{lat}" lon="{lon}"/>' for lon, lat in AREA)
+        + "</trkseg></trk></gpx>"
+    )
+    for name, content in (("area.geojson", json.dumps(geojson)), ("area.kml", kml), ("area.gpx", gpx)):
+        path = tmp_path / name
+        path.write_text(content)
+        area, sha256 = load_area(path)
+        assert len(area.rings) == 1
+        assert area.bounds == pytest.approx((50.438, 30.495, 50.466, 30.548))
+        assert len(sha256) == 64
+
+    with pytest.raises(AreaFileError):
+        parse_area(b"<kml><Point><coordinates>30.5,50.4</coordinates></Point></kml>", ".kml")
+    with pytest.raises(AreaFileError):
+        parse_area(b"not json", ".geojson")
+
+
+def test_clipped_grid_exports(upload_dir):
+    """Test that all formats of a clipped hexagonal grid contain the same cells"""
+    area = AreaPolygon([AREA])
+    params = GridParams.for_area(area, "a" * 64, 150, "hex")
+    assert params.key != GridParams.for_area(area, "b" * 64, 150, "hex").key
+    assert params.key != GridParams.for_area(area, "a" * 64, 150, "square").key
+    cells = params.cells()
+    assert len(cells) < params.cols * params.rows
+
+    features = json.loads(export_grid(params, "geojson").read_text())["features"]
+    assert len(features) == len(cells)
+    assert len(features[0]["geometry"]["coordinates"][0]) == 7
+
+    gpx = ET.parse(export_grid(params, "gpx")).getroot()
+    ns = {"gpx": "http://www.topografix.com/GPX/1/1"}
+    assert [w.find("gpx:name", ns).text for w in gpx.findall("gpx:wpt", ns)] == cells.names
+    assert len(gpx.findall("gpx:trk/gpx:trkseg", ns)) == len(cells)
+
+    kml = ET.parse(export_grid(params, "kml")).getroot()
+    ns = {"kml": "http://www.opengis.net/kml/2.2"}
+    assert len(kml.findall("kml:Document/kml:Folder/kml:Placemark", ns)) == len(cells)
@@ -0,0 +1,150 @@
+from concurrent.futures import Future
+
+import numpy as np
+import pytest
+
+from app.services import grid_coverage
+from app.services.grid_coverage import _densify, _hex_lattice, cell_coverage, cell_status, schedule_coverage
+from app.services.grid_export import GridParams
+from app.services.tracks import TrackFileError, Track, parse_tracks
+
+METERS_PER_DEGREE = 111320.0
+
+
+def _row_track(cells, row):
+    """Densely sampled east-west track along the centers of a row"""
+    lat = float(cells.center_lats[cells.row_index == row][0])
+    return Track(lons=np.linspace(30.50, 30.54, 200), lats=np.full(200, lat))
+
+
+@pytest.mark.parametrize("sweep_width", [10, 25, 50])
+def test_straight_track_covers_sweep_over_cell_size(sweep_width):
+    """Test that a track through a row covers sweep width / cell size of its cells"""
+    params = GridParams(50.45, 30.52, 20, 20, 50)
+    cells = params.cells()
+    fractions = cell_coverage(params, [_row_track(cells, 10)], sweep_width)
+
+    assert fractions[cells.row_index == 10] == pytest.approx(sweep_width / 50, abs=0.02)
+    assert not fractions[(cells.row_index < 9) | (cells.row_index > 11)].any()
+
+
+def test_tracks_outside_the_grid_cover_nothing():
+    """Test empty and remote tracks"""
+    params = GridParams(50.45, 30.52, 10, 10, 50)
+    remote = Track(lons=np.linspace(31.0, 31.01, 50), lats=np.full(50, 50.45))
+    assert not cell_coverage(params, [], 20).any()
+    assert not cell_coverage(params, [remote], 20).any()
+
+
+def test_hex_lattice_maps_points_to_their_cell():
+    """Test that hexagon centers and points near their corners map to the cell"""
+    params = GridParams(50.45, 30.52, 7, 6, 100, shape="hex")
+    cells = params.cells()
+    meters_per_lon = METERS_PER_DEGREE * np.cos(np.radians(params.center_lat))
+
+    def to_plane(lons, lats):
+        return (lons - params.center_lon) * meters_per_lon, (lats - params.center_lat) * METERS_PER_DEGREE
+
+    cx, cy = to_plane(cells.center_lons, cells.center_lats)
+    rows, cols = _hex_lattice(params, cx, cy)
+    assert rows.tolist() == cells.row_index.tolist()
+    assert cols.tolist() == cells.col_index.tolist()
+
+    # Corners pulled 5% towards the center
+    rx, ry = to_plane(cells.ring_lons, cells.ring_lats)
+    rows, cols = _hex_lattice(params, cx[:, None] + 0.95 * (rx - cx[:, None]), cy[:, None] + 0.95 * (ry - cy[:, None]))
+    assert (rows == cells.row_index[:, None]).all()
+    assert (cols == cells.col_index[:, None]).all()
+
+
+def test_hex_cells_are_covered():
+    """Test coverage of a hexagonal grid by a wide sweep"""
+    params = GridParams(50.45, 30.52, 8, 8, 50, shape="hex")
+    cells = params.cells()
+    fractions = cell_coverage(params, [_row_track(cells, 4)], 200)
+    assert fractions[cells.row_index == 4] == pytest.approx(1.0)
+    assert not fractions[cells.row_index == 0].any()
+
+
+def test_densify_skips_gaps():
+    """Test that long gaps (GPS dropouts) are not walked"""
+    xs, ys = _densify(np.array([0.0, 10.0, 1000.0]), np.array([0.0, 0.0, 0.0]), 1.0)
+    assert np.isclose(xs, 5.0).any()
+    assert not ((xs > 10.0) & (xs < 1000.0)).any()
+
+
+def test_track_files_are_parsed():
+    """Test reading tracks and point times from GPX and KML"""
+    gpx = (
+        '<gpx xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>'
+        '<trkpt lat="50.45" lon="30.52"><time>2024-05-01T10:00:00Z</time></trkpt>'
+        '<trkpt lat="50.46" lon="30.53"><time>2024-05-01T10:05:00Z</time></trkpt>'
+        '</trkseg></trk><rte><rtept lat="50.4" lon="30.5"/></rte></gpx>'
+    ).encode()
+    tracks = parse_tracks(gpx, ".gpx")
+    assert len(tracks) == 2
+    assert tracks[0].lats.tolist() == [50.45, 50.46]
+    assert tracks[0].times[1] - tracks[0].times[0] == 300
+    assert tracks[1].times is None
+
+    kml = (
+        '<kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2"><Document>'
+        "<Placemark><LineString><coordinates>30.52,50.45,0 30.53,50.46,0</coordinates></LineString></Placemark>"
+        "<Placemark><gx:Track><when>2024-05-01T10:00:00Z</when><when>2024-05-01T10:01:00Z</when>"
+        "<gx:coord>30.52 50.45 120</gx:coord><gx:coord>30.521 50.451 121</gx:coord></gx:Track></Placemark>"
+        "</Document></kml>"
+    ).encode()
+    tracks = parse_tracks(kml, ".kml")
+    assert [len(track) for track in tracks] == [2, 2]
+    assert tracks[0].lons.tolist() == [30.52, 30.53]
+    assert tracks[1].times[1] - tracks[1].times[0] == 60
+
+    with pytest.raises(TrackFileError):
+        parse_tracks(b"<gpx", ".gpx")
+    with pytest.raises(TrackFileError):
+        parse_tracks(b"{}", ".geojson")
+
+
+def test_cell_status_is_never_lowered():
+    """Test status transitions caused by coverage"""
+    assert cell_status("unassigned", 0) == "unassigned"
+    assert cell_status("assigned", 10) == "in_progress"
+    assert cell_status("assigned", 95) == "completed"
+    assert cell_status("completed", 10) == "completed"
+    assert cell_status("skipped", 10) == "skipped"
+
+
+class _ManualPool:
+    """Pool whose jobs finish when the test says so"""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.jobs.append((future, args))
+        return future
+
+
+def test_schedule_coalesces_jobs_while_running(monkeypatch):
+    """Test that uploads during a running job lead to exactly one follow-up job"""
+    pool = _ManualPool()
+    recorded = []
+    monkeypatch.setattr(grid_coverage, "get_pool", lambda: pool)
+    monkeypatch.setattr(grid_coverage, "record_coverage", lambda field_search_id, result: recorded.append(result))
+    params = GridParams(50.45, 30.52, 4, 4, 50)
+
+    schedule_coverage(7, params, ["/uploads/a.gpx"])
+    schedule_coverage(7, params, ["/uploads/a.gpx", "/uploads/b.gpx"])
+    schedule_coverage(7, params, ["/uploads/a.gpx", "/uploads/b.gpx", "/uploads/c.kml", "/uploads/photo.jpg"])
+    assert len(pool.jobs) == 1
+    assert grid_coverage.is_pending(7)
+
+    pool.jobs[0][0].set_result({"percent": 1.0})
+    assert recorded == [{"percent": 1.0}]
+    assert len(pool.jobs) == 2
+    assert pool.jobs[1][1][1] == ["a.gpx", "b.gpx", "c.kml"]
+
+    pool.jobs[1][0].set_result({"percent": 2.0})
+    assert len(pool.jobs) == 2
+    assert not grid_coverage.is_pending(7)
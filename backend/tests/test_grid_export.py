@@ -0,0 +1,194 @@
+import json
+import math
+import os
+import time
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from app.services import grid_export
+from app.services.grid_export import GridParams, export_grid, grid_tile, prune_grid_cache, render_tile, tile_json
+from app.services.vector_tiles import lonlat_to_tile
+
+PARAMS = GridParams(center_lat=50.45, center_lon=30.52, cols=12, rows=9, cell_size=100)
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(upload_dir):
+    return upload_dir
+
+
+def _read_varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return result, pos
+
+
+def _fields(data):
+    """(field number, value) pairs of a protobuf message (varint and length-delimited only)"""
+    pos = 0
+    while pos < len(data):
+        key, pos = _read_varint(data, pos)
+        if key & 7 == 0:
+            value, pos = _read_varint(data, pos)
+        else:
+            length, pos = _read_varint(data, pos)
+            value, pos = data[pos:pos + length], pos + length
+        yield key >> 3, value
+
+
+def _feature_counts(tile):
+    """Number of features per layer name"""
+    counts = {}
+    for number, layer in _fields(tile):
+        assert number == 3
+        fields = list(_fields(layer))
+        name = next(value for n, value in fields if n == 1).decode()
+        counts[name] = sum(1 for n, _ in fields if n == 2)
+    return counts
+
+
+def test_params_hash_changes_with_every_parameter():
+    """Test that the cache key identifies the parameter set"""
+    assert PARAMS.key == GridParams(50.45, 30.52, 12, 9, 100).key
+    assert PARAMS.key != GridParams(50.45, 30.52, 12, 9, 101).key
+    assert PARAMS.key != GridParams(50.45, 30.52, 9, 12, 100).key
+
+
+def test_exports_are_cached_by_parameter_hash(upload_dir):
+    """Test that each format is rendered once and stored under the hash"""
+    path = export_grid(PARAMS, "kml")
+    assert path == upload_dir / ".grid-cache" / PARAMS.key / "grid.kml"
+
+    old = time.time() - 3600
+    os.utime(path, (old, old))
+    assert export_grid(PARAMS, "kml") == path
+    assert path.stat().st_mtime == pytest.approx(old)
+
+
+def test_kml_and_geojson_describe_the_same_cells():
+    """Test cell names and positions across formats"""
+    kml = ET.parse(export_grid(PARAMS, "kml")).getroot()
+    ns = {"kml": "http://www.opengis.net/kml/2.2"}
+    placemarks = kml.findall("kml:Document/kml:Folder/kml:Placemark", ns)
+    assert len(placemarks) == 12 * 9
+    assert placemarks[13].find("kml:name", ns).text == "B2"
+
+    geojson = json.loads(export_grid(PARAMS, "geojson").read_text())
+    features = geojson["features"]
+    assert len(features) == 12 * 9
+    cell = features[13]
+    assert cell["properties"] == {"name": "B2", "row": 1, "col": 1}
+
+    # The KML point of a cell lies inside its GeoJSON polygon
+    lon, lat = map(float, placemarks[13].find("kml:Point/kml:coordinates", ns).text.split(","))
+    ring = cell["geometry"]["coordinates"][0]
+    assert min(p[0] for p in ring) < lon < max(p[0] for p in ring)
+    assert min(p[1] for p in ring) < lat < max(p[1] for p in ring)
+    assert ring[0] == ring[-1]
+
+
+def test_tiles_cover_every_cell_once():
+    """Test that all tiles of a zoom level together label each cell exactly once"""
+    cells = PARAMS.cells()
+    min_zoom, _ = PARAMS.zoom_range
+    zoom = min_zoom + 2
+    min_lat, min_lon, max_lat, max_lon = cells.bounds
+    x0, y0 = (int(v) for v in lonlat_to_tile(min_lon, max_lat, zoom))
+    x1, y1 = (int(v) for v in lonlat_to_tile(max_lon, min_lat, zoom))
+
+    labels = polygons = 0
+    for x in range(x0, x1 + 1):
+        for y in range(y0, y1 + 1):
+            counts = _feature_counts(render_tile(cells, zoom, x, y))
+            labels += counts.get("labels", 0)
+            polygons += counts.get("cells", 0)
+
+    assert labels == 12 * 9
+    # Cells crossing tile borders appear in each tile they touch
+    assert polygons >= 12 * 9
+
+
+def test_tile_outside_the_grid_is_not_cached(upload_dir):
+    """Test that tiles without cells are not rendered into the cache"""
+    zoom = PARAMS.zoom_range[0]
+    x, y = (int(v) for v in lonlat_to_tile(10.0, 40.0, zoom))
+
+    assert grid_tile(PARAMS, zoom, x, y) is None
+    assert not (upload_dir / ".grid-cache" / PARAMS.key / "tiles").exists()
+
+    x, y = (int(v) for v in lonlat_to_tile(PARAMS.center_lon, PARAMS.center_lat, zoom))
+    path = grid_tile(PARAMS, zoom, x, y)
+    assert path == upload_dir / ".grid-cache" / PARAMS.key / "tiles" / str(zoom) / str(x) / f"{y}.pbf"
+    assert path.stat().st_size > 0
+
+
+def test_tilejson_zoom_range_depends_on_cell_size():
+    """Test that smaller cells get tiles from a higher zoom level on"""
+    small = tile_json(GridParams(50.45, 30.52, 10, 10, 25), "/tiles/{z}/{x}/{y}.pbf")
+    large = tile_json(GridParams(50.45, 30.52, 10, 10, 400), "/tiles/{z}/{x}/{y}.pbf")
+
+    assert small["minzoom"] == large["minzoom"] + 4
+    # At the min zoom a cell is at least MIN_CELL_PIXELS wide
+    meters_per_pixel = 156543.03392 * math.cos(math.radians(50.45)) / 2 ** small["minzoom"]
+    assert 25 / meters_per_pixel >= grid_export.MIN_CELL_PIXELS
+
+
+def test_unused_cache_entries_are_pruned():
+    """Test that entries not used for the retention period are removed"""
+    entry = export_grid(PARAMS, "gpx").parent
+    assert prune_grid_cache(max_age_days=1) == 0
+
+    old = time.time() - 2 * 86400
+    os.utime(entry, (old, old))
+    assert prune_grid_cache(max_age_days=1, dry_run=True) == 1
+    assert entry.exists()
+    assert prune_grid_cache(max_age_days=1) == 1
+    assert not entry.exists()
+
+
+def _field_search_with_grid(client, auth_headers, **grid):
+    case = client.post(
+        "/cases/",
+        json={
+            "applicant_last_name": "Петров", "applicant_first_name": "Иван",
+            "missing_last_name": "Петрова", "missing_first_name": "Мария", "tags": []
+        },
+        headers=auth_headers,
+    ).json()
+    search = client.post("/searches/", json={"case_id": case["id"], "status": "planned"}, headers=auth_headers).json()
+    field_search_id = client.post("/field_searches/", json={"search_id": search["id"]}, headers=auth_headers).json()["id"]
+    response = client.put(f"/field_searches/{field_search_id}", json={
+        "grid_center_lat": 50.45, "grid_center_lon": 30.52, "grid_cell_size": 100, **grid
+    }, headers=auth_headers)
+    assert response.status_code == 200
+    return field_search_id
+
+
+def test_oversized_field_search_grid_is_rejected(client, auth_headers):
+    """Test that exports and tiles of a grid beyond the cell limit answer 400 instead of building it"""
+    field_search_id = _field_search_with_grid(client, auth_headers, grid_cols=100_000, grid_rows=100_000)
+
+    for path in ("grid/export?format=geojson", "grid/tiles.json", "grid/tiles/14/9573/5529.pbf"):
+        response = client.get(f"/field_searches/{field_search_id}/{path}", headers=auth_headers)
+        assert response.status_code == 400, path
+        assert "too large" in response.json()["error"]["message"]
+
+
+def test_generated_grid_file_is_in_the_upload_dir(client, auth_headers, upload_dir):
+    """Test that the generated GPX grid is stored in and downloaded from the configured upload directory"""
+    field_search_id = _field_search_with_grid(client, auth_headers, grid_cols=3, grid_rows=2)
+
+    response = client.post(f"/field_searches/{field_search_id}/generate-grid", headers=auth_headers)
+    assert response.status_code == 200
+    filename = response.json()["filename"]
+    assert (upload_dir / filename).is_file()
+
+    response = client.get(f"/field_searches/{field_search_id}/download-grid", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.content == (upload_dir / filename).read_bytes()
@@ -0,0 +1,49 @@
+import pytest
+
+from app.services.grid_state import (
+    MAX_STATE_CELLS, CellCodeError, apply_change, cell_code, cell_index, empty_states, parse_cell_code,
+    status_counts
+)
+
+
+def test_parse_cell_code():
+    """Test that codes map back to the labels of gpx_service.column_label"""
+    assert parse_cell_code("A1") == (0, 0)
+    assert parse_cell_code("z3") == (2, 25)
+    assert parse_cell_code(" AA10 ") == (9, 26)
+    for code in ("", "A", "1", "A0", "A-1", "1A"):
+        with pytest.raises(CellCodeError):
+            parse_cell_code(code)
+
+
+def test_cell_index_round_trip():
+    """Test indexes inside the grid and rejection outside it"""
+    cols, rows = 30, 7
+    assert [cell_code(cell_index(cell_code(i, cols), cols, rows), cols) for i in range(cols * rows)] \
+        == [cell_code(i, cols) for i in range(cols * rows)]
+    assert cell_index("B2", cols, rows) == cols + 1
+    with pytest.raises(CellCodeError):
+        cell_index("AE1", cols, rows)
+    with pytest.raises(CellCodeError):
+        cell_index("A8", cols, rows)
+
+
+def test_empty_states_limit():
+    """Test that oversized grids are refused"""
+    assert empty_states(3, 2) == bytes(6)
+    with pytest.raises(ValueError):
+        empty_states(MAX_STATE_CELLS, 2)
+
+
+def test_apply_change():
+    """Test status bytes, sparse assignments and notes"""
+    states, assignments, notes = bytearray(empty_states(4, 4)), {}, {}
+    apply_change(states, assignments, notes, "B1", 1, {"status": "assigned", "assigned_to_field_search_id": 7})
+    apply_change(states, assignments, notes, "C1", 2, {"status": "completed", "notes": "Checked"})
+    assert status_counts(states) == {"unassigned": 14, "assigned": 1, "in_progress": 0, "completed": 1}
+    assert assignments == {"B1": 7} and notes == {"C1": "Checked"}
+
+    # Missing keys are left alone, None and empty notes clear
+    apply_change(states, assignments, notes, "B1", 1, {"assigned_to_field_search_id": None})
+    apply_change(states, assignments, notes, "C1", 2, {"notes": ""})
+    assert states[1] == 1 and assignments == {} and notes == {}
@@ -0,0 +1,51 @@
+import asyncio
+
+from PIL import Image
+
+from app.services import image_variants
+from app.services.image_variants import ensure_variant, render_variants, variant_url
+
+
+def test_variant_url_for_images_only():
+    """Test that variant URLs are derived for images and skipped for other media"""
+    assert variant_url("/uploads/abc_photo.jpg") == "/uploads/variants/thumb/abc_photo.jpg.webp"
+    assert variant_url("/uploads/abc_photo.JPG", "medium") == "/uploads/variants/medium/abc_photo.JPG.webp"
+    assert variant_url("/uploads/abc_video.mp4") is None
+    assert variant_url("https://example.com/photo.jpg") is None
+    assert variant_url(None) is None
+
+
+def test_render_variants_resizes_to_webp(upload_dir):
+    """Test that thumb and medium variants keep aspect ratio and are WebP"""
+    Image.new("RGB", (3000, 1500), "red").save(upload_dir / "big.jpg")
+
+    rendered = render_variants(
+        str(upload_dir / "big.jpg"), "big.jpg", ["thumb", "medium"], str(upload_dir / "variants")
+    )
+
+    with Image.open(rendered["thumb"]) as thumb:
+        assert thumb.format == "WEBP"
+        assert thumb.size == (200, 100)
+    with Image.open(rendered["medium"]) as medium:
+        assert medium.size == (1024, 512)
+
+
+def test_ensure_variant_renders_in_pool(upload_dir):
+    """Test that a missing variant of an existing upload is rendered lazily"""
+    Image.new("RGB", (800, 600), "blue").save(upload_dir / "old.png")
+
+    try:
+        path = asyncio.run(ensure_variant("old.png", "thumb"))
+    finally:
+        image_variants.shutdown_pool()
+
+    assert path == upload_dir / "variants" / "thumb" / "old.png.webp"
+    assert path.exists()
+
+
+def test_ensure_variant_missing_original(upload_dir):
+    """Test that a variant of a missing or non-image file is not rendered"""
+    (upload_dir / "clip.mp4").write_bytes(b"not an image")
+
+    assert asyncio.run(ensure_variant("missing.jpg", "thumb")) is None
+    assert asyncio.run(ensure_variant("clip.mp4", "thumb")) is None
@@ -0,0 +1,205 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.services import live_positions, live_updates
+from app.services.live_positions import (
+    TRAIL_POINTS, Position, add_positions, flush, is_allowed, last_positions, trail
+)
+
+# The buffers fixture replaces it
+_write_positions = live_positions.write_positions
+
+
+@pytest.fixture(autouse=True)
+def buffers(monkeypatch):
+    """Fresh in-memory state, writes and live messages recorded"""
+    monkeypatch.setattr(live_positions, "_participants", {})
+    monkeypatch.setattr(live_positions, "_allowed", {})
+    written, published = [], []
+    monkeypatch.setattr(live_positions, "write_positions", lambda rows: written.append(rows))
+    monkeypatch.setattr(live_updates, "publish", lambda *args: published.append(args))
+    return written, published
+
+
+def _walk(start, count, user_offset=0.0):
+    return [Position(float(t), 50.45 + t * 1e-5, 30.52 + user_offset) for t in range(start, start + count)]
+
+
+def test_last_positions_and_resends():
+    """Test newest positions per participant with out-of-order and resent batches"""
+    assert add_positions(1, 10, _walk(100, 5)) == 5
+    assert add_positions(1, 10, _walk(100, 5)) == 0
+    # A late batch is stored but does not move the participant back
+    assert add_positions(1, 10, [Position(50.0, 50.0, 30.0)]) == 1
+    add_positions(1, 11, _walk(200, 3, 0.01))
+    add_positions(2, 10, _walk(300, 1))
+
+    positions = last_positions(1)
+    assert set(positions) == {10, 11}
+    assert positions[10].recorded_at == 104.0
+    assert positions[11].recorded_at == 202.0
+    assert [point.recorded_at for point in trail(1, 10, since=102.0)] == [103.0, 104.0]
+
+
+def test_late_resends_are_skipped(buffers):
+    """Test that a late point resent before the flush is buffered once"""
+    written, _ = buffers
+    add_positions(1, 10, _walk(100, 5))
+    assert add_positions(1, 10, [Position(50.0, 50.0, 30.0)]) == 1
+    assert add_positions(1, 10, [Position(50.0, 50.0, 30.0)]) == 0
+    flush()
+    assert len(written[0]) == 6
+
+
+def test_trail_is_a_ring_buffer():
+    """Test that only the newest TRAIL_POINTS points stay in memory"""
+    add_positions(1, 10, _walk(0, TRAIL_POINTS + 100))
+    points = trail(1, 10)
+    assert len(points) == TRAIL_POINTS
+    assert points[0].recorded_at == 100.0
+
+
+def test_flush_writes_one_batch(buffers):
+    """Test that all pending points go out in one write and moved participants are published"""
+    written, published = buffers
+    add_positions(1, 10, _walk(0, 30))
+    add_positions(1, 11, _walk(0, 30, 0.01))
+    add_positions(2, 12, _walk(0, 5))
+
+    assert flush() == 65
+    assert len(written) == 1 and len(written[0]) == 65
+    assert {row["user_id"] for row in written[0]} == {10, 11, 12}
+    assert sorted((args[0], len(args[2]["positions"])) for args in published) == [(1, 2), (2, 1)]
+
+    # Nothing new: no write, no message
+    assert flush() == 0
+    assert len(written) == 1 and len(published) == 2
+
+
+def test_failed_write_keeps_points(monkeypatch):
+    """Test that points survive a database outage but not a permanent error"""
+    add_positions(1, 10, _walk(0, 10))
+
+    def unavailable(rows):
+        raise OperationalError("INSERT", {}, Exception("connection refused"))
+    monkeypatch.setattr(live_positions, "write_positions", unavailable)
+    assert flush() == 0
+
+    # Field search deleted: nothing can be stored, the buffers go too
+    monkeypatch.setattr(live_positions, "write_positions", lambda rows: rows)
+    assert flush() == 0
+    assert last_positions(1) == {}
+
+    written = []
+    monkeypatch.setattr(live_positions, "write_positions", lambda rows: written.append(rows))
+    assert flush() == 0 and written == []
+
+
+def test_outage_then_recovery(monkeypatch):
+    """Test that points kept during an outage are written afterwards"""
+    add_positions(1, 10, _walk(0, 10))
+    monkeypatch.setattr(
+        live_positions, "write_positions",
+        lambda rows: (_ for _ in ()).throw(OperationalError("INSERT", {}, Exception("down")))
+    )
+    flush()
+    add_positions(1, 10, _walk(10, 5))
+
+    written = []
+    monkeypatch.setattr(live_positions, "write_positions", lambda rows: written.append(rows))
+    assert flush() == 15
+    assert [row["recorded_at"] for row in written[0]] == [float(t) for t in range(15)]
+
+
+def test_allowed_users_are_cached():
+    """Test that the participant list is loaded once per TTL"""
+    loads = []
+
+    def load():
+        loads.append(1)
+        return {10, 11}
+
+    assert is_allowed(1, 10, load)
+    assert not is_allowed(1, 99, load)
+    assert len(loads) == 1
+    live_positions.participants_changed(1)
+    assert is_allowed(1, 11, load)
+    assert len(loads) == 2
+
+
+def _field_search(client, auth_headers):
+    case = client.post(
+        "/cases/",
+        json={
+            "applicant_last_name": "Петров", "applicant_first_name": "Иван",
+            "missing_last_name": "Петрова", "missing_first_name": "Мария", "tags": []
+        },
+        headers=auth_headers,
+    ).json()
+    search = client.post("/searches/", json={"case_id": case["id"], "status": "planned"}, headers=auth_headers).json()
+    return client.post("/field_searches/", json={"search_id": search["id"]}, headers=auth_headers).json()["id"]
+
+
+def test_write_skips_resends_and_deleted_field_searches(client, auth_headers, test_user, db_session, monkeypatch):
+    """Test that stored resends are skipped and only the rows of a deleted field search are dropped"""
+    from sqlalchemy import func, select
+
+    from app.models.participant_position import ParticipantPosition
+    from tests.conftest import TestingSessionLocal
+
+    monkeypatch.setattr("app.db.SessionLocal", TestingSessionLocal)
+    field_search_id = _field_search(client, auth_headers)
+    rows = [
+        {"field_search_id": search_id, "user_id": test_user.id, **point._asdict()}
+        for search_id in (field_search_id, 999999) for point in _walk(0, 3)
+    ]
+
+    dropped = _write_positions(rows)
+    assert [row["field_search_id"] for row in dropped] == [999999] * 3
+    # Resent to another worker: already stored
+    assert _write_positions(rows[:3] + rows[1:2]) == []
+
+    count = db_session.scalar(select(func.count()).select_from(ParticipantPosition))
+    assert count == 3
+
+
+def test_shared_workers_read_stored_positions(client, auth_headers, test_user, db_session, monkeypatch):
+    """Test that with several workers positions posted to another worker are served from the table"""
+    from datetime import datetime, timezone
+
+    from sqlalchemy import insert
+
+    from app.models.participant_position import ParticipantPosition
+    from app.services import shared_state
+
+    field_search_id = _field_search(client, auth_headers)
+
+    # Written by another worker
+    start = int(datetime.now(timezone.utc).timestamp()) - 60
+
+    def walk(offset, count):
+        return [point._replace(recorded_at=start + point.recorded_at) for point in _walk(offset, count)]
+    db_session.execute(insert(ParticipantPosition), [
+        {
+            "field_search_id": field_search_id, "user_id": test_user.id,
+            "recorded_at": datetime.fromtimestamp(point.recorded_at, timezone.utc), "lat": point.lat, "lon": point.lon
+        }
+        for point in walk(0, 5)
+    ])
+    db_session.commit()
+    url = f"/field_searches/{field_search_id}/positions"
+
+    assert client.get(url, headers=auth_headers).json() == []
+    monkeypatch.setattr(shared_state, "is_shared", lambda: True)
+    positions = client.get(url, headers=auth_headers).json()
+    assert [position["user_id"] for position in positions] == [test_user.id]
+    assert datetime.fromisoformat(positions[0]["recorded_at"]).timestamp() == start + 4
+
+    # Not flushed yet on this worker: newer than the stored ones
+    add_positions(field_search_id, test_user.id, walk(5, 2))
+    positions = client.get(url, headers=auth_headers).json()
+    assert datetime.fromisoformat(positions[0]["recorded_at"]).timestamp() == start + 6
+    points = client.get(f"{url}/{test_user.id}/trail", headers=auth_headers).json()
+    assert [datetime.fromisoformat(point["recorded_at"]).timestamp() for point in points] == [
+        float(t) for t in range(start, start + 7)
+    ]
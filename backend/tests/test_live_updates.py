@@ -0,0 +1,61 @@
+import asyncio
+import json
+import threading
+from datetime import datetime, timezone
+
+from app.services import live_updates
+from app.services.live_updates import MAX_QUEUED, publish, subscribe, subscriber_count, unsubscribe
+
+
+def test_publish_from_worker_thread():
+    """Test that a message published by a sync endpoint thread reaches the client"""
+    async def run():
+        subscription = subscribe(7)
+        other = subscribe(8)
+        try:
+            when = datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+            thread = threading.Thread(target=publish, args=(7, "event", {"action": "created", "at": when}))
+            thread.start()
+            message = json.loads(await subscription.next(1.0))
+            thread.join()
+            assert message == {
+                "type": "event", "field_search_id": 7, "action": "created", "at": "2026-10-19T12:00:00+00:00"
+            }
+            assert await other.next(0.05) is None
+        finally:
+            unsubscribe(subscription)
+            unsubscribe(other)
+
+    asyncio.run(run())
+    assert subscriber_count(7) == 0
+
+
+def test_slow_client_gets_resync():
+    """Test that a client that falls behind gets one resync message instead of the backlog"""
+    async def run():
+        subscription = subscribe(9)
+        try:
+            for i in range(MAX_QUEUED + 50):
+                publish(9, "cells", {"i": i})
+            # Deliveries are scheduled on the loop
+            await asyncio.sleep(0)
+            messages = []
+            while (message := await subscription.next(0.05)) is not None:
+                messages.append(json.loads(message))
+            assert [m["type"] for m in messages] == ["resync"]
+
+            publish(9, "cells", {"i": 0})
+            assert json.loads(await subscription.next(1.0))["type"] == "cells"
+        finally:
+            unsubscribe(subscription)
+
+    asyncio.run(run())
+
+
+def test_publish_without_subscribers(monkeypatch):
+    """Test that publishing never raises into the writer"""
+    publish(12345, "tracks", {"added": ["/uploads/a.gpx"]})
+
+    monkeypatch.setattr(live_updates, "LIVE_UPDATES_BACKEND", "postgres")
+    monkeypatch.setattr(live_updates, "_notify", lambda *args: 1 / 0)
+    publish(12345, "tracks", {"added": []})
@@ -0,0 +1,256 @@
+import pytest
+
+
+@pytest.fixture
+def map_grid_id(client, auth_headers):
+    """Map grid of a fresh case and search"""
+    case = client.post(
+        "/cases/",
+        json={
+            "applicant_last_name": "Петров", "applicant_first_name": "Иван",
+            "missing_last_name": "Петрова", "missing_first_name": "Мария", "tags": []
+        },
+        headers=auth_headers,
+    ).json()
+    search = client.post("/searches/", json={"case_id": case["id"], "status": "planned"}, headers=auth_headers).json()
+    response = client.post("/map_grids/", json={"search_id": search["id"]}, headers=auth_headers)
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def test_generate_cells_from_parameters(client, auth_headers, map_grid_id):
+    """Test creating all cells of a grid at once and skipping existing codes"""
+    params = {"center_lat": 50.45, "center_lon": 30.52, "cols": 20, "rows": 20, "cell_size": 100}
+    response = client.post(f"/map_grids/{map_grid_id}/cells/generate", json=params, headers=auth_headers)
+    assert response.status_code == 201
+    assert response.json() == {"created": 400, "skipped": 0}
+
+    response = client.post(f"/map_grids/{map_grid_id}/cells/generate", json=params, headers=auth_headers)
+    assert response.json() == {"created": 0, "skipped": 400}
+
+    response = client.post(
+        f"/map_grids/{map_grid_id}/cells/generate", json={**params, "cols": 2, "rows": 2, "replace": True},
+        headers=auth_headers
+    )
+    assert response.json() == {"created": 4, "skipped": 0}
+
+    cells = client.get(f"/map_grids/{map_grid_id}/cells", headers=auth_headers).json()
+    assert sorted(cell["cell_code"] for cell in cells) == ["A1", "A2", "B1", "B2"]
+    assert all(cell["status"] == "unassigned" for cell in cells)
+
+
+def test_generate_cells_needs_parameters(client, auth_headers, map_grid_id):
+    """Test that incomplete grid parameters are rejected"""
+    response = client.post(
+        f"/map_grids/{map_grid_id}/cells/generate", json={"center_lat": 50.45}, headers=auth_headers
+    )
+    assert response.status_code == 422
+
+
+def test_batch_create_and_update(client, auth_headers, map_grid_id):
+    """Test batched creation and status changes by id and by code"""
+    response = client.post(
+        f"/map_grids/{map_grid_id}/cells/batch",
+        json={"cells": [{"cell_code": f"A{i}"} for i in range(1, 6)]},
+        headers=auth_headers,
+    )
+    assert response.status_code == 201
+    created = response.json()
+    assert [cell["cell_code"] for cell in created] == ["A1", "A2", "A3", "A4", "A5"]
+
+    response = client.patch(
+        f"/map_grids/{map_grid_id}/cells",
+        json={"cells": [
+            {"id": created[0]["id"], "status": "completed", "notes": "Checked"},
+            {"cell_code": "A2", "status": "in_progress"},
+        ]},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    updated = {cell["cell_code"]: cell for cell in response.json()}
+    assert updated["A1"]["status"] == "completed" and updated["A1"]["notes"] == "Checked"
+    assert updated["A2"]["status"] == "in_progress"
+    assert set(updated) == {"A1", "A2"}
+
+
+def test_batch_update_is_all_or_nothing(client, auth_headers, map_grid_id):
+    """Test that one unknown cell or field search rejects the whole batch"""
+    client.post(f"/map_grids/{map_grid_id}/cells/batch", json={"cells": [{"cell_code": "A1"}]}, headers=auth_headers)
+
+    response = client.patch(
+        f"/map_grids/{map_grid_id}/cells",
+        json={"cells": [{"cell_code": "A1", "status": "completed"}, {"cell_code": "Z9", "status": "completed"}]},
+        headers=auth_headers,
+    )
+    assert response.status_code == 404
+    assert "Z9" in response.json()["error"]["message"]
+
+    response = client.patch(
+        f"/map_grids/{map_grid_id}/cells",
+        json={"cells": [{"cell_code": "A1", "assigned_to_field_search_id": 999999}]},
+        headers=auth_headers,
+    )
+    assert response.status_code == 404
+
+    cells = client.get(f"/map_grids/{map_grid_id}/cells", headers=auth_headers).json()
+    assert cells[0]["status"] == "unassigned"
+
+    response = client.patch(
+        f"/map_grids/{map_grid_id}/cells", json={"cells": [{"cell_code": "A1", "status": "lost"}]},
+        headers=auth_headers,
+    )
+    assert response.status_code == 422
+
+
+def test_compact_state(client, auth_headers, map_grid_id):
+    """Test importing cells into the compact state and changing it in batches"""
+    created = client.post(
+        f"/map_grids/{map_grid_id}/cells/batch",
+        json={"cells": [{"cell_code": "A1", "status": "completed"}, {"cell_code": "Z99"}]},
+        headers=auth_headers,
+    ).json()
+    assert client.get(f"/map_grids/{map_grid_id}/state", headers=auth_headers).status_code == 404
+
+    # The state mirrors all cells, so they must fit into it
+    response = client.put(f"/map_grids/{map_grid_id}/state", json={"cols": 10, "rows": 10}, headers=auth_headers)
+    assert response.status_code == 400 and "Z99" in response.json()["error"]["message"]
+    client.delete(f"/map_grids/{map_grid_id}/cells/{created[1]['id']}", headers=auth_headers)
+
+    response = client.put(f"/map_grids/{map_grid_id}/state", json={"cols": 10, "rows": 10}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["counts"] == {"unassigned": 99, "assigned": 0, "in_progress": 0, "completed": 1}
+
+    response = client.patch(
+        f"/map_grids/{map_grid_id}/state",
+        json={"cells": [{"cell_code": "B3", "status": "in_progress", "notes": "Swamp"}]},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    state = response.json()
+    assert state["counts"]["in_progress"] == 1 and state["notes"] == {"B3": "Swamp"}
+
+    response = client.get(f"/map_grids/{map_grid_id}/state?format=binary", headers=auth_headers)
+    assert response.headers["x-grid-cols"] == "10"
+    assert response.content[0] == 3 and response.content[21] == 2
+
+    response = client.patch(
+        f"/map_grids/{map_grid_id}/state",
+        json={"cells": [{"cell_code": "A1", "status": "unassigned"}, {"cell_code": "K1", "status": "completed"}]},
+        headers=auth_headers,
+    )
+    assert response.status_code == 400
+    assert client.get(f"/map_grids/{map_grid_id}/state", headers=auth_headers).json()["counts"]["completed"] == 1
+
+
+def test_changes_since_version(client, auth_headers, map_grid_id):
+    """Test that polling with since_version returns only what changed"""
+    created = client.post(
+        f"/map_grids/{map_grid_id}/cells/batch",
+        json={"cells": [{"cell_code": f"A{i}"} for i in range(1, 6)]},
+        headers=auth_headers,
+    ).json()
+
+    response = client.get(f"/map_grids/{map_grid_id}/changes", headers=auth_headers)
+    assert response.status_code == 200
+    full = response.json()
+    assert full["full"] is True and len(full["cells"]) == 5 and full["map_grid"]["id"] == map_grid_id
+    version = full["version"]
+
+    response = client.get(f"/map_grids/{map_grid_id}/changes?since_version={version}", headers=auth_headers)
+    assert response.json() == {
+        "version": version, "full": False, "map_grid": None, "cells": [], "deleted_cell_ids": []
+    }
+
+    client.patch(
+        f"/map_grids/{map_grid_id}/cells", json={"cells": [{"cell_code": "A2", "status": "completed"}]},
+        headers=auth_headers,
+    )
+    client.delete(f"/map_grids/{map_grid_id}/cells/{created[0]['id']}", headers=auth_headers)
+
+    delta = client.get(f"/map_grids/{map_grid_id}/changes?since_version={version}", headers=auth_headers).json()
+    assert delta["version"] == version + 2
+    assert [cell["cell_code"] for cell in delta["cells"]] == ["A2"]
+    assert delta["deleted_cell_ids"] == [created[0]["id"]]
+    assert delta["map_grid"] is None
+
+    client.put(f"/map_grids/{map_grid_id}", json={"notes": "Forest"}, headers=auth_headers)
+    delta = client.get(f"/map_grids/{map_grid_id}/changes?since_version={version + 2}", headers=auth_headers).json()
+    assert delta["map_grid"]["notes"] == "Forest" and delta["cells"] == []
+
+
+def test_expired_tombstones_force_a_full_sync(client, auth_headers, db_session, map_grid_id):
+    """Test that tombstones past the retention are pruned and clients behind them sync everything"""
+    from datetime import timedelta
+
+    from sqlalchemy import func, update
+
+    from app.models.sync_deletion import SyncDeletion
+
+    created = client.post(
+        f"/map_grids/{map_grid_id}/cells/batch",
+        json={"cells": [{"cell_code": f"A{i}"} for i in range(1, 4)]},
+        headers=auth_headers,
+    ).json()
+    version = client.get(f"/map_grids/{map_grid_id}/changes", headers=auth_headers).json()["version"]
+    client.delete(f"/map_grids/{map_grid_id}/cells/{created[0]['id']}", headers=auth_headers)
+    db_session.execute(update(SyncDeletion).values(deleted_at=func.now() - timedelta(days=365)))
+    db_session.commit()
+
+    client.delete(f"/map_grids/{map_grid_id}/cells/{created[1]['id']}", headers=auth_headers)
+    assert db_session.query(SyncDeletion).count() == 1
+    delta = client.get(f"/map_grids/{map_grid_id}/changes?since_version={version}", headers=auth_headers).json()
+    assert delta["full"] is True and [cell["cell_code"] for cell in delta["cells"]] == ["A3"]
+    # Clients past the pruned removal still get deltas
+    delta = client.get(f"/map_grids/{map_grid_id}/changes?since_version={version + 1}", headers=auth_headers).json()
+    assert delta["full"] is False and delta["deleted_cell_ids"] == [created[1]["id"]]
+
+
+def test_state_mirrors_cells(client, auth_headers, map_grid_id):
+    """Test that cell writes and state writes show up in both reads"""
+    client.put(f"/map_grids/{map_grid_id}/state", json={"cols": 5, "rows": 5}, headers=auth_headers)
+    created = client.post(
+        f"/map_grids/{map_grid_id}/cells/batch",
+        json={"cells": [{"cell_code": "A1"}, {"cell_code": "B1", "status": "assigned"}]},
+        headers=auth_headers,
+    ).json()
+    assert client.get(f"/map_grids/{map_grid_id}/state", headers=auth_headers).json()["counts"]["assigned"] == 1
+
+    # Batch PATCH of rows, then the state
+    response = client.patch(
+        f"/map_grids/{map_grid_id}/cells",
+        json={"cells": [{"cell_code": "A1", "status": "completed", "notes": "Done"}, {"cell_code": "B1", "status": "unassigned"}]},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    state = client.get(f"/map_grids/{map_grid_id}/state", headers=auth_headers).json()
+    assert state["counts"] == {"unassigned": 24, "assigned": 0, "in_progress": 0, "completed": 1}
+    assert state["notes"] == {"A1": "Done"}
+
+    # Single cell update and delete
+    client.put(f"/map_grids/{map_grid_id}/cells/{created[1]['id']}", json={"status": "in_progress"}, headers=auth_headers)
+    assert client.get(f"/map_grids/{map_grid_id}/state", headers=auth_headers).json()["counts"]["in_progress"] == 1
+    client.delete(f"/map_grids/{map_grid_id}/cells/{created[1]['id']}", headers=auth_headers)
+    assert client.get(f"/map_grids/{map_grid_id}/state", headers=auth_headers).json()["counts"]["in_progress"] == 0
+
+    # State PATCH, then the rows (a row is created for a cell that had none)
+    response = client.patch(
+        f"/map_grids/{map_grid_id}/state",
+        json={"cells": [{"cell_code": "A1", "status": "in_progress"}, {"cell_code": "c2", "status": "assigned"}]},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    cells = {cell["cell_code"]: cell for cell in client.get(f"/map_grids/{map_grid_id}/cells", headers=auth_headers).json()}
+    assert cells["A1"]["status"] == "in_progress" and cells["A1"]["notes"] == "Done"
+    assert cells["C2"]["status"] == "assigned"
+
+    # Cells outside the state's grid are rejected, nothing is written
+    params = {"center_lat": 50.45, "center_lon": 30.52, "cols": 6, "rows": 6, "cell_size": 100}
+    response = client.post(f"/map_grids/{map_grid_id}/cells/generate", json=params, headers=auth_headers)
+    assert response.status_code == 400
+    assert len(client.get(f"/map_grids/{map_grid_id}/cells", headers=auth_headers).json()) == 2
+
+    # Regenerating the rows rebuilds the state from them
+    params = {**params, "cols": 5, "rows": 5, "replace": True}
+    assert client.post(f"/map_grids/{map_grid_id}/cells/generate", json=params, headers=auth_headers).status_code == 201
+    state = client.get(f"/map_grids/{map_grid_id}/state", headers=auth_headers).json()
+    assert state["counts"]["unassigned"] == 25 and state["notes"] == {}
@@ -0,0 +1,70 @@
+import pytest
+
+from app.models.organization import Organization, OrganizationType
+from app.services import nearest_institutions
+from app.services.nearest_institutions import nearest_organizations, organization_types
+
+
+def test_organization_types():
+    """Test that names map to types and an empty selection means all types"""
+    assert organization_types(None) == list(OrganizationType)
+    assert organization_types(["police", "medical"]) == [OrganizationType.police, OrganizationType.medical]
+    with pytest.raises(ValueError):
+        organization_types(["hospital"])
+
+
+def test_radius_grows_until_every_type_is_complete(monkeypatch):
+    """Test the kNN rounds: the radius grows only while a type has too few organizations"""
+    organizations = [
+        (Organization(id=1, type=OrganizationType.police), 3.0),
+        (Organization(id=2, type=OrganizationType.medical), 25.0),
+        (Organization(id=3, type=OrganizationType.medical), 90.0),
+    ]
+    radii = []
+
+    def ranked(db, lat, lon, radius_km, types, per_type):
+        radii.append(radius_km)
+        return [
+            (organization, distance) for organization, distance in organizations
+            if distance <= radius_km and organization.type in types
+        ]
+
+    monkeypatch.setattr(nearest_institutions, "_ranked", ranked)
+
+    found, radius = nearest_organizations(None, 50.45, 30.52, 1, [OrganizationType.police, OrganizationType.medical])
+    assert radii == [10.0, 40.0] and radius == 40.0
+    assert [organization.id for organization, _ in found] == [1, 2]
+
+    radii.clear()
+    found, radius = nearest_organizations(None, 50.45, 30.52, 5, [OrganizationType.medical], max_radius_km=100)
+    assert radii == [10.0, 40.0, 100] and radius == 100
+    assert [organization.id for organization, _ in found] == [2, 3]
+
+
+def test_nearest_and_checklist(client, auth_headers):
+    """Test the nearest lookup around a case and the planned call checklist"""
+    for name, kind, lat, lon in (
+        ("Лікарня №1", "medical", 50.4510, 30.5240),
+        ("Лікарня Бровари", "medical", 50.5110, 30.7909),
+        ("Поліція Львів", "police", 49.8397, 24.0297),
+    ):
+        response = client.post("/organizations/", json={"name": name, "type": kind, "lat": lat, "lon": lon}, headers=auth_headers)
+        assert response.status_code == 201
+    case = client.post("/cases/", json={
+        "applicant_last_name": "Петренко",
+        "applicant_first_name": "Іван",
+        "missing_persons": [{"last_name": "Петренко", "first_name": "Марія", "last_seen_lat": 50.45, "last_seen_lon": 30.52}],
+    }, headers=auth_headers).json()
+
+    response = client.get(f"/organizations/nearest?case_id={case['id']}&per_type=1&max_radius_km=600", headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert [(o["name"], o["type"]) for o in data["organizations"]] == [("Поліція Львів", "police"), ("Лікарня №1", "medical")]
+    assert data["organizations"][1]["distance_km"] < 1
+
+    body = {"case_id": case["id"], "per_type": 2, "types": ["medical"]}
+    response = client.post("/institutions_calls/checklist", json=body, headers=auth_headers)
+    assert response.status_code == 201
+    assert [call["organization_name"] for call in response.json()["institutions_calls"]] == ["Лікарня №1", "Лікарня Бровари"]
+    # Organizations already on the checklist are not planned twice
+    assert client.post("/institutions_calls/checklist", json=body, headers=auth_headers).json()["total"] == 0
@@ -0,0 +1,134 @@
+"""
+Tests for the sliding-window rate limiter (no database needed).
+"""
+import threading
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.middleware import rate_limit
+from app.middleware.rate_limit import RateLimiter, enforce_rate_limit, parse_policy
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_request(ip: str) -> Request:
+    return Request({"type": "http", "headers": [(b"x-real-ip", ip.encode())], "client": ("127.0.0.1", 1)})
+
+
+def test_allows_up_to_limit_then_blocks():
+    """Test the limit per key"""
+    clock = FakeClock(1200.0)
+    limiter = RateLimiter(requests_per_window=3, window_seconds=60, clock=clock)
+    assert [limiter.check_rate_limit("1.1.1.1") for _ in range(4)] == [True, True, True, False]
+    assert limiter.get_remaining_requests("1.1.1.1") == 0
+    # Other keys have their own budget
+    assert limiter.check_rate_limit("2.2.2.2")
+    assert limiter.get_remaining_requests("3.3.3.3") == 3
+
+
+def test_previous_window_weight_decays():
+    """Test the sliding estimate across window boundaries"""
+    clock = FakeClock(1200.0)  # Start of a window
+    limiter = RateLimiter(requests_per_window=4, window_seconds=60, clock=clock)
+    for _ in range(4):
+        assert limiter.check_rate_limit("ip")
+    # A quarter into the next window, 3 of the 4 previous requests still count
+    clock.now = 1275.0
+    assert limiter.check_rate_limit("ip")
+    assert not limiter.check_rate_limit("ip")
+    # Half way, 2 previous + 1 current
+    clock.now = 1290.0
+    assert limiter.check_rate_limit("ip")
+    assert not limiter.check_rate_limit("ip")
+    # Two windows later the history is gone
+    clock.now = 1400.0
+    assert limiter.get_remaining_requests("ip") == 4
+
+
+def test_blocked_requests_do_not_count():
+    """Test rejected requests are not recorded"""
+    clock = FakeClock(1200.0)
+    limiter = RateLimiter(requests_per_window=2, window_seconds=60, clock=clock)
+    for _ in range(10):
+        limiter.check_rate_limit("ip")
+    clock.now = 1260.0 + 59.0
+    # Only the 2 allowed requests were recorded; nearly all of their weight is gone
+    assert limiter.check_rate_limit("ip")
+
+
+def test_retry_after():
+    """Test the wait until the next allowed request"""
+    clock = FakeClock(1200.0)
+    limiter = RateLimiter(requests_per_window=2, window_seconds=60, clock=clock)
+    assert limiter.retry_after("ip") == 0
+    limiter.check_rate_limit("ip")
+    limiter.check_rate_limit("ip")
+    clock.now = 1210.0
+    # Current window is full: wait for its end, then the previous weight must decay
+    assert limiter.retry_after("ip") == 50
+    clock.now = 1260.0
+    wait = limiter.retry_after("ip")
+    assert wait == 30
+    clock.now += wait
+    assert limiter.check_rate_limit("ip")
+
+
+def test_idle_keys_are_evicted():
+    """Test idle keys are dropped from memory"""
+    clock = FakeClock(1200.0)
+    limiter = RateLimiter(requests_per_window=5, window_seconds=60, clock=clock)
+    for i in range(1000):
+        limiter.check_rate_limit(f"10.0.{i // 256}.{i % 256}")
+    assert limiter.key_count() == 1000
+    clock.now = 1200.0 + 3 * 60
+    for i in range(100):
+        limiter.check_rate_limit(f"10.1.0.{i}")
+    assert limiter.key_count() == 100
+
+
+def test_concurrent_checks_never_exceed_limit():
+    """Test the shard locks under concurrent checks"""
+    limiter = RateLimiter(requests_per_window=50, window_seconds=3600, clock=FakeClock(0.0))
+    allowed = []
+
+    def worker():
+        allowed.append(sum(limiter.check_rate_limit("ip") for _ in range(100)))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(allowed) == 50
+
+
+def test_parse_policy():
+    """Test policy strings"""
+    limiter = parse_policy("30/120")
+    assert (limiter.requests_per_window, limiter.window_seconds) == (30, 120)
+    assert parse_policy("7").window_seconds == 60
+
+
+def test_enforce_raises_429_with_retry_after():
+    """Test the 429 response"""
+    limiter = RateLimiter(requests_per_window=1, window_seconds=60, clock=FakeClock(1200.0))
+    enforce_rate_limit(limiter, make_request("9.9.9.9"))
+    with pytest.raises(HTTPException) as exc:
+        enforce_rate_limit(limiter, make_request("9.9.9.9"))
+    assert exc.value.status_code == 429
+    assert exc.value.detail["window_seconds"] == 60
+    assert exc.value.headers["Retry-After"] == "60"
+
+
+def test_policies_have_separate_limiters():
+    """Test policies keep separate counters"""
+    assert rate_limit.public_rate_limiter is rate_limit.rate_limiters["public"]
+    assert rate_limit.rate_limiters["telegram"] is not rate_limit.public_rate_limiter
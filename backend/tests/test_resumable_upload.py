@@ -0,0 +1,126 @@
+import hashlib
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import upload
+from app.routers.auth import get_current_user
+from app.services import resumable_upload
+
+CONTENT = b"drone video " * 1000
+DIGEST = hashlib.sha256(CONTENT).hexdigest()
+
+
+@pytest.fixture
+def client(upload_dir, monkeypatch):
+    """Client for the upload router storing into a temporary directory"""
+    monkeypatch.setattr(upload, "process_new_uploads", lambda urls: None)
+
+    app = FastAPI()
+    app.include_router(upload.router)
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=1)
+    return TestClient(app)
+
+
+def _create(client, **extra):
+    response = client.post("/upload/sessions", json={"filename": "flight.MP4", "size": len(CONTENT), **extra})
+    assert response.status_code == 201
+    return response.json()["upload_id"]
+
+
+def test_chunks_are_assembled_and_stored_content_addressed(client, upload_dir):
+    """Test the full create / PATCH / resume / complete cycle"""
+    upload_id = _create(client, sha256=DIGEST)
+
+    first = client.patch(f"/upload/sessions/{upload_id}", content=CONTENT[:5000], headers={"Upload-Offset": "0"})
+    assert first.status_code == 200
+    assert first.json()["offset"] == 5000
+
+    # Client lost track after a disconnect and asks where to resume
+    state = client.get(f"/upload/sessions/{upload_id}")
+    assert state.headers["Upload-Offset"] == "5000"
+
+    chunk = CONTENT[5000:]
+    second = client.patch(
+        f"/upload/sessions/{upload_id}",
+        content=chunk,
+        headers={"Upload-Offset": "5000", "Upload-Checksum": f"sha256 {hashlib.sha256(chunk).hexdigest()}"},
+    )
+    assert second.json()["offset"] == len(CONTENT)
+
+    done = client.post(f"/upload/sessions/{upload_id}/complete")
+    assert done.status_code == 200
+    assert done.json()["url"] == f"/uploads/{DIGEST[:2]}/{DIGEST[2:4]}/{DIGEST}.mp4"
+    assert (upload_dir / DIGEST[:2] / DIGEST[2:4] / f"{DIGEST}.mp4").read_bytes() == CONTENT
+    assert client.get(f"/upload/sessions/{upload_id}").status_code == 404
+
+
+def test_wrong_offset_and_bad_checksum_are_rejected(client):
+    """Test that misplaced or corrupted chunks do not change the upload"""
+    upload_id = _create(client)
+
+    conflict = client.patch(f"/upload/sessions/{upload_id}", content=b"abc", headers={"Upload-Offset": "10"})
+    assert conflict.status_code == 409
+    assert conflict.headers["Upload-Offset"] == "0"
+
+    corrupted = client.patch(
+        f"/upload/sessions/{upload_id}",
+        content=CONTENT[:100],
+        headers={"Upload-Offset": "0", "Upload-Checksum": f"sha256 {'0' * 64}"},
+    )
+    assert corrupted.status_code == 400
+    assert client.get(f"/upload/sessions/{upload_id}").json()["offset"] == 0
+
+    incomplete = client.post(f"/upload/sessions/{upload_id}/complete")
+    assert incomplete.status_code == 409
+
+
+def test_whole_file_checksum_mismatch_discards_upload(client):
+    """Test the integrity check on completion"""
+    upload_id = _create(client, sha256="0" * 64)
+    client.patch(f"/upload/sessions/{upload_id}", content=CONTENT, headers={"Upload-Offset": "0"})
+
+    response = client.post(f"/upload/sessions/{upload_id}/complete")
+
+    assert response.status_code == 422
+    assert client.get(f"/upload/sessions/{upload_id}").status_code == 404
+
+
+def test_disallowed_file_type_is_rejected(client):
+    """Test that only media extensions can be uploaded"""
+    response = client.post("/upload/sessions", json={"filename": "script.sh", "size": 10})
+    assert response.status_code == 400
+
+
+def test_busy_session_is_rejected(client, upload_dir):
+    """Test that a PATCH while another request (in any worker) holds the session is refused"""
+    import fcntl
+
+    upload_id = _create(client)
+    with open(upload_dir / ".sessions" / f"{upload_id}.part", "r+b") as other:
+        fcntl.flock(other.fileno(), fcntl.LOCK_EX)
+        busy = client.patch(f"/upload/sessions/{upload_id}", content=CONTENT[:100], headers={"Upload-Offset": "0"})
+        assert busy.status_code == 409
+        assert client.delete(f"/upload/sessions/{upload_id}").status_code == 409
+
+    assert client.patch(f"/upload/sessions/{upload_id}", content=CONTENT[:100], headers={"Upload-Offset": "0"}).json()["offset"] == 100
+    assert client.delete(f"/upload/sessions/{upload_id}").status_code == 204
+    assert client.patch(f"/upload/sessions/{upload_id}", content=b"x", headers={"Upload-Offset": "100"}).status_code == 404
+
+
+def test_sessions_need_a_user_and_are_limited(client, monkeypatch):
+    """Test that anonymous callers cannot open sessions and users only a few at a time"""
+    monkeypatch.setattr(resumable_upload, "MAX_OPEN_SESSIONS", 2)
+    upload_id = _create(client)
+    _create(client)
+    response = client.post("/upload/sessions", json={"filename": "flight.mp4", "size": 10})
+    assert response.status_code == 429
+
+    # Finished sessions no longer count
+    client.delete(f"/upload/sessions/{upload_id}")
+    _create(client)
+
+    client.app.dependency_overrides.clear()
+    assert client.post("/upload/sessions", json={"filename": "flight.mp4", "size": 10}).status_code == 403
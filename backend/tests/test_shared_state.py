@@ -0,0 +1,240 @@
+"""
+Tests for the shared state backends and the shared rate limiter (no database needed).
+
+The Redis backend runs against a minimal in-process server speaking the
+Redis protocol (the commands the backend uses).
+"""
+import socketserver
+import threading
+import time
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.middleware.rate_limit import SharedRateLimiter
+from app.services.shared_state import (
+    REDIS_DELETE_IF, REDIS_EXTEND_IF, MemoryState, PostgresState, RedisState, SharedStateError
+)
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    def _command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2].decode())
+        return args
+
+    def _reply(self, value) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        if isinstance(value, int):
+            return b":%d\r\n" % value
+        if isinstance(value, Exception):
+            return b"-ERR %s\r\n" % str(value).encode()
+        if value == "OK":
+            return b"+OK\r\n"
+        data = value.encode()
+        return b"$%d\r\n%s\r\n" % (len(data), data)
+
+    def handle(self):
+        store = self.server.store
+        while True:
+            args = self._command()
+            if args is None:
+                return
+            name, key = args[0].upper(), args[1] if len(args) > 1 else None
+            if name == "EVAL":
+                # Only the backend's compare-and-delete / -expire scripts
+                script, key, expected = args[1], args[3], args[4]
+            now = time.monotonic()
+            with self.server.lock:
+                if key in store and store[key][1] <= now:
+                    del store[key]
+                if name == "EVAL":
+                    if key not in store or store[key][0] != expected:
+                        reply = 0
+                    elif script == REDIS_DELETE_IF:
+                        del store[key]
+                        reply = 1
+                    elif script == REDIS_EXTEND_IF:
+                        store[key] = (expected, now + int(args[5]) / 1000)
+                        reply = 1
+                    else:
+                        reply = ValueError("unknown script")
+                elif name == "GET":
+                    reply = store[key][0] if key in store else None
+                elif name == "SET":
+                    options = [arg.upper() for arg in args[3:]]
+                    expires = now + int(args[4]) / 1000 if "PX" in options else float("inf")
+                    if "NX" in options and key in store:
+                        reply = None
+                    else:
+                        store[key] = (args[2], expires)
+                        reply = "OK"
+                elif name == "INCRBY":
+                    value, expires = store.get(key, ("0", float("inf")))
+                    store[key] = (str(int(value) + int(args[2])), expires)
+                    reply = int(store[key][0])
+                elif name == "DEL":
+                    reply = 1 if store.pop(key, None) else 0
+                else:
+                    reply = ValueError(f"unknown command '{name}'")
+            self.wfile.write(self._reply(reply))
+
+
+@pytest.fixture
+def redis_url():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), RespHandler)
+    server.daemon_threads = True
+    server.store, server.lock = {}, threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"redis://127.0.0.1:{server.server_address[1]}/0"
+    server.shutdown()
+    server.server_close()
+
+
+def _check_backend(state):
+    assert state.get("missing") is None
+    assert state.incr("counter", 1, ttl=60) == 1
+    assert state.incr("counter", 4, ttl=60) == 5
+    assert state.incr("counter", -1, ttl=60) == 4
+    assert state.get("counter") == "4"
+    assert state.add("lock", "worker-1", ttl=60)
+    assert not state.add("lock", "worker-2", ttl=60)
+    assert state.get("lock") == "worker-1"
+    state.delete("lock")
+    assert state.add("lock", "worker-2", ttl=60)
+    # Only the owner releases or renews a lock
+    assert not state.delete_if("lock", "worker-1")
+    assert not state.extend_if("lock", "worker-1", ttl=60)
+    assert state.extend_if("lock", "worker-2", ttl=60)
+    assert state.delete_if("lock", "worker-2")
+    assert state.get("lock") is None
+    assert not state.extend_if("lock", "worker-2", ttl=60)
+
+
+def test_memory_state():
+    """Test counters, locks and expiry of the process-local backend"""
+    clock = FakeClock()
+    state = MemoryState(clock=clock)
+    _check_backend(state)
+    state.incr("short", 1, ttl=5)
+    clock.now += 5
+    assert state.get("short") is None
+    assert state.incr("short", 1, ttl=5) == 1
+    assert state.add("lock", "worker-3", ttl=60)
+    clock.now += 30
+    assert state.extend_if("lock", "worker-3", ttl=60)
+    clock.now += 59
+    assert not state.add("lock", "worker-4", ttl=60)
+    clock.now += 1
+    assert not state.delete_if("lock", "worker-3")
+    assert state.add("lock", "worker-4", ttl=60)
+
+
+def test_redis_state(redis_url):
+    """Test the Redis-protocol backend against a stand-in server"""
+    state = RedisState(redis_url)
+    _check_backend(state)
+    state.incr("short", 1, ttl=0.05)
+    time.sleep(0.1)
+    assert state.get("short") is None
+    # Counters written by another worker (connection) are seen
+    assert RedisState(redis_url).incr("counter", 1, ttl=60) == 5
+    with pytest.raises(SharedStateError):
+        state.execute(["FLUSHALL"])
+    # The connection stays usable after an error reply
+    assert state.get("counter") == "5"
+
+
+def test_redis_state_failed_setup(redis_url):
+    """Test a connection whose AUTH fails is not reused for later commands"""
+    state = RedisState(redis_url.replace("redis://", "redis://worker:secret@"))
+    for _ in range(2):
+        with pytest.raises(SharedStateError):
+            state.get("counter")
+    assert RedisState(redis_url).get("counter") is None
+
+
+def test_redis_state_unreachable():
+    """Test errors of an unreachable server"""
+    with pytest.raises(SharedStateError):
+        RedisState("redis://127.0.0.1:1/0", timeout=0.5).get("key")
+
+
+def test_postgres_statements():
+    """Test the upserts of the postgres backend compile to atomic statements"""
+    captured = []
+
+    class Connection:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            return False
+
+        def execute(self, statement):
+            captured.append(str(statement.compile(dialect=postgresql.dialect())))
+            raise RuntimeError("no database")
+
+    class Engine:
+        begin = connect = lambda self: Connection()
+
+    state = PostgresState(engine=Engine())
+    state._next_purge = float("inf")
+    with pytest.raises(RuntimeError):
+        state.incr("counter", 1, ttl=60)
+    with pytest.raises(RuntimeError):
+        state.add("lock", "worker-1", ttl=60)
+    incr, add = captured
+    assert "ON CONFLICT (key) DO UPDATE" in incr and "RETURNING shared_state.value" in incr
+    assert "ON CONFLICT (key) DO UPDATE" in add and "WHERE shared_state.expires_at <= now()" in add
+
+
+def test_shared_rate_limiter():
+    """Test the sliding window on shared counters, seen by every worker"""
+    clock = FakeClock(1200.0)
+    state = MemoryState(clock=clock)
+    workers = [SharedRateLimiter("public", 4, 60, state=state, clock=clock) for _ in range(2)]
+    assert [workers[i % 2].check_rate_limit("ip") for i in range(5)] == [True, True, True, True, False]
+    assert workers[1].get_remaining_requests("ip") == 0
+    assert workers[0].retry_after("ip") == 60
+    # A quarter into the next window, 3 of the 4 previous requests still count
+    clock.now = 1275.0
+    assert workers[1].check_rate_limit("ip")
+    assert not workers[0].check_rate_limit("ip")
+    assert workers[0].get_remaining_requests("other") == 4
+
+
+def test_shared_rate_limiter_fails_open():
+    """Test requests are allowed when the backend fails"""
+    limiter = SharedRateLimiter("public", 1, 60, state=RedisState("redis://127.0.0.1:1/0", timeout=0.5))
+    assert limiter.check_rate_limit("ip")
+    assert limiter.check_rate_limit("ip")
+    assert limiter.retry_after("ip") == 0
+
+
+def test_postgres_state(db_session):
+    """Test the postgres backend on the test database (PostgreSQL only)"""
+    engine = db_session.get_bind()
+    if engine.dialect.name != "postgresql":
+        pytest.skip("needs TEST_DATABASE_URL of a PostgreSQL database")
+    state = PostgresState(engine=engine)
+    _check_backend(state)
+    state.incr("short", 1, ttl=0.05)
+    time.sleep(0.1)
+    assert state.get("short") is None
+    assert state.incr("short", 1, ttl=60) == 1
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import time
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import upload
+from app.routers.auth import get_current_user
+from app.services import storage
+from app.services.storage import LocalStorage, key_from_url
+
+CONTENT = b"body-cam clip " * 500
+DIGEST = hashlib.sha256(CONTENT).hexdigest()
+KEY = f"{DIGEST[:2]}/{DIGEST[2:4]}/{DIGEST}.mp4"
+
+
+@pytest.fixture
+def client(upload_dir, monkeypatch):
+    """Client for the upload router with local storage in a temporary directory"""
+    monkeypatch.setattr(storage, "_storage", LocalStorage())
+    processed = []
+    monkeypatch.setattr(upload, "process_new_uploads", processed.extend)
+
+    app = FastAPI()
+    app.include_router(upload.router)
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=1)
+    test_client = TestClient(app)
+    test_client.processed = processed
+    return test_client
+
+
+def test_local_storage_operations(tmp_path):
+    """Test put/move/delete and listing that skips staging areas and excluded dirs"""
+    backend = LocalStorage(tmp_path)
+    source = tmp_path / ".tmp" / "staged"
+    source.parent.mkdir()
+    source.write_bytes(b"data")
+
+    backend.put_file(source, "ab/cd/file.jpg")
+    backend.put_file(source, "variants/thumb/ab/cd/file.jpg.webp")
+    assert backend.size("ab/cd/file.jpg") == 4
+    assert backend.size("missing.jpg") is None
+
+    keys = {item.key for item in backend.iter_objects(exclude={"variants"})}
+    assert keys == {"ab/cd/file.jpg"}
+
+    old = time.time() - 3600
+    os.utime(tmp_path / "ab/cd/file.jpg", (old, old))
+    backend.move("ab/cd/file.jpg", ".quarantine/ab/cd/file.jpg")
+    moved = list(backend.iter_objects(".quarantine"))
+    assert [item.key for item in moved] == [".quarantine/ab/cd/file.jpg"]
+    assert moved[0].modified > old
+
+    backend.delete(".quarantine/ab/cd/file.jpg")
+    backend.delete(".quarantine/ab/cd/file.jpg")
+    assert not backend.exists(".quarantine/ab/cd/file.jpg")
+
+
+def test_keys_cannot_leave_the_upload_directory(tmp_path):
+    """Test that traversal in URLs and keys is rejected"""
+    assert key_from_url("/uploads/ab/cd/x.jpg") == "ab/cd/x.jpg"
+    assert key_from_url("/uploads/../etc/passwd") is None
+    assert key_from_url("/uploads//etc/passwd") is None
+    assert key_from_url("/static/x.jpg") is None
+    with pytest.raises(ValueError):
+        LocalStorage(tmp_path).path("../outside")
+
+
+def test_direct_upload_with_local_backend(client, upload_dir):
+    """Test request / PUT / complete with the signed local upload URL"""
+    response = client.post("/upload/direct", json={"filename": "clip.MP4", "size": len(CONTENT), "sha256": DIGEST})
+    assert response.status_code == 200
+    target = response.json()
+    assert target["exists"] is False
+    assert target["url"] == f"/uploads/{KEY}"
+    assert target["upload_url"].startswith("/upload/direct/")
+
+    put = client.put(target["upload_url"], content=CONTENT, headers=target["headers"])
+    assert put.status_code == 200
+    assert (upload_dir / KEY).read_bytes() == CONTENT
+
+    done = client.post("/upload/direct/complete", json={"url": target["url"]})
+    assert done.json() == {"url": target["url"], "size": len(CONTENT), "sha256": DIGEST}
+    assert client.processed == [target["url"]]
+
+    # Same content again - nothing to send
+    again = client.post("/upload/direct", json={"filename": "copy.mp4", "size": len(CONTENT), "sha256": DIGEST})
+    assert again.json()["exists"] is True
+
+
+def test_direct_upload_rejects_other_content(client, upload_dir):
+    """Test that the upload URL only accepts the announced file"""
+    target = client.post(
+        "/upload/direct", json={"filename": "clip.mp4", "size": len(CONTENT), "sha256": DIGEST}
+    ).json()
+
+    assert client.put(target["upload_url"], content=CONTENT[:-1] + b"X").status_code == 422
+    assert client.put("/upload/direct/not-a-token", content=CONTENT).status_code == 403
+    assert not (upload_dir / KEY).exists()
+    assert client.post("/upload/direct/complete", json={"url": target["url"]}).status_code == 404
+
+
+def test_s3_presigned_upload_is_bound_to_checksum():
+    """Test that presigned PUT URLs sign content type and SHA-256 (no network needed)"""
+    pytest.importorskip("boto3")
+    backend = storage.S3Storage(
+        bucket="uploads",
+        endpoint_url="http://minio:9000",
+        public_endpoint_url="https://files.example.org",
+        access_key="key",
+        secret_key="secret",
+    )
+
+    presigned = backend.presigned_upload(KEY, DIGEST, len(CONTENT), "video/mp4")
+
+    url = urlparse(presigned.url)
+    assert url.netloc == "files.example.org"
+    assert url.path == f"/uploads/{KEY}"
+    signed = parse_qs(url.query)["X-Amz-SignedHeaders"][0].split(";")
+    assert {"content-type", "x-amz-checksum-sha256"} <= set(signed)
+    assert presigned.headers["Content-Type"] == "video/mp4"
+    assert presigned.headers["Cache-Control"] == storage.IMMUTABLE_CACHE_CONTROL
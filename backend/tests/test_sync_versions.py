@@ -0,0 +1,29 @@
+from app.services.sync_versions import is_full_sync, stamp_tracks, tracks_since
+
+
+def test_full_sync():
+    """Test when a client gets everything instead of changes"""
+    assert is_full_sync(None, 5)
+    assert is_full_sync(0, 5)
+    assert not is_full_sync(3, 5)
+    assert not is_full_sync(5, 5)
+    # Client ahead of the server (database restored from a backup)
+    assert is_full_sync(9, 5)
+    # Tombstones after the client's version were pruned
+    assert is_full_sync(3, 5, pruned_version=4)
+    assert not is_full_sync(4, 5, pruned_version=4)
+
+
+def test_stamp_tracks():
+    """Test that only new track URLs get the new version"""
+    versions, removed = stamp_tracks(None, ["/uploads/a.gpx", "/uploads/b.gpx"], 1)
+    assert versions == {"/uploads/a.gpx": 1, "/uploads/b.gpx": 1} and removed == []
+
+    versions, removed = stamp_tracks(versions, ["/uploads/b.gpx", "/uploads/c.gpx"], 4)
+    assert versions == {"/uploads/b.gpx": 1, "/uploads/c.gpx": 4}
+    assert removed == ["/uploads/a.gpx"]
+
+    assert tracks_since(versions, 0) == ["/uploads/b.gpx", "/uploads/c.gpx"]
+    assert tracks_since(versions, 3) == ["/uploads/c.gpx"]
+    assert tracks_since(versions, 4) == []
+    assert tracks_since(None, 0) == []
@@ -0,0 +1,151 @@
+import math
+from concurrent.futures import Future
+
+import numpy as np
+import pytest
+
+from app.services import track_stats
+from app.services.track_stats import (
+    aggregate_track_stats, covered_pixel_ids, measure_tracks, merge_intervals, schedule_track_stats, segment_lengths
+)
+from app.services.tracks import Track
+
+METERS_PER_DEGREE = 111320.0
+
+
+def _walk(start_lon, meters, seconds, start_time=1_700_000_000.0, points=200):
+    """Straight eastward walk at 50.45 N"""
+    lons = start_lon + np.linspace(0, meters, points) / (METERS_PER_DEGREE * math.cos(math.radians(50.45)))
+    return Track(
+        lons=lons,
+        lats=np.full(points, 50.45),
+        times=start_time + np.linspace(0, seconds, points),
+    )
+
+
+def test_segment_lengths_haversine():
+    """Test haversine distances against known values"""
+    # One degree of latitude and of longitude on the equator
+    lengths = segment_lengths(np.array([0.0, 0.0, 1.0]), np.array([0.0, 1.0, 1.0]))
+    assert lengths[0] == pytest.approx(111195, rel=1e-3)
+    assert lengths[1] == pytest.approx(111178, rel=1e-3)
+
+
+def test_merge_intervals():
+    """Test the union of time spans"""
+    assert merge_intervals([[5, 8], [0, 2], [1, 3], [8, 9]]) == [[0, 3], [5, 9]]
+    assert merge_intervals([]) == []
+
+
+def test_measure_tracks():
+    """Test distance, times and swept area of a walk with a pause and a glitch"""
+    walk = _walk(30.52, 1000, 1000)
+    # Standing still for 10 minutes at the end
+    pause = Track(
+        lons=np.full(10, walk.lons[-1]),
+        lats=np.full(10, 50.45),
+        times=walk.times[-1] + np.linspace(60, 600, 10),
+    )
+    stats = measure_tracks([walk, pause], 20)
+
+    assert stats["segments"] == 2
+    assert stats["points"] == 210
+    assert stats["distance_m"] == pytest.approx(1000, rel=0.01)
+    assert stats["moving_s"] == pytest.approx(1000, abs=1)
+    assert stats["intervals"] == [[walk.times[0], walk.times[-1]], [pause.times[0], pause.times[-1]]]
+    # Strip of 1000 x 20 m plus the round ends
+    assert stats["area_m2"] == pytest.approx(1000 * 20 + math.pi * 10 ** 2, rel=0.05)
+
+    # A 5 km jump within a few seconds is not walked (nor the way back)
+    glitch = _walk(30.52, 1000, 1000)
+    glitch.lons[100] += 0.07
+    assert 980 < measure_tracks([glitch], 20)["distance_m"] < stats["distance_m"]
+
+
+def test_aggregate_by_participant_and_group():
+    """Test totals, per-participant and per-group aggregates"""
+    walks = {
+        "/uploads/a.gpx": _walk(30.52, 1000, 1000),
+        "/uploads/b.gpx": _walk(30.53, 500, 500, start_time=1_700_000_500.0),
+        "/uploads/c.gpx": _walk(30.54, 200, 200, start_time=1_700_003_600.0),
+        "/uploads/d.gpx": _walk(30.55, 100, 100),
+    }
+    files = {url: measure_tracks([walk], 20) for url, walk in walks.items()}
+    covered, pixel_area = covered_pixel_ids({url: [walk] for url, walk in walks.items()}, 20)
+    owners = {"/uploads/a.gpx": 1, "/uploads/b.gpx": 2, "/uploads/c.gpx": 1}
+    groups = {1: "Group A", 2: "Group A", 3: None}
+
+    result = aggregate_track_stats(files, owners, groups, covered, pixel_area)
+
+    totals = result["totals"]
+    assert totals["tracks"] == 4
+    assert totals["distance_m"] == pytest.approx(1800, rel=0.01)
+    # a and b overlap in time, c starts an hour later
+    assert totals["time_on_ground_s"] == 1000 + 200
+
+    participants = {p["user_id"]: p for p in result["participants"]}
+    assert set(participants) == {1, 2}
+    assert participants[1]["tracks"] == 2
+    assert participants[1]["time_on_ground_s"] == 1200
+    assert participants[1]["group_name"] == "Group A"
+
+    assert [(g["group_name"], g["participants"], g["tracks"]) for g in result["groups"]] == [("Group A", 2, 3)]
+
+
+def test_covered_area_counts_overlaps_once():
+    """Test that ground walked twice, by one participant or two, is covered once"""
+    walks = {
+        "/uploads/a.gpx": _walk(30.52, 1000, 1000),
+        "/uploads/b.gpx": _walk(30.52, 1000, 1000, start_time=1_700_003_600.0),
+        # Second half of a's strip only
+        "/uploads/c.gpx": _walk(30.52 + 500 / (METERS_PER_DEGREE * math.cos(math.radians(50.45))), 500, 500),
+    }
+    files = {url: measure_tracks([walk], 20) for url, walk in walks.items()}
+    covered, pixel_area = covered_pixel_ids({url: [walk] for url, walk in walks.items()}, 20)
+    owners = {"/uploads/a.gpx": 1, "/uploads/b.gpx": 1, "/uploads/c.gpx": 2}
+    groups = {1: "Group A", 2: "Group A"}
+
+    result = aggregate_track_stats(files, owners, groups, covered, pixel_area)
+
+    strip = 1000 * 20 + math.pi * 10 ** 2
+    assert result["totals"]["area_m2"] == pytest.approx(strip, rel=0.05)
+    assert result["participants"][0]["area_m2"] == pytest.approx(strip, rel=0.05)
+    assert result["participants"][1]["area_m2"] == pytest.approx(files["/uploads/c.gpx"]["area_m2"], rel=0.05)
+    assert result["groups"][0]["area_m2"] == result["totals"]["area_m2"]
+
+
+class _ManualPool:
+    """Pool whose jobs finish when the test says so"""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.jobs.append((future, args))
+        return future
+
+
+def test_only_new_tracks_are_measured(monkeypatch):
+    """Test incremental recomputation and coalescing of jobs"""
+    pool = _ManualPool()
+    recorded = []
+    monkeypatch.setattr(track_stats, "get_pool", lambda: pool)
+    monkeypatch.setattr(
+        track_stats, "record_track_stats", lambda field_search_id, results, sweep: recorded.append(results)
+    )
+    previous = {"sweep_width": 20.0, "tracks": {"/uploads/a.gpx": {}}}
+
+    schedule_track_stats(3, ["/uploads/a.gpx", "/uploads/b.gpx", "/uploads/p.jpg"], previous, 20)
+    # All files are read for the covered areas, a is not measured again
+    assert pool.jobs[0][1] == ({"/uploads/a.gpx": "a.gpx", "/uploads/b.gpx": "b.gpx"}, 20.0, {"/uploads/a.gpx"})
+
+    # Another sweep width measures everything again, after the running job
+    schedule_track_stats(3, ["/uploads/a.gpx", "/uploads/b.gpx"], previous, 30)
+    assert len(pool.jobs) == 1 and track_stats.is_pending(3)
+    pool.jobs[0][0].set_result({"/uploads/b.gpx": None})
+    assert recorded == [{"/uploads/b.gpx": None}]
+    assert pool.jobs[1][1] == ({"/uploads/a.gpx": "a.gpx", "/uploads/b.gpx": "b.gpx"}, 30.0, set())
+
+    pool.jobs[1][0].set_result({})
+    assert not track_stats.is_pending(3)
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from app.services.media_pipeline import derivative_keys
+from app.services.track_variants import (
+    TRACK_MAX_ZOOM, TRACK_MIN_ZOOM, encode_polyline, level_for_zoom, load_track_levels,
+    simplification_tolerances, track_variant_path
+)
+
+
+def _decode(encoded, precision=5):
+    """Reference polyline decoder"""
+    values, current, shift = [], 0, 0
+    for char in encoded:
+        byte = ord(char) - 63
+        current |= (byte & 0x1F) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(current >> 1) if current & 1 else current >> 1)
+            current, shift = 0, 0
+    coordinates = np.cumsum(np.array(values).reshape(-1, 2), axis=0) / 10 ** precision
+    return coordinates[:, 0], coordinates[:, 1]
+
+
+def _douglas_peucker(xs, ys, tolerance):
+    """Reference recursive Douglas-Peucker, returns the kept mask"""
+    keep = np.zeros(len(xs), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(xs) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        dx, dy = xs[end] - xs[start], ys[end] - ys[start]
+        px, py = xs[start + 1:end] - xs[start], ys[start + 1:end] - ys[start]
+        length2 = dx * dx + dy * dy
+        t = np.clip((px * dx + py * dy) / (length2 or 1.0), 0, 1)
+        distances = np.hypot(px - t * dx, py - t * dy)
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack += [(start, split), (split, end)]
+    return keep
+
+
+def test_encode_polyline():
+    """Test the encoder against the format's reference example and a round trip"""
+    assert encode_polyline(np.array([38.5, 40.7, 43.252]), np.array([-120.2, -120.95, -126.453])) \
+        == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert encode_polyline(np.array([]), np.array([])) == ""
+
+    rng = np.random.default_rng(3)
+    lats, lons = rng.uniform(-80, 80, 500), rng.uniform(-180, 180, 500)
+    decoded_lats, decoded_lons = _decode(encode_polyline(lats, lons))
+    assert decoded_lats == pytest.approx(lats, abs=1e-5)
+    assert decoded_lons == pytest.approx(lons, abs=1e-5)
+
+
+def test_tolerances_match_douglas_peucker():
+    """Test that thresholding the tolerances equals running Douglas-Peucker"""
+    rng = np.random.default_rng(7)
+    for trial in range(15):
+        n = int(rng.integers(2, 300))
+        xs, ys = rng.normal(0, 1, n).cumsum(), rng.normal(0, 1, n).cumsum()
+        if trial == 0:
+            # Closed loop
+            xs[-1], ys[-1] = xs[0], ys[0]
+        tolerances = simplification_tolerances(xs, ys, 0.05)
+        for tolerance in (0.05, 0.5, 2.0, 10.0):
+            assert (_douglas_peucker(xs, ys, tolerance) == (tolerances > tolerance)).all()
+
+
+def test_level_for_zoom():
+    """Test that requested zooms map to stored levels"""
+    assert level_for_zoom(2) == TRACK_MIN_ZOOM
+    assert level_for_zoom(14) == 14
+    assert level_for_zoom(21) == TRACK_MAX_ZOOM
+
+
+def test_track_levels_are_rendered_lazily(upload_dir):
+    """Test that a track without derivative is simplified on first request"""
+    rng = np.random.default_rng(5)
+    lats = 50.45 + rng.normal(0, 2e-5, 2000).cumsum()
+    lons = 30.52 + rng.normal(0, 2e-5, 2000).cumsum()
+    points = "".join(f'<trkpt lat="{lat}" lon="{lon}"/>' for lat, lon in zip(lats, lons))
+    (upload_dir / "ab").mkdir()
+    (upload_dir / "ab" / "walk.gpx").write_text(
+        f'<gpx xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>{points}</trkseg></trk></gpx>'
+    )
+
+    levels = load_track_levels("/uploads/ab/walk.gpx")
+    assert track_variant_path("ab/walk.gpx", upload_dir / "variants").is_file()
+    assert levels["points"] == 2000
+    counts = [len(_decode(levels["zooms"][str(zoom)][0])[0]) for zoom in range(TRACK_MIN_ZOOM, TRACK_MAX_ZOOM + 1)]
+    assert counts == sorted(counts)
+    assert 2 <= counts[0] < counts[-1] <= 2000
+
+    assert load_track_levels("/uploads/ab/missing.gpx") is None
+    assert load_track_levels("/uploads/ab/photo.jpg") is None
+
+
+def test_track_derivative_is_removed_with_original():
+    """Test that the simplified track counts as a derivative of its upload"""
+    assert "variants/track/ab/walk.gpx.json" in derivative_keys("ab/walk.gpx")
@@ -0,0 +1,63 @@
+import os
+import time
+
+import pytest
+
+from app.services import upload_gc
+from app.services.upload_gc import collect_garbage
+
+
+@pytest.fixture
+def upload_dir(upload_dir, monkeypatch):
+    """Temporary upload tree with one live file"""
+    monkeypatch.setattr(upload_gc, "collect_live_paths", lambda db: {"ab/cd/live.jpg"})
+    monkeypatch.setattr(upload_gc, "_forget_media_info", lambda db, urls: None)
+
+    old = time.time() - 7 * 86400
+    for relative in ("ab/cd/live.jpg", "ab/cd/orphan.jpg", "variants/thumb/ab/cd/orphan.jpg.webp"):
+        path = upload_dir / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"data")
+        os.utime(path, (old, old))
+    (upload_dir / "fresh.jpg").write_bytes(b"just uploaded, form not saved yet")
+    return upload_dir
+
+
+def test_dry_run_reports_without_touching_files(upload_dir):
+    """Test that a dry run only reports unreferenced files past the grace period"""
+    report = collect_garbage(None, dry_run=True, grace_period_hours=24)
+
+    assert report.scanned_files == 3
+    assert report.quarantined == ["ab/cd/orphan.jpg"]
+    assert (upload_dir / "ab/cd/orphan.jpg").exists()
+    assert not (upload_dir / ".quarantine").exists()
+
+
+def test_orphans_are_quarantined_then_deleted(upload_dir):
+    """Test the two-stage quarantine/delete cycle including image variants"""
+    report = collect_garbage(None, dry_run=False, grace_period_hours=24, quarantine_days=3)
+
+    assert report.quarantined_files == 1
+    assert not (upload_dir / "ab/cd/orphan.jpg").exists()
+    assert (upload_dir / ".quarantine/ab/cd/orphan.jpg").exists()
+    assert (upload_dir / "ab/cd/live.jpg").exists()
+    assert (upload_dir / "fresh.jpg").exists()
+
+    # Quarantined right now - kept until the quarantine period is over
+    assert collect_garbage(None, dry_run=False, grace_period_hours=24, quarantine_days=3).deleted_files == 0
+
+    report = collect_garbage(None, dry_run=False, grace_period_hours=24, quarantine_days=0)
+    assert report.deleted == ["ab/cd/orphan.jpg"]
+    assert not (upload_dir / ".quarantine/ab/cd/orphan.jpg").exists()
+    assert not (upload_dir / "variants/thumb/ab/cd/orphan.jpg.webp").exists()
+
+
+def test_referenced_quarantined_file_is_restored(upload_dir, monkeypatch):
+    """Test that a file referenced again is moved back from quarantine"""
+    collect_garbage(None, dry_run=False, grace_period_hours=24)
+    monkeypatch.setattr(upload_gc, "collect_live_paths", lambda db: {"ab/cd/live.jpg", "ab/cd/orphan.jpg"})
+
+    report = collect_garbage(None, dry_run=False, grace_period_hours=24)
+
+    assert report.restored == ["ab/cd/orphan.jpg"]
+    assert (upload_dir / "ab/cd/orphan.jpg").exists()
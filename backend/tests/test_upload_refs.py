@@ -0,0 +1,34 @@
+from app.models.field_search import FieldSearch
+from app.models.orientation import Orientation
+from app.services.upload_refs import collect_refs, remove_unreferenced
+
+
+def test_collect_refs_reads_array_and_scalar_columns():
+    """Test that all tracked URL columns of a record are collected"""
+    field_search = FieldSearch(
+        search_tracks=["/uploads/ab/cd/track.gpx", None],
+        search_photos=["/uploads/photo.jpg", "https://example.com/external.jpg"],
+        preparation_grid_file="/uploads/grid_1.gpx",
+    )
+
+    assert collect_refs(field_search) == {
+        ("/uploads/ab/cd/track.gpx", "search_tracks"),
+        ("/uploads/photo.jpg", "search_photos"),
+        ("/uploads/grid_1.gpx", "preparation_grid_file"),
+    }
+    assert collect_refs(Orientation()) == set()
+
+
+def test_remove_unreferenced_keeps_shared_files(upload_dir, monkeypatch):
+    """Test that only files without remaining references are deleted"""
+    from app.services import upload_refs
+
+    (upload_dir / "shared.jpg").write_bytes(b"1")
+    (upload_dir / "orphan.jpg").write_bytes(b"2")
+    monkeypatch.setattr(upload_refs, "is_referenced", lambda db, url: url == "/uploads/shared.jpg")
+
+    removed = remove_unreferenced(None, ["/uploads/shared.jpg", "/uploads/orphan.jpg", "/uploads/missing.jpg"])
+
+    assert removed == 1
+    assert (upload_dir / "shared.jpg").exists()
+    assert not (upload_dir / "orphan.jpg").exists()
@@ -0,0 +1,73 @@
+import asyncio
+import hashlib
+import io
+
+import pytest
+from fastapi import UploadFile
+
+from app.services import upload_service
+from app.services.upload_service import (
+    UploadTooLargeError, content_hash_from_url, remove_uploads, resolve_upload_name, save_upload
+)
+
+
+@pytest.fixture
+def upload_dir(upload_dir, monkeypatch):
+    """Temporary upload directory, copied in small chunks"""
+    monkeypatch.setattr(upload_service, "CHUNK_SIZE", 1024)
+    return upload_dir
+
+
+def test_save_upload_streams_file_and_hashes(upload_dir):
+    """Test that a file is copied in chunks and its digest is computed"""
+    content = b"x" * 5000
+    upload = UploadFile(file=io.BytesIO(content), filename="Фото 1!.JPG")
+
+    stored = asyncio.run(save_upload(upload, max_size=10_000))
+
+    digest = hashlib.sha256(content).hexdigest()
+    assert stored.size == len(content)
+    assert stored.sha256 == digest
+    assert stored.filename == f"{digest[:2]}/{digest[2:4]}/{digest}.jpg"
+    assert stored.url == f"/uploads/{stored.filename}"
+    assert not stored.deduplicated
+    assert (upload_dir / stored.filename).read_bytes() == content
+    assert list((upload_dir / ".tmp").iterdir()) == []
+
+
+def test_save_upload_rejects_oversized_file_without_leftovers(upload_dir):
+    """Test that the size limit is enforced while copying and nothing is left on disk"""
+    upload = UploadFile(file=io.BytesIO(b"x" * 5000), filename="video.mp4")
+
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(save_upload(upload, max_size=2048))
+
+    assert [p.name for p in upload_dir.iterdir()] == [".tmp"]
+    assert list((upload_dir / ".tmp").iterdir()) == []
+
+
+def test_save_upload_deduplicates_identical_content(upload_dir):
+    """Test that re-uploading the same bytes reuses the stored file"""
+    content = b"same photo"
+    first = asyncio.run(save_upload(UploadFile(file=io.BytesIO(content), filename="a.jpg"), max_size=10_000))
+    second = asyncio.run(save_upload(UploadFile(file=io.BytesIO(content), filename="b.JPG"), max_size=10_000))
+
+    assert second.url == first.url
+    assert second.deduplicated
+    assert list((upload_dir / ".tmp").iterdir()) == []
+
+    # Cleanup after a failed request must not remove a file that existed before it
+    remove_uploads([second])
+    assert first.path.exists()
+
+
+def test_content_addressed_url_helpers():
+    """Test parsing of content-addressed URLs and bare file names"""
+    digest = hashlib.sha256(b"x").hexdigest()
+    url = f"/uploads/{digest[:2]}/{digest[2:4]}/{digest}.png"
+
+    assert content_hash_from_url(url) == digest
+    assert content_hash_from_url(f"/uploads/00/00/{digest}.png") is None
+    assert content_hash_from_url("/uploads/0b1c_photo.png") is None
+    assert resolve_upload_name(f"{digest}.png") == url[len("/uploads/"):]
+    assert resolve_upload_name("0b1c_photo.png") == "0b1c_photo.png"
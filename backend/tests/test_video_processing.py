@@ -0,0 +1,30 @@
+import json
+import subprocess
+
+from app.services import video_processing
+from app.services.video_processing import is_video_url, probe_video, video_variant_url
+
+
+def test_video_variant_urls():
+    """Test mapping of video URLs to poster/web rendition URLs"""
+    url = "/uploads/ab/cd/abcdef.mov"
+
+    assert is_video_url(url)
+    assert video_variant_url(url, "poster") == "/uploads/variants/poster/ab/cd/abcdef.mov.jpg"
+    assert video_variant_url(url, "web") == "/uploads/variants/web/ab/cd/abcdef.mov.mp4"
+    assert video_variant_url("/uploads/photo.jpg") is None
+    assert video_variant_url("/uploads/variants/web/ab/cd/abcdef.mov.mp4") is None
+
+
+def test_probe_video_applies_rotation(monkeypatch):
+    """Test that portrait phone videos report display dimensions"""
+    output = {
+        "streams": [{"width": 1920, "height": 1080, "side_data_list": [{"rotation": -90}]}],
+        "format": {"duration": "12.480000"},
+    }
+    monkeypatch.setattr(
+        video_processing, "_run",
+        lambda args, timeout: subprocess.CompletedProcess(args, 0, stdout=json.dumps(output).encode())
+    )
+
+    assert probe_video("/tmp/clip.mov") == {"duration": 12.48, "width": 1080, "height": 1920}
@@ -35,6 +35,16 @@ export interface FieldSearchUpdate {
   notes?: string;
 }
 
+export type GridExportFormat = 'gpx' | 'kml' | 'geojson';
+
+export interface GeneratedGrid {
+  grid_file_url: string;
+  filename: string;
+  // API paths of the other formats and of the TileJSON for vector tiles
+  exports: Record<GridExportFormat, string>;
+  tiles: string;
+}
+
 export const fieldSearchesApi = {
   list: async (params?: { case_id?: number; status_filter?: string; skip?: number; limit?: number }): Promise<FieldSearchListResponse> => {
     const response = await api.get<FieldSearchListResponse>('/field_searches/', { params });
@@ -60,8 +70,16 @@ export const fieldSearchesApi = {
     await api.delete(`/field_searches/${id}`);
   },
 
-  generateGrid: async (fieldSearchId: number): Promise<{ grid_file_url: string; filename: string }> => {
-    const response = await api.post<{ grid_file_url: string; filename: string }>(`/field_searches/${fieldSearchId}/generate-grid`);
+  generateGrid: async (fieldSearchId: number): Promise<GeneratedGrid> => {
+    const response = await api.post<GeneratedGrid>(`/field_searches/${fieldSearchId}/generate-grid`);
+    return response.data;
+  },
+
+  exportGrid: async (fieldSearchId: number, format: GridExportFormat): Promise<Blob> => {
+    const response = await api.get(`/field_searches/${fieldSearchId}/grid/export`, {
+      params: { format },
+      responseType: 'blob',
+    });
     return response.data;
   },
 
@@ -1,5 +1,30 @@
+import axios from 'axios';
 import { api } from './client';
 
+interface UploadSession {
+  upload_id: string;
+  size: number;
+  offset: number;
+  chunk_size: number;
+}
+
+interface DirectUpload {
+  url: string;
+  exists: boolean;
+  upload_url: string | null;
+  method: string;
+  headers: Record<string, string>;
+}
+
+const MAX_CHUNK_RETRIES = 5;
+
+const sha256Hex = async (file: File): Promise<string> => {
+  const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+  return Array.from(new Uint8Array(digest))
+    .map((byte) => byte.toString(16).padStart(2, '0'))
+    .join('');
+};
+
 export const uploadApi = {
   uploadImages: async (files: File[]): Promise<string[]> => {
     const formData = new FormData();
@@ -31,6 +56,73 @@ export const uploadApi = {
     return response.data;
   },
 
+  /**
+   * Resumable upload for large media (field video over mobile networks).
+   * Sends the file in chunks; a dropped connection retries from the last
+   * offset acknowledged by the server. Returns the stored file URL.
+   */
+  uploadLargeMedia: async (file: File, onProgress?: (loaded: number, total: number) => void): Promise<string> => {
+    const { data: session } = await api.post<UploadSession>('/upload/sessions', {
+      filename: file.name,
+      size: file.size,
+    });
+
+    let offset = session.offset;
+    let retries = 0;
+    while (offset < file.size) {
+      const chunk = file.slice(offset, offset + session.chunk_size);
+      try {
+        const { data } = await api.patch<UploadSession>(`/upload/sessions/${session.upload_id}`, chunk, {
+          headers: {
+            'Content-Type': 'application/offset+octet-stream',
+            'Upload-Offset': String(offset),
+          },
+        });
+        offset = data.offset;
+        retries = 0;
+        onProgress?.(offset, file.size);
+      } catch (error) {
+        if (++retries > MAX_CHUNK_RETRIES) throw error;
+        await new Promise((resolve) => setTimeout(resolve, 1000 * retries));
+        // Ask the server how much actually arrived before the failure
+        const { data } = await api.get<UploadSession>(`/upload/sessions/${session.upload_id}`);
+        offset = data.offset;
+      }
+    }
+
+    const { data } = await api.post<{ url: string }>(`/upload/sessions/${session.upload_id}/complete`);
+    return data.url;
+  },
+
+  /**
+   * Upload a media file straight to storage via a presigned URL (object
+   * storage in production), bypassing the API workers. Files already stored
+   * are not sent again. Returns the stored file URL.
+   */
+  uploadDirect: async (file: File, onProgress?: (loaded: number, total: number) => void): Promise<string> => {
+    const { data: target } = await api.post<DirectUpload>('/upload/direct', {
+      filename: file.name,
+      size: file.size,
+      sha256: await sha256Hex(file),
+      content_type: file.type || undefined,
+    });
+
+    if (target.exists || !target.upload_url) return target.url;
+
+    // Relative URLs are served by the API itself (local storage)
+    const client = target.upload_url.startsWith('/') ? api : axios;
+    await client.request({
+      url: target.upload_url,
+      method: target.method,
+      data: file,
+      headers: target.headers,
+      onUploadProgress: (event) => onProgress?.(event.loaded, file.size),
+    });
+
+    const { data } = await api.post<{ url: string }>('/upload/direct/complete', { url: target.url });
+    return data.url;
+  },
+
   deleteImage: async (filename: string): Promise<void> => {
     await api.delete(`/upload/images/${filename}`);
   },
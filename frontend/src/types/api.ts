@@ -197,10 +197,30 @@ export interface FieldSearch {
   grid_cols: number | null;
   grid_rows: number | null;
   grid_cell_size: number | null;
+  grid_shape: 'square' | 'hex';
+  grid_area_file: string | null;
 
   // Search progress section
   search_tracks: string[];
+  search_track_owners: Record<string, number> | null;
   search_photos: string[];
+  track_totals: TrackStatsTotals | null;
+  track_stats_updated_at: string | null;
+  version: number;
+  grid_sweep_width: number | null;
+  grid_coverage_percent: number | null;
+  grid_coverage_updated_at: string | null;
+}
+
+export interface TrackStatsTotals {
+  tracks: number;
+  points: number;
+  distance_m: number;
+  area_m2: number;
+  moving_s: number;
+  time_on_ground_s: number;
+  start: string | null;
+  end: string | null;
 }
 
 // Search types
@@ -454,6 +474,10 @@ export interface DashboardStats {
   field_searches: {
     total: number;
     by_status: Record<string, number>;
+    tracks: number;
+    distance_km: number;
+    area_km2: number;
+    time_on_ground_hours: number;
   };
   distributions: {
     total: number;
@@ -85,7 +85,16 @@ async def process_case_info(message: types.Message, state: FSMContext):
             ) as resp:
                 if resp.status == 201:
                     result = await resp.json()
-                    case_id = result["case_id"]
+                    case_id = result.get("case_id")
+
+                    if not case_id:
+                        # Додано до вже наявної заявки - фото прикріпити нікуди
+                        await message.answer(
+                            "✅ Дані збережено!\n\n"
+                            "Наша команда зв'яжеться з вами найближчим часом."
+                        )
+                        await state.clear()
+                        return
 
                     # Зберігаємо case_id в state
                     await state.update_data(case_id=case_id)